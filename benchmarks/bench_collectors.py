@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Compare scrape-cycle cost of the exporter's collector backends.
+
+Runs N collection cycles per backend and reports wall-clock latency
+(p50/p99/max) and CPU time per cycle, including CPU burnt in child
+processes (the dcgmi fork for the subprocess backend).
+
+Run inside the container, where the hostengine and fake GPUs are up:
+  python3 benchmarks/bench_collectors.py -n 50
+  python3 benchmarks/bench_collectors.py -b subprocess,pydcgm -n 200
+
+Note that the dmon-stream child's CPU time is only accounted once it exits.
+"""
+
+import argparse
+import resource
+import time
+
+
+from bench_common import dcgm_exporter, percentile
+
+
+def cpu_seconds():
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (self_usage.ru_utime + self_usage.ru_stime +
+            child_usage.ru_utime + child_usage.ru_stime)
+
+
+def wait_ready(collector, timeout=10.0):
+    """The dmon-stream backend needs its first rows before collect() succeeds"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return collector.collect()
+        except RuntimeError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def bench(backend, cycles, warmup):
+    collector = dcgm_exporter.create_collector(backend)
+    try:
+        wait_ready(collector)
+        for _ in range(warmup):
+            collector.collect()
+        latencies = []
+        gpus = 0
+        cpu_start = cpu_seconds()
+        for _ in range(cycles):
+            start = time.perf_counter()
+            gpus = len(collector.collect())
+            latencies.append(time.perf_counter() - start)
+        cpu_total = cpu_seconds() - cpu_start
+    finally:
+        collector.close()
+    return {
+        'backend': collector.name,
+        'gpus': gpus,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': max(latencies) * 1000,
+        'cpu_ms': cpu_total / cycles * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark exporter collector backends')
+    parser.add_argument('-b', '--backends', default='subprocess,pydcgm,dmon-stream',
+                        help='Comma-separated backends to compare (default: subprocess,pydcgm,dmon-stream)')
+    parser.add_argument('-n', '--cycles', type=int, default=50,
+                        help='Collection cycles per backend (default: 50)')
+    parser.add_argument('-w', '--warmup', type=int, default=3,
+                        help='Warmup cycles per backend (default: 3)')
+    args = parser.parse_args()
+
+    print(f"{'backend':<12} {'gpus':>5} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'cpu ms/cycle':>13}")
+    for backend in args.backends.split(','):
+        try:
+            r = bench(backend.strip(), args.cycles, args.warmup)
+        except Exception as e:
+            print(f"{backend:<12} failed: {e}")
+            continue
+        print(f"{r['backend']:<12} {r['gpus']:>5} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+              f"{r['max_ms']:>9.2f} {r['cpu_ms']:>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+"""Helpers shared by the benchmark scripts"""
+
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import dcgm_exporter  # noqa: E402
+
+
+def synthetic_metrics(num_gpus):
+    """Collector-shaped {gpu_id: {field_id: value}} data for `num_gpus` GPUs"""
+    return {
+        str(gpu): {field_id: float(gpu * 10 + idx) for idx, field_id in enumerate(dcgm_exporter.FIELD_MAPPING)}
+        for gpu in range(1, num_gpus + 1)
+    }
+
+
+def synthetic_snapshot(num_gpus):
+    return dcgm_exporter.MetricsSnapshot(dcgm_exporter.render_metrics(synthetic_metrics(num_gpus)))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Parse cost of large dcgmi dmon outputs: header-driven DmonParser vs the
+previous positional parser (kept here as the baseline).
+
+  python3 benchmarks/bench_dmon_parser.py --gpus 1000 --fields 50 -n 20
+"""
+
+import argparse
+import random
+import time
+
+
+from bench_common import dcgm_exporter, percentile
+
+
+def legacy_parse_dcgmi_output(output, field_ids):
+    """The per-line positional parser DmonParser replaced"""
+    metrics = {}
+    for line in output.strip().split('\n'):
+        if not line.startswith('GPU '):
+            continue
+        parts = line.split()
+        if len(parts) < 2 or parts[1] == '0':
+            continue
+        values = {}
+        ids = list(field_ids)
+        for idx, val in enumerate(parts[2:]):
+            if idx < len(ids) and val != 'N/A':
+                try:
+                    values[ids[idx]] = float(val)
+                except ValueError:
+                    pass
+        metrics.setdefault(parts[1], {}).update(values)
+    return metrics
+
+
+def synthetic_dmon_output(num_gpus, num_fields, na_ratio, seed=0):
+    rng = random.Random(seed)
+    known = list(dcgm_exporter.DMON_SHORT_NAMES)
+    names = [known[idx] if idx < len(known) else f"F{idx:04d}" for idx in range(num_fields)]
+    lines = ['#Entity   ' + '  '.join(names), 'ID        ' + '  '.join('X' for _ in names)]
+    for gpu in range(num_gpus + 1):
+        values = ('N/A' if rng.random() < na_ratio else f"{rng.uniform(0, 20000):.3f}" for _ in names)
+        lines.append(f"GPU {gpu:<5} " + '  '.join(values))
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--gpus', type=int, default=1000)
+    parser.add_argument('--fields', type=int, default=50)
+    parser.add_argument('--na-ratio', type=float, default=0.05, help='Fraction of N/A cells')
+    parser.add_argument('-n', '--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    field_ids = [str(1000 + idx) for idx in range(args.fields)]
+    output = synthetic_dmon_output(args.gpus, args.fields, args.na_ratio)
+    print(f"{args.gpus} GPUs x {args.fields} fields, {len(output) / 1024:.0f} KiB of dmon output")
+
+    for name, parse in (('legacy', legacy_parse_dcgmi_output), ('header', dcgm_exporter.parse_dcgmi_output)):
+        samples = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            metrics = parse(output, field_ids)
+            samples.append(time.perf_counter() - start)
+        cells = sum(len(values) for values in metrics.values())
+        print(f"{name:<8} p50 {percentile(samples, 50) * 1000:8.2f} ms  p99 {percentile(samples, 99) * 1000:8.2f} ms  "
+              f"({cells / percentile(samples, 50) / 1e6:.1f} M cells/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+OTLP push throughput: data points/sec the pusher encodes and delivers to a
+local sink receiver (in a separate process, so it does not compete for the
+GIL), plus the per-snapshot cost publish() adds to the refresh loop.
+
+  python3 benchmarks/bench_otlp_push.py --gpus 1024 --snapshots 10 --batch-size 8192 -c 2
+"""
+
+import argparse
+import multiprocessing
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench_common import dcgm_exporter, percentile, synthetic_metrics
+import dcgm_otlp_push
+
+
+class SinkHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_sink(port, ready):
+    server = ThreadingHTTPServer(('127.0.0.1', port), SinkHandler)
+    server.daemon_threads = True
+    ready.set()
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--gpus', type=int, default=1024)
+    parser.add_argument('--snapshots', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=8192)
+    parser.add_argument('-c', '--connections', type=int, default=2)
+    parser.add_argument('--compression', choices=('gzip', 'none'), default='gzip')
+    parser.add_argument('--port', type=int, default=14318)
+    args = parser.parse_args()
+
+    ready = multiprocessing.Event()
+    sink = multiprocessing.Process(target=serve_sink, args=(args.port, ready), daemon=True)
+    sink.start()
+    ready.wait(10)
+    try:
+        pusher = dcgm_otlp_push.OtlpPusher(f'http://127.0.0.1:{args.port}/v1/metrics', headers={},
+                                           compression=args.compression, batch_size=args.batch_size,
+                                           flush_interval=3600, max_queue=args.gpus * args.snapshots,
+                                           connections=args.connections)
+        metrics = synthetic_metrics(args.gpus)
+        publish = []
+        start = time.perf_counter()
+        for _ in range(args.snapshots):
+            snapshot = dcgm_exporter.MetricsSnapshot('', gpu_metrics=metrics)
+            begin = time.perf_counter()
+            pusher.publish(snapshot)
+            publish.append(time.perf_counter() - begin)
+        pusher.flush()
+        elapsed = time.perf_counter() - start
+        pusher.close()
+        print(f"{args.gpus} GPUs x {len(dcgm_exporter.FIELD_MAPPING)} fields x {args.snapshots} snapshots, "
+              f"batch {args.batch_size}, {args.connections} connection(s), {args.compression}")
+        print(f"delivered {pusher.sent_points} points in {pusher.sent_requests} requests: "
+              f"{pusher.sent_points / elapsed:,.0f} points/s")
+        print(f"publish() p50 {percentile(publish, 50) * 1000:.2f}ms  max {max(publish) * 1000:.2f}ms")
+    finally:
+        sink.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Per-tick cost of the scalar profiles vs the vectorized (numpy) ones.
+
+The scalar engine calls profile.apply() once per GPU like the manager does;
+the batched engine calls apply_batch() once for the whole GPU array. No DCGM
+needed.
+
+  python3 benchmarks/bench_profiles.py --gpus 16,1024,4096 -n 20
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import bench_common  # noqa: F401 - puts ../src on sys.path
+import dcgm_batch_profiles
+import dcgm_fake_manager
+from bench_common import percentile
+
+
+def time_scalar(profile_name, num_gpus, ticks):
+    profiles = {gpu_id: dcgm_fake_manager.ProfileFactory.create(profile_name)
+                for gpu_id in range(1, num_gpus + 1)}
+    samples = []
+    for _ in range(ticks):
+        start = time.perf_counter()
+        for gpu_id, profile in profiles.items():
+            {k: int(v) for k, v in profile.apply(gpu_id, {}).items()}
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def time_batched(profile_name, num_gpus, ticks, with_dicts):
+    profile = dcgm_batch_profiles.create_batch_profile(profile_name, seed=0)
+    gpu_ids = np.arange(1, num_gpus + 1)
+    samples = []
+    for _ in range(ticks):
+        start = time.perf_counter()
+        rows = profile.apply_batch(gpu_ids)
+        if with_dicts:
+            dcgm_batch_profiles.rows_to_dicts(gpu_ids, rows)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--gpus', default='16,256,1024,4096', help='Comma-separated GPU counts')
+    parser.add_argument('-p', '--profiles', default=','.join(dcgm_fake_manager.ProfileFactory.list_profiles()))
+    parser.add_argument('-n', '--ticks', type=int, default=20, help='Ticks per measurement')
+    args = parser.parse_args()
+
+    print(f"{'profile':<10} {'gpus':>6} {'scalar p50':>11} {'batch p50':>10} {'+dicts p50':>11} {'speedup':>8}")
+    for profile_name in args.profiles.split(','):
+        for num_gpus in (int(n) for n in args.gpus.split(',')):
+            scalar = percentile(time_scalar(profile_name, num_gpus, args.ticks), 50)
+            batch = percentile(time_batched(profile_name, num_gpus, args.ticks, False), 50)
+            dicts = percentile(time_batched(profile_name, num_gpus, args.ticks, True), 50)
+            print(f"{profile_name:<10} {num_gpus:>6} {scalar * 1000:>9.2f}ms {batch * 1000:>8.2f}ms "
+                  f"{dicts * 1000:>9.2f}ms {scalar / batch:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main()
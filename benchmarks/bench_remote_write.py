@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Remote-write throughput: samples/sec the fleet driver sustains into a local
+sink receiver (in a separate process, so it does not compete for the GIL).
+Each tick runs the metric profiles for every GPU in the fleet and queues it
+on the writer; the run reports what was delivered over the whole window,
+plus tick cost, request size and snappy compression ratio.
+
+  python3 benchmarks/bench_remote_write.py --nodes 100 --gpus 8 --ticks 10 --shards 4
+"""
+
+import argparse
+import multiprocessing
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench_common import percentile
+import dcgm_field_registry
+import dcgm_remote_write
+
+
+class SinkHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(204)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_sink(port, ready):
+    server = ThreadingHTTPServer(('127.0.0.1', port), SinkHandler)
+    server.daemon_threads = True
+    ready.set()
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=100)
+    parser.add_argument('--gpus', type=int, default=8)
+    parser.add_argument('--ticks', type=int, default=10)
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--max-samples-per-send', type=int, default=2000)
+    parser.add_argument('--profile', default='spike')
+    parser.add_argument('--profile-engine', choices=['scalar', 'numpy'], default='scalar')
+    parser.add_argument('--port', type=int, default=19201)
+    args = parser.parse_args()
+
+    ready = multiprocessing.Event()
+    sink = multiprocessing.Process(target=serve_sink, args=(args.port, ready), daemon=True)
+    sink.start()
+    ready.wait(10)
+    try:
+        fields = dcgm_field_registry.FIELDS
+        writer = dcgm_remote_write.RemoteWriter(f'http://127.0.0.1:{args.port}/api/v1/write', fields=fields,
+                                                external_labels=(), shards=args.shards,
+                                                max_samples_per_send=args.max_samples_per_send,
+                                                batch_send_deadline=0.5,
+                                                capacity=args.nodes * args.gpus * len(fields) * args.ticks)
+        fleet = dcgm_remote_write.FleetSimulator(args.nodes, args.gpus, args.profile,
+                                                 profile_engine=args.profile_engine, fields=fields)
+        ticks = []
+        start = time.perf_counter()
+        for tick in range(args.ticks):
+            begin = time.perf_counter()
+            timestamp = 1.7e9 + tick * fleet.update_interval
+            for labels, gpu_metrics in fleet.tick().items():
+                writer.submit(gpu_metrics, timestamp, labels)
+            ticks.append(time.perf_counter() - begin)
+        writer.flush()
+        elapsed = time.perf_counter() - start
+        writer.close()
+        sample_rows = [(int(1.7e12), labels, gpu_id, values, len(values))
+                       for labels, gpu_metrics in list(fleet.tick().items())[:4]
+                       for gpu_id, values in gpu_metrics.items()]
+        raw = writer.encoder.encode(sample_rows)
+        ratio = len(raw) / len(dcgm_remote_write.compress(raw))
+        print(f"{args.nodes} nodes x {args.gpus} GPUs x {len(fields)} fields x {args.ticks} ticks, "
+              f"{args.shards} shard(s), {args.max_samples_per_send} samples/send, {args.profile_engine} profiles")
+        print(f"delivered {writer.sent_samples} samples in {writer.sent_requests} requests "
+              f"({writer.sent_bytes / max(writer.sent_requests, 1) / 1024:.1f} KiB each, "
+              f"snappy {ratio:.1f}x): {writer.sent_samples / elapsed:,.0f} samples/s sustained")
+        print(f"tick p50 {percentile(ticks, 50) * 1000:.1f}ms  max {max(ticks) * 1000:.1f}ms  "
+              f"dropped {writer.dropped_samples}")
+    finally:
+        sink.terminate()
+
+
+if __name__ == '__main__':
+    main()
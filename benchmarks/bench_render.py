@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Exposition render cost: the cached-layout ExpositionRenderer vs the previous
+build-every-line-and-sort renderer (kept here as the baseline), plus the
+OpenMetrics and protobuf renderers that share its layout.
+
+Each refresh changes a fraction of the values (--changed), like a collector
+where only some fields move between cycles. Time is the p50 of -n renders,
+memory is the tracemalloc peak allocated while rendering one refresh.
+
+  python3 benchmarks/bench_render.py --gpus 1024 --fields 50 -n 20
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+
+from bench_common import dcgm_exporter, percentile
+
+
+def legacy_render_metrics(gpu_metrics):
+    """The per-refresh f-string + global sort renderer ExpositionRenderer replaced"""
+    lines = []
+    for gpu_id, fields in gpu_metrics.items():
+        labels = f'gpu="{gpu_id}",device="nvidia{gpu_id}"'
+        for field_id, value in fields.items():
+            if field_id in dcgm_exporter.FIELD_MAPPING:
+                metric_name, _ = dcgm_exporter.FIELD_MAPPING[field_id]
+                lines.append(f'{metric_name}{{{labels}}} {value}')
+    output = []
+    for field_id, (name, help_text) in dcgm_exporter.FIELD_MAPPING.items():
+        output.append(f"# HELP {name} {help_text}")
+        output.append(f"# TYPE {name} gauge")
+    output.extend(sorted(lines))
+    return '\n'.join(output) + '\n'
+
+
+def refreshes(num_gpus, fields, changed, count, seed=0):
+    """`count` collector results where a `changed` fraction of values moves each time
+    (gauges jump to a new value, counters only go up)"""
+    rng = random.Random(seed)
+    counters = {field.field_id for field in fields if field.metric_type == 'counter'}
+    metrics = {str(gpu): {field.field_id: float(rng.randint(0, 20000)) for field in fields}
+               for gpu in range(1, num_gpus + 1)}
+
+    def move(field_id, value):
+        step = float(rng.randint(0, 20000))
+        return value + step if field_id in counters else step
+
+    results = []
+    for _ in range(count):
+        metrics = {gpu_id: {field_id: (move(field_id, value) if rng.random() < changed else value)
+                            for field_id, value in values.items()}
+                   for gpu_id, values in metrics.items()}
+        results.append(metrics)
+    return results
+
+
+def measure(render, inputs):
+    render(inputs[0])  # warm-up: builds the layout for the cached renderer
+    samples = []
+    for metrics in inputs[1:]:
+        start = time.perf_counter()
+        render(metrics)
+        samples.append(time.perf_counter() - start)
+    tracemalloc.start()
+    render(inputs[0])  # differs from the last refresh unless nothing changes
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return percentile(samples, 50), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--gpus', type=int, default=1024)
+    parser.add_argument('--fields', type=int, default=50, help='Registry fields per GPU')
+    parser.add_argument('--changed', default='1.0,0.1,0', help='Comma-separated fractions of values changed per refresh')
+    parser.add_argument('-n', '--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    fields = dcgm_exporter.EXPORTED_FIELDS[:args.fields]
+    print(f"{args.gpus} GPUs x {len(fields)} fields = {args.gpus * len(fields)} series")
+    print(f"{'renderer':<12} {'changed':>8} {'p50':>10} {'peak mem':>10}")
+    for changed in (float(c) for c in args.changed.split(',')):
+        inputs = refreshes(args.gpus, fields, changed, args.runs + 1)
+        for name, render in (('legacy', legacy_render_metrics),
+                             ('cached', dcgm_exporter.ExpositionRenderer(fields).render),
+                             ('openmetrics', dcgm_exporter.ExpositionRenderer(fields, openmetrics=True).render),
+                             ('protobuf', dcgm_exporter.ProtobufRenderer(fields).render)):
+            p50, peak = measure(render, inputs)
+            print(f"{name:<12} {changed:>7.0%} {p50 * 1000:>8.2f}ms {peak / 1024 / 1024:>8.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
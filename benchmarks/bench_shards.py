@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Collection cost across hostengine shards: serial vs concurrent fan-out.
+
+Reads the shard map written by `dcgm_fake_manager.py start -n <many>` and,
+for the first 1, 2, 4, ... shards, times one collection cycle done shard
+by shard and the same cycle through ShardedCollector's concurrent fan-out.
+
+Run inside the container after starting e.g. 256 GPUs (16 shards):
+  python3 benchmarks/bench_shards.py -b pydcgm -n 20
+"""
+
+import argparse
+import time
+
+
+from bench_common import dcgm_exporter, percentile
+
+
+def bench(backend, shards, cycles):
+    sharded = dcgm_exporter.ShardedCollector(backend, shards)
+    try:
+        serial, concurrent = [], []
+        for _ in range(cycles):
+            start = time.perf_counter()
+            for c in sharded.collectors:
+                c.collect()
+            serial.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            gpus = len(sharded.collect())
+            concurrent.append(time.perf_counter() - start)
+    finally:
+        sharded.close()
+    return gpus, percentile(serial, 50), percentile(concurrent, 50)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-b', '--backend', default='pydcgm', help='Per-shard collector backend')
+    parser.add_argument('-n', '--cycles', type=int, default=20, help='Collection cycles per measurement')
+    parser.add_argument('--shard-map', default=dcgm_exporter.DCGM_SHARD_MAP)
+    args = parser.parse_args()
+
+    shards = dcgm_exporter.load_shard_map(args.shard_map)
+    if not shards:
+        parser.error(f"no shard map at {args.shard_map}; start the manager first")
+
+    print(f"{'shards':>6} {'gpus':>6} {'serial p50':>11} {'fan-out p50':>12} {'speedup':>8}")
+    count = 1
+    while True:
+        gpus, serial, concurrent = bench(args.backend, shards[:count], args.cycles)
+        print(f"{count:>6} {gpus:>6} {serial * 1000:>9.2f}ms {concurrent * 1000:>10.2f}ms "
+              f"{serial / concurrent:>7.1f}x")
+        if count == len(shards):
+            break
+        count = min(count * 2, len(shards))
+
+
+if __name__ == '__main__':
+    main()
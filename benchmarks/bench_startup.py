@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Startup and shutdown time of the fake GPU manager, by phase.
+
+Each run starts `dcgm_fake_manager.py start` with its own DCGM_READY_FILE,
+waits for the file (hostengines up, GPUs created, first cycle injected),
+reads the manager's startup breakdown from it, then times
+`dcgm_fake_manager.py stop`. Run inside the container, with nothing else
+holding the hostengine ports:
+  python3 benchmarks/bench_startup.py -n 10 --gpus 4,64
+
+With --image it instead times whole container cold starts, from
+`docker run` until /health answers (and, with --metrics, until /metrics
+has GPU samples), which is what CI pays per container:
+  python3 benchmarks/bench_startup.py --image dcgm-fake-gpu-exporter -n 10
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import bench_common  # noqa: F401 - puts ../src on sys.path
+from bench_common import percentile
+
+MANAGER = os.path.join(bench_common.SRC_DIR, 'dcgm_fake_manager.py')
+PHASES = ('hostengine', 'gpus', 'inject', 'total')
+
+
+def wait_for(check, timeout):
+    deadline = time.monotonic() + timeout
+    while not check():
+        if time.monotonic() > deadline:
+            raise TimeoutError("timed out")
+        time.sleep(0.01)
+    return time.monotonic()
+
+
+def run_manager(num_gpus, dcgm_dir, timeout):
+    """(seconds until ready, the manager's own phases, seconds `stop` took)"""
+    ready_file = os.path.join(tempfile.gettempdir(), f'bench-startup-{os.getpid()}.json')
+    env = dict(os.environ, NUM_FAKE_GPUS=str(num_gpus), DCGM_READY_FILE=ready_file)
+    args = [sys.executable, MANAGER] + (['-d', dcgm_dir] if dcgm_dir else [])
+    start = time.monotonic()
+    manager = subprocess.Popen(args + ['start'], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               stdin=subprocess.DEVNULL)
+    try:
+        ready = wait_for(lambda: os.path.exists(ready_file) or manager.poll() is not None, timeout)
+        if not os.path.exists(ready_file):
+            raise RuntimeError(f"manager exited with {manager.returncode} before it was ready")
+        with open(ready_file) as f:
+            phases = json.load(f)['startup_seconds']
+    finally:
+        stop_start = time.monotonic()
+        subprocess.run(args + ['stop'], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        stopped = time.monotonic()
+        # The updater thread keeps the start process alive
+        manager.send_signal(signal.SIGTERM)
+        manager.wait()
+        if os.path.exists(ready_file):
+            os.remove(ready_file)
+    return ready - start, phases, stopped - stop_start
+
+
+def http_ok(url, needle=None):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status == 200 and (needle is None or needle in response.read())
+    except OSError:
+        return False
+
+
+def run_container(image, port, metrics, timeout):
+    """(seconds until /health, seconds until /metrics has GPU samples or None)"""
+    name = f'bench-startup-{os.getpid()}'
+    start = time.monotonic()
+    subprocess.run(['docker', 'run', '-d', '--rm', '--name', name, '-p', f'{port}:9400', image],
+                   check=True, stdout=subprocess.DEVNULL)
+    try:
+        healthy = wait_for(lambda: http_ok(f'http://localhost:{port}/health'), timeout)
+        serving = wait_for(lambda: http_ok(f'http://localhost:{port}/metrics', b'dcgm_gpu_temp{'),
+                           timeout) if metrics else None
+    finally:
+        subprocess.run(['docker', 'rm', '-f', name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return healthy - start, None if serving is None else serving - start
+
+
+def summary(samples):
+    return f"{percentile(samples, 50) * 1000:>8.0f} {max(samples) * 1000:>8.0f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--runs', type=int, default=5, help='Starts per configuration')
+    parser.add_argument('--gpus', default='4', help='Comma-separated GPU counts (manager mode)')
+    parser.add_argument('-d', '--dcgm-dir', help='DCGM directory passed to the manager')
+    parser.add_argument('--image', help='Time container cold starts of this image instead')
+    parser.add_argument('--port', type=int, default=19400, help='Host port for --image')
+    parser.add_argument('--metrics', action='store_true', help='With --image, also wait for GPU samples')
+    parser.add_argument('--timeout', type=float, default=120, help='Seconds before a start counts as failed')
+    args = parser.parse_args()
+
+    if args.image:
+        healthy, serving = [], []
+        for _ in range(args.runs):
+            health, metrics = run_container(args.image, args.port, args.metrics, args.timeout)
+            healthy.append(health)
+            if metrics is not None:
+                serving.append(metrics)
+        print(f"{'container':<22} {'p50 ms':>8} {'max ms':>8}")
+        print(f"{'until /health':<22} {summary(healthy)}")
+        if serving:
+            print(f"{'until GPU metrics':<22} {summary(serving)}")
+        return
+
+    print(f"{'gpus':>5} {'phase':<12} {'p50 ms':>8} {'max ms':>8}")
+    for num_gpus in (int(n) for n in args.gpus.split(',')):
+        ready, stop, phases = [], [], {phase: [] for phase in PHASES}
+        for _ in range(args.runs):
+            seconds, breakdown, stopped = run_manager(num_gpus, args.dcgm_dir, args.timeout)
+            ready.append(seconds)
+            stop.append(stopped)
+            for phase in PHASES:
+                phases[phase].append(breakdown[phase])
+        for phase in PHASES:
+            print(f"{num_gpus:>5} {phase:<12} {summary(phases[phase])}")
+        print(f"{num_gpus:>5} {'until ready':<12} {summary(ready)}")
+        print(f"{num_gpus:>5} {'stop':<12} {summary(stop)}")
+
+
+if __name__ == '__main__':
+    main()
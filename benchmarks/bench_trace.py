@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Streaming cost of the trace profile: per-tick time and peak memory while a
+synthetic `dcgmi dmon` trace (or an nvidia-smi CSV) is read and resampled.
+No DCGM needed.
+
+  python3 benchmarks/bench_trace.py --gpus 64,512,2048 --frames 200
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import bench_common  # noqa: F401 - puts ../src on sys.path
+import dcgm_trace
+from bench_common import percentile
+
+
+def write_dmon(path, num_gpus, frames):
+    with open(path, 'w') as f:
+        f.write("#Entity TMPTR POWER GPUTL MCUTL SMCLK MMCLK FBUSD\nID C W % % MHZ MHZ MB\n")
+        for frame in range(frames):
+            f.writelines(f"GPU {gpu} {40 + frame % 40} {100 + gpu % 200}.5 {frame % 100} 30 1410 877 {gpu}\n"
+                         for gpu in range(num_gpus))
+
+
+def write_csv(path, num_gpus, frames):
+    with open(path, 'w') as f:
+        f.write("timestamp, index, temperature.gpu, power.draw [W], utilization.gpu [%], memory.used [MiB]\n")
+        for frame in range(frames):
+            stamp = f"2024/01/15 10:{frame // 60 % 60:02d}:{frame % 60:02d}.000"
+            f.writelines(f"{stamp}, {gpu}, {40 + frame % 40}, {100 + gpu % 200}.50 W, {frame % 100} %, {gpu} MiB\n"
+                         for gpu in range(num_gpus))
+
+
+def run(path, interval, frames):
+    """Tick times of one pass, then the peak allocation of a second pass (tracemalloc slows it down)"""
+    reader = dcgm_trace.TraceReader(path, interval=interval, loop=False)
+    samples = []
+    for index in range(frames):
+        start = time.perf_counter()
+        reader.tick(index)
+        samples.append(time.perf_counter() - start)
+    reader = dcgm_trace.TraceReader(path, interval=interval, loop=False)
+    tracemalloc.start()
+    try:
+        for index in range(frames):
+            reader.tick(index)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return samples, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--gpus', default='64,512,2048', help='Comma-separated GPU counts')
+    parser.add_argument('--frames', type=int, default=200, help='Samples per GPU in the trace')
+    parser.add_argument('--formats', default='dmon,csv', help='Comma-separated trace formats')
+    args = parser.parse_args()
+
+    writers = {'dmon': write_dmon, 'csv': write_csv}
+    workdir = tempfile.mkdtemp(prefix='bench-trace-')
+    print(f"{'format':<6} {'gpus':>6} {'file MiB':>9} {'tick p50':>9} {'tick p99':>9} {'lines/s':>10} {'peak MiB':>9}")
+    try:
+        for trace_format in args.formats.split(','):
+            for num_gpus in (int(n) for n in args.gpus.split(',')):
+                path = os.path.join(workdir, f'trace.{trace_format}')
+                writers[trace_format](path, num_gpus, args.frames)
+                size = os.path.getsize(path)
+                samples, peak = run(path, 1.0, args.frames)
+                os.remove(path)
+                lines_per_s = num_gpus * args.frames / sum(samples)
+                print(f"{trace_format:<6} {num_gpus:>6} {size / 2**20:>9.1f} "
+                      f"{percentile(samples, 50) * 1000:>7.1f}ms {percentile(samples, 99) * 1000:>7.1f}ms "
+                      f"{lines_per_s:>10,.0f} {peak / 2**20:>9.2f}")
+    finally:
+        os.rmdir(workdir)
+
+
+if __name__ == '__main__':
+    main()
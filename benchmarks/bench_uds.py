@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Compare the two UDS server designs:
+
+  proxy   - legacy standalone server: every UDS client triggers an HTTP
+            round trip to the exporter's /metrics endpoint
+  direct  - in-process listener: clients get the exporter's pre-encoded
+            snapshot bytes straight from memory
+
+Both run against the same synthetic cache (no DCGM needed); the proxy design
+needs the `requests` package.
+
+  python3 benchmarks/bench_uds.py -c 32 -n 100 --gpus 64
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from bench_common import dcgm_exporter, percentile, synthetic_snapshot
+import dcgm_uds_server
+
+
+def serve_http(port, num_gpus, ready):
+    dcgm_exporter.metrics_cache = synthetic_snapshot(num_gpus)
+    server = dcgm_exporter.ExporterHTTPServer(('127.0.0.1', port), dcgm_exporter.MetricsHandler)
+    ready.set()
+    server.serve_forever()
+
+
+def serve_proxy(uds_path, port, ready):
+    dcgm_uds_server.METRICS_URL = f"http://127.0.0.1:{port}/metrics"
+    dcgm_uds_server.start_uds_server(uds_path=uds_path, ready=ready)
+
+
+def serve_direct(uds_path, num_gpus, ready):
+    snapshot = synthetic_snapshot(num_gpus)
+    dcgm_uds_server.start_uds_server(lambda: snapshot, uds_path=uds_path, ready=ready)
+
+
+def fetch(uds_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(uds_path)
+        sock.sendall(b'GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b''.join(chunks)
+    finally:
+        sock.close()
+
+
+def client_loop(uds_path, requests_per_client, latencies, errors):
+    for _ in range(requests_per_client):
+        start = time.perf_counter()
+        try:
+            response = fetch(uds_path)
+        except OSError as e:
+            errors.append(type(e).__name__)
+            continue
+        if not response.startswith(b'HTTP/1.1 200'):
+            errors.append(response[:40])
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+def run(name, uds_path, clients, requests_per_client):
+    latencies, errors = [], []
+    threads = [threading.Thread(target=client_loop, args=(uds_path, requests_per_client, latencies, errors))
+               for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    if not latencies:
+        print(f"{name:<8} no successful requests, {len(errors)} errors")
+        return
+    print(f"{name:<8} {len(latencies):>8} {len(latencies) / elapsed:>10.0f} "
+          f"{percentile(latencies, 50) * 1000:>9.2f} {percentile(latencies, 99) * 1000:>9.2f} {len(errors):>7}")
+
+
+def start(target, args):
+    ready = multiprocessing.Event()
+    proc = multiprocessing.Process(target=target, args=args + (ready,), daemon=True)
+    proc.start()
+    if not ready.wait(10):
+        raise RuntimeError(f"{target.__name__} did not start")
+    return proc
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark proxy vs in-process UDS serving')
+    parser.add_argument('-c', '--clients', type=int, default=32, help='Concurrent clients (default: 32)')
+    parser.add_argument('-n', '--requests', type=int, default=100, help='Requests per client (default: 100)')
+    parser.add_argument('--gpus', type=int, default=64, help='GPUs in the synthetic cache (default: 64)')
+    parser.add_argument('--port', type=int, default=19401, help='Port for the HTTP exporter (default: 19401)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='dcgm-uds-bench-')
+    proxy_path = os.path.join(workdir, 'proxy.sock')
+    direct_path = os.path.join(workdir, 'direct.sock')
+
+    procs = [start(serve_http, (args.port, args.gpus))]
+    procs.append(start(serve_proxy, (proxy_path, args.port)))
+    procs.append(start(serve_direct, (direct_path, args.gpus)))
+
+    print(f"{args.clients} clients x {args.requests} requests, {args.gpus} GPUs")
+    print(f"{'design':<8} {'requests':>8} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    run('proxy', proxy_path, args.clients, args.requests)
+    run('direct', direct_path, args.clients, args.requests)
+
+    for proc in procs:
+        proc.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Load-test the exporter's /metrics endpoint with many concurrent scrapers.
+
+By default an exporter HTTP server is started in a child process and fed a
+synthetic cache (no DCGM needed); pass --url to hit a running exporter instead.
+Each client keeps one keep-alive connection and scrapes in a loop; a separate
+prober hits /health so stalls show up as liveness latency.
+
+  python3 benchmarks/loadtest_http.py -c 128 -n 50 --gpus 256
+  python3 benchmarks/loadtest_http.py --url http://localhost:9400 -c 100
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+from bench_common import dcgm_exporter, percentile, synthetic_snapshot
+
+
+def serve(port, num_gpus, ready):
+    dcgm_exporter.metrics_cache = synthetic_snapshot(num_gpus)
+    server = dcgm_exporter.ExporterHTTPServer(('127.0.0.1', port), dcgm_exporter.MetricsHandler)
+    ready.set()
+    server.serve_forever()
+
+
+def scrape_loop(host, port, path, requests_per_client, gzip_ok, latencies, errors):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    headers = {'Accept-Encoding': 'gzip'} if gzip_ok else {}
+    for _ in range(requests_per_client):
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def report(name, latencies, errors, elapsed):
+    if not latencies:
+        print(f"{name:<8} no successful requests, {len(errors)} errors")
+        return
+    print(f"{name:<8} {len(latencies):>8} {len(latencies) / elapsed:>10.0f} "
+          f"{percentile(latencies, 50) * 1000:>9.2f} {percentile(latencies, 99) * 1000:>9.2f} "
+          f"{max(latencies) * 1000:>9.2f} {len(errors):>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent scrape load test for the exporter')
+    parser.add_argument('--url', help='Target a running exporter (e.g. http://localhost:9400)')
+    parser.add_argument('-c', '--clients', type=int, default=128, help='Concurrent clients (default: 128)')
+    parser.add_argument('-n', '--requests', type=int, default=50, help='Requests per client (default: 50)')
+    parser.add_argument('--gpus', type=int, default=256, help='GPUs in the synthetic cache (default: 256)')
+    parser.add_argument('--port', type=int, default=19400, help='Port for the local server (default: 19400)')
+    parser.add_argument('--gzip', action='store_true', help='Request gzip-encoded payloads')
+    args = parser.parse_args()
+
+    server_proc = None
+    if args.url:
+        target = urlsplit(args.url)
+        host, port = target.hostname, target.port or 80
+    else:
+        host, port = '127.0.0.1', args.port
+        ready = multiprocessing.Event()
+        server_proc = multiprocessing.Process(target=serve, args=(port, args.gpus, ready), daemon=True)
+        server_proc.start()
+        ready.wait(10)
+        time.sleep(0.2)
+
+    scrape_latencies, scrape_errors = [], []
+    health_latencies, health_errors = [], []
+    clients = [
+        threading.Thread(target=scrape_loop,
+                         args=(host, port, '/metrics', args.requests, args.gzip, scrape_latencies, scrape_errors))
+        for _ in range(args.clients)
+    ]
+    prober = threading.Thread(target=scrape_loop,
+                              args=(host, port, '/health', args.requests, False, health_latencies, health_errors))
+    start = time.perf_counter()
+    for t in clients + [prober]:
+        t.start()
+    for t in clients + [prober]:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.clients} clients x {args.requests} requests against {host}:{port} in {elapsed:.2f}s")
+    print(f"{'path':<8} {'requests':>8} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+    report('metrics', scrape_latencies, scrape_errors, elapsed)
+    report('health', health_latencies, health_errors, elapsed)
+
+    if server_proc is not None:
+        server_proc.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+OpenMetrics backfill files for the DCGM Fake GPU Manager's simulated runs
+
+Usage:
+  python3 dcgm_fake_manager.py backfill --hours 24 -p degrading -o /tmp/gpus.om
+  promtool tsdb create-blocks-from openmetrics /tmp/gpus.om /prometheus
+
+  The manager runs its profiles on a simulated clock as fast as they go and
+  hands every tick here as {gpu id: {field id: value}}. Series carry the
+  exporter's metric names and gpu/device labels, so the blocks hold what a
+  scrape of the live exporter would have stored and alert rules written
+  against it evaluate unchanged.
+
+  OpenMetrics keeps each family's samples together while ticks arrive in
+  time order with every family in each, so every family's lines are streamed
+  to a temporary file of its own and the files are joined under their
+  TYPE/UNIT/HELP headers at the end. Memory stays at one tick however many
+  hours are written.
+"""
+
+import os
+import shutil
+import tempfile
+
+import dcgm_field_registry
+
+def write_backfill(path, ticks, fields=dcgm_field_registry.FIELDS):
+    """Write `ticks` ((unix time, {gpu id: {field id: value}}) in time order) to `path`; returns the sample count"""
+    fields = sorted(fields, key=lambda field: field.metric_name)
+    samples = 0
+    with tempfile.TemporaryDirectory(prefix='dcgm-backfill-', dir=os.path.dirname(os.path.abspath(path))) as workdir:
+        parts = [open(os.path.join(workdir, f'{index}.om'), 'w') for index in range(len(fields))]
+        try:
+            prefixes = None
+            for timestamp, gpu_metrics in ticks:
+                if prefixes is None or prefixes.keys() != gpu_metrics.keys():
+                    prefixes = {gpu_id: [f'{field.metric_name}{{gpu="{gpu_id}",device="nvidia{gpu_id}"}} '
+                                         for field in fields] for gpu_id in gpu_metrics}
+                stamp = f' {timestamp:.3f}\n'
+                for index, (field, part) in enumerate(zip(fields, parts)):
+                    lines = [prefixes[gpu_id][index] + str(values[field.field_id]) + stamp
+                             for gpu_id, values in gpu_metrics.items() if field.field_id in values]
+                    part.write(''.join(lines))
+                    samples += len(lines)
+        finally:
+            for part in parts:
+                part.close()
+        with open(path, 'w') as out:
+            for index, field in enumerate(fields):
+                out.write(dcgm_field_registry.openmetrics_header(field))
+                with open(os.path.join(workdir, f'{index}.om')) as part:
+                    shutil.copyfileobj(part, out)
+            out.write('# EOF\n')
+    return samples
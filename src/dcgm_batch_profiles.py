@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Vectorized metric profiles for DCGM Fake GPU Manager
+
+Batched counterparts of the scalar profiles in dcgm_fake_manager.py: one
+call generates a tick for a whole array of GPUs with NumPy RNG and math, so
+thousands of GPUs per tick stay in the low milliseconds. The scalar classes
+remain the reference implementation; tests/test_batch_profiles.py checks
+that both produce the same distributions.
+
+Usage:
+  profile = create_batch_profile('wave', seed=42)
+  rows = profile.apply_batch(np.arange(1, 1025))
+  rows['temp'], rows['power'], ...   # one int64 column per metric
+"""
+
+import numpy as np
+
+METRIC_COLUMNS = ('temp', 'power', 'gpu_util', 'mem_util', 'sm_clock', 'mem_clock', 'fb_used')
+METRIC_DTYPE = np.dtype([(name, np.int64) for name in METRIC_COLUMNS])
+# Simulated seconds per tick without a clock, as dcgm_fake_manager.PROFILE_TICK_SECONDS
+PROFILE_TICK_SECONDS = 30.0
+
+
+class BatchProfile:
+    """Base class for vectorized metric profiles."""
+
+    def __init__(self, name, seed=None):
+        self.name = name
+        self.iteration = 0
+        self.clock = None
+        self.rng = np.random.default_rng(seed)
+
+    def elapsed(self):
+        """Simulated seconds since the profile started: the clock's, else PROFILE_TICK_SECONDS per tick."""
+        if self.clock is not None:
+            return self.clock.elapsed
+        return self.iteration * PROFILE_TICK_SECONDS
+
+    def apply_batch(self, gpu_ids):
+        """
+        Generate one tick of metrics for every GPU in `gpu_ids`.
+
+        Args:
+            gpu_ids: array-like of GPU identifiers (1-N)
+
+        Returns:
+            structured array of len(gpu_ids) with METRIC_DTYPE columns
+        """
+        raise NotImplementedError
+
+    def _randint(self, low, high, size):
+        """Inclusive bounds, like random.randint."""
+        return self.rng.integers(low, high + 1, size=size)
+
+    @staticmethod
+    def _rows(temp, power, gpu_util, mem_util, sm_clock, mem_clock, fb_used):
+        rows = np.empty(len(temp), dtype=METRIC_DTYPE)
+        rows['temp'] = temp
+        rows['power'] = power
+        rows['gpu_util'] = gpu_util
+        rows['mem_util'] = mem_util
+        rows['sm_clock'] = sm_clock
+        rows['mem_clock'] = mem_clock
+        rows['fb_used'] = fb_used
+        return rows
+
+
+class StaticBatchProfile(BatchProfile):
+    def __init__(self, seed=None):
+        super().__init__("static", seed)
+
+    def apply_batch(self, gpu_ids):
+        g = np.asarray(gpu_ids, dtype=np.int64) - 1
+        n = len(g)
+        return self._rows(
+            temp=np.clip(50 + g * 5 + self._randint(0, 5, n), 45, 85),
+            power=np.clip(150 + g * 20 + self._randint(-10, 10, n), 100, 300),
+            gpu_util=np.clip(30 + g * 10 + self._randint(-5, 5, n), 0, 100),
+            mem_util=np.clip(40 + g * 5 + self._randint(-5, 5, n), 0, 100),
+            sm_clock=1400 + self._randint(-50, 100, n),
+            mem_clock=877 + self._randint(-20, 0, n),
+            fb_used=np.clip(4096 + g * 1024 + self._randint(-512, 512, n), 2048, 14336),
+        )
+
+
+class StableBatchProfile(BatchProfile):
+    def __init__(self, seed=None):
+        super().__init__("stable", seed)
+
+    def apply_batch(self, gpu_ids):
+        g = np.asarray(gpu_ids, dtype=np.int64) - 1
+        n = len(g)
+        return self._rows(
+            temp=np.clip(55 + g * 3 + self._randint(-1, 1, n), 45, 90),
+            power=np.clip(180 + g * 15 + self._randint(-3, 3, n), 100, 350),
+            gpu_util=np.clip(50 + g * 5 + self._randint(-2, 2, n), 0, 100),
+            mem_util=np.clip(45 + g * 3 + self._randint(-2, 2, n), 0, 100),
+            sm_clock=1400 + self._randint(-10, 10, n),
+            mem_clock=877 + self._randint(-5, 5, n),
+            fb_used=np.clip(6144 + g * 512 + self._randint(-100, 100, n), 2048, 14336),
+        )
+
+
+class SpikeBatchProfile(BatchProfile):
+    def __init__(self, seed=None):
+        super().__init__("spike", seed)
+
+    def apply_batch(self, gpu_ids):
+        self.iteration += 1
+        g = np.asarray(gpu_ids, dtype=np.int64) - 1
+        n = len(g)
+
+        # 20% chance of spike, per GPU
+        spiking = self.rng.random(n) < 0.20
+
+        temp = np.where(spiking, 75 + self._randint(0, 15, n), 50 + g * 4 + self._randint(-5, 5, n))
+        power = np.where(spiking, 280 + self._randint(0, 50, n), 150 + g * 15 + self._randint(-10, 10, n))
+        gpu_util = np.where(spiking, 90 + self._randint(0, 10, n), 25 + g * 8 + self._randint(-10, 10, n))
+        mem_util = np.where(spiking, 85 + self._randint(0, 15, n), 30 + g * 5 + self._randint(-10, 10, n))
+        used_mem = np.where(spiking, 12288 + self._randint(0, 2048, n),
+                            4096 + g * 1024 + self._randint(-1024, 1024, n))
+
+        return self._rows(
+            temp=np.clip(temp, 45, 95),
+            power=np.clip(power, 100, 350),
+            gpu_util=np.clip(gpu_util, 0, 100),
+            mem_util=np.clip(mem_util, 0, 100),
+            sm_clock=np.where(spiking, 1400 + self._randint(-100, 200, n), 1400 + self._randint(-50, 50, n)),
+            mem_clock=877 + self._randint(-20, 20, n),
+            fb_used=np.clip(used_mem, 2048, 14336),
+        )
+
+
+class WaveBatchProfile(BatchProfile):
+    def __init__(self, seed=None):
+        super().__init__("wave", seed)
+        # One random phase offset per GPU, like one scalar WaveProfile per GPU
+        self.time_offsets = {}
+
+    def _offsets(self, gpu_ids):
+        missing = [gpu_id for gpu_id in gpu_ids.tolist() if gpu_id not in self.time_offsets]
+        if missing:
+            for gpu_id, offset in zip(missing, self.rng.uniform(0, 2 * np.pi, size=len(missing))):
+                self.time_offsets[gpu_id] = offset
+        return np.fromiter((self.time_offsets[gpu_id] for gpu_id in gpu_ids.tolist()),
+                           dtype=np.float64, count=len(gpu_ids))
+
+    def apply_batch(self, gpu_ids):
+        self.iteration += 1
+        gpu_ids = np.asarray(gpu_ids, dtype=np.int64)
+
+        # Sine wave with a period of 30 simulated minutes
+        phase = (self.elapsed() / 1800.0) * 2 * np.pi + self._offsets(gpu_ids) + gpu_ids * 0.5
+        wave = np.sin(phase)
+
+        return self._rows(
+            temp=np.clip(60 + wave * 20, 45, 90).astype(np.int64),
+            power=np.clip(200 + wave * 80, 100, 350).astype(np.int64),
+            gpu_util=np.clip(50 + wave * 40, 0, 100).astype(np.int64),
+            mem_util=np.clip(50 + wave * 40 * 0.8, 0, 100).astype(np.int64),
+            sm_clock=1400 + (wave * 200).astype(np.int64),
+            mem_clock=877 + (wave * 100).astype(np.int64),
+            fb_used=np.clip(8192 + wave * 4096, 2048, 14336).astype(np.int64),
+        )
+
+
+class DegradingBatchProfile(BatchProfile):
+    def __init__(self, seed=None):
+        super().__init__("degrading", seed)
+
+    def apply_batch(self, gpu_ids):
+        self.iteration += 1
+        n = len(gpu_ids)
+
+        degradation_factor = min(self.elapsed() / 6000.0, 0.5)  # Up to 50% degradation, after 50 simulated minutes
+
+        temp = 50 + (degradation_factor * 30) + self._randint(-3, 3, n)
+        power = 150 + (degradation_factor * 100) + self._randint(-10, 10, n)
+        gpu_util = 70 - (degradation_factor * 30) + self._randint(-5, 5, n)
+        mem_util = 60 - (degradation_factor * 20) + self._randint(-5, 5, n)
+
+        return self._rows(
+            temp=np.clip(temp, 45, 95).astype(np.int64),
+            power=np.clip(power, 100, 350).astype(np.int64),
+            gpu_util=np.clip(gpu_util, 0, 100).astype(np.int64),
+            mem_util=np.clip(mem_util, 0, 100).astype(np.int64),
+            sm_clock=int(1400 - (degradation_factor * 300)) + self._randint(-50, 50, n),
+            mem_clock=int(877 - (degradation_factor * 100)) + self._randint(-20, 20, n),
+            fb_used=np.clip(6144 + self._randint(-1024, 1024, n), 2048, 14336),
+        )
+
+
+class FaultyBatchProfile(BatchProfile):
+    def __init__(self, seed=None):
+        super().__init__("faulty", seed)
+        # Per-GPU fault state, keyed by position in the last gpu_ids array
+        self.gpu_ids = None
+        self.is_faulting = None
+        self.fault_countdown = None
+
+    def apply_batch(self, gpu_ids):
+        self.iteration += 1
+        gpu_ids = np.asarray(gpu_ids, dtype=np.int64)
+        g = gpu_ids - 1
+        n = len(g)
+        if self.gpu_ids is None or not np.array_equal(self.gpu_ids, gpu_ids):
+            self.gpu_ids = gpu_ids.copy()
+            self.is_faulting = np.zeros(n, dtype=bool)
+            self.fault_countdown = np.zeros(n, dtype=np.int64)
+
+        # Randomly enter fault state (10% chance) for 3-10 iterations
+        entering = ~self.is_faulting & (self.rng.random(n) < 0.10)
+        self.is_faulting |= entering
+        self.fault_countdown = np.where(entering, self._randint(3, 10, n), self.fault_countdown)
+
+        # Exit fault state
+        self.fault_countdown = np.where(self.is_faulting, self.fault_countdown - 1, self.fault_countdown)
+        self.is_faulting &= self.fault_countdown > 0
+        f = self.is_faulting
+
+        return self._rows(
+            temp=np.clip(np.where(f, 85 + self._randint(0, 10, n), 55 + g * 4 + self._randint(-5, 5, n)), 45, 100),
+            power=np.clip(np.where(f, self.rng.choice([50, 100, 300, 350], size=n),
+                                   170 + g * 15 + self._randint(-10, 10, n)), 50, 350),
+            gpu_util=np.clip(np.where(f, self._randint(0, 20, n), 60 + g * 5 + self._randint(-10, 10, n)), 0, 100),
+            mem_util=np.clip(np.where(f, self._randint(0, 25, n), 55 + g * 3 + self._randint(-10, 10, n)), 0, 100),
+            sm_clock=np.where(f, 800 + self._randint(-200, 200, n), 1400 + self._randint(-50, 50, n)),
+            mem_clock=np.where(f, 500 + self._randint(-100, 100, n), 877 + self._randint(-20, 20, n)),
+            fb_used=np.clip(np.where(f, 2048 + self._randint(0, 1024, n),
+                                     7168 + g * 512 + self._randint(-512, 512, n)), 2048, 14336),
+        )
+
+
+class ChaosBatchProfile(BatchProfile):
+    def __init__(self, seed=None):
+        super().__init__("chaos", seed)
+
+    def apply_batch(self, gpu_ids):
+        n = len(gpu_ids)
+        return self._rows(
+            temp=self._randint(45, 95, n),
+            power=self._randint(100, 350, n),
+            gpu_util=self._randint(0, 100, n),
+            mem_util=self._randint(0, 100, n),
+            sm_clock=self._randint(800, 1800, n),
+            mem_clock=self._randint(600, 1000, n),
+            fb_used=self._randint(2048, 14336, n),
+        )
+
+
+BATCH_PROFILES = {
+    'static': StaticBatchProfile,
+    'stable': StableBatchProfile,
+    'spike': SpikeBatchProfile,
+    'wave': WaveBatchProfile,
+    'degrading': DegradingBatchProfile,
+    'faulty': FaultyBatchProfile,
+    'chaos': ChaosBatchProfile,
+}
+
+
+def create_batch_profile(profile_name, seed=None):
+    """Create a batched profile by name; unknown names fall back to 'static' like ProfileFactory."""
+    return BATCH_PROFILES.get(profile_name.lower(), StaticBatchProfile)(seed=seed)
+
+
+def rows_to_dicts(gpu_ids, rows):
+    """Convert a batch back to the scalar API's {gpu_id: {metric: int}} shape."""
+    columns = {name: rows[name].tolist() for name in METRIC_COLUMNS}
+    return {
+        int(gpu_id): {name: columns[name][i] for name in METRIC_COLUMNS}
+        for i, gpu_id in enumerate(np.asarray(gpu_ids).tolist())
+    }
@@ -1,123 +1,1253 @@
 #!/usr/bin/env python3
 """DCGM OpenTelemetry/Prometheus Exporter using dcgmi CLI"""
-import os, sys, time, subprocess, re
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from threading import Thread, Lock
+import os, sys, time, subprocess, re, gzip, hashlib, json, struct, queue, selectors, socket
+from concurrent.futures import ThreadPoolExecutor
+from itertools import compress
+from operator import ne
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread, Lock, Event, BoundedSemaphore
 
-metrics_cache = ""
-metrics_lock = Lock()
+import dcgm_field_registry
+import dcgm_history
+import dcgm_self_metrics
+from dcgm_self_metrics import PROTOBUF_METRIC_TYPES, pb_field, varint
+
+TEXT_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+PROTOBUF_CONTENT_TYPE = 'application/vnd.google.protobuf; proto=io.prometheus.client.MetricFamily; encoding=delimited'
+
+class EncodedPayload:
+    """One exposition format of a snapshot: its bytes, gzipped once, and their ETag.
+
+    `skip` is the slice of `body` holding the self metrics. They change on
+    every refresh, so the ETag leaves them out and is weak: two payloads
+    with the same ETag carry the same GPU series, not the same bytes.
+    """
+    __slots__ = ('content_type', 'body', 'gzip_body', 'etag')
+
+    def __init__(self, content_type, body, skip=None):
+        self.content_type = content_type
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=6, mtime=0)
+        digest = hashlib.blake2b(digest_size=16)
+        if skip is None:
+            digest.update(body)
+            self.etag = f'"{digest.hexdigest()}"'
+        else:
+            view = memoryview(body)
+            digest.update(view[:skip.start])
+            digest.update(view[skip.stop:])
+            self.etag = f'W/"{digest.hexdigest()}"'
+
+def encode_payload(content_type, body, self_metrics=None, at=None):
+    """EncodedPayload of `body` with `self_metrics` inserted at byte `at` (default: the end)"""
+    if self_metrics is None:
+        return EncodedPayload(content_type, body)
+    at = len(body) if at is None else at
+    return EncodedPayload(content_type, body[:at] + self_metrics + body[at:], slice(at, at + len(self_metrics)))
+
+class MetricsSnapshot:
+    """Immutable /metrics payloads, one per exposition format, encoded and gzipped once per refresh.
+
+    `self_metrics` is the (text, OpenMetrics, protobuf) rendering of the
+    exporter's own families, appended to each format (before OpenMetrics'
+    `# EOF`) but left out of its ETag, so an unchanged collection keeps its
+    ETag across refreshes. `gpu_metrics` keeps the collector output of this
+    refresh for listeners that need values, not bytes. It is None when the
+    collection failed, also while the last good series are still being served.
+    """
+    __slots__ = ('payloads', 'body', 'gzip_body', 'etag', 'gpu_metrics', 'timestamp')
+
+    def __init__(self, text, openmetrics=None, protobuf=None, gpu_metrics=None, self_metrics=None):
+        self_text, self_openmetrics, self_protobuf = self_metrics or (None, None, None)
+        text_payload = encode_payload(TEXT_CONTENT_TYPE, text.encode('utf-8'),
+                                      None if self_text is None else self_text.encode('utf-8'))
+        self.payloads = {'text': text_payload}
+        if openmetrics is not None:
+            body = openmetrics.encode('utf-8')
+            self.payloads['openmetrics'] = encode_payload(
+                OPENMETRICS_CONTENT_TYPE, body, None if self_openmetrics is None else self_openmetrics.encode('utf-8'),
+                len(body) - len(b'# EOF\n'))
+        if protobuf is not None:
+            self.payloads['protobuf'] = encode_payload(PROTOBUF_CONTENT_TYPE, protobuf, self_protobuf)
+        # The text payload doubles as the snapshot itself (UDS deltas, older callers)
+        self.body, self.gzip_body, self.etag = text_payload.body, text_payload.gzip_body, text_payload.etag
+        self.gpu_metrics = gpu_metrics
+        self.timestamp = time.time()
+
+    def negotiate(self, accept):
+        """The payload to serve for an Accept header"""
+        return self.payloads[negotiate_format(accept, self.payloads)]
+
+# Published by reference swap only: the updater builds a complete snapshot
+# off to the side and rebinds this name, readers just load it. No lock needed.
+metrics_cache = MetricsSnapshot("")
+# Callables invoked with each newly published snapshot (e.g. UDS subscriptions)
+snapshot_listeners = []
+# dcgm_history.History fed by each successful collection, served at /api/v1/history (None: disabled)
+history = None
 DCGMI_PATH = "/usr/local/dcgm/share/dcgm_tests/apps/amd64/dcgmi"
+DCGM_DIR = os.environ.get('DCGM_DIR', '/root/Workspace/DCGM/_out/Linux-amd64-debug')
+DCGM_HOST = os.environ.get('DCGM_HOSTENGINE_ADDRESS', 'localhost')
+COLLECTOR_BACKEND = os.environ.get('COLLECTOR_BACKEND', 'auto').lower()
+METRICS_REFRESH_INTERVAL = float(os.environ.get('METRICS_REFRESH_INTERVAL', '5'))
+# Seconds the last good collection keeps being served after collections start failing (0: drop it at once)
+METRICS_MAX_STALENESS = float(os.environ.get('METRICS_MAX_STALENESS', '60'))
+# First retry delay after a failed collection, doubling up to METRICS_REFRESH_INTERVAL
+COLLECT_RETRY_BACKOFF = float(os.environ.get('COLLECT_RETRY_BACKOFF', '0.5'))
+DMON_DELAY_MS = int(os.environ.get('DMON_DELAY_MS', '1000'))
+DMON_STALL_TIMEOUT = float(os.environ.get('DMON_STALL_TIMEOUT', '10'))
+HTTP_MAX_WORKERS = int(os.environ.get('HTTP_MAX_WORKERS', '64'))
+HTTP_MAX_PENDING = int(os.environ.get('HTTP_MAX_PENDING', '256'))
+HTTP_REQUEST_TIMEOUT = float(os.environ.get('HTTP_REQUEST_TIMEOUT', '10'))
+# Keep-alive connections waiting between requests; past this the longest idle are closed
+HTTP_MAX_IDLE = int(os.environ.get('HTTP_MAX_IDLE', '1024'))
+ENABLE_UDS = os.environ.get('ENABLE_UDS', 'false').lower() == 'true'
+# Written by dcgm_fake_manager.py: hostengine shards and their local->global GPU ids
+DCGM_SHARD_MAP = os.environ.get('DCGM_SHARD_MAP', '/tmp/dcgm-fake-shards.json')
+# Used by the 'simulate' backend, same meaning as for dcgm_fake_manager.py
+NUM_FAKE_GPUS = int(os.environ.get('NUM_FAKE_GPUS', '4'))
+METRIC_PROFILE = os.environ.get('METRIC_PROFILE', 'static')
+GPU_PROFILES = [p.strip() for p in os.environ.get('GPU_PROFILES', '').split(',') if p.strip()]
+METRIC_UPDATE_INTERVAL = float(os.environ.get('METRIC_UPDATE_INTERVAL', '30'))
+METRIC_TIME_SCALE = float(os.environ.get('METRIC_TIME_SCALE', '1'))
+GPU_START_INDEX = int(os.environ.get('GPU_START_INDEX', '1'))
+PROFILE_ENGINE = os.environ.get('PROFILE_ENGINE', 'scalar').lower()
+# Formats rendered on each refresh besides text 0.0.4 (served by Accept negotiation)
+EXPOSITION_FORMATS = [f.strip().lower() for f in os.environ.get('EXPOSITION_FORMATS', 'openmetrics,protobuf').split(',')
+                      if f.strip()]
+# Comma-separated dcgm_field_registry groups to collect and export ('all' or empty: every field)
+DCGM_FIELD_GROUPS = os.environ.get('DCGM_FIELD_GROUPS', 'all')
+# Append the exporter's own metrics (dcgm_self_metrics) to every snapshot
+SELF_METRICS = os.environ.get('SELF_METRICS', 'true').lower() == 'true'
+# Written by dcgm_fake_manager.py after each injection cycle, exported with our own metrics
+DCGM_MANAGER_METRICS = os.environ.get('DCGM_MANAGER_METRICS', '/tmp/dcgm-fake-manager-metrics.json')
 
+# Fields collected and exported, from the shared registry
+EXPORTED_FIELDS = dcgm_field_registry.select_fields(DCGM_FIELD_GROUPS)
 # Map DCGM field IDs to metric names
-FIELD_MAPPING = {
-    '150': ('dcgm_gpu_temp', 'GPU temperature in Celsius'),
-    '155': ('dcgm_power_usage', 'Power usage in watts'),
-    '203': ('dcgm_gpu_utilization', 'GPU utilization percentage'),
-    '204': ('dcgm_mem_copy_utilization', 'Memory utilization percentage'),
-    '210': ('dcgm_sm_clock', 'SM clock in MHz'),
-    '211': ('dcgm_mem_clock', 'Memory clock in MHz'),
-    '251': ('dcgm_fb_total', 'Total framebuffer in MB'),
-    '252': ('dcgm_fb_used', 'Used framebuffer in MB'),
-    '253': ('dcgm_fb_free', 'Free framebuffer in MB'),
-}
+FIELD_MAPPING = {field.field_id: (field.metric_name, field.help) for field in EXPORTED_FIELDS}
 
-def parse_dcgmi_output(output):
-    metrics = {}
-    lines = output.strip().split('\n')
-    for i, line in enumerate(lines):
-        if line.startswith('GPU '):
-            parts = line.split()
-            if len(parts) >= 2:
-                gpu_id = parts[1]
-                if gpu_id == '0':
+def exposition_header(fields):
+    """HELP/TYPE block for `fields`, built once rather than on every render"""
+    return ''.join(f"# HELP {field.metric_name} {field.help}\n# TYPE {field.metric_name} {field.metric_type}\n"
+                   for field in fields)
+
+EXPOSITION_HEADER = exposition_header(EXPORTED_FIELDS)
+
+# Self-instrumentation, rendered into each snapshot after the GPU series
+COLLECTION_DURATION = dcgm_self_metrics.REGISTRY.histogram(
+    'dcgm_exporter_collection_duration_seconds',
+    'Refresh time by phase: collect (whole collector call), subprocess (dcgmi run), parse (dmon output), '
+    'render (every exposition format)', ['phase'])
+COLLECTION_ERRORS = dcgm_self_metrics.REGISTRY.counter(
+    'dcgm_exporter_collection_errors_total', 'Failed collections (or hostengine shards) by reason', ['reason'])
+LISTENER_ERRORS = dcgm_self_metrics.REGISTRY.counter(
+    'dcgm_exporter_listener_errors_total',
+    'Exceptions raised by snapshot listeners (push, history, UDS subscriptions), by listener', ['listener'])
+CACHE_AGE = dcgm_self_metrics.REGISTRY.gauge(
+    'dcgm_exporter_cache_age_seconds', 'Age of the served GPU data as of the last refresh (0 right after a collection)')
+UP = dcgm_self_metrics.REGISTRY.gauge(
+    'dcgm_exporter_up', '1 if the last collection succeeded, 0 while serving the last good one or none at all')
+LAST_SUCCESS = dcgm_self_metrics.REGISTRY.gauge(
+    'dcgm_exporter_last_success_timestamp_seconds', 'Unix time of the last successful collection')
+SCRAPES = dcgm_self_metrics.REGISTRY.counter(
+    'dcgm_exporter_scrapes_total', '/metrics requests answered, by exposition format and status code',
+    ['format', 'code'])
+SCRAPE_BYTES = dcgm_self_metrics.REGISTRY.counter(
+    'dcgm_exporter_scrape_bytes_total', '/metrics response body bytes sent, by exposition format', ['format'])
+SCRAPE_DURATION = dcgm_self_metrics.REGISTRY.histogram(
+    'dcgm_exporter_scrape_duration_seconds', 'Time MetricsHandler spends answering a /metrics request')
+HTTP_REJECTED = dcgm_self_metrics.REGISTRY.counter(
+    'dcgm_exporter_http_rejected_total', 'Connections answered with 503 because every worker and queue slot was busy')
+DMON_RESTARTS = dcgm_self_metrics.REGISTRY.counter(
+    'dcgm_exporter_dmon_restarts_total', 'Restarts of the dmon-stream collector\'s dcgmi child')
+dcgm_self_metrics.REGISTRY.gauge(
+    'dcgm_exporter_history_bytes', 'Memory held by the /api/v1/history ring buffers',
+    function=lambda: {(): history.memory_bytes()} if history is not None else {})
+# (protocol, client) push destinations; each client's stats() feeds the counters below
+push_clients = []
+
+def push_counter(name, help, stat, results=None):
+    """Counter read from every push client's stats(), optionally split by a result label"""
+    if results is None:
+        return dcgm_self_metrics.REGISTRY.counter(name, help, ['protocol'], function=lambda: {
+            (protocol,): client.stats()[stat] for protocol, client in push_clients})
+    return dcgm_self_metrics.REGISTRY.counter(name, help, ['protocol', 'result'], function=lambda: {
+        (protocol, result): client.stats()[stat + result] for protocol, client in push_clients for result in results})
+
+push_counter('dcgm_exporter_push_samples_total', 'Samples pushed (OTLP data points, remote-write samples) by result',
+             'samples_', ('sent', 'dropped'))
+push_counter('dcgm_exporter_push_requests_total', 'Push requests acknowledged by the receiver', 'requests')
+push_counter('dcgm_exporter_push_retries_total', 'Push requests retried after a transient failure', 'retries')
+manager_metrics = dcgm_self_metrics.FamilyFile(DCGM_MANAGER_METRICS)
+
+def self_metric_families():
+    """Our own metric families, plus the fake manager's when it has written them"""
+    return dcgm_self_metrics.REGISTRY.collect() + manager_metrics.load()
+
+# dcgmi dmon column headers -> DCGM field ids
+DMON_SHORT_NAMES = dcgm_field_registry.DMON_SHORT_NAMES
+# Entity labels dmon prints in the first column
+DMON_ENTITY_TYPES = frozenset(('GPU', 'GPU-I', 'GPU_I', 'GPU-CI', 'GPU_CI', 'VGPU',
+                               'SWITCH', 'LINK', 'CPU', 'CORE'))
+
+class DmonParser:
+    """Parse `dcgmi dmon` output using its `#Entity` header to map columns to fields.
+
+    Columns are resolved once per header: a known short name wins, anything
+    else falls back to the field requested at that position with `-e`.
+    Until a header has been seen the columns are purely positional.
+    """
+
+    def __init__(self, field_ids=None):
+        self.field_ids = tuple(FIELD_MAPPING) if field_ids is None else tuple(field_ids)
+        self._set_columns(self.field_ids)
+
+    def _set_columns(self, columns):
+        self.columns = columns
+        # Every column maps to a field: rows without N/A take the dict(zip()) fast path
+        self.dense = None not in columns
+
+    def parse_header(self, line):
+        names = line.split()[1:]
+        self._set_columns(tuple(
+            DMON_SHORT_NAMES.get(name) or (self.field_ids[idx] if idx < len(self.field_ids) else None)
+            for idx, name in enumerate(names)))
+
+    def parse_row(self, line):
+        """(entity_type, entity_id, {field_id: value}) for a data row; None for anything else"""
+        parts = line.split()
+        if len(parts) < 2:
+            return None
+        entity = parts[0]
+        if entity not in DMON_ENTITY_TYPES:
+            if entity == '#Entity':
+                self.parse_header(line)
+            return None
+        cells = parts[2:]
+        try:
+            if self.dense and 'N/A' not in cells:
+                values = dict(zip(self.columns, map(float, cells)))
+            else:
+                values = {field_id: float(val) for field_id, val in zip(self.columns, cells)
+                          if field_id is not None and val != 'N/A'}
+        except ValueError:
+            # Garbled cell: keep whatever else in the row parses
+            values = {}
+            for field_id, val in zip(self.columns, cells):
+                if field_id is None or val == 'N/A':
                     continue
-                values = parts[2:]
-                if gpu_id not in metrics:
-                    metrics[gpu_id] = {}
-                field_ids = list(FIELD_MAPPING.keys())
-                for idx, val in enumerate(values):
-                    if idx < len(field_ids):
-                        field_id = field_ids[idx]
-                        if val != 'N/A':
-                            try:
-                                metrics[gpu_id][field_id] = float(val)
-                            except ValueError:
-                                pass
+                try:
+                    values[field_id] = float(val)
+                except ValueError:
+                    pass
+        return entity, parts[1], values
+
+    def parse_gpu_row(self, line):
+        """(gpu_id, values) for a fake GPU row; GPU 0 (the NVML injection device) is skipped"""
+        row = self.parse_row(line)
+        if row is None or row[0] != 'GPU' or row[1] == '0':
+            return None
+        return row[1], row[2]
+
+def parse_dcgmi_output(output, field_ids=None):
+    parser = DmonParser(field_ids)
+    metrics = {}
+    for line in output.splitlines():
+        row = parser.parse_gpu_row(line)
+        if row is not None:
+            gpu_id, values = row
+            metrics.setdefault(gpu_id, {}).update(values)
     return metrics
 
-def collect_metrics():
-    try:
+class SubprocessCollector:
+    """Fork `dcgmi dmon -c 1` on every cycle (fallback backend)"""
+    name = 'subprocess'
+    requires_dcgmi = True
+
+    def __init__(self, host=None):
+        self.host_args = ['--host', host] if host else []
+
+    def collect(self):
         field_ids = ','.join(FIELD_MAPPING.keys())
+        started = time.perf_counter()
         result = subprocess.run(
-            [DCGMI_PATH, 'dmon', '-e', field_ids, '-c', '1'],
+            [DCGMI_PATH, 'dmon', '-e', field_ids, '-c', '1'] + self.host_args,
             capture_output=True,
             text=True,
             timeout=5,
             env=os.environ.copy()
         )
+        ran = time.perf_counter()
+        COLLECTION_DURATION.observe(ran - started, ('subprocess',))
         if result.returncode != 0:
-            print(f"dcgmi error: {result.stderr}", flush=True)
-            return "# Error: dcgmi command failed\n"
-        gpu_metrics = parse_dcgmi_output(result.stdout)
-        lines = []
-        for gpu_id, fields in gpu_metrics.items():
-            labels = f'gpu="{gpu_id}",device="nvidia{gpu_id}"'
-            for field_id, value in fields.items():
-                if field_id in FIELD_MAPPING:
-                    metric_name, _ = FIELD_MAPPING[field_id]
-                    lines.append(f'{metric_name}{{{labels}}} {value}')
-        output = []
-        for field_id, (name, help_text) in FIELD_MAPPING.items():
-            output.append(f"# HELP {name} {help_text}")
-            output.append(f"# TYPE {name} gauge")
-        output.extend(sorted(lines))
-        return '\n'.join(output) + '\n'
+            raise RuntimeError(f"dcgmi command failed: {result.stderr}")
+        metrics = parse_dcgmi_output(result.stdout)
+        COLLECTION_DURATION.observe(time.perf_counter() - ran, ('parse',))
+        return metrics
+
+    def close(self):
+        pass
+
+class PydcgmCollector:
+    """Keep one hostengine connection open and read the latest field values in-process"""
+    name = 'pydcgm'
+    requires_dcgmi = False
+
+    def __init__(self, host=DCGM_HOST):
+        sys.path.insert(0, os.path.join(DCGM_DIR, 'share/dcgm_tests'))
+        import pydcgm
+        import dcgm_structs
+        self.handle = pydcgm.DcgmHandle(None, host, dcgm_structs.DCGM_OPERATION_MODE_AUTO)
+        system = self.handle.GetSystem()
+        # GPU 0 is the NVML injection device, the fake GPUs start at 1
+        gpu_ids = [gpu_id for gpu_id in system.discovery.GetAllGpuIds() if gpu_id > 0]
+        self.group = system.GetGroupWithGpuIds('dcgm_exporter', gpu_ids)
+        self.field_group = pydcgm.DcgmFieldGroup(
+            self.handle, 'dcgm_exporter', [int(f) for f in FIELD_MAPPING])
+        # 1s update frequency, keep an hour of samples at most
+        self.group.samples.WatchFields(self.field_group, 1000000, 3600.0, 0)
+
+    def collect(self):
+        metrics = {}
+        latest = self.group.samples.GetLatest(self.field_group).values
+        for gpu_id, fields in latest.items():
+            gpu_metrics = metrics.setdefault(str(gpu_id), {})
+            for field_id, series in fields.items():
+                if len(series) == 0:
+                    continue
+                value = series[-1]
+                if value.isBlank:
+                    continue
+                try:
+                    gpu_metrics[str(field_id)] = float(value.value)
+                except (TypeError, ValueError):
+                    pass
+        return metrics
+
+    def close(self):
+        try:
+            self.field_group.Delete()
+            self.group.Delete()
+            self.handle.Shutdown()
+        except Exception:
+            pass
+
+class DmonStreamCollector:
+    """Run one long-lived `dcgmi dmon -d <delay>` and parse its stdout on a reader thread.
+
+    The child is supervised: it is restarted with exponential backoff when it
+    exits, and killed and restarted when it produces no output for
+    `stall_timeout` seconds. A GPU missing from a whole frame of rows is
+    dropped from the served data.
+    """
+    name = 'dmon-stream'
+    requires_dcgmi = True
+    # Restart delays double from first_backoff up to max_backoff; a child that ran healthy_after seconds resets them
+    first_backoff = 0.5
+    max_backoff = 30.0
+    healthy_after = 60.0
+
+    def __init__(self, host=None, delay_ms=DMON_DELAY_MS, stall_timeout=DMON_STALL_TIMEOUT):
+        self.host_args = ['--host', host] if host else []
+        self.delay_ms = delay_ms
+        self.stall_timeout = max(stall_timeout, 3 * delay_ms / 1000.0)
+        self.latest = {}
+        self.latest_lock = Lock()
+        self.last_output = time.monotonic()
+        self.last_row = 0.0
+        self.restarts = 0
+        self.process = None
+        self.stopped = Event()
+        self.supervisor = Thread(target=self._supervise, daemon=True)
+        self.supervisor.start()
+
+    def _command(self):
+        return [DCGMI_PATH, 'dmon', '-e', ','.join(FIELD_MAPPING.keys()), '-d', str(self.delay_ms)] + self.host_args
+
+    def _supervise(self):
+        backoff = self.first_backoff
+        while not self.stopped.is_set():
+            started = time.monotonic()
+            try:
+                self.process = subprocess.Popen(
+                    self._command(),
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                    text=True,
+                    bufsize=1,
+                    env=os.environ.copy()
+                )
+            except OSError as e:
+                print(f"Failed to start dcgmi dmon: {e}", flush=True)
+            else:
+                reader = Thread(target=self._read, args=(self.process,), daemon=True)
+                reader.start()
+                self._watch(self.process)
+                reader.join(timeout=1)
+            if self.stopped.is_set():
+                break
+            # A child that ran healthily for a while gets a fresh backoff
+            if time.monotonic() - started > self.healthy_after:
+                backoff = self.first_backoff
+            self.restarts += 1
+            DMON_RESTARTS.inc()
+            print(f"dcgmi dmon exited, restarting in {backoff:.1f}s (restart #{self.restarts})", flush=True)
+            self.stopped.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _watch(self, process):
+        self.last_output = time.monotonic()
+        # Waiting on the child itself notices an exit at once; close() kills it to end the wait
+        while not self.stopped.is_set():
+            try:
+                process.wait(min(1.0, self.stall_timeout / 4))
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            if time.monotonic() - self.last_output > self.stall_timeout:
+                print(f"dcgmi dmon produced no output for {self.stall_timeout:g}s, restarting", flush=True)
+                break
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+    def _read(self, process):
+        # Fresh parser per child: each one prints its own header
+        parser = DmonParser()
+        # GPUs seen in the current frame: a GPU showing up twice starts the next one
+        frame = set()
+        for line in process.stdout:
+            self.last_output = time.monotonic()
+            row = parser.parse_gpu_row(line)
+            if row is None:
+                continue
+            gpu_id, values = row
+            # Publish the whole row at once so readers never see half a GPU
+            with self.latest_lock:
+                if gpu_id in frame:
+                    for gone in self.latest.keys() - frame:
+                        del self.latest[gone]
+                    frame.clear()
+                frame.add(gpu_id)
+                self.latest[gpu_id] = values
+                self.last_row = self.last_output
+
+    def collect(self):
+        with self.latest_lock:
+            if not self.latest:
+                raise RuntimeError("dcgmi dmon stream has not produced any GPU rows yet")
+            if time.monotonic() - self.last_row > self.stall_timeout:
+                raise RuntimeError(f"dcgmi dmon stream stale for more than {self.stall_timeout:g}s")
+            return {gpu_id: dict(values) for gpu_id, values in self.latest.items()}
+
+    def close(self):
+        self.stopped.set()
+        process = self.process
+        if process is not None and process.poll() is None:
+            process.kill()
+
+class SimulateCollector:
+    """Drive dcgm_fake_manager's metric profiles in-process: no hostengine, NVML injection or dcgmi.
+
+    Profiles tick every METRIC_UPDATE_INTERVAL seconds, like the manager's
+    injection loop, and collect() in between returns the last tick. Each tick
+    moves their clock METRIC_UPDATE_INTERVAL x METRIC_TIME_SCALE simulated seconds.
+    """
+    name = 'simulate'
+    requires_dcgmi = False
+
+    def __init__(self, host=None, num_gpus=None, metric_profile=None, gpu_profiles=None,
+                 update_interval=None, gpu_start_index=None, profile_engine=None, time_scale=None):
+        import dcgm_fake_manager
+        num_gpus = NUM_FAKE_GPUS if num_gpus is None else num_gpus
+        start = GPU_START_INDEX if gpu_start_index is None else gpu_start_index
+        profiles = dcgm_fake_manager.create_profiles(
+            num_gpus, metric_profile or METRIC_PROFILE, GPU_PROFILES if gpu_profiles is None else gpu_profiles)
+        self.update_interval = METRIC_UPDATE_INTERVAL if update_interval is None else update_interval
+        self.clock = dcgm_fake_manager.SimulatedClock(self.update_interval * (time_scale or METRIC_TIME_SCALE))
+        self.generator = dcgm_fake_manager.MetricGenerator(profiles, profile_engine or PROFILE_ENGINE, self.clock)
+        self.ordinals = list(range(1, num_gpus + 1))
+        self.gpu_ids = {ordinal: str(start + ordinal - 1) for ordinal in self.ordinals}
+        self.synthesizer = dcgm_field_registry.FieldSynthesizer(EXPORTED_FIELDS)
+        self.next_tick = 0.0
+        self.latest = {}
+
+    def collect(self):
+        now = time.monotonic()
+        if now >= self.next_tick:
+            fields_by_ordinal = self.synthesizer.expand(self.generator.generate(self.ordinals), self.clock.step)
+            metrics = {self.gpu_ids[ordinal]: {field_id: float(value) for field_id, value in fields.items()}
+                       for ordinal, fields in fields_by_ordinal.items()}
+            # Rebind, never mutate: render_metrics may still be reading the last tick
+            self.latest = metrics
+            self.next_tick = now + self.update_interval
+        return self.latest
+
+    def close(self):
+        pass
+
+COLLECTORS = {
+    'subprocess': SubprocessCollector,
+    'pydcgm': PydcgmCollector,
+    'dmon-stream': DmonStreamCollector,
+    'simulate': SimulateCollector,
+}
+
+def load_shard_map(path=None):
+    """Read the manager's shard map; None when there is none (single default hostengine)"""
+    path = path or DCGM_SHARD_MAP
+    try:
+        with open(path) as f:
+            shard_map = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable shard map {path}: {e}", flush=True)
+        return None
+    return shard_map.get('shards') or None
+
+class ShardedCollector:
+    """Collect from every hostengine shard concurrently and merge into one GPU map.
+
+    Each shard numbers its fake GPUs from 1; the shard map translates those
+    local ids into the manager's global GPU_START_INDEX-based numbering.
+    """
+    requires_dcgmi = False
+
+    def __init__(self, backend, shards):
+        self.shards = shards
+        self.pool = ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix='shard')
+        # Connecting is per-shard latency too, so open all shards at once
+        self.collectors = list(self.pool.map(lambda shard: create_collector(backend, shard['host']), shards))
+        self.name = f"sharded-{self.collectors[0].name}"
+        self.requires_dcgmi = any(c.requires_dcgmi for c in self.collectors)
+
+    def collect(self):
+        futures = [self.pool.submit(c.collect) for c in self.collectors]
+        metrics = {}
+        failed = 0
+        for shard, future in zip(self.shards, futures):
+            try:
+                shard_metrics = future.result()
+            except Exception as e:
+                failed += 1
+                COLLECTION_ERRORS.inc(('shard',))
+                print(f"Shard {shard['shard']} ({shard['host']}) collection failed: {e}", flush=True)
+                continue
+            gpu_ids = shard['gpus']
+            for local_id, fields in shard_metrics.items():
+                if local_id in gpu_ids:
+                    metrics[str(gpu_ids[local_id])] = fields
+        if failed == len(self.shards):
+            raise RuntimeError(f"all {failed} hostengine shards failed")
+        return metrics
+
+    def close(self):
+        for c in self.collectors:
+            c.close()
+        self.pool.shutdown(wait=False)
+
+def create_collector(backend=COLLECTOR_BACKEND, host=None):
+    """Create the collector for `backend`; 'auto' prefers pydcgm and falls back to dcgmi.
+
+    Without an explicit `host`, a shard map from the manager fans out to one
+    collector per hostengine shard.
+    """
+    if backend not in COLLECTORS and backend != 'auto':
+        raise ValueError(f"Unknown COLLECTOR_BACKEND '{backend}', "
+                         f"expected one of: auto, {', '.join(COLLECTORS)}")
+    if host is None and backend != 'simulate':
+        shards = load_shard_map()
+        if shards:
+            return ShardedCollector(backend, shards)
+    if backend == 'auto':
+        try:
+            return PydcgmCollector(host or DCGM_HOST)
+        except Exception as e:
+            print(f"pydcgm collector unavailable ({e}), falling back to dcgmi subprocess", flush=True)
+            return SubprocessCollector(host)
+    if backend == 'pydcgm':
+        return PydcgmCollector(host or DCGM_HOST)
+    return COLLECTORS[backend](host)
+
+collector = None
+
+class CounterStarts:
+    """Created timestamp of each counter series, shared by the OpenMetrics and protobuf renderers.
+
+    A series starts when the exporter first sees it and restarts whenever
+    its value goes down (the counter was reset, e.g. the manager restarted).
+    """
+
+    def __init__(self):
+        self.series = {}
+        self.lock = Lock()
+
+    def created(self, gpu_id, field_id, value):
+        with self.lock:
+            entry = self.series.get((gpu_id, field_id))
+            if entry is None:
+                entry = self.series[(gpu_id, field_id)] = [time.time(), value]
+            elif value is not None and entry[1] is not None and value < entry[1]:
+                entry[0] = time.time()
+            if value is not None:
+                entry[1] = value
+            return entry[0]
+
+counter_starts = CounterStarts()
+
+def changed_rows(values, last):
+    """Rows of a GPU column whose value moved since `last`, or None when the
+    whole column is cheaper to redo: first render, a field appeared or went
+    away, or most of the values moved anyway."""
+    if last is None:
+        return None
+    if (None in values or None in last) and [v is None for v in values] != [v is None for v in last]:
+        return None
+    moved = list(map(ne, values, last))
+    if 2 * sum(moved) > len(values):
+        return None
+    return list(compress(range(len(values)), moved))
+
+class ExpositionRenderer:
+    """Formats collector output into a cached text exposition layout.
+
+    The layout is built once per GPU set: a metric x GPU grid of
+    `metric{labels} ` prefixes, in the sorted order the exporter has always
+    emitted, interleaved with value strings. A render only formats the values
+    that changed since the last one (a GPU whose values are all unchanged is
+    skipped after one list compare) and re-joins the parts; there is no
+    per-render sort and no line rebuilding. An unchanged refresh returns the
+    previous text as is.
+
+    Text format 0.0.4 puts the HELP/TYPE block first; OpenMetrics puts each
+    family's TYPE/UNIT/HELP before its samples, follows every counter sample
+    with its `_created` timestamp and ends with `# EOF`.
+    """
+
+    def __init__(self, fields=None, openmetrics=False, starts=None):
+        fields = EXPORTED_FIELDS if fields is None else fields
+        # Sorting on name + '{' puts `foo` after `foo_bar`, exactly like sorting whole lines
+        self.fields = sorted(fields, key=lambda field: field.metric_name + '{')
+        self.field_ids = [field.field_id for field in self.fields]
+        if openmetrics:
+            self.lead, self.tail = '', '# EOF\n'
+            self.row_headers = [dcgm_field_registry.openmetrics_header(field) for field in self.fields]
+        else:
+            self.lead, self.tail = exposition_header(fields), ''
+            self.row_headers = [''] * len(self.fields)
+        self.counter_rows = [row for row, field in enumerate(self.fields)
+                             if openmetrics and field.metric_type == dcgm_field_registry.COUNTER]
+        self.counter_set = frozenset(self.counter_rows)
+        self.starts = counter_starts if starts is None else starts
+        self.lock = Lock()
+        self.gpu_ids = None
+        self.text = None
+
+    def _build_layout(self, gpu_ids):
+        # `"` sorts before digits, so gpu="1" < gpu="10" < gpu="2" as in a line sort
+        order = sorted(gpu_ids, key=lambda gpu_id: f'{gpu_id}"')
+        self.stride = stride = 2 * len(order) + 1
+        self.parts = [self.lead]
+        for header in self.row_headers:
+            self.parts.append(header)
+            self.parts.extend([''] * (stride - 1))
+        end = len(self.parts)
+        self.parts.append(self.tail)
+        self.columns = []
+        for rank, gpu_id in enumerate(order):
+            labels = f'{{gpu="{gpu_id}",device="nvidia{gpu_id}"}}'
+            prefixes = [f'{field.metric_name}{labels} ' for field in self.fields]
+            # gpu_id, labels, prefixes, value templates, created timestamps, prefix slice, value slice, last values
+            self.columns.append([gpu_id, labels, prefixes, ['{}\n'] * len(self.fields), {},
+                                 slice(2 + 2 * rank, end, stride), slice(3 + 2 * rank, end, stride), None])
+        self.gpu_ids = gpu_ids
+        self.text = None
+
+    def _track_created(self, column, row, value):
+        """Refresh a counter cell's `_created` line; True when its timestamp changed"""
+        field = self.fields[row]
+        created = self.starts.created(column[0], field.field_id, value)
+        if column[4].get(row) == created:
+            return False
+        column[4][row] = created
+        family = dcgm_field_registry.openmetrics_family(field)
+        line = f'{family}_created{column[1]} {created:.3f}\n'
+        column[3][row] = '{}\n' + line.replace('{', '{{').replace('}', '}}')
+        return True
+
+    def render(self, gpu_metrics):
+        with self.lock:
+            gpu_ids = tuple(gpu_metrics)
+            if gpu_ids != self.gpu_ids:
+                self._build_layout(gpu_ids)
+            parts, field_ids, stride = self.parts, self.field_ids, self.stride
+            for column in self.columns:
+                values = list(map(gpu_metrics[column[0]].get, field_ids))
+                last = column[7]
+                if values == last:
+                    continue
+                column[7] = values
+                self.text = None
+                templates = column[3]
+                rows = changed_rows(values, last)
+                if rows is not None:
+                    # Same series as last time: re-format just the values that moved
+                    first = column[6].start
+                    for row in rows:
+                        if row in self.counter_set:
+                            self._track_created(column, row, values[row])
+                        parts[first + row * stride] = templates[row].format(values[row])
+                    continue
+                for row in self.counter_rows:
+                    self._track_created(column, row, values[row])
+                if None not in values:
+                    parts[column[5]] = column[2]
+                    parts[column[6]] = map(str.format, templates, values)
+                else:
+                    # Absent fields blank their prefix as well as their value
+                    parts[column[5]] = [prefix if value is not None else ''
+                                        for prefix, value in zip(column[2], values)]
+                    parts[column[6]] = ['' if value is None else template.format(value)
+                                        for template, value in zip(templates, values)]
+            if self.text is None:
+                self.text = ''.join(parts)
+            return self.text
+
+class ProtobufRenderer:
+    """Encodes collector output as length-delimited io.prometheus.client.MetricFamily messages.
+
+    Same cached metric x GPU grid as ExpositionRenderer, in bytes: each
+    series' Metric message is a precomputed prefix (labels, gauge/counter
+    header, counter created timestamp) followed by its 8-byte double, so a
+    changed value is one struct pack. A family's length prefix is only
+    recomputed when a series appears, disappears or its created timestamp
+    changes.
+    """
+    pack_double = struct.Struct('<d').pack
+
+    def __init__(self, fields=None, starts=None):
+        fields = EXPORTED_FIELDS if fields is None else fields
+        self.fields = sorted(fields, key=lambda field: field.metric_name + '{')
+        self.field_ids = [field.field_id for field in self.fields]
+        self.counter_rows = [row for row, field in enumerate(self.fields)
+                             if field.metric_type == dcgm_field_registry.COUNTER]
+        self.counter_set = frozenset(self.counter_rows)
+        self.family_fields = []
+        for field in self.fields:
+            unit = dcgm_field_registry.openmetrics_unit(field)
+            self.family_fields.append(
+                pb_field(1, field.metric_name) + pb_field(2, field.help) +
+                b'\x18' + varint(PROTOBUF_METRIC_TYPES[field.metric_type]) + (pb_field(5, unit) if unit else b''))
+        self.starts = counter_starts if starts is None else starts
+        self.lock = Lock()
+        self.gpu_ids = None
+        self.body = None
+
+    def _build_layout(self, gpu_ids):
+        order = sorted(gpu_ids, key=lambda gpu_id: f'{gpu_id}"')
+        self.stride = stride = 2 * len(order) + 1
+        self.parts = []
+        for _ in self.fields:
+            self.parts.append(b'')
+            self.parts.extend([b''] * (stride - 1))
+        end = len(self.parts)
+        self.columns = []
+        for rank, gpu_id in enumerate(order):
+            labels = (pb_field(1, pb_field(1, 'gpu') + pb_field(2, str(gpu_id))) +
+                      pb_field(1, pb_field(1, 'device') + pb_field(2, f'nvidia{gpu_id}')))
+            prefixes = [self._prefix(labels, field, None) for field in self.fields]
+            # gpu_id, labels, prefixes, created timestamps, prefix slice, value slice, last values
+            self.columns.append([gpu_id, labels, prefixes, {}, slice(1 + 2 * rank, end, stride),
+                                 slice(2 + 2 * rank, end, stride), None])
+        self.gpu_ids = gpu_ids
+        self.body = None
+
+    @staticmethod
+    def _prefix(labels, field, created):
+        """Metric message up to (not including) its 8-byte value"""
+        if field.metric_type == dcgm_field_registry.COUNTER:
+            seconds, nanos = divmod(int(round((created or 0) * 1e9)), 1000000000)
+            timestamp = b'\x08' + varint(seconds) + (b'\x10' + varint(nanos) if nanos else b'')
+            counter = pb_field(3, timestamp) + b'\x09'
+            value_header = b'\x1a' + varint(len(counter) + 8) + counter
+        else:
+            value_header = b'\x12\x09\x09'
+        metric = labels + value_header
+        return b'\x22' + varint(len(metric) + 8) + metric
+
+    def _track_created(self, column, row, value):
+        field = self.fields[row]
+        created = self.starts.created(column[0], field.field_id, value)
+        if column[3].get(row) == created:
+            return False
+        column[3][row] = created
+        column[2][row] = self._prefix(column[1], field, created)
+        return True
+
+    def render(self, gpu_metrics):
+        with self.lock:
+            gpu_ids = tuple(gpu_metrics)
+            if gpu_ids != self.gpu_ids:
+                self._build_layout(gpu_ids)
+            parts, field_ids, stride, pack = self.parts, self.field_ids, self.stride, self.pack_double
+            dirty_rows = set()
+            for column in self.columns:
+                values = list(map(gpu_metrics[column[0]].get, field_ids))
+                last = column[6]
+                if values == last:
+                    continue
+                column[6] = values
+                self.body = None
+                rows = changed_rows(values, last)
+                if rows is not None:
+                    first = column[5].start
+                    for row in rows:
+                        idx = first + row * stride
+                        if row in self.counter_set and self._track_created(column, row, values[row]):
+                            parts[idx - 1] = column[2][row]
+                            dirty_rows.add(row)
+                        parts[idx] = pack(values[row])
+                    continue
+                for row in self.counter_rows:
+                    self._track_created(column, row, values[row])
+                parts[column[4]] = [prefix if value is not None else b''
+                                    for prefix, value in zip(column[2], values)]
+                parts[column[5]] = [b'' if value is None else pack(value) for value in values]
+                dirty_rows.update(range(len(self.fields)))
+            for row in dirty_rows:
+                start = row * stride
+                family = self.family_fields[row]
+                size = len(family) + sum(map(len, parts[start + 1:start + stride]))
+                parts[start] = varint(size) + family
+            if self.body is None:
+                self.body = b''.join(parts)
+            return self.body
+
+renderer = ExpositionRenderer()
+openmetrics_renderer = ExpositionRenderer(openmetrics=True)
+protobuf_renderer = ProtobufRenderer()
+
+def render_metrics(gpu_metrics):
+    return renderer.render(gpu_metrics)
+
+def render_openmetrics(gpu_metrics):
+    return openmetrics_renderer.render(gpu_metrics)
+
+def render_protobuf(gpu_metrics):
+    return protobuf_renderer.render(gpu_metrics)
+
+def collect_gpu_metrics():
+    """(gpu_metrics, None) from the collector, or (None, error comment) if it failed"""
+    global collector
+    try:
+        if collector is None:
+            collector = create_collector()
+        started = time.perf_counter()
+        gpu_metrics = collector.collect()
+        COLLECTION_DURATION.observe(time.perf_counter() - started, ('collect',))
+        return gpu_metrics, None
     except subprocess.TimeoutExpired:
+        COLLECTION_ERRORS.inc(('timeout',))
         print("dcgmi timeout", flush=True)
-        return "# Error: dcgmi timeout\n"
+        return None, "# Error: dcgmi timeout\n"
+    except RuntimeError as e:
+        COLLECTION_ERRORS.inc(('dcgmi',))
+        print(f"dcgmi error: {e}", flush=True)
+        return None, "# Error: dcgmi command failed\n"
     except Exception as e:
+        COLLECTION_ERRORS.inc(('exception',))
         print(f"Error collecting metrics: {e}", flush=True)
         import traceback
         traceback.print_exc()
-        return "# Error: collection failed\n"
+        return None, "# Error: collection failed\n"
+
+def collect_metrics():
+    gpu_metrics, error = collect_gpu_metrics()
+    return error if gpu_metrics is None else render_metrics(gpu_metrics)
+
+def build_snapshot(gpu_metrics, formats=None, self_metrics=None, error='', stale=False):
+    """Render every enabled exposition format of one collection into a snapshot.
+
+    `self_metrics` returns the self-instrumentation families appended to
+    every format, outside its ETag; it is called after rendering, so this
+    render's time is included. The text starts with the `error` comment, if any. Without
+    `gpu_metrics` (a failed collection) only text is served unless there
+    are self metrics to put in the other formats. A `stale` snapshot
+    re-serves the last good collection: it renders its series but carries
+    no `gpu_metrics`, so listeners do not take them for new values.
+    """
+    formats = EXPOSITION_FORMATS if formats is None else formats
+    if gpu_metrics is None:
+        if self_metrics is None:
+            return MetricsSnapshot(error)
+        text = error
+        openmetrics = '# EOF\n' if 'openmetrics' in formats else None
+        protobuf = b'' if 'protobuf' in formats else None
+    else:
+        started = time.perf_counter()
+        text = error + render_metrics(gpu_metrics)
+        openmetrics = render_openmetrics(gpu_metrics) if 'openmetrics' in formats else None
+        protobuf = render_protobuf(gpu_metrics) if 'protobuf' in formats else None
+        COLLECTION_DURATION.observe(time.perf_counter() - started, ('render',))
+    rendered = None
+    if self_metrics is not None:
+        families = self_metrics()
+        rendered = (dcgm_self_metrics.render_text(families),
+                    dcgm_self_metrics.render_openmetrics(families) if 'openmetrics' in formats else None,
+                    dcgm_self_metrics.render_protobuf(families) if 'protobuf' in formats else None)
+    return MetricsSnapshot(text, openmetrics=openmetrics, protobuf=protobuf,
+                           gpu_metrics=None if stale else gpu_metrics, self_metrics=rendered)
+
+# (gpu_metrics, unix time) of the last successful collection
+last_good = None
+
+def refresh_metrics_cache():
+    """Collect and encode a new snapshot, then publish it with a single rebind.
 
-def update_metrics_cache():
-    global metrics_cache
-    while True:
+    A failed collection keeps the last good series on /metrics, behind the
+    error comment and with dcgm_exporter_up 0, until they are older than
+    METRICS_MAX_STALENESS; then only the error is served. Returns whether
+    the collection succeeded.
+    """
+    global metrics_cache, last_good
+    gpu_metrics, error = collect_gpu_metrics()
+    self_metrics = self_metric_families if SELF_METRICS else None
+    now = time.time()
+    if gpu_metrics is not None:
+        last_good = (gpu_metrics, now)
+        UP.set(1)
+        CACHE_AGE.set(0)
+        LAST_SUCCESS.set(round(now, 3))
+        snapshot = build_snapshot(gpu_metrics, self_metrics=self_metrics)
+    else:
+        UP.set(0)
+        age = None if last_good is None else now - last_good[1]
+        if age is not None:
+            CACHE_AGE.set(round(age, 3))
+        if age is not None and last_good[0] is not None and age <= METRICS_MAX_STALENESS:
+            snapshot = build_snapshot(last_good[0], self_metrics=self_metrics, stale=True,
+                                      error=f"{error}# Serving the last good collection from {age:.1f}s ago\n")
+        else:
+            if age is not None and last_good[0] is not None:
+                print(f"Last good collection is {age:.0f}s old (max {METRICS_MAX_STALENESS:g}s), "
+                      f"no longer serving it", flush=True)
+                # Keep its time for the cache age only
+                last_good = (None, last_good[1])
+            # The error comment alone is valid text format
+            snapshot = build_snapshot(None, self_metrics=self_metrics, error=error)
+    metrics_cache = snapshot
+    for listener in snapshot_listeners:
+        # One failing listener must neither starve the others nor fail a good collection
         try:
-            with metrics_lock:
-                metrics_cache = collect_metrics()
+            listener(snapshot)
         except Exception as e:
+            name = getattr(listener, '__qualname__', type(listener).__name__)
+            LISTENER_ERRORS.inc((name,))
+            print(f"Snapshot listener {name} failed: {e}", flush=True)
+    return gpu_metrics is not None
+
+def update_metrics_cache(stop=None):
+    """Refresh every METRICS_REFRESH_INTERVAL; retry failed collections sooner, with exponential backoff"""
+    stop = stop or Event()
+    backoff = COLLECT_RETRY_BACKOFF
+    while not stop.is_set():
+        try:
+            collected = refresh_metrics_cache()
+        except Exception as e:
+            COLLECTION_ERRORS.inc(('refresh',))
             print(f"Cache update error: {e}", flush=True)
-        time.sleep(5)
+            collected = False
+        if collected:
+            backoff = COLLECT_RETRY_BACKOFF
+            stop.wait(METRICS_REFRESH_INTERVAL)
+        else:
+            stop.wait(min(backoff, METRICS_REFRESH_INTERVAL))
+            backoff *= 2
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header allows gzip.
+
+    An explicit `gzip` entry wins over `*` wherever they appear; a q that
+    does not parse counts as 1, like no q at all.
+    """
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        name, *params = [part.strip() for part in coding.split(';')]
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 1.0
+        qualities[name.lower()] = q
+    q = qualities.get('gzip', qualities.get('*', 0.0))
+    return q > 0
+
+# Media types per format; Accept parameters other than q only matter for protobuf
+FORMAT_MEDIA_TYPES = {
+    'text': 'text/plain',
+    'openmetrics': 'application/openmetrics-text',
+    'protobuf': 'application/vnd.google.protobuf',
+}
+PROTOBUF_PARAMS = {'proto': 'io.prometheus.client.MetricFamily', 'encoding': 'delimited'}
+
+def negotiate_format(accept, available=FORMAT_MEDIA_TYPES):
+    """Pick the format in `available` the Accept header prefers, falling back to text.
+
+    The highest q wins; on equal q an exact media type beats a wildcard and
+    text beats the others, so `*/*` keeps getting the classic format.
+    """
+    best, best_rank = 'text', None
+    for entry in accept.split(','):
+        media_type, *params = [part.strip() for part in entry.split(';')]
+        media_type = media_type.lower()
+        q, extra = 1.0, {}
+        for param in params:
+            key, _, value = param.partition('=')
+            key = key.strip().lower()
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+            else:
+                extra[key] = value.strip().strip('"')
+        if q <= 0:
+            continue
+        for order, name in enumerate(FORMAT_MEDIA_TYPES):
+            if name not in available:
+                continue
+            candidate = FORMAT_MEDIA_TYPES[name]
+            if media_type == candidate:
+                specific = 1
+                if name == 'protobuf' and any(extra.get(k, v) != v for k, v in PROTOBUF_PARAMS.items()):
+                    continue
+            elif media_type == '*/*' or media_type == candidate.split('/')[0] + '/*':
+                specific = 0
+            else:
+                continue
+            rank = (q, specific, -order)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = name, rank
+    return best
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match uses weak comparison: a W/ prefix on either side does not matter"""
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*' or (tag[2:] if tag.startswith('W/') else tag) == opaque:
+            return True
+    return False
 
 class MetricsHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps scraper connections alive; every response carries a length.
+    # The timeout bounds slow requests; ExporterHTTPServer bounds idle keep-alive connections.
+    protocol_version = 'HTTP/1.1'
+    timeout = HTTP_REQUEST_TIMEOUT
+
+    def handle(self):
+        # One request per turn, plus any pipelined behind it: an idle keep-alive
+        # connection goes back to the server instead of holding this worker
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self._pipelined():
+            self.handle_one_request()
+
+    def _pipelined(self):
+        """Whether the next request's bytes have already arrived (never blocks)"""
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
     def do_GET(self):
         if self.path == '/metrics':
-            with metrics_lock:
-                response = metrics_cache
+            started = time.perf_counter()
+            snapshot = metrics_cache
+            name = negotiate_format(self.headers.get('Accept', ''), snapshot.payloads)
+            payload = snapshot.payloads[name]
+            if etag_matches(self.headers.get('If-None-Match', ''), payload.etag):
+                self.send_response(304)
+                self.send_header('ETag', payload.etag)
+                self.send_header('Vary', 'Accept, Accept-Encoding')
+                SCRAPES.inc((name, '304'))
+                self.end_headers()
+                SCRAPE_DURATION.observe(time.perf_counter() - started)
+                return
+            use_gzip = accepts_gzip(self.headers.get('Accept-Encoding', ''))
+            body = payload.gzip_body if use_gzip else payload.body
             self.send_response(200)
-            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.send_header('Content-Type', payload.content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', payload.etag)
+            self.send_header('Vary', 'Accept, Accept-Encoding')
+            if use_gzip:
+                self.send_header('Content-Encoding', 'gzip')
+            self.end_headers()
+            # Counted before the body goes out, so a client that has read it sees its own scrape
+            SCRAPES.inc((name, '200'))
+            SCRAPE_BYTES.inc((name,), len(body))
+            self.wfile.write(body)
+            SCRAPE_DURATION.observe(time.perf_counter() - started)
+        elif self.path.partition('?')[0] == '/api/v1/history':
+            status, body = dcgm_history.handle_query(history, self.path.partition('?')[2])
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
             self.end_headers()
-            self.wfile.write(response.encode())
+            self.wfile.write(body)
         elif self.path == '/health':
             self.send_response(200)
+            self.send_header('Content-Length', '3')
             self.end_headers()
             self.wfile.write(b'OK\n')
         else:
             self.send_response(404)
+            self.send_header('Content-Length', '0')
             self.end_headers()
     def log_message(self, *args): pass
 
+class ExporterHTTPServer(ThreadingHTTPServer):
+    """Serve requests from a fixed worker pool with a bounded backlog.
+
+    At most `max_workers` requests are handled at once and `max_pending`
+    more wait for a worker; anything beyond that is answered with 503 and
+    closed immediately, so a burst of scrapers cannot exhaust threads.
+    Between requests a keep-alive connection holds neither: it waits in an
+    idle poller until its next request arrives, for `idle_timeout` seconds
+    at most, and the longest idle ones are closed beyond `max_idle`.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, max_workers=HTTP_MAX_WORKERS, max_pending=HTTP_MAX_PENDING,
+                 idle_timeout=HTTP_REQUEST_TIMEOUT, max_idle=HTTP_MAX_IDLE):
+        super().__init__(server_address, handler_class)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='http')
+        self.slots = BoundedSemaphore(max_workers + max_pending)
+        self.rejected = 0
+        self.idle_timeout = idle_timeout
+        self.max_idle = max_idle
+        # socket -> (client address, deadline) in parking order; only the poller touches it
+        self.idle = {}
+        # (socket, client address) handed over by workers; None stops the poller
+        self.parked = queue.SimpleQueue()
+        self.selector = selectors.DefaultSelector()
+        self.wakeup, self.waker = socket.socketpair()
+        self.selector.register(self.wakeup, selectors.EVENT_READ)
+        self.poller = Thread(target=self._poll_idle, name='http-idle', daemon=True)
+        self.poller.start()
+
+    def process_request(self, request, client_address):
+        if not self.slots.acquire(blocking=False):
+            self.rejected += 1
+            HTTP_REJECTED.inc()
+            try:
+                request.sendall(b'HTTP/1.1 503 Service Unavailable\r\n'
+                                b'Content-Length: 0\r\nConnection: close\r\n\r\n')
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self.pool.submit(self._process_pooled, request, client_address)
+
+    def finish_request(self, request, client_address):
+        return self.RequestHandlerClass(request, client_address, self)
+
+    def _process_pooled(self, request, client_address):
+        keep_alive = False
+        try:
+            keep_alive = not self.finish_request(request, client_address).close_connection
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.slots.release()
+            if keep_alive:
+                self._park(request, client_address)
+            else:
+                self.shutdown_request(request)
+
+    def _park(self, request, client_address):
+        self.parked.put((request, client_address))
+        try:
+            self.waker.send(b'\0')
+        except OSError:
+            # Server closed: nobody will poll it
+            self.shutdown_request(request)
+
+    def _poll_idle(self):
+        while True:
+            timeout = None
+            if self.idle:
+                timeout = max(0.0, next(iter(self.idle.values()))[1] - time.monotonic())
+            for key, _ in self.selector.select(timeout):
+                if key.fileobj is self.wakeup:
+                    self.wakeup.recv(4096)
+                    while not self.parked.empty():
+                        item = self.parked.get()
+                        if item is None:
+                            return
+                        self.selector.register(item[0], selectors.EVENT_READ)
+                        self.idle[item[0]] = (item[1], time.monotonic() + self.idle_timeout)
+                    continue
+                # Next request (or the client hanging up): back to the pool
+                self.selector.unregister(key.fileobj)
+                self.process_request(key.fileobj, self.idle.pop(key.fileobj)[0])
+            now = time.monotonic()
+            while self.idle:
+                request, (_, deadline) = next(iter(self.idle.items()))
+                if deadline > now and len(self.idle) <= self.max_idle:
+                    break
+                del self.idle[request]
+                self.selector.unregister(request)
+                self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.parked.put(None)
+        try:
+            self.waker.send(b'\0')
+        except OSError:
+            pass
+        self.poller.join(timeout=1)
+        for request in list(self.idle):
+            self.shutdown_request(request)
+        self.idle.clear()
+        self.selector.close()
+        self.waker.close()
+        self.wakeup.close()
+        self.pool.shutdown(wait=False)
+
 if __name__ == '__main__':
     sys.stdout = os.fdopen(sys.stdout.fileno(), 'w', buffering=1)
     sys.stderr = os.fdopen(sys.stderr.fileno(), 'w', buffering=1)
-    print("DCGM OpenTelemetry Exporter (CLI-based)", flush=True)
-    if not os.path.exists(DCGMI_PATH):
-        print(f"✗ dcgmi not found at {DCGMI_PATH}", flush=True)
+    print("DCGM OpenTelemetry Exporter", flush=True)
+    try:
+        collector = create_collector()
+    except ValueError as e:
+        print(f"✗ {e}", flush=True)
         sys.exit(1)
-    print(f"✓ Using dcgmi at {DCGMI_PATH}", flush=True)
-    print("Testing dcgmi...", flush=True)
+    if collector.requires_dcgmi:
+        if not os.path.exists(DCGMI_PATH):
+            print(f"✗ dcgmi not found at {DCGMI_PATH}", flush=True)
+            sys.exit(1)
+        print(f"✓ Using dcgmi at {DCGMI_PATH}", flush=True)
+    elif isinstance(collector, SimulateCollector):
+        print(f"✓ Using simulate collector ({len(collector.ordinals)} GPUs, no hostengine)", flush=True)
+    elif isinstance(collector, ShardedCollector):
+        print(f"✓ Using {collector.name} collector across {len(collector.shards)} hostengine shards", flush=True)
+    else:
+        print(f"✓ Using {collector.name} collector (hostengine: {DCGM_HOST})", flush=True)
+    print("Testing collector...", flush=True)
     try:
         test_result = collect_metrics()
         print("Sample output:", flush=True)
@@ -126,11 +1256,51 @@ if __name__ == '__main__':
         print(f"✗ Test failed: {e}", flush=True)
         import traceback
         traceback.print_exc()
+    import dcgm_otlp_push
+    if dcgm_otlp_push.OTLP_ENDPOINT:
+        # Push each snapshot to an OTLP receiver as well as serving /metrics
+        try:
+            pusher = dcgm_otlp_push.OtlpPusher(fields=EXPORTED_FIELDS)
+        except ValueError as e:
+            print(f"✗ {e}", flush=True)
+            sys.exit(1)
+        snapshot_listeners.append(pusher.publish)
+        push_clients.append(('otlp', pusher))
+        print(f"✓ Pushing OTLP metrics to {pusher.endpoint}", flush=True)
+    import dcgm_remote_write
+    if dcgm_remote_write.REMOTE_WRITE_URL:
+        try:
+            writer = dcgm_remote_write.RemoteWriter(fields=EXPORTED_FIELDS)
+        except ValueError as e:
+            print(f"✗ {e}", flush=True)
+            sys.exit(1)
+        snapshot_listeners.append(writer.publish)
+        push_clients.append(('remote_write', writer))
+        print(f"✓ Remote writing to {writer.endpoint} over {len(writer.shards)} shards", flush=True)
+    if dcgm_history.HISTORY_RETENTION > 0:
+        try:
+            history = dcgm_history.History()
+        except ValueError as e:
+            print(f"✗ {e}", flush=True)
+            sys.exit(1)
+        snapshot_listeners.append(history.publish)
+        print(f"✓ Keeping {history.retention:g}s of history at {history.resolution:g}s resolution "
+              f"(at most {history.max_memory_bytes() / 2**20:.0f} MiB for {history.max_series} series)", flush=True)
     Thread(target=update_metrics_cache, daemon=True).start()
+    if ENABLE_UDS:
+        # Serve the socket from this process so UDS clients get the same
+        # pre-encoded snapshot as HTTP scrapers, without a loopback hop
+        import dcgm_uds_server
+        broadcaster = dcgm_uds_server.SnapshotBroadcaster()
+        snapshot_listeners.append(broadcaster.publish)
+        Thread(target=dcgm_uds_server.start_uds_server, args=(lambda: metrics_cache,),
+               kwargs={'broadcaster': broadcaster}, daemon=True).start()
     port = int(os.environ.get('EXPORTER_PORT', '9400'))
-    server = HTTPServer(('0.0.0.0', port), MetricsHandler)
+    server = ExporterHTTPServer(('0.0.0.0', port), MetricsHandler)
     print(f"✓ Started on port {port}", flush=True)
     print(f"  Metrics: http://localhost:{port}/metrics", flush=True)
+    if history is not None:
+        print(f"  History: http://localhost:{port}/api/v1/history?gpu=1&field=dcgm_gpu_temp", flush=True)
     try:
         server.serve_forever()
     except KeyboardInterrupt:
@@ -13,8 +13,16 @@ import argparse
 import socket
 import math
 import random
+import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import dcgm_backfill
+import dcgm_field_registry
+import dcgm_recording
+import dcgm_self_metrics
+import dcgm_trace
+
 # Colors for output
 class Colors:
     GREEN = '\033[0;32m'
@@ -40,12 +48,51 @@ def log_info(msg):
 # Metric Profile Classes
 # ============================================================================
 
+# Simulated seconds per tick of a profile that runs without a clock (the default update interval)
+PROFILE_TICK_SECONDS = 30.0
+# Simulated seconds per wall-clock second: each update advances the profiles' clock by interval x scale
+METRIC_TIME_SCALE = float(os.environ.get('METRIC_TIME_SCALE', '1'))
+
+
+class SimulatedClock:
+    """Simulated time shared by the profiles of one generator.
+
+    Time-shaped profiles (wave, degrading) read `elapsed` rather than
+    counting their own ticks, so a wave period or a degradation ramp spans
+    the same simulated time at any update interval. The generator advances
+    the clock one `step` per tick, whether ticks come every update interval,
+    faster (METRIC_TIME_SCALE) or back to back (backfill).
+    """
+
+    def __init__(self, step=PROFILE_TICK_SECONDS, start=None):
+        if step <= 0:
+            raise ValueError(f"Simulated clock step must be positive (got {step:g})")
+        self.step = step
+        self.start = time.time() if start is None else start
+        self.elapsed = 0.0
+
+    def advance(self):
+        self.elapsed += self.step
+        return self.elapsed
+
+    def now(self):
+        """Unix time of the current tick"""
+        return self.start + self.elapsed
+
+
 class MetricProfile:
     """Base class for metric behavior profiles."""
     
     def __init__(self, name):
         self.name = name
         self.iteration = 0
+        self.clock = None
+    
+    def elapsed(self):
+        """Simulated seconds since the profile started: the clock's, else PROFILE_TICK_SECONDS per tick."""
+        if self.clock is not None:
+            return self.clock.elapsed
+        return self.iteration * PROFILE_TICK_SECONDS
     
     def apply(self, gpu_id, base_values):
         """
@@ -185,6 +232,8 @@ class SpikeProfile(MetricProfile):
 class WaveProfile(MetricProfile):
     """Wave profile - sine wave patterns for realistic workload simulation."""
     
+    PERIOD = 1800.0  # seconds (60 updates at the default 30s interval)
+    
     def __init__(self):
         super().__init__("wave")
         self.time_offset = random.uniform(0, 2 * math.pi)
@@ -192,8 +241,8 @@ class WaveProfile(MetricProfile):
     def apply(self, gpu_id, base_values):
         self.iteration += 1
         
-        # Create sine wave with period of ~60 iterations (30 minutes at 30s intervals)
-        phase = (self.iteration / 60.0) * 2 * math.pi + self.time_offset + (gpu_id * 0.5)
+        # Create sine wave with a period of 30 simulated minutes
+        phase = (self.elapsed() / self.PERIOD) * 2 * math.pi + self.time_offset + (gpu_id * 0.5)
         wave = math.sin(phase)
         
         # Map wave to metrics (wave ranges from -1 to 1)
@@ -238,6 +287,8 @@ class WaveProfile(MetricProfile):
 class DegradingProfile(MetricProfile):
     """Degrading profile - simulates gradual performance decline."""
     
+    RAMP = 6000.0  # seconds to full degradation, which is capped at 50% (reached after 50 simulated minutes)
+    
     def __init__(self):
         super().__init__("degrading")
     
@@ -246,7 +297,7 @@ class DegradingProfile(MetricProfile):
         
         # Gradual increase in temperature and power over time
         # Gradual decrease in performance
-        degradation_factor = min(self.iteration / 200.0, 0.5)  # Up to 50% degradation
+        degradation_factor = min(self.elapsed() / self.RAMP, 0.5)  # Up to 50% degradation
         
         temp = 50 + (degradation_factor * 30) + random.randint(-3, 3)
         power = 150 + (degradation_factor * 100) + random.randint(-10, 10)
@@ -359,6 +410,97 @@ class ChaosProfile(MetricProfile):
         }
 
 
+# Profile tick columns written by METRIC_RECORD_FILE and read back by the replay profile
+RECORDED_METRICS = ('temp', 'power', 'gpu_util', 'mem_util', 'sm_clock', 'mem_clock', 'fb_used')
+REPLAY_FILE = os.environ.get('REPLAY_FILE', '/tmp/dcgm-fake-recording.bin')
+REPLAY_SPEED = float(os.environ.get('REPLAY_SPEED', '1'))
+REPLAY_LOOP = os.environ.get('REPLAY_LOOP', 'true').lower() == 'true'
+
+
+class ReplayProfile(MetricProfile):
+    """Replay profile - streams a recording (METRIC_RECORD_FILE) back, one recorded cycle per tick.
+
+    Every GPU's instance shares one memory-mapped reader per file. GPUs the
+    recording has no row for reuse the recorded GPUs cyclically.
+    """
+
+    # (path, speed) -> dcgm_recording.Replay
+    readers = {}
+
+    def __init__(self, path=None, speed=None):
+        super().__init__("replay")
+        self.path = path or REPLAY_FILE
+        self.speed = speed or REPLAY_SPEED
+        self.reader = None
+
+    def apply(self, gpu_id, base_values):
+        if self.reader is None:
+            key = (self.path, self.speed)
+            if key not in ReplayProfile.readers:
+                ReplayProfile.readers[key] = dcgm_recording.Replay(self.path, self.speed, loop=REPLAY_LOOP)
+            self.reader = ReplayProfile.readers[key]
+        cycle = self.reader.cycle(self.iteration)
+        self.iteration += 1
+        values = cycle.get(gpu_id)
+        if values is None:
+            recorded = sorted(cycle)
+            values = cycle[recorded[(gpu_id - 1) % len(recorded)]]
+        return dict(values)
+
+
+TRACE_FILE = os.environ.get('TRACE_FILE', '')
+TRACE_FORMAT = os.environ.get('TRACE_FORMAT', 'auto').lower()
+TRACE_SAMPLE_INTERVAL = float(os.environ.get('TRACE_SAMPLE_INTERVAL', '1'))
+TRACE_COLUMNS = os.environ.get('TRACE_COLUMNS', '')
+TRACE_GPU_MAP = os.environ.get('TRACE_GPU_MAP', '')
+TRACE_LOOP = os.environ.get('TRACE_LOOP', 'true').lower() == 'true'
+# Values for tick keys a trace has no column for (an idle GPU)
+TRACE_DEFAULTS = {'temp': 35, 'power': 60, 'gpu_util': 0, 'mem_util': 0, 'sm_clock': 210, 'mem_clock': 877,
+                  'fb_used': 0}
+
+
+def parse_gpu_map(spec):
+    """`1=0,2=3` (fake GPU ordinal = trace GPU id) -> {1: '0', 2: '3'}"""
+    gpu_map = {}
+    for item in spec.split(','):
+        ordinal, sep, gpu = item.partition('=')
+        if sep and ordinal.strip().isdigit() and gpu.strip():
+            gpu_map[int(ordinal)] = gpu.strip()
+    return gpu_map
+
+
+class TraceProfile(MetricProfile):
+    """Trace profile - replays telemetry from real GPUs (TRACE_FILE), resampled to the update interval.
+
+    Every GPU's instance shares one streaming reader per file. Fake GPUs
+    take the trace GPU TRACE_GPU_MAP names, else the trace's GPUs in order,
+    cyclically; metrics the trace lacks stay at TRACE_DEFAULTS.
+    """
+
+    # (path, interval) -> dcgm_trace.TraceReader
+    readers = {}
+
+    def __init__(self, path=None, interval=None):
+        super().__init__("trace")
+        self.path = path or TRACE_FILE
+        self.interval = interval or float(os.environ.get('METRIC_UPDATE_INTERVAL', '30'))
+        self.gpu_map = parse_gpu_map(TRACE_GPU_MAP)
+        self.reader = None
+
+    def apply(self, gpu_id, base_values):
+        if self.reader is None:
+            if not self.path:
+                raise ValueError("The trace profile needs TRACE_FILE")
+            key = (self.path, self.interval)
+            if key not in TraceProfile.readers:
+                TraceProfile.readers[key] = dcgm_trace.TraceReader(
+                    self.path, self.interval, TRACE_FORMAT, TRACE_SAMPLE_INTERVAL, TRACE_COLUMNS, loop=TRACE_LOOP)
+            self.reader = TraceProfile.readers[key]
+        values = self.reader.gpu_values(self.iteration, gpu_id, self.gpu_map)
+        self.iteration += 1
+        return {**TRACE_DEFAULTS, **values}
+
+
 class ProfileFactory:
     """Factory for creating metric profiles."""
     
@@ -370,6 +512,8 @@ class ProfileFactory:
         'degrading': DegradingProfile,
         'faulty': FaultyProfile,
         'chaos': ChaosProfile,
+        'replay': ReplayProfile,
+        'trace': TraceProfile,
     }
     
     @classmethod
@@ -387,37 +531,386 @@ class ProfileFactory:
         return list(cls.PROFILES.keys())
 
 
+def create_profiles(num_gpus, metric_profile='static', gpu_profiles=None):
+    """One profile instance per GPU ordinal (1-N); per-GPU profiles repeat cyclically."""
+    if gpu_profiles:
+        return {i: ProfileFactory.create(gpu_profiles[(i - 1) % len(gpu_profiles)])
+                for i in range(1, num_gpus + 1)}
+    return {i: ProfileFactory.create(metric_profile) for i in range(1, num_gpus + 1)}
+
+
+def configure_sources(profiles, step, replay_file=None, replay_speed=None, trace_file=None):
+    """Point replay and trace profiles at their files (overriding the env defaults) and the update step."""
+    for profile in profiles.values():
+        if isinstance(profile, ReplayProfile):
+            profile.path = replay_file or profile.path
+            profile.speed = replay_speed or profile.speed
+        elif isinstance(profile, TraceProfile):
+            profile.path = trace_file or profile.path
+            profile.interval = step
+
+
+class MetricGenerator:
+    """Ticks the per-GPU profiles, either one apply() per GPU or batched with numpy.
+
+    The 'numpy' engine groups GPUs by profile name and calls apply_batch()
+    once per group (profiles without a batched version, such as replay, still
+    run per GPU); it falls back to 'scalar' when numpy is not installed.
+    Every tick first advances the simulated clock the profiles share.
+    """
+
+    def __init__(self, profiles, engine='scalar', clock=None):
+        self.profiles = profiles
+        self.engine = engine
+        self.clock = clock or SimulatedClock()
+        for profile in self.profiles.values():
+            profile.clock = self.clock
+        self.batch_groups = None
+        if self.engine == 'numpy':
+            try:
+                import dcgm_batch_profiles
+            except ImportError:
+                log_warn("numpy not available, falling back to scalar profile engine")
+                self.engine = 'scalar'
+        elif self.engine != 'scalar':
+            log_warn(f"Unknown profile engine '{self.engine}', using 'scalar'")
+            self.engine = 'scalar'
+
+    def generate(self, gpu_ids):
+        """Run one profile tick for `gpu_ids`; returns {gpu_id: {metrics key: int}}."""
+        self.clock.advance()
+        if self.engine == 'numpy':
+            return self._generate_batched(gpu_ids)
+        return self._generate_scalar(gpu_ids)
+
+    def _generate_scalar(self, gpu_ids):
+        values_by_gpu = {}
+        for gpu_id in gpu_ids:
+            # Get the profile for this GPU
+            profile = self.profiles.get(gpu_id, self.profiles[1])
+
+            # Apply profile transformation
+            base_values = {}  # Profiles generate their own values
+            metrics = profile.apply(gpu_id, base_values)
+
+            # Convert all metrics to integers (DCGM expects i64, not floats)
+            values_by_gpu[gpu_id] = {k: int(v) for k, v in metrics.items()}
+        return values_by_gpu
+
+    def _generate_batched(self, gpu_ids):
+        """One apply_batch() per profile name instead of one apply() per GPU."""
+        import numpy as np
+        import dcgm_batch_profiles
+
+        gpu_ids = list(gpu_ids)
+        if self.batch_groups is None or self.batch_groups[0] != gpu_ids:
+            by_name = {}
+            for gpu_id in gpu_ids:
+                name = self.profiles.get(gpu_id, self.profiles[1]).name
+                by_name.setdefault(name, []).append(gpu_id)
+            groups = [(dcgm_batch_profiles.create_batch_profile(name), np.array(ids, dtype=np.int64))
+                      if name in dcgm_batch_profiles.BATCH_PROFILES else (None, ids)
+                      for name, ids in by_name.items()]
+            for profile, _ in groups:
+                if profile is not None:
+                    profile.clock = self.clock
+            self.batch_groups = (gpu_ids, groups)
+
+        values_by_gpu = {}
+        for profile, ids in self.batch_groups[1]:
+            if profile is None:
+                values_by_gpu.update(self._generate_scalar(ids))
+            else:
+                values_by_gpu.update(dcgm_batch_profiles.rows_to_dicts(ids, profile.apply_batch(ids)))
+        return values_by_gpu
+
+
+# ============================================================================
+# Field Injection
+# ============================================================================
+
+# Registry groups the exporter collects (see dcgm_field_registry.FIELD_GROUPS); only those are injected
+DCGM_FIELD_GROUPS = os.environ.get('DCGM_FIELD_GROUPS', 'all')
+# Fields injected into every fake GPU each cycle
+INJECTION_FIELDS = dcgm_field_registry.select_fields(DCGM_FIELD_GROUPS)
+
+
+class FieldInjector:
+    """Long-lived DCGM connection that injects a whole cycle of field values.
+
+    The handle, the fake GPU list and one injection struct per (GPU, field)
+    are created once; each cycle only stamps the timestamp and value and
+    issues the inject call. DCGM has no multi-value injection API, so this
+    is one call per value - without the field metadata lookup and the
+    read-back verification `inject_value()` performs for every field.
+    """
+
+    def __init__(self, dcgm_dir, host="localhost", fields=INJECTION_FIELDS):
+        sys.path.insert(0, os.path.join(dcgm_dir, 'share/dcgm_tests'))
+        import pydcgm
+        import dcgm_structs
+        import dcgm_structs_internal
+        import dcgm_agent
+        import dcgm_agent_internal
+        import dcgm_fields
+
+        self._inject = dcgm_agent_internal.dcgmInjectEntityFieldValue
+        self._entity_group = dcgm_fields.DCGM_FE_GPU
+        self.handle = pydcgm.DcgmHandle(None, host, dcgm_structs.DCGM_OPERATION_MODE_AUTO)
+
+        # Skip GPU 0 (it's the injected V100 from nvml injection library)
+        # Only inject into fake GPUs (1-N)
+        self.gpu_ids = [gid for gid in dcgm_agent.dcgmGetAllDevices(self.handle.handle) if gid > 0]
+
+        # Older dcgm_fields modules may lack some registry constants: skip those fields
+        known = [spec for spec in fields if hasattr(dcgm_fields, spec.dcgm_name)]
+        skipped = [spec.dcgm_name for spec in fields if not hasattr(dcgm_fields, spec.dcgm_name)]
+        if skipped:
+            log_warn(f"dcgm_fields has no {', '.join(skipped)}; not injecting them")
+        field_types = {
+            dcgm_field_registry.INT64: ord(dcgm_fields.DCGM_FT_INT64),
+            dcgm_field_registry.DOUBLE: ord(dcgm_fields.DCGM_FT_DOUBLE),
+        }
+        self.entries = {}
+        for gpu_id in self.gpu_ids:
+            entries = []
+            for spec in known:
+                field = dcgm_structs_internal.c_dcgmInjectFieldValue_v1()
+                field.version = dcgm_structs_internal.dcgmInjectFieldValue_version1
+                field.fieldId = getattr(dcgm_fields, spec.dcgm_name)
+                field.status = 0
+                field.fieldType = field_types[spec.value_type]
+                entries.append((spec.field_id, spec.value_type == dcgm_field_registry.DOUBLE, field))
+            self.entries[gpu_id] = entries
+
+    def inject(self, values_by_gpu):
+        """Inject {gpu_id: {field_id: value}} for one cycle; returns the number of DCGM calls"""
+        ts = int(time.time() * 1000000)
+        handle = self.handle.handle
+        calls = 0
+        for gpu_id, values in values_by_gpu.items():
+            for field_id, is_double, field in self.entries[gpu_id]:
+                field.ts = ts
+                if is_double:
+                    field.value.dbl = values[field_id]
+                else:
+                    field.value.i64 = values[field_id]
+                self._inject(handle, self._entity_group, gpu_id, field)
+                calls += 1
+        return calls
+
+    def close(self):
+        try:
+            self.handle.Shutdown()
+        except Exception:
+            pass
+
+
+# ============================================================================
+# Backfill
+# ============================================================================
+
+def simulate(num_gpus, duration, metric_profile='static', gpu_profiles=None, update_interval=30, start=None,
+             gpu_start_index=1, profile_engine='scalar', fields=INJECTION_FIELDS, replay_file=None,
+             replay_speed=None, trace_file=None):
+    """Run the profiles through `duration` simulated seconds as fast as they go, without DCGM.
+
+    Yields (unix time, {gpu id: {field id: value}}) every update interval of
+    simulated time from `start` (default: `duration` ago), keyed by the GPU
+    ids the exporter would publish. Replay and trace profiles read the files
+    given here, as DCGMFakeManager's do.
+    """
+    start = time.time() - duration if start is None else start
+    clock = SimulatedClock(update_interval, start)
+    profiles = create_profiles(num_gpus, metric_profile, gpu_profiles)
+    configure_sources(profiles, clock.step, replay_file, replay_speed, trace_file)
+    generator = MetricGenerator(profiles, profile_engine, clock)
+    synthesizer = dcgm_field_registry.FieldSynthesizer(fields)
+    ordinals = list(range(1, num_gpus + 1))
+    gpu_ids = {ordinal: str(gpu_start_index + ordinal - 1) for ordinal in ordinals}
+    for _ in range(int(duration // clock.step)):
+        fields_by_ordinal = synthesizer.expand(generator.generate(ordinals), clock.step)
+        yield clock.now(), {gpu_ids[ordinal]: values for ordinal, values in fields_by_ordinal.items()}
+
+
+# ============================================================================
+# Hostengine Shards
+# ============================================================================
+
+# DCGM has a hard limit on fake entities per hostengine (typically 16-32)
+MAX_FAKE_GPUS_PER_HOSTENGINE = 16
+SHARD_MAP_FILE = os.environ.get('DCGM_SHARD_MAP', '/tmp/dcgm-fake-shards.json')
+# Per-GPU lines logged each injection cycle; the rest are summarized
+MAX_LOGGED_GPUS = 16
+# Self metrics, rewritten after every injection cycle for the exporter to export
+MANAGER_METRICS_FILE = os.environ.get('DCGM_MANAGER_METRICS', '/tmp/dcgm-fake-manager-metrics.json')
+
+# Own registry: the exporter's simulate backend imports this module too
+MANAGER_METRICS = dcgm_self_metrics.Registry()
+INJECTION_DURATION = MANAGER_METRICS.histogram(
+    'dcgm_fake_manager_injection_duration_seconds',
+    'Injection cycle time by phase: profiles (generate and expand every field), inject (DCGM calls)', ['phase'])
+INJECTION_GPU_DURATION = MANAGER_METRICS.histogram(
+    'dcgm_fake_manager_injection_gpu_duration_seconds', 'Injection cycle time per fake GPU',
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1))
+INJECTION_CYCLES = MANAGER_METRICS.counter(
+    'dcgm_fake_manager_injection_cycles_total', 'Injection cycles by result', ['result'])
+INJECTION_CALLS = MANAGER_METRICS.counter(
+    'dcgm_fake_manager_injection_calls_total', 'DCGM field value injection calls')
+INJECTED_GPUS = MANAGER_METRICS.gauge(
+    'dcgm_fake_manager_injected_gpus', 'Fake GPUs injected in the last cycle')
+LAST_INJECTION = MANAGER_METRICS.gauge(
+    'dcgm_fake_manager_last_injection_timestamp_seconds', 'Unix time of the last successful injection cycle')
+STARTUP_DURATION = MANAGER_METRICS.gauge(
+    'dcgm_fake_manager_startup_duration_seconds',
+    'Time start() took by phase: hostengine, gpus (create and connect), inject (first cycle), total', ['phase'])
+
+# Seconds start() waits in all for hostengine ports and DCGM connections to come up
+STARTUP_TIMEOUT = float(os.environ.get('STARTUP_TIMEOUT', '30'))
+# Seconds stop() gives the hostengines to exit on SIGTERM before sending SIGKILL
+STOP_GRACE_PERIOD = float(os.environ.get('STOP_GRACE_PERIOD', '2'))
+# Written once start() has injected the first cycle, with the startup breakdown; the entrypoint waits for it
+READY_FILE = os.environ.get('DCGM_READY_FILE', '/tmp/dcgm-fake-ready.json')
+
+
+def poll(check, timeout, first_delay=0.005, max_delay=0.2):
+    """Call `check` until it returns something truthy or `timeout` seconds have passed; returns its last result.
+
+    Sleeps between calls double from `first_delay` up to `max_delay`, so a
+    condition that is met quickly costs milliseconds, not a fixed sleep.
+    """
+    deadline = time.monotonic() + timeout
+    delay = first_delay
+    while True:
+        result = check()
+        remaining = deadline - time.monotonic()
+        if result or remaining <= 0:
+            return result
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+
+def pid_alive(pid):
+    """Whether `pid` is still running; reaps it if it is our child, and a zombie counts as gone."""
+    try:
+        if os.waitpid(pid, os.WNOHANG)[0] == pid:
+            return False
+    except ChildProcessError:
+        pass
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running under another user (e.g. a root hostengine): alive, just not ours to signal
+        pass
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except (OSError, IndexError):
+        return True
+
+
+class HostengineShard:
+    """One nv-hostengine process and the slice of fake GPUs it owns.
+
+    GPUs are numbered globally by ordinal (1..num_gpus across all shards);
+    each shard only sees its own GPUs under shard-local DCGM ids.
+    """
+
+    def __init__(self, index, port, first_ordinal, num_gpus):
+        self.index = index
+        self.port = port
+        self.first_ordinal = first_ordinal
+        self.num_gpus = num_gpus
+        self.pid = None
+        self.process = None
+        self.gpu_ids = []  # shard-local DCGM ids of the fake GPUs, in ordinal order
+        self.injector = None
+        # Shard 0 keeps the historical log/pid locations
+        self.log_file = '/tmp/dcgm-fake.log' if index == 0 else f'/tmp/dcgm-fake-shard{index}.log'
+        self.hostengine_pid_file = None if index == 0 else f'/tmp/nv-hostengine-shard{index}.pid'
+
+    @property
+    def host(self):
+        return f"localhost:{self.port}"
+
+    def ordinal(self, position):
+        return self.first_ordinal + position
+
+
+def plan_shards(num_gpus, gpus_per_shard=MAX_FAKE_GPUS_PER_HOSTENGINE, base_port=5555):
+    """Spread `num_gpus` as evenly as possible over the fewest shards that fit"""
+    gpus_per_shard = max(1, min(gpus_per_shard, MAX_FAKE_GPUS_PER_HOSTENGINE))
+    num_shards = max(1, math.ceil(num_gpus / gpus_per_shard))
+    shards = []
+    first_ordinal = 1
+    for index in range(num_shards):
+        count = num_gpus // num_shards + (1 if index < num_gpus % num_shards else 0)
+        shards.append(HostengineShard(index, base_port + index, first_ordinal, count))
+        first_ordinal += count
+    return shards
+
+
+def read_shard_map(path=SHARD_MAP_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
 # ============================================================================
 # DCGM Manager Class
 # ============================================================================
 
 class DCGMFakeManager:
     def __init__(self, dcgm_dir=None, num_gpus=4, metric_profile='static', 
-                 gpu_profiles=None, update_interval=30, gpu_start_index=1):
+                 gpu_profiles=None, update_interval=30, gpu_start_index=1, profile_engine='scalar',
+                 gpus_per_shard=MAX_FAKE_GPUS_PER_HOSTENGINE, base_port=5555,
+                 record_file=None, replay_file=None, replay_speed=None, trace_file=None, time_scale=None,
+                 fields=INJECTION_FIELDS):
         self.dcgm_dir = dcgm_dir or os.path.expanduser('~/Workspace/DCGM/_out/Linux-amd64-debug')
         self.num_gpus = num_gpus
         self.metric_profile = metric_profile
         self.gpu_profiles = gpu_profiles  # List of profiles per GPU
         self.update_interval = update_interval
+        self.time_scale = time_scale or METRIC_TIME_SCALE
+        # Each update advances the profiles by interval x scale simulated seconds
+        self.clock = SimulatedClock(self.update_interval * self.time_scale)
         self.gpu_start_index = gpu_start_index
         self.pid_file = '/tmp/dcgm-fake-gpu.pid'
         self.log_file = '/tmp/dcgm-fake.log'
         self.hostengine_pid = None
+        self.shard_map_file = SHARD_MAP_FILE
+        self.metrics_file = MANAGER_METRICS_FILE
+        self.ready_file = READY_FILE
+        # time.monotonic() by which start() gives up waiting on hostengines and DCGM connections
+        self.startup_deadline = None
+        self.record_file = record_file
+        self.recorder = None
+        self.shards = plan_shards(self.num_gpus, gpus_per_shard, base_port)
         
         # Create profile instances for each GPU
-        self.profiles = {}
-        if self.gpu_profiles and len(self.gpu_profiles) > 0:
-            # Per-GPU profiles specified
-            for i in range(1, self.num_gpus + 1):
-                profile_idx = (i - 1) % len(self.gpu_profiles)
-                profile_name = self.gpu_profiles[profile_idx]
-                self.profiles[i] = ProfileFactory.create(profile_name)
+        self.profiles = create_profiles(self.num_gpus, self.metric_profile, self.gpu_profiles)
+        if self.gpu_profiles:
             log_info(f"Using per-GPU profiles: {self.gpu_profiles}")
         else:
-            # Use same profile for all GPUs
-            for i in range(1, self.num_gpus + 1):
-                self.profiles[i] = ProfileFactory.create(self.metric_profile)
             log_info(f"Using profile '{self.metric_profile}' for all GPUs")
+        configure_sources(self.profiles, self.clock.step, replay_file, replay_speed, trace_file)
+
+        self.generator = MetricGenerator(self.profiles, profile_engine, self.clock)
+        self.profile_engine = self.generator.engine
+        if self.profile_engine == 'numpy':
+            log_info("Using vectorized (numpy) profile engine")
+        if self.time_scale != 1:
+            log_info(f"Simulated time runs {self.time_scale:g}x faster: {self.clock.step:g}s per update")
+        # Expands each profile tick into the injected fields (counters keep running totals)
+        self.fields = fields
+        self.synthesizer = dcgm_field_registry.FieldSynthesizer(fields)
+        if len(fields) < len(dcgm_field_registry.FIELDS):
+            log_info(f"Injecting {len(fields)} of {len(dcgm_field_registry.FIELDS)} fields "
+                     f"(DCGM_FIELD_GROUPS={DCGM_FIELD_GROUPS})")
 
         # Validate DCGM directory
         if not os.path.isdir(self.dcgm_dir):
@@ -435,6 +928,33 @@ class DCGMFakeManager:
             log_warn(f"Creating {self.num_gpus} GPUs may impact performance and memory usage")
         if self.num_gpus > 500:
             log_warn(f"Large GPU count (>{self.num_gpus}) may cause significant resource usage")
+        if len(self.shards) > 1:
+            log_info(f"Spreading {self.num_gpus} GPUs over {len(self.shards)} hostengine shards "
+                     f"(ports {self.shards[0].port}-{self.shards[-1].port})")
+
+    def global_gpu_id(self, ordinal):
+        """GPU_START_INDEX-based id the exporter publishes for a GPU ordinal"""
+        return self.gpu_start_index + ordinal - 1
+
+    def write_shard_map(self):
+        """Publish shard ports, pids and local->global GPU ids for the exporter and `stop`"""
+        shard_map = {
+            'gpu_start_index': self.gpu_start_index,
+            'shards': [
+                {
+                    'shard': shard.index,
+                    'host': shard.host,
+                    'pid': shard.pid,
+                    'gpus': {str(gpu_id): self.global_gpu_id(shard.ordinal(pos))
+                             for pos, gpu_id in enumerate(shard.gpu_ids)},
+                }
+                for shard in self.shards
+            ],
+        }
+        tmp_path = f"{self.shard_map_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(shard_map, f)
+        os.replace(tmp_path, self.shard_map_file)
 
     def is_port_open(self, port=5555, host='localhost', timeout=1):
         """Check if a port is open."""
@@ -453,137 +973,219 @@ class DCGMFakeManager:
             try:
                 with open(self.pid_file, 'r') as f:
                     pid = int(f.read().strip())
-                os.kill(pid, 0)  # Check if process exists
-                return True, pid
             except (OSError, ValueError):
                 return False, None
+            # A root-owned hostengine we may not signal still counts as running
+            if pid_alive(pid):
+                return True, pid
         return False, None
 
-    def stop(self):
-        """Stop the DCGM host engine."""
+    def running_pids(self):
+        """PIDs of all live hostengine shards (shard map first, pid file as fallback)."""
+        pids = []
+        shard_map = read_shard_map(self.shard_map_file)
+        if shard_map:
+            pids = [shard['pid'] for shard in shard_map.get('shards', []) if shard.get('pid')]
         running, pid = self.is_running()
+        if running and pid not in pids:
+            pids.append(pid)
+        return [pid for pid in pids if pid_alive(pid)]
+
+    def stop(self):
+        """Stop the DCGM host engine (all shards)."""
+        pids = self.running_pids()
 
-        if not running:
+        if not pids:
             log_warn("DCGM host engine is not running")
             return
 
-        log(f"Stopping DCGM host engine (PID: {pid})...")
+        log(f"Stopping DCGM host engine (PID: {', '.join(str(pid) for pid in pids)})...")
 
         try:
-            os.kill(pid, signal.SIGTERM)
-            time.sleep(2)
-
-            # Check if still running
-            try:
-                os.kill(pid, 0)
-                log_warn("Process still running, forcing kill...")
-                os.kill(pid, signal.SIGKILL)
-                time.sleep(1)
-            except OSError:
-                pass
-
-            if os.path.exists(self.pid_file):
-                os.remove(self.pid_file)
+            # Signal every shard first so they shut down in parallel
+            for pid in pids:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    # Exited since running_pids(); the wait below finds it gone
+                    pass
+
+            # Done as soon as every shard has exited; SIGKILL whatever outlives the grace period
+            def exited():
+                return not any(pid_alive(pid) for pid in pids)
+
+            if not poll(exited, STOP_GRACE_PERIOD):
+                for pid in pids:
+                    try:
+                        if pid_alive(pid):
+                            log_warn(f"Process {pid} still running, forcing kill...")
+                            os.kill(pid, signal.SIGKILL)
+                    except OSError:
+                        pass
+                poll(exited, STOP_GRACE_PERIOD)
+
+            for path in (self.pid_file, self.shard_map_file, self.metrics_file, self.ready_file):
+                if os.path.exists(path):
+                    os.remove(path)
 
             log("✓ DCGM host engine stopped")
         except Exception as e:
             log_error(f"Failed to stop host engine: {e}")
 
+    def time_left(self):
+        """Seconds left before the startup deadline (STARTUP_TIMEOUT when start() did not set one)"""
+        if self.startup_deadline is None:
+            return STARTUP_TIMEOUT
+        return max(0.0, self.startup_deadline - time.monotonic())
+
+    def connect(self, host):
+        """pydcgm handle to a hostengine, retried with backoff while it is still coming up."""
+        import pydcgm
+        import dcgm_structs
+
+        errors = []
+
+        def attempt():
+            try:
+                return pydcgm.DcgmHandle(None, host, dcgm_structs.DCGM_OPERATION_MODE_AUTO)
+            except Exception as e:
+                errors.append(e)
+                return None
+
+        handle = poll(attempt, self.time_left())
+        if handle is None:
+            raise errors[-1] if errors else TimeoutError(f"Could not connect to {host}")
+        return handle
+
     def start_host_engine(self):
-        """Start the DCGM host engine."""
-        log("Starting nv-hostengine...")
+        """Start one nv-hostengine per shard, all at once, and wait until every port is open.
 
-        hostengine_path = os.path.join(self.dcgm_dir, 'bin/nv-hostengine')
+        When any shard fails to come up, the ones that did are stopped again so
+        a retry finds their ports free.
+        """
+        log(f"Starting nv-hostengine ({len(self.shards)} shard{'s' if len(self.shards) > 1 else ''})...")
 
-        # Open log file
-        log_f = open(self.log_file, 'w')
-
-        # Start the process in foreground mode (-n flag) but as a background subprocess
-        # This prevents nv-hostengine from daemonizing itself
-        process = subprocess.Popen(
-            [hostengine_path, '-n'],  # -n = no daemon mode
-            stdout=log_f,
-            stderr=subprocess.STDOUT,
-            stdin=subprocess.DEVNULL,
-            env=self.env,
-            cwd=self.dcgm_dir,
-            start_new_session=True  # Detach from session so it survives script exit
-        )
+        log_files = {}
+        started = False
+        try:
+            started = self._launch_host_engines(log_files)
+            return started
+        finally:
+            # Each hostengine writes its log through its own descriptor
+            for log_f in log_files.values():
+                log_f.close()
+            if not started and any(shard.pid for shard in self.shards):
+                # The shard map tells stop() about every shard launched, even if startup broke off early
+                self.write_shard_map()
+                self.stop()
 
-        self.hostengine_pid = process.pid
+    def _launch_host_engines(self, log_files):
+        """Launch every shard's nv-hostengine (log handles go in `log_files`); True once all listen."""
+        hostengine_path = os.path.join(self.dcgm_dir, 'bin/nv-hostengine')
+
+        for shard in self.shards:
+            # Open log file
+            log_f = open(shard.log_file, 'w')
+            log_files[shard.index] = log_f
+
+            # Start the process in foreground mode (-n flag) but as a background subprocess
+            # This prevents nv-hostengine from daemonizing itself
+            cmd = [hostengine_path, '-n', '-p', str(shard.port)]  # -n = no daemon mode
+            if shard.hostengine_pid_file:
+                # Each extra instance needs its own lock file
+                cmd += ['--pid', shard.hostengine_pid_file]
+            shard.process = subprocess.Popen(
+                cmd,
+                stdout=log_f,
+                stderr=subprocess.STDOUT,
+                stdin=subprocess.DEVNULL,
+                env=self.env,
+                cwd=self.dcgm_dir,
+                start_new_session=True  # Detach from session so it survives script exit
+            )
+            shard.pid = shard.process.pid
+            log(f"Host engine shard {shard.index} started (PID: {shard.pid}, port {shard.port})")
+
+        self.hostengine_pid = self.shards[0].pid
 
         # Save PID
         with open(self.pid_file, 'w') as f:
             f.write(str(self.hostengine_pid))
+        self.write_shard_map()
 
-        log(f"Host engine started (PID: {self.hostengine_pid})")
-
-        # Wait for it to be ready
+        # Wait for it to be ready: poll the ports with a tight backoff until the startup deadline
         log("Waiting for host engine to initialize...")
-        max_retries = 15
-        for i in range(max_retries):
-            time.sleep(2)
-
-            # Check if process is still alive
-            if process.poll() is not None:
-                log_error("Host engine process died!")
-                log_error(f"Exit code: {process.returncode}")
-                log_error(f"Check log: {self.log_file}")
-                log_f.close()
-                with open(self.log_file, 'r') as f:
-                    log_error(f.read())
-                return False
-
-            # Check if port is open
-            if self.is_port_open(5555):
-                log("✓ Host engine is ready and listening on port 5555")
-                # Don't close log_f - keep it open for the process
-                return True
+        pending = list(self.shards)
+        died = []
+
+        def ready():
+            for shard in list(pending):
+                # Check if process is still alive
+                if shard.process.poll() is not None:
+                    died.append(shard)
+                    return True
+                # Check if port is open
+                if self.is_port_open(shard.port):
+                    pending.remove(shard)
+            return not pending
+
+        poll(ready, self.time_left())
+        for shard in died:
+            log_error(f"Host engine shard {shard.index} process died!")
+            log_error(f"Exit code: {shard.process.returncode}")
+            log_error(f"Check log: {shard.log_file}")
+            with open(shard.log_file, 'r') as f:
+                log_error(f.read())
+            return False
 
-            if i < max_retries - 1:
-                log_info(f"Still waiting... ({i+1}/{max_retries})")
+        if not pending:
+            log(f"✓ Host engine is ready and listening on port"
+                f"{'s' if len(self.shards) > 1 else ''} "
+                f"{', '.join(str(shard.port) for shard in self.shards)}")
+            return True
 
-        log_warn("Timeout waiting for port 5555")
+        log_warn(f"Timeout waiting for port{'s' if len(pending) > 1 else ''} "
+                 f"{', '.join(str(shard.port) for shard in pending)}")
 
         # Show the log
-        log_f.close()
-        with open(self.log_file, 'r') as f:
-            log_warn("Log contents:")
-            print(f.read())
+        for shard in pending:
+            with open(shard.log_file, 'r') as f:
+                log_warn(f"Log contents (shard {shard.index}):")
+                print(f.read())
 
         return False
 
     def create_fake_gpus(self):
-        """Create fake GPU entities."""
-        # DCGM has a hard limit on fake entities (typically 16-32)
-        MAX_FAKE_GPUS = 16
-        
-        if self.num_gpus > MAX_FAKE_GPUS:
-            log_warn(f"Requested {self.num_gpus} GPUs exceeds DCGM limit of {MAX_FAKE_GPUS}")
-            log_warn(f"Reducing to {MAX_FAKE_GPUS} GPUs")
-            self.num_gpus = MAX_FAKE_GPUS
-        
+        """Create fake GPU entities on every shard in parallel."""
         log(f"Creating {self.num_gpus} fake GPUs...")
 
         # Add DCGM Python modules to path
         sys.path.insert(0, os.path.join(self.dcgm_dir, 'share/dcgm_tests'))
 
+        with ThreadPoolExecutor(max_workers=len(self.shards)) as pool:
+            results = list(pool.map(self._create_shard_gpus, self.shards))
+        if not all(results):
+            return False
+
+        self.write_shard_map()
+        return True
+
+    def _create_shard_gpus(self, shard):
+        """Create one shard's fake GPUs; the DCGM calls release the GIL, so shards overlap."""
         try:
-            import pydcgm
-            import dcgm_structs
             import dcgm_structs_internal
             import dcgm_agent_internal
             import dcgm_fields
 
-            # Connect to DCGM
-            handle = pydcgm.DcgmHandle(None, "localhost", dcgm_structs.DCGM_OPERATION_MODE_AUTO)
+            # Connect to DCGM: the port opens a moment before the hostengine takes connections
+            handle = self.connect(shard.host)
 
             # Create fake GPUs
             cfe = dcgm_structs_internal.c_dcgmCreateFakeEntities_v2()
             cfe.numToCreate = 0
             fake_gpu_list = []
 
-            for i in range(self.num_gpus):
+            for i in range(shard.num_gpus):
                 cfe.entityList[cfe.numToCreate].entity.entityGroupId = dcgm_fields.DCGM_FE_GPU
                 cfe.numToCreate += 1
 
@@ -592,20 +1194,23 @@ class DCGMFakeManager:
                 if updated.entityList[i].entity.entityGroupId == dcgm_fields.DCGM_FE_GPU:
                     fake_gpu_list.append(updated.entityList[i].entity.entityId)
 
-            log(f"✓ Created {len(fake_gpu_list)} fake GPUs: {fake_gpu_list}")
+            shard.gpu_ids = fake_gpu_list
+            first = self.global_gpu_id(shard.first_ordinal)
+            log(f"✓ Created {len(fake_gpu_list)} fake GPUs on shard {shard.index}: {fake_gpu_list} "
+                f"(global GPUs {first}-{first + len(fake_gpu_list) - 1})")
 
             # Inject GPU attributes using NVML injection
-            self._inject_gpu_attributes_nvml(handle.handle, fake_gpu_list)
+            self._inject_gpu_attributes_nvml(handle.handle, fake_gpu_list, shard.first_ordinal)
 
             return True
 
         except Exception as e:
-            log_error(f"Failed to create fake GPUs: {e}")
+            log_error(f"Failed to create fake GPUs on shard {shard.index}: {e}")
             import traceback
             traceback.print_exc()
             return False
 
-    def _inject_gpu_attributes_nvml(self, handle, gpu_ids):
+    def _inject_gpu_attributes_nvml(self, handle, gpu_ids, first_ordinal=1):
         """Inject GPU attributes using NVML injection."""
         log("Injecting GPU attributes (name, UUID, PCI)...")
 
@@ -625,9 +1230,11 @@ class DCGMFakeManager:
                 "A100-PCIE-40GB"
             ]
 
-            for idx, gpu_id in enumerate(gpu_ids):
+            for idx, gpu_id in enumerate(gpu_ids, start=first_ordinal - 1):
                 gpu_name = gpu_models[idx % len(gpu_models)]
-                pci_bus_id = f"00000000:{idx+1:02x}:00.0"
+                # Global ordinal keeps names, bus ids and UUIDs unique across shards
+                pci_domain, pci_bus = divmod(idx + 1, 256)
+                pci_bus_id = f"{pci_domain:08x}:{pci_bus:02x}:00.0"
                 uuid = f"GPU-{idx+1:08x}-fake-dcgm-{idx+1:04x}-{self.num_gpus:04x}{idx+1:08x}"
 
                 # Inject GPU Name
@@ -664,8 +1271,8 @@ class DCGMFakeManager:
                     # Create PCI info structure
                     bus_id_buf = create_string_buffer(pci_bus_id.encode('utf-8'), 32)
                     injected_ret.values[0].value.PciInfo.busId = bus_id_buf.value
-                    injected_ret.values[0].value.PciInfo.domain = 0
-                    injected_ret.values[0].value.PciInfo.bus = idx + 1
+                    injected_ret.values[0].value.PciInfo.domain = pci_domain
+                    injected_ret.values[0].value.PciInfo.bus = pci_bus
                     injected_ret.values[0].value.PciInfo.device = 0
                     injected_ret.values[0].value.PciInfo.pciDeviceId = 0x1DB6  # V100/A100 device ID
                     injected_ret.values[0].value.PciInfo.pciSubSystemId = 0x12A2
@@ -685,81 +1292,109 @@ class DCGMFakeManager:
             import traceback
             traceback.print_exc()
 
+    def generate_metrics(self, gpu_ids):
+        """Run one profile tick for `gpu_ids`; returns {gpu_id: {metrics key: int}}."""
+        return self.generator.generate(gpu_ids)
+
     def inject_metrics(self):
         """Inject realistic metrics into fake GPUs using configured profiles."""
         log("Injecting metrics using profiles...")
 
-        # Add DCGM Python modules to path
-        sys.path.insert(0, os.path.join(self.dcgm_dir, 'share/dcgm_tests'))
-
         try:
-            import pydcgm
-            import dcgm_structs
-            import dcgm_fields
-            import dcgm_field_injection_helpers
-            import dcgm_agent
-
-            # Connect to DCGM
-            handle = pydcgm.DcgmHandle(None, "localhost", dcgm_structs.DCGM_OPERATION_MODE_AUTO)
-            gpu_ids = dcgm_agent.dcgmGetAllDevices(handle.handle)
-
-            # Skip GPU 0 (it's the injected V100 from nvml injection library)
-            # Only inject into fake GPUs (1-N)
-            fake_gpu_ids = [gid for gid in gpu_ids if gid > 0]
-
-            for gpu_id in fake_gpu_ids:
-                # Get the profile for this GPU
-                profile = self.profiles.get(gpu_id, self.profiles[1])
-                
-                # Apply profile transformation
-                base_values = {}  # Profiles generate their own values
-                metrics = profile.apply(gpu_id, base_values)
-                
-                # Convert all metrics to integers (DCGM expects i64, not floats)
-                metrics = {k: int(v) for k, v in metrics.items()}
-                
-                # Inject the metrics
-                dcgm_field_injection_helpers.inject_value(
-                    handle.handle, gpu_id, dcgm_fields.DCGM_FI_DEV_GPU_TEMP,
-                    metrics['temp'], 0, True)
-                dcgm_field_injection_helpers.inject_value(
-                    handle.handle, gpu_id, dcgm_fields.DCGM_FI_DEV_POWER_USAGE,
-                    metrics['power'], 0, True)
-                dcgm_field_injection_helpers.inject_value(
-                    handle.handle, gpu_id, dcgm_fields.DCGM_FI_DEV_GPU_UTIL,
-                    metrics['gpu_util'], 0, True)
-                dcgm_field_injection_helpers.inject_value(
-                    handle.handle, gpu_id, dcgm_fields.DCGM_FI_DEV_MEM_COPY_UTIL,
-                    metrics['mem_util'], 0, True)
-                dcgm_field_injection_helpers.inject_value(
-                    handle.handle, gpu_id, dcgm_fields.DCGM_FI_DEV_SM_CLOCK,
-                    metrics['sm_clock'], 0, True)
-                dcgm_field_injection_helpers.inject_value(
-                    handle.handle, gpu_id, dcgm_fields.DCGM_FI_DEV_MEM_CLOCK,
-                    metrics['mem_clock'], 0, True)
-                dcgm_field_injection_helpers.inject_value(
-                    handle.handle, gpu_id, dcgm_fields.DCGM_FI_DEV_FB_TOTAL,
-                    16384, 0, True)
-                dcgm_field_injection_helpers.inject_value(
-                    handle.handle, gpu_id, dcgm_fields.DCGM_FI_DEV_FB_USED,
-                    metrics['fb_used'], 0, True)
-                dcgm_field_injection_helpers.inject_value(
-                    handle.handle, gpu_id, dcgm_fields.DCGM_FI_DEV_FB_FREE,
-                    16384 - metrics['fb_used'], 0, True)
-
-                profile_name = profile.name
-                log_info(f"  GPU {gpu_id} [{profile_name}]: {metrics['temp']:.0f}°C, "
-                        f"{metrics['power']:.0f}W, {metrics['gpu_util']:.0f}% util")
+            # Connect once per shard and reuse the handle and device list across cycles
+            missing = [shard for shard in self.shards if shard.injector is None]
+            if missing:
+                with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+                    for shard, injector in zip(missing, pool.map(
+                            lambda shard: FieldInjector(self.dcgm_dir, shard.host, self.fields), missing)):
+                        shard.injector = injector
+
+            cycle_start = time.perf_counter()
+            ordinals = [shard.ordinal(pos) for shard in self.shards for pos in range(len(self._shard_gpu_ids(shard)))]
+            values_by_ordinal = self.generate_metrics(ordinals)
+            if self.record_file:
+                self.record_cycle(values_by_ordinal)
+            fields_by_ordinal = self.synthesizer.expand(values_by_ordinal, self.clock.step)
+
+            generated = time.perf_counter()
+            if len(self.shards) == 1:
+                calls = self._inject_shard(self.shards[0], fields_by_ordinal)
+            else:
+                with ThreadPoolExecutor(max_workers=len(self.shards)) as pool:
+                    calls = sum(pool.map(lambda shard: self._inject_shard(shard, fields_by_ordinal), self.shards))
+            injected = time.perf_counter()
 
-            log("✓ Metrics injected")
+            for ordinal, metrics in list(values_by_ordinal.items())[:MAX_LOGGED_GPUS]:
+                profile_name = self.profiles.get(ordinal, self.profiles[1]).name
+                log_info(f"  GPU {self.global_gpu_id(ordinal)} [{profile_name}]: {metrics['temp']:.0f}°C, "
+                        f"{metrics['power']:.0f}W, {metrics['gpu_util']:.0f}% util")
+            if len(values_by_ordinal) > MAX_LOGGED_GPUS:
+                log_info(f"  ... and {len(values_by_ordinal) - MAX_LOGGED_GPUS} more GPUs")
+
+            num_gpus = max(len(values_by_ordinal), 1)
+            INJECTION_DURATION.observe(generated - cycle_start, ('profiles',))
+            INJECTION_DURATION.observe(injected - generated, ('inject',))
+            INJECTION_GPU_DURATION.observe((injected - cycle_start) / num_gpus)
+            INJECTION_CYCLES.inc(('success',))
+            INJECTION_CALLS.inc(amount=calls)
+            INJECTED_GPUS.set(len(values_by_ordinal))
+            LAST_INJECTION.set(round(time.time(), 3))
+            self.write_self_metrics()
+            log(f"✓ Metrics injected: {len(values_by_ordinal)} GPUs, {calls} DCGM calls in "
+                f"{(injected - cycle_start) * 1000:.1f} ms (profiles {(generated - cycle_start) * 1000:.1f} ms, "
+                f"inject {(injected - generated) * 1000:.1f} ms, "
+                f"{(injected - cycle_start) * 1000000 / num_gpus:.0f} µs/GPU)")
             return True
 
         except Exception as e:
             log_error(f"Failed to inject metrics: {e}")
             import traceback
             traceback.print_exc()
+            INJECTION_CYCLES.inc(('error',))
+            self.write_self_metrics()
+            # Reconnect on the next cycle
+            for shard in self.shards:
+                if shard.injector is not None:
+                    shard.injector.close()
+                    shard.injector = None
             return False
 
+    def record_cycle(self, values_by_ordinal):
+        """Append this cycle's profile ticks to the recording (best effort)"""
+        try:
+            if self.recorder is None:
+                self.recorder = dcgm_recording.Recorder(self.record_file, RECORDED_METRICS)
+                log_info(f"Recording profile ticks to {self.record_file}")
+            self.recorder.write_cycle(time.time(), values_by_ordinal)
+        except (OSError, ValueError) as e:
+            log_warn(f"Could not record metrics to {self.record_file}: {e}; recording stopped")
+            self.record_file = None
+
+    def next_update_delay(self, interval):
+        """Seconds until the next cycle: the recorded gap (over the replay speed) when replaying, else `interval`"""
+        for profile in self.profiles.values():
+            if isinstance(profile, ReplayProfile) and profile.reader is not None:
+                return profile.reader.next_delay(interval)
+        return interval
+
+    def write_self_metrics(self):
+        """Publish the injection metrics for the exporter (best effort)"""
+        try:
+            dcgm_self_metrics.write_families(self.metrics_file, MANAGER_METRICS.collect())
+        except OSError as e:
+            log_warn(f"Could not write self metrics to {self.metrics_file}: {e}")
+
+    def _shard_gpu_ids(self, shard):
+        """Shard-local ids in ordinal order; never more than the shard's share of GPUs."""
+        return (shard.gpu_ids or shard.injector.gpu_ids)[:shard.num_gpus]
+
+    def _inject_shard(self, shard, values_by_ordinal):
+        """Inject one shard's slice of a cycle under its shard-local GPU ids."""
+        return shard.injector.inject({
+            gpu_id: values_by_ordinal[shard.ordinal(pos)]
+            for pos, gpu_id in enumerate(self._shard_gpu_ids(shard))
+        })
+
     def start_metric_updater(self, interval=None):
         """Start background thread to update metrics periodically."""
         import threading
@@ -771,7 +1406,7 @@ class DCGMFakeManager:
             log_info(f"Metric updater thread started (interval: {interval}s)")
             while True:
                 try:
-                    time.sleep(interval)
+                    time.sleep(self.next_update_delay(interval))
                     log_info(f"[Update #{self.profiles[1].iteration}] Updating metrics...")
                     self.inject_metrics()
                     log_info(f"[Update #{self.profiles[1].iteration}] Metrics updated successfully")
@@ -785,6 +1420,14 @@ class DCGMFakeManager:
         self.updater_thread.start()
         log(f"✓ Started metric updater (updates every {interval}s)")
 
+    def write_ready_file(self, phases):
+        """Tell whoever waits on READY_FILE (the container entrypoint) that the fake GPUs are up"""
+        tmp_path = f"{self.ready_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'pid': os.getpid(), 'hostengine_pids': [shard.pid for shard in self.shards],
+                       'startup_seconds': {phase: round(seconds, 3) for phase, seconds in phases.items()}}, f)
+        os.replace(tmp_path, self.ready_file)
+
     def create_wrapper(self):
         """Create dcgm.sh wrapper script."""
         wrapper_path = os.path.join(self.dcgm_dir, 'dcgm.sh')
@@ -818,35 +1461,48 @@ exec $DCGM_DIR/bin/dcgmi "$@"
             response = input("Stop and restart? (y/n): ").lower().strip()
             if response == 'y':
                 self.stop()
-                time.sleep(2)
             else:
                 log("Exiting...")
                 return False
 
+        # Every wait below polls for readiness against one deadline instead of sleeping
+        started = time.perf_counter()
+        self.startup_deadline = time.monotonic() + STARTUP_TIMEOUT
+        if os.path.exists(self.ready_file):
+            os.remove(self.ready_file)
+
         # Start host engine
         if not self.start_host_engine():
             log_error("Failed to start host engine")
             return False
-
-        time.sleep(2)
+        hostengine_ready = time.perf_counter()
 
         # Create fake GPUs
         if not self.create_fake_gpus():
             log_error("Failed to create fake GPUs")
             self.stop()
             return False
-
-        time.sleep(1)
+        gpus_ready = time.perf_counter()
 
         # Inject metrics
         if not self.inject_metrics():
             log_warn("Failed to inject metrics (GPUs created but no metrics)")
+        injected = time.perf_counter()
+
+        phases = {'hostengine': hostengine_ready - started, 'gpus': gpus_ready - hostengine_ready,
+                  'inject': injected - gpus_ready, 'total': injected - started}
+        for phase, seconds in phases.items():
+            STARTUP_DURATION.set(round(seconds, 3), (phase,))
+        self.write_self_metrics()
+        log(f"✓ Started in {phases['total'] * 1000:.0f} ms (hostengine {phases['hostengine'] * 1000:.0f} ms, "
+            f"fake GPUs {phases['gpus'] * 1000:.0f} ms, first injection {phases['inject'] * 1000:.0f} ms)")
 
         # Start metric updater for dynamic updates
         self.start_metric_updater()
 
         # Create wrapper
         self.create_wrapper()
+        self.write_ready_file(phases)
 
         print()
         print("=" * 50)
@@ -854,7 +1510,10 @@ exec $DCGM_DIR/bin/dcgmi "$@"
         print("=" * 50)
         print()
         log_info(f"Host Engine PID: {self.hostengine_pid}")
-        log_info(f"Fake GPUs: {self.num_gpus} (GPUs 1-{self.num_gpus})")
+        if len(self.shards) > 1:
+            log_info(f"Hostengine shards: {len(self.shards)} (ports {self.shards[0].port}-{self.shards[-1].port}, "
+                     f"map: {self.shard_map_file})")
+        log_info(f"Fake GPUs: {self.num_gpus} (GPUs {self.global_gpu_id(1)}-{self.global_gpu_id(self.num_gpus)})")
         log_info(f"Metric Profile: {self.metric_profile}")
         if self.gpu_profiles:
             log_info(f"Per-GPU Profiles: {', '.join(self.gpu_profiles)}")
@@ -868,7 +1527,7 @@ exec $DCGM_DIR/bin/dcgmi "$@"
         print(f"  {self.dcgm_dir}/dcgm.sh dmon -e 150,155,203,204")
         print()
         print(f"To stop: python3 {sys.argv[0]} stop")
-        print(f"Or: kill {self.hostengine_pid}")
+        print(f"Or: kill {' '.join(str(shard.pid) for shard in self.shards)}")
         print()
 
         return True
@@ -886,28 +1545,56 @@ exec $DCGM_DIR/bin/dcgmi "$@"
             log(f"DCGM is running (PID: {pid})")
             log_info(f"Log file: {self.log_file}")
 
-            if self.is_port_open(5555):
-                log("✓ Port 5555 is open and accepting connections")
-            else:
-                log_warn("Port 5555 is not accessible")
-
-            # Try to get GPU count
-            try:
-                sys.path.insert(0, os.path.join(self.dcgm_dir, 'share/dcgm_tests'))
-                import pydcgm
-                import dcgm_agent
-
-                handle = pydcgm.DcgmHandle(None, "localhost")
-                gpu_ids = dcgm_agent.dcgmGetAllDevices(handle.handle)
-                log_info(f"Number of GPUs: {len(gpu_ids)}")
-            except:
-                log_warn("Could not query GPU count")
+            shard_map = read_shard_map(self.shard_map_file)
+            shards = shard_map['shards'] if shard_map else [{'shard': 0, 'host': 'localhost:5555', 'gpus': None}]
+            for shard in shards:
+                port = int(shard['host'].rsplit(':', 1)[1])
+                prefix = f"Shard {shard['shard']}: " if len(shards) > 1 else ""
+                if self.is_port_open(port):
+                    log(f"✓ {prefix}Port {port} is open and accepting connections")
+                else:
+                    log_warn(f"{prefix}Port {port} is not accessible")
+
+                # Try to get GPU count
+                try:
+                    sys.path.insert(0, os.path.join(self.dcgm_dir, 'share/dcgm_tests'))
+                    import pydcgm
+                    import dcgm_agent
+
+                    handle = pydcgm.DcgmHandle(None, shard['host'])
+                    gpu_ids = dcgm_agent.dcgmGetAllDevices(handle.handle)
+                    log_info(f"{prefix}Number of GPUs: {len(gpu_ids)}")
+                    if shard['gpus']:
+                        global_ids = sorted(shard['gpus'].values())
+                        log_info(f"{prefix}Global GPU ids: {global_ids[0]}-{global_ids[-1]}")
+                except:
+                    log_warn(f"{prefix}Could not query GPU count")
         else:
             log_warn("DCGM is not running")
 
         print()
 
 
+def backfill(args, num_gpus, metric_profile, gpu_profiles, update_interval, gpu_start_index, profile_engine):
+    """Write BACKFILL_HOURS of simulated metrics to an OpenMetrics file for promtool"""
+    hours = args.hours if args.hours is not None else float(os.environ.get('BACKFILL_HOURS', '24'))
+    output = args.output or os.environ.get('BACKFILL_FILE', '/tmp/dcgm-fake-backfill.om')
+    try:
+        log_info(f"Simulating {hours:g}h of {num_gpus} GPUs every {update_interval}s into {output}...")
+        started = time.perf_counter()
+        ticks = simulate(num_gpus, hours * 3600, metric_profile, gpu_profiles, update_interval, args.start,
+                         gpu_start_index, profile_engine, INJECTION_FIELDS, args.replay, args.replay_speed,
+                         args.trace)
+        samples = dcgm_backfill.write_backfill(output, ticks, INJECTION_FIELDS)
+    except (OSError, ValueError) as e:
+        log_error(f"Backfill failed: {e}")
+        # A non-zero exit so scripts feeding promtool stop here
+        sys.exit(1)
+    log(f"✓ Wrote {samples:,} samples ({hours:g}h, {num_gpus} GPUs) to {output} "
+        f"in {time.perf_counter() - started:.1f}s")
+    log_info(f"Load them with: promtool tsdb create-blocks-from openmetrics {output} <prometheus data dir>")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='DCGM Fake GPU Manager',
@@ -916,8 +1603,14 @@ def main():
 Examples:
   python3 dcgm_fake_manager.py start                    # Start with defaults (4 GPUs, static profile)
   python3 dcgm_fake_manager.py start -n 8               # Start with 8 GPUs
+  python3 dcgm_fake_manager.py start -n 256             # 256 GPUs over 16 hostengine shards
   python3 dcgm_fake_manager.py start -p spike           # Use spike profile
   python3 dcgm_fake_manager.py start --gpu-profiles stable,spike,faulty  # Per-GPU profiles
+  python3 dcgm_fake_manager.py start -p chaos --record /tmp/run.bin    # Record a run
+  python3 dcgm_fake_manager.py start --replay /tmp/run.bin --replay-speed 10  # Replay it 10x faster
+  python3 dcgm_fake_manager.py start --trace node7-dmon.log -i 1        # Stream a real dmon trace
+  python3 dcgm_fake_manager.py start -p wave -i 2 --time-scale 15       # A 30-minute wave every 2 minutes
+  python3 dcgm_fake_manager.py backfill -p degrading --hours 24 -o gpus.om  # 24h of history, no DCGM needed
   python3 dcgm_fake_manager.py status                   # Check status
   python3 dcgm_fake_manager.py stop                     # Stop service
 
@@ -929,11 +1622,31 @@ Environment Variables:
   METRIC_PROFILE           Profile name (default: static)
   GPU_PROFILES             Comma-separated per-GPU profiles (overrides METRIC_PROFILE)
   METRIC_UPDATE_INTERVAL   Update interval in seconds (default: 30)
+  METRIC_TIME_SCALE        Simulated seconds per wall-clock second (default: 1)
   GPU_START_INDEX          Starting GPU index (default: 1)
+  PROFILE_ENGINE           Profile engine: scalar or numpy (default: scalar)
+  GPUS_PER_HOSTENGINE      Fake GPUs per nv-hostengine shard, max 16 (default: 16)
+  HOSTENGINE_BASE_PORT     Port of the first shard; shard N listens on base+N (default: 5555)
+  DCGM_SHARD_MAP           Shard map file read by the exporter (default: /tmp/dcgm-fake-shards.json)
+  METRIC_RECORD_FILE       Append every cycle's profile ticks to this file (default: off)
+  REPLAY_FILE              Recording streamed back by the replay profile (default: /tmp/dcgm-fake-recording.bin)
+  REPLAY_SPEED             Replay speed-up over the recorded pace (default: 1)
+  REPLAY_LOOP              Start the recording over when it ends (default: true)
+  TRACE_FILE               dcgmi dmon log, /metrics scrapes or CSV streamed by the trace profile
+  TRACE_FORMAT             Trace format: auto, dmon, prometheus or csv (default: auto)
+  TRACE_SAMPLE_INTERVAL    Seconds between trace samples without timestamps (default: 1)
+  TRACE_COLUMNS            Extra column mappings, e.g. temp=gpu_temp_c,power@2=gpu2_watts
+  TRACE_GPU_MAP            Fake GPU ordinal to trace GPU id, e.g. 1=0,2=3 (default: in order)
+  TRACE_LOOP               Start the trace over when it ends (default: true)
+  STARTUP_TIMEOUT          Seconds start() waits in all for hostengines and DCGM connections (default: 30)
+  STOP_GRACE_PERIOD        Seconds stop() waits after SIGTERM before SIGKILL (default: 2)
+  DCGM_READY_FILE          Written with the startup breakdown once start() is done (default: /tmp/dcgm-fake-ready.json)
+  BACKFILL_HOURS           Simulated hours written by backfill (default: 24)
+  BACKFILL_FILE            OpenMetrics file written by backfill (default: /tmp/dcgm-fake-backfill.om)
         """
     )
 
-    parser.add_argument('action', choices=['start', 'stop', 'restart', 'status'],
+    parser.add_argument('action', choices=['start', 'stop', 'restart', 'status', 'backfill'],
                        help='Action to perform')
     parser.add_argument('-n', '--num-gpus', type=int,
                        help='Number of fake GPUs to create (default: from NUM_FAKE_GPUS env or 4)')
@@ -945,6 +1658,29 @@ Environment Variables:
                        help='Metric update interval in seconds (default: from METRIC_UPDATE_INTERVAL env or 30)')
     parser.add_argument('--gpu-start-index', type=int,
                        help='Starting GPU index (default: from GPU_START_INDEX env or 1)')
+    parser.add_argument('--profile-engine', choices=['scalar', 'numpy'],
+                       help='Profile engine (default: from PROFILE_ENGINE env or scalar)')
+    parser.add_argument('--gpus-per-shard', type=int,
+                       help=f'Fake GPUs per nv-hostengine shard (default: from GPUS_PER_HOSTENGINE env or {MAX_FAKE_GPUS_PER_HOSTENGINE})')
+    parser.add_argument('--base-port', type=int,
+                       help='Port of the first hostengine shard (default: from HOSTENGINE_BASE_PORT env or 5555)')
+    parser.add_argument('--record', metavar='FILE',
+                       help='Record every cycle\'s profile ticks to FILE (default: from METRIC_RECORD_FILE env)')
+    parser.add_argument('--replay', metavar='FILE',
+                       help='Replay a recording instead of running profiles (same as -p replay with REPLAY_FILE)')
+    parser.add_argument('--replay-speed', type=float,
+                       help='Replay speed-up over the recorded pace (default: from REPLAY_SPEED env or 1)')
+    parser.add_argument('--trace', metavar='FILE',
+                       help='Stream a dmon/scrape/CSV telemetry trace instead of running profiles '
+                            '(same as -p trace with TRACE_FILE)')
+    parser.add_argument('--time-scale', type=float,
+                       help='Simulated seconds per wall-clock second (default: from METRIC_TIME_SCALE env or 1)')
+    parser.add_argument('--hours', type=float,
+                       help='backfill: simulated hours to write (default: from BACKFILL_HOURS env or 24)')
+    parser.add_argument('--start', type=float,
+                       help='backfill: unix time of the first sample (default: so that the last one is now)')
+    parser.add_argument('-o', '--output', metavar='FILE',
+                       help='backfill: OpenMetrics file to write (default: from BACKFILL_FILE env)')
     parser.add_argument('-d', '--dcgm-dir',
                        help='DCGM directory (default: ~/Workspace/DCGM/_out/Linux-amd64-debug)')
 
@@ -958,6 +1694,11 @@ Environment Variables:
         num_gpus = 4
 
     metric_profile = args.profile if args.profile else os.environ.get('METRIC_PROFILE', 'static')
+    if args.replay:
+        metric_profile = 'replay'
+    elif args.trace:
+        metric_profile = 'trace'
+    record_file = args.record if args.record else os.environ.get('METRIC_RECORD_FILE', '')
     
     # Parse GPU profiles (per-GPU)
     gpu_profiles = None
@@ -978,6 +1719,27 @@ Environment Variables:
         log_warn("Invalid GPU_START_INDEX value, using default: 1")
         gpu_start_index = 1
 
+    profile_engine = args.profile_engine if args.profile_engine else os.environ.get('PROFILE_ENGINE', 'scalar')
+
+    try:
+        gpus_per_shard = args.gpus_per_shard if args.gpus_per_shard is not None else int(os.environ.get('GPUS_PER_HOSTENGINE', str(MAX_FAKE_GPUS_PER_HOSTENGINE)))
+    except ValueError:
+        log_warn(f"Invalid GPUS_PER_HOSTENGINE value, using default: {MAX_FAKE_GPUS_PER_HOSTENGINE}")
+        gpus_per_shard = MAX_FAKE_GPUS_PER_HOSTENGINE
+    if gpus_per_shard > MAX_FAKE_GPUS_PER_HOSTENGINE:
+        log_warn(f"GPUS_PER_HOSTENGINE {gpus_per_shard} exceeds DCGM limit of {MAX_FAKE_GPUS_PER_HOSTENGINE}, using {MAX_FAKE_GPUS_PER_HOSTENGINE}")
+        gpus_per_shard = MAX_FAKE_GPUS_PER_HOSTENGINE
+
+    try:
+        base_port = args.base_port if args.base_port is not None else int(os.environ.get('HOSTENGINE_BASE_PORT', '5555'))
+    except ValueError:
+        log_warn("Invalid HOSTENGINE_BASE_PORT value, using default: 5555")
+        base_port = 5555
+
+    if args.action == 'backfill':
+        backfill(args, num_gpus, metric_profile, gpu_profiles, update_interval, gpu_start_index, profile_engine)
+        return
+
     try:
         manager = DCGMFakeManager(
             dcgm_dir=args.dcgm_dir,
@@ -985,7 +1747,15 @@ Environment Variables:
             metric_profile=metric_profile,
             gpu_profiles=gpu_profiles,
             update_interval=update_interval,
-            gpu_start_index=gpu_start_index
+            gpu_start_index=gpu_start_index,
+            profile_engine=profile_engine,
+            gpus_per_shard=gpus_per_shard,
+            base_port=base_port,
+            record_file=record_file,
+            replay_file=args.replay,
+            replay_speed=args.replay_speed,
+            trace_file=args.trace,
+            time_scale=args.time_scale
         )
 
         if args.action == 'start':
@@ -994,7 +1764,6 @@ Environment Variables:
             manager.stop()
         elif args.action == 'restart':
             manager.stop()
-            time.sleep(2)
             manager.start()
         elif args.action == 'status':
             manager.status()
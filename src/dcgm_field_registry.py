@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+DCGM field registry shared by dcgm_fake_manager.py and dcgm_exporter.py
+
+One row per DCGM field: the DCGM id and dcgm_fields constant, the exported
+Prometheus metric (name, type, help, unit), the value type injected into
+the hostengine, the dcgmi dmon column header and a group used to pick
+subsets. The manager injects, and the exporter collects and renders, the
+ones in DCGM_FIELD_GROUPS, and both synthesize
+the values the same way from a profile tick (temp, power, gpu_util,
+mem_util, sm_clock, mem_clock, fb_used) via FieldSynthesizer.
+
+Usage:
+  synthesizer = FieldSynthesizer()
+  synthesizer.expand({1: profile.apply(1, {})}, elapsed=30)
+  # -> {1: {'100': 1412, '101': 877, '102': 1270, ...}}
+"""
+
+from collections import namedtuple
+
+GAUGE = 'gauge'
+COUNTER = 'counter'
+
+INT64 = 'int64'
+DOUBLE = 'double'
+
+FB_TOTAL_MB = 16384
+FB_RESERVED_MB = 0
+POWER_LIMIT_W = 300.0
+MAX_SM_CLOCK_MHZ = 1530
+MAX_MEM_CLOCK_MHZ = 877
+SLOWDOWN_TEMP_C = 85
+SHUTDOWN_TEMP_C = 90
+
+# DCGM_CLOCKS_THROTTLE_REASON_* bits
+THROTTLE_GPU_IDLE = 0x1
+THROTTLE_SW_POWER_CAP = 0x4
+THROTTLE_HW_SLOWDOWN = 0x8
+THROTTLE_SW_THERMAL = 0x20
+
+# dcgm_fields constant names resolved by the manager at injection time.
+# `derive` maps one profile tick to the field value; for counters it returns
+# a per-second rate that FieldSynthesizer integrates over the tick interval.
+DcgmField = namedtuple('DcgmField', 'field_id dcgm_name metric_name metric_type unit value_type '
+                                    'short_name group help derive')
+
+
+def throttle_reasons(v):
+    reasons = 0
+    if v['gpu_util'] == 0:
+        reasons |= THROTTLE_GPU_IDLE
+    if v['power'] >= 0.95 * POWER_LIMIT_W:
+        reasons |= THROTTLE_SW_POWER_CAP
+    if v['temp'] >= SHUTDOWN_TEMP_C:
+        reasons |= THROTTLE_HW_SLOWDOWN
+    if v['temp'] >= SLOWDOWN_TEMP_C:
+        reasons |= THROTTLE_SW_THERMAL
+    return reasons
+
+
+def _busy(v):
+    return v['gpu_util'] / 100.0
+
+
+def _mem_busy(v):
+    return v['mem_util'] / 100.0
+
+
+def _field(field_id, dcgm_name, metric_name, metric_type, unit, value_type, short_name, group, help_text, derive):
+    return DcgmField(str(field_id), dcgm_name, metric_name, metric_type, unit, value_type,
+                     short_name, group, help_text, derive)
+
+
+FIELDS = (
+    # Clocks
+    _field(100, 'DCGM_FI_DEV_SM_CLOCK', 'dcgm_sm_clock', GAUGE, 'MHz', INT64, 'SMCLK', 'clocks',
+           'SM clock in MHz', lambda v: v['sm_clock']),
+    _field(101, 'DCGM_FI_DEV_MEM_CLOCK', 'dcgm_mem_clock', GAUGE, 'MHz', INT64, 'MMCLK', 'clocks',
+           'Memory clock in MHz', lambda v: v['mem_clock']),
+    _field(102, 'DCGM_FI_DEV_VIDEO_CLOCK', 'dcgm_video_clock', GAUGE, 'MHz', INT64, None, 'clocks',
+           'Video encoder/decoder clock in MHz', lambda v: v['sm_clock'] * 9 // 10),
+    _field(110, 'DCGM_FI_DEV_APP_SM_CLOCK', 'dcgm_app_sm_clock', GAUGE, 'MHz', INT64, None, 'clocks',
+           'Application SM clock in MHz', lambda v: MAX_SM_CLOCK_MHZ - 120),
+    _field(111, 'DCGM_FI_DEV_APP_MEM_CLOCK', 'dcgm_app_mem_clock', GAUGE, 'MHz', INT64, None, 'clocks',
+           'Application memory clock in MHz', lambda v: MAX_MEM_CLOCK_MHZ),
+    _field(112, 'DCGM_FI_DEV_CLOCK_THROTTLE_REASONS', 'dcgm_clock_throttle_reasons', GAUGE, 'bitmask', INT64,
+           None, 'clocks', 'Current clock throttle reasons (DCGM_CLOCKS_THROTTLE_REASON_* bitmask)',
+           throttle_reasons),
+    _field(113, 'DCGM_FI_DEV_MAX_SM_CLOCK', 'dcgm_max_sm_clock', GAUGE, 'MHz', INT64, None, 'clocks',
+           'Maximum SM clock in MHz', lambda v: MAX_SM_CLOCK_MHZ),
+    _field(114, 'DCGM_FI_DEV_MAX_MEM_CLOCK', 'dcgm_max_mem_clock', GAUGE, 'MHz', INT64, None, 'clocks',
+           'Maximum memory clock in MHz', lambda v: MAX_MEM_CLOCK_MHZ),
+
+    # Temperature
+    _field(140, 'DCGM_FI_DEV_MEMORY_TEMP', 'dcgm_memory_temp', GAUGE, 'Celsius', INT64, None, 'thermal',
+           'Memory temperature in Celsius', lambda v: v['temp'] + 3),
+    _field(150, 'DCGM_FI_DEV_GPU_TEMP', 'dcgm_gpu_temp', GAUGE, 'Celsius', INT64, 'TMPTR', 'thermal',
+           'GPU temperature in Celsius', lambda v: v['temp']),
+    _field(158, 'DCGM_FI_DEV_SLOWDOWN_TEMP', 'dcgm_slowdown_temp', GAUGE, 'Celsius', INT64, None, 'thermal',
+           'Slowdown temperature threshold in Celsius', lambda v: SLOWDOWN_TEMP_C),
+    _field(159, 'DCGM_FI_DEV_SHUTDOWN_TEMP', 'dcgm_shutdown_temp', GAUGE, 'Celsius', INT64, None, 'thermal',
+           'Shutdown temperature threshold in Celsius', lambda v: SHUTDOWN_TEMP_C),
+    _field(191, 'DCGM_FI_DEV_FAN_SPEED', 'dcgm_fan_speed', GAUGE, 'percentage', INT64, None, 'thermal',
+           'Fan speed percentage', lambda v: max(30, min(100, (v['temp'] - 20) * 3 // 2))),
+
+    # Power
+    _field(155, 'DCGM_FI_DEV_POWER_USAGE', 'dcgm_power_usage', GAUGE, 'Watts', DOUBLE, 'POWER', 'power',
+           'Power usage in watts', lambda v: v['power']),
+    _field(156, 'DCGM_FI_DEV_TOTAL_ENERGY_CONSUMPTION', 'dcgm_total_energy_consumption_millijoules_total',
+           COUNTER, 'mJ', INT64, 'TOTEC', 'power', 'Total energy consumption since boot in millijoules',
+           lambda v: v['power'] * 1000.0),
+    _field(160, 'DCGM_FI_DEV_POWER_MGMT_LIMIT', 'dcgm_power_management_limit_watts', GAUGE, 'Watts', DOUBLE, None,
+           'power', 'Power management limit in watts', lambda v: POWER_LIMIT_W),
+    _field(164, 'DCGM_FI_DEV_ENFORCED_POWER_LIMIT', 'dcgm_enforced_power_limit_watts', GAUGE, 'Watts', DOUBLE, None,
+           'power', 'Enforced power limit in watts', lambda v: POWER_LIMIT_W),
+    _field(190, 'DCGM_FI_DEV_PSTATE', 'dcgm_pstate', GAUGE, 'pstate', INT64, None, 'power',
+           'Performance state (P0-P15)', lambda v: 0 if v['gpu_util'] > 0 else 8),
+
+    # Utilization
+    _field(203, 'DCGM_FI_DEV_GPU_UTIL', 'dcgm_gpu_utilization', GAUGE, 'percentage', INT64, 'GPUTL', 'utilization',
+           'GPU utilization percentage', lambda v: v['gpu_util']),
+    _field(204, 'DCGM_FI_DEV_MEM_COPY_UTIL', 'dcgm_mem_copy_utilization', GAUGE, 'percentage', INT64, 'MCUTL',
+           'utilization', 'Memory utilization percentage', lambda v: v['mem_util']),
+    _field(206, 'DCGM_FI_DEV_ENC_UTIL', 'dcgm_enc_utilization', GAUGE, 'percentage', INT64, None, 'utilization',
+           'Encoder utilization percentage', lambda v: 0),
+    _field(207, 'DCGM_FI_DEV_DEC_UTIL', 'dcgm_dec_utilization', GAUGE, 'percentage', INT64, None, 'utilization',
+           'Decoder utilization percentage', lambda v: 0),
+
+    # Framebuffer
+    _field(250, 'DCGM_FI_DEV_FB_TOTAL', 'dcgm_fb_total', GAUGE, 'MB', INT64, 'FBTTL', 'memory',
+           'Total framebuffer in MB', lambda v: FB_TOTAL_MB),
+    _field(251, 'DCGM_FI_DEV_FB_FREE', 'dcgm_fb_free', GAUGE, 'MB', INT64, 'FBFRE', 'memory',
+           'Free framebuffer in MB', lambda v: FB_TOTAL_MB - FB_RESERVED_MB - v['fb_used']),
+    _field(252, 'DCGM_FI_DEV_FB_USED', 'dcgm_fb_used', GAUGE, 'MB', INT64, 'FBUSD', 'memory',
+           'Used framebuffer in MB', lambda v: v['fb_used']),
+    _field(253, 'DCGM_FI_DEV_FB_RESERVED', 'dcgm_fb_reserved', GAUGE, 'MB', INT64, 'FBRSV', 'memory',
+           'Reserved framebuffer in MB', lambda v: FB_RESERVED_MB),
+
+    # PCIe
+    _field(200, 'DCGM_FI_DEV_PCIE_TX_THROUGHPUT', 'dcgm_pcie_tx_throughput', GAUGE, 'KB/s', INT64, None, 'pcie',
+           'PCIe transmit throughput in KB/s', lambda v: v['mem_util'] * 40000),
+    _field(201, 'DCGM_FI_DEV_PCIE_RX_THROUGHPUT', 'dcgm_pcie_rx_throughput', GAUGE, 'KB/s', INT64, None, 'pcie',
+           'PCIe receive throughput in KB/s', lambda v: v['mem_util'] * 60000),
+    _field(202, 'DCGM_FI_DEV_PCIE_REPLAY_COUNTER', 'dcgm_pcie_replay_total', COUNTER, 'count', INT64, None, 'pcie',
+           'PCIe replay count', lambda v: 0.0),
+    _field(235, 'DCGM_FI_DEV_PCIE_MAX_LINK_GEN', 'dcgm_pcie_max_link_gen', GAUGE, 'generation', INT64, None, 'pcie',
+           'Maximum PCIe link generation', lambda v: 3),
+    _field(236, 'DCGM_FI_DEV_PCIE_MAX_LINK_WIDTH', 'dcgm_pcie_max_link_width', GAUGE, 'lanes', INT64, None, 'pcie',
+           'Maximum PCIe link width', lambda v: 16),
+    _field(237, 'DCGM_FI_DEV_PCIE_LINK_GEN', 'dcgm_pcie_link_gen', GAUGE, 'generation', INT64, None, 'pcie',
+           'Current PCIe link generation', lambda v: 3),
+    _field(238, 'DCGM_FI_DEV_PCIE_LINK_WIDTH', 'dcgm_pcie_link_width', GAUGE, 'lanes', INT64, None, 'pcie',
+           'Current PCIe link width', lambda v: 16),
+
+    # Errors and violations
+    _field(230, 'DCGM_FI_DEV_XID_ERRORS', 'dcgm_xid_errors', GAUGE, 'xid', INT64, None, 'errors',
+           'Value of the last XID error encountered',
+           lambda v: 43 if v['temp'] >= SLOWDOWN_TEMP_C and v['gpu_util'] <= 20 else 0),
+    _field(240, 'DCGM_FI_DEV_POWER_VIOLATION', 'dcgm_power_violation_microseconds_total',
+           COUNTER, 'us', INT64, None, 'errors', 'Throttling duration due to power constraints in microseconds',
+           lambda v: 1e6 if v['power'] >= 0.95 * POWER_LIMIT_W else 0.0),
+    _field(241, 'DCGM_FI_DEV_THERMAL_VIOLATION', 'dcgm_thermal_violation_microseconds_total',
+           COUNTER, 'us', INT64, None, 'errors', 'Throttling duration due to thermal constraints in microseconds',
+           lambda v: 1e6 if v['temp'] >= SLOWDOWN_TEMP_C else 0.0),
+    _field(242, 'DCGM_FI_DEV_SYNC_BOOST_VIOLATION', 'dcgm_sync_boost_violation_microseconds_total',
+           COUNTER, 'us', INT64, None, 'errors', 'Throttling duration due to sync-boost constraints in microseconds',
+           lambda v: 0.0),
+    _field(243, 'DCGM_FI_DEV_BOARD_LIMIT_VIOLATION', 'dcgm_board_limit_violation_microseconds_total',
+           COUNTER, 'us', INT64, None, 'errors', 'Throttling duration due to board limit constraints in microseconds',
+           lambda v: 0.0),
+    _field(244, 'DCGM_FI_DEV_LOW_UTIL_VIOLATION', 'dcgm_low_util_violation_microseconds_total',
+           COUNTER, 'us', INT64, None, 'errors', 'Throttling duration due to low utilization in microseconds',
+           lambda v: 1e6 if v['gpu_util'] < 5 else 0.0),
+    _field(245, 'DCGM_FI_DEV_RELIABILITY_VIOLATION', 'dcgm_reliability_violation_microseconds_total',
+           COUNTER, 'us', INT64, None, 'errors', 'Throttling duration due to reliability constraints in microseconds',
+           lambda v: 0.0),
+
+    # ECC and row remapping
+    _field(310, 'DCGM_FI_DEV_ECC_SBE_VOL_TOTAL', 'dcgm_ecc_sbe_volatile_total', COUNTER, 'count', INT64, None,
+           'ecc', 'Single-bit volatile ECC errors', lambda v: 0.01 * max(0, v['temp'] - 80)),
+    _field(311, 'DCGM_FI_DEV_ECC_DBE_VOL_TOTAL', 'dcgm_ecc_dbe_volatile_total', COUNTER, 'count', INT64, None,
+           'ecc', 'Double-bit volatile ECC errors', lambda v: 0.001 * max(0, v['temp'] - 90)),
+    _field(312, 'DCGM_FI_DEV_ECC_SBE_AGG_TOTAL', 'dcgm_ecc_sbe_aggregate_total', COUNTER, 'count', INT64, None,
+           'ecc', 'Single-bit persistent ECC errors', lambda v: 0.01 * max(0, v['temp'] - 80)),
+    _field(313, 'DCGM_FI_DEV_ECC_DBE_AGG_TOTAL', 'dcgm_ecc_dbe_aggregate_total', COUNTER, 'count', INT64, None,
+           'ecc', 'Double-bit persistent ECC errors', lambda v: 0.001 * max(0, v['temp'] - 90)),
+    _field(393, 'DCGM_FI_DEV_UNCORRECTABLE_REMAPPED_ROWS', 'dcgm_uncorrectable_remapped_rows_total', COUNTER,
+           'rows', INT64, None, 'ecc', 'Rows remapped due to uncorrectable errors', lambda v: 0.0),
+    _field(394, 'DCGM_FI_DEV_CORRECTABLE_REMAPPED_ROWS', 'dcgm_correctable_remapped_rows_total', COUNTER,
+           'rows', INT64, None, 'ecc', 'Rows remapped due to correctable errors', lambda v: 0.0),
+    _field(395, 'DCGM_FI_DEV_ROW_REMAP_FAILURE', 'dcgm_row_remap_failure', GAUGE, 'bool', INT64, None, 'ecc',
+           'Whether remapping of rows has failed', lambda v: 0),
+    _field(396, 'DCGM_FI_DEV_ROW_REMAP_PENDING', 'dcgm_row_remap_pending', GAUGE, 'bool', INT64, None, 'ecc',
+           'Whether a row remap is pending a GPU reset', lambda v: 0),
+
+    # NVLink
+    _field(409, 'DCGM_FI_DEV_NVLINK_CRC_FLIT_ERROR_COUNT_TOTAL', 'dcgm_nvlink_crc_flit_errors_total', COUNTER,
+           'count', INT64, None, 'nvlink', 'NVLink flow-control CRC errors, all lanes', lambda v: 0.0),
+    _field(419, 'DCGM_FI_DEV_NVLINK_CRC_DATA_ERROR_COUNT_TOTAL', 'dcgm_nvlink_crc_data_errors_total', COUNTER,
+           'count', INT64, None, 'nvlink', 'NVLink data CRC errors, all lanes', lambda v: 0.0),
+    _field(429, 'DCGM_FI_DEV_NVLINK_REPLAY_ERROR_COUNT_TOTAL', 'dcgm_nvlink_replay_errors_total', COUNTER,
+           'count', INT64, None, 'nvlink', 'NVLink replay errors, all lanes', lambda v: 0.0),
+    _field(439, 'DCGM_FI_DEV_NVLINK_RECOVERY_ERROR_COUNT_TOTAL', 'dcgm_nvlink_recovery_errors_total', COUNTER,
+           'count', INT64, None, 'nvlink', 'NVLink recovery errors, all lanes', lambda v: 0.0),
+    _field(449, 'DCGM_FI_DEV_NVLINK_BANDWIDTH_TOTAL', 'dcgm_nvlink_bandwidth_kilobytes_total',
+           COUNTER, 'KB', INT64, None, 'nvlink', 'NVLink bandwidth counter, all lanes',
+           lambda v: v['gpu_util'] * 100000.0),
+
+    # Profiling (DCP)
+    _field(1001, 'DCGM_FI_PROF_GR_ENGINE_ACTIVE', 'dcgm_gr_engine_active', GAUGE, 'ratio', DOUBLE, 'GRACT', 'prof',
+           'Ratio of time the graphics engine is active', _busy),
+    _field(1002, 'DCGM_FI_PROF_SM_ACTIVE', 'dcgm_sm_active', GAUGE, 'ratio', DOUBLE, 'SMACT', 'prof',
+           'Ratio of cycles an SM has at least one warp assigned', lambda v: _busy(v) * 0.95),
+    _field(1003, 'DCGM_FI_PROF_SM_OCCUPANCY', 'dcgm_sm_occupancy', GAUGE, 'ratio', DOUBLE, 'SMOCC', 'prof',
+           'Ratio of warps resident on an SM to the maximum', lambda v: _busy(v) * 0.6),
+    _field(1004, 'DCGM_FI_PROF_PIPE_TENSOR_ACTIVE', 'dcgm_pipe_tensor_active', GAUGE, 'ratio', DOUBLE, 'TENSO',
+           'prof', 'Ratio of cycles the tensor pipe is active', lambda v: _busy(v) * 0.4),
+    _field(1005, 'DCGM_FI_PROF_DRAM_ACTIVE', 'dcgm_dram_active', GAUGE, 'ratio', DOUBLE, 'DRAMA', 'prof',
+           'Ratio of cycles the device memory interface is active', _mem_busy),
+    _field(1006, 'DCGM_FI_PROF_PIPE_FP64_ACTIVE', 'dcgm_pipe_fp64_active', GAUGE, 'ratio', DOUBLE, 'FP64A', 'prof',
+           'Ratio of cycles the FP64 pipe is active', lambda v: _busy(v) * 0.05),
+    _field(1007, 'DCGM_FI_PROF_PIPE_FP32_ACTIVE', 'dcgm_pipe_fp32_active', GAUGE, 'ratio', DOUBLE, 'FP32A', 'prof',
+           'Ratio of cycles the FP32 pipe is active', lambda v: _busy(v) * 0.3),
+    _field(1008, 'DCGM_FI_PROF_PIPE_FP16_ACTIVE', 'dcgm_pipe_fp16_active', GAUGE, 'ratio', DOUBLE, 'FP16A', 'prof',
+           'Ratio of cycles the FP16 pipe is active', lambda v: _busy(v) * 0.2),
+    _field(1009, 'DCGM_FI_PROF_PCIE_TX_BYTES', 'dcgm_pcie_tx_bytes_per_second', GAUGE, 'B/s', INT64, 'PCITX', 'prof',
+           'PCIe transmit rate in bytes per second', lambda v: v['mem_util'] * 40000 * 1024),
+    _field(1010, 'DCGM_FI_PROF_PCIE_RX_BYTES', 'dcgm_pcie_rx_bytes_per_second', GAUGE, 'B/s', INT64, 'PCIRX', 'prof',
+           'PCIe receive rate in bytes per second', lambda v: v['mem_util'] * 60000 * 1024),
+    _field(1011, 'DCGM_FI_PROF_NVLINK_TX_BYTES', 'dcgm_nvlink_tx_bytes_per_second', GAUGE, 'B/s', INT64,
+           'NVLTX', 'prof', 'NVLink transmit rate in bytes per second', lambda v: v['gpu_util'] * 50000 * 1024),
+    _field(1012, 'DCGM_FI_PROF_NVLINK_RX_BYTES', 'dcgm_nvlink_rx_bytes_per_second', GAUGE, 'B/s', INT64,
+           'NVLRX', 'prof', 'NVLink receive rate in bytes per second', lambda v: v['gpu_util'] * 50000 * 1024),
+)
+
+FIELDS_BY_ID = {field.field_id: field for field in FIELDS}
+# Registry units -> OpenMetrics unit names
+OPENMETRICS_UNITS = {'Celsius': 'celsius', 'Watts': 'watts', 'mJ': 'millijoules', 'us': 'microseconds',
+                     'KB': 'kilobytes', 'MB': 'megabytes', 'B/s': 'bytes_per_second', 'ratio': 'ratio'}
+FIELD_GROUPS = tuple(sorted({field.group for field in FIELDS}))
+# dcgmi dmon column headers -> DCGM field ids
+DMON_SHORT_NAMES = {field.short_name: field.field_id for field in FIELDS if field.short_name}
+
+
+def select_fields(groups=None):
+    """Registry rows whose group is in `groups` (an iterable or comma-separated string); all when empty or 'all'"""
+    if isinstance(groups, str):
+        groups = [g.strip() for g in groups.split(',') if g.strip()]
+    if not groups or 'all' in groups:
+        return FIELDS
+    unknown = set(groups) - set(FIELD_GROUPS)
+    if unknown:
+        raise ValueError(f"Unknown field group(s) {', '.join(sorted(unknown))}; choose from {', '.join(FIELD_GROUPS)}")
+    return tuple(field for field in FIELDS if field.group in groups)
+
+
+def openmetrics_family(field):
+    """OpenMetrics family name: a counter's samples carry `_total`, its family does not"""
+    if field.metric_type == COUNTER and field.metric_name.endswith('_total'):
+        return field.metric_name[:-len('_total')]
+    return field.metric_name
+
+
+def openmetrics_unit(field):
+    """The field's OpenMetrics unit, or None: OpenMetrics only allows a unit that suffixes the family name"""
+    unit = OPENMETRICS_UNITS.get(field.unit)
+    if unit and openmetrics_family(field).endswith('_' + unit):
+        return unit
+    return None
+
+
+def openmetrics_header(field):
+    """The TYPE/UNIT/HELP lines that open the field's OpenMetrics family"""
+    family = openmetrics_family(field)
+    unit = openmetrics_unit(field)
+    return (f"# TYPE {family} {field.metric_type}\n" + (f"# UNIT {family} {unit}\n" if unit else '') +
+            f"# HELP {family} {field.help}\n")
+
+
+class FieldSynthesizer:
+    """Expands profile ticks into a value for every registry field.
+
+    Gauges are derived from the tick directly; counters integrate their
+    per-second rate over `elapsed` seconds and keep the running total per GPU,
+    so they only ever go up.
+    """
+
+    def __init__(self, fields=FIELDS):
+        self.fields = tuple(fields)
+        self.totals = {}
+
+    def expand(self, values_by_gpu, elapsed):
+        """{gpu_id: profile tick} -> {gpu_id: {field_id: int or float}}"""
+        expanded = {}
+        for gpu_id, values in values_by_gpu.items():
+            totals = self.totals.setdefault(gpu_id, {})
+            row = {}
+            for field in self.fields:
+                value = field.derive(values)
+                if field.metric_type == COUNTER:
+                    value = totals[field.field_id] = totals.get(field.field_id, 0.0) + value * elapsed
+                row[field.field_id] = int(value) if field.value_type == INT64 else float(value)
+            expanded[gpu_id] = row
+        return expanded
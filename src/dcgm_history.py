@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Per-GPU time-series history for DCGM Fake GPU Exporter
+
+Usage:
+  The exporter records every successful collection here and serves it at
+    /api/v1/history?gpu=1&field=dcgm_gpu_temp&start=<unix>&end=<unix>
+  (`field` is a metric name or DCGM field id; every parameter is optional).
+
+  Each (gpu, field) series is a preallocated array('d') ring of
+  HISTORY_RETENTION / HISTORY_RESOLUTION slots, sharing one ring of slot
+  timestamps. Collections landing in the same resolution bucket overwrite
+  that bucket's slot; a series absent from a collection gets NaN there.
+  Memory is fixed once a series exists: 8 bytes per slot, so at most
+  (HISTORY_MAX_SERIES + 1) * slots * 8 bytes, e.g. 1,024 GPUs x 50 fields
+  keeping 1h at 5s is ~295 MB and 24h at 60s ~590 MB. A range query is a
+  bisect over the timestamps and one or two C-level slices per series.
+"""
+
+import array
+import bisect
+import json
+import math
+import os
+import threading
+from urllib.parse import parse_qs
+
+import dcgm_field_registry
+
+# Seconds of history kept per series (0 disables the history)
+HISTORY_RETENTION = float(os.getenv('HISTORY_RETENTION', '3600'))
+# Seconds per slot; defaults to the exporter's refresh interval
+HISTORY_RESOLUTION = float(os.getenv('HISTORY_RESOLUTION', os.getenv('METRICS_REFRESH_INTERVAL', '5')))
+# Series beyond this many are not recorded (the memory bound), 1,024 GPUs x 50 fields by default
+HISTORY_MAX_SERIES = int(os.getenv('HISTORY_MAX_SERIES', str(1024 * 50)))
+
+NAN = float('nan')
+
+class History:
+    """Fixed-memory ring buffers of every (gpu, field) series"""
+
+    def __init__(self, retention=None, resolution=None, max_series=None):
+        self.retention = HISTORY_RETENTION if retention is None else retention
+        self.resolution = HISTORY_RESOLUTION if resolution is None else resolution
+        self.max_series = HISTORY_MAX_SERIES if max_series is None else max_series
+        if self.retention <= 0 or self.resolution <= 0:
+            raise ValueError(f"History retention and resolution must be positive "
+                             f"(got {self.retention:g}s and {self.resolution:g}s)")
+        self.slots = max(1, math.ceil(self.retention / self.resolution))
+        self.times = array.array('d', [NAN]) * self.slots
+        # (gpu_id, field_id) -> array('d') of self.slots values
+        self.series = {}
+        self.cursor = -1
+        self.bucket = None
+        self.filled = 0
+        self.dropped_series = 0
+        self.lock = threading.Lock()
+
+    def memory_bytes(self):
+        return (len(self.series) + 1) * self.slots * self.times.itemsize
+
+    def max_memory_bytes(self):
+        return (self.max_series + 1) * self.slots * self.times.itemsize
+
+    def publish(self, snapshot):
+        """Snapshot listener: record the collection it came from, if any"""
+        if snapshot.gpu_metrics is not None:
+            self.record(snapshot.gpu_metrics, snapshot.timestamp)
+
+    def record(self, gpu_metrics, timestamp):
+        """Store one collection ({gpu_id: {field_id: value}}) taken at unix time `timestamp`"""
+        bucket = int(timestamp // self.resolution)
+        with self.lock:
+            if bucket != self.bucket or self.cursor < 0:
+                self.cursor = (self.cursor + 1) % self.slots
+                self.filled = min(self.filled + 1, self.slots)
+                self.bucket = bucket
+            cursor = self.cursor
+            self.times[cursor] = timestamp
+            written = 0
+            for gpu_id, fields in gpu_metrics.items():
+                for field_id, value in fields.items():
+                    row = self.series.get((gpu_id, field_id))
+                    if row is None:
+                        if len(self.series) >= self.max_series:
+                            self.dropped_series += 1
+                            continue
+                        row = self.series[(gpu_id, field_id)] = array.array('d', [NAN]) * self.slots
+                    row[cursor] = value
+                    written += 1
+            if written < len(self.series):
+                for (gpu_id, field_id), row in self.series.items():
+                    if field_id not in gpu_metrics.get(gpu_id, ()):
+                        row[cursor] = NAN
+
+    def query(self, gpu=None, field=None, start=None, end=None):
+        """[(gpu_id, field_id, timestamps, values)] for the series matching `gpu`/`field`, start <= t <= end"""
+        with self.lock:
+            # Oldest slot first: the ring is chronological from just after the cursor once it has wrapped
+            oldest = (self.cursor + 1) % self.slots if self.filled == self.slots else 0
+            times = _span(self.times, oldest, 0, self.filled)
+            lo = 0 if start is None else bisect.bisect_left(times, start)
+            hi = len(times) if end is None else bisect.bisect_right(times, end)
+            hi = max(lo, hi)
+            if gpu is not None and field is not None:
+                keys = [(gpu, field)] if (gpu, field) in self.series else []
+            else:
+                keys = sorted((key for key in self.series
+                               if (gpu is None or key[0] == gpu) and (field is None or key[1] == field)),
+                              key=_series_order)
+            return [(gpu_id, field_id, times[lo:hi], _span(self.series[(gpu_id, field_id)], oldest, lo, hi))
+                    for gpu_id, field_id in keys]
+
+def _series_order(key):
+    return tuple((0, int(part), '') if part.isdigit() else (1, 0, part) for part in key)
+
+def _span(ring, oldest, lo, hi):
+    """Chronological positions lo:hi of a ring whose oldest slot is `oldest`, as one array"""
+    size = len(ring)
+    first, last = oldest + lo, oldest + hi
+    if last <= size:
+        return ring[first:last]
+    if first >= size:
+        return ring[first - size:last - size]
+    return ring[first:] + ring[:last - size]
+
+def resolve_field(name):
+    """DCGM field id for a metric name or field id, or None"""
+    if name in dcgm_field_registry.FIELDS_BY_ID:
+        return name
+    return next((field.field_id for field in dcgm_field_registry.FIELDS if field.metric_name == name), None)
+
+def _error(status, message):
+    return status, json.dumps({'status': 'error', 'errorType': 'bad_data', 'error': message}).encode()
+
+def handle_query(history, query_string):
+    """(HTTP status, JSON body) answering /api/v1/history?gpu=&field=&start=&end="""
+    if history is None:
+        return _error(404, "history is disabled (HISTORY_RETENTION=0)")
+    params = {name: values[-1] for name, values in parse_qs(query_string).items()}
+    field = None
+    if params.get('field'):
+        field = resolve_field(params['field'])
+        if field is None:
+            return _error(400, f"unknown field {params['field']!r}")
+    bounds = {}
+    for name in ('start', 'end'):
+        try:
+            bounds[name] = float(params[name]) if params.get(name) else None
+        except ValueError:
+            return _error(400, f"invalid {name} {params[name]!r}, expected unix seconds")
+    result = []
+    for gpu_id, field_id, times, values in history.query(params.get('gpu') or None, field, **bounds):
+        registry_field = dcgm_field_registry.FIELDS_BY_ID.get(field_id)
+        metric = {'__name__': registry_field.metric_name if registry_field else field_id,
+                  'gpu': gpu_id, 'device': f'nvidia{gpu_id}', 'field': field_id}
+        result.append({'metric': metric, 'values': [[t, v] for t, v in zip(times, values) if v == v]})
+    return 200, json.dumps({'status': 'success', 'data': {
+        'retention': history.retention, 'resolution': history.resolution, 'result': result}}).encode()
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+OTLP/HTTP push for DCGM Fake GPU Exporter
+Sends every collected snapshot to an OpenTelemetry receiver
+
+Usage:
+  Set OTEL_EXPORTER_OTLP_ENDPOINT (e.g. http://otel-collector:4318)
+  The exporter then converts each snapshot it publishes into OTLP metrics
+  and POSTs them as OTLP/HTTP JSON to <endpoint>/v1/metrics, alongside the
+  /metrics pull endpoint.
+
+  Snapshots are queued one GPU row at a time. Sender threads ship batches of
+  up to OTLP_BATCH_SIZE data points as soon as that many are queued, or
+  every OTLP_FLUSH_INTERVAL seconds otherwise, each over its own keep-alive
+  connection. When the receiver falls behind, the queue keeps the newest
+  OTLP_MAX_QUEUE rows and drops the oldest.
+"""
+
+import collections
+import gzip
+import http.client
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import dcgm_field_registry
+
+# Configuration (standard OTel SDK variables where one exists)
+_BASE_ENDPOINT = os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT', '').rstrip('/')
+OTLP_ENDPOINT = os.getenv('OTEL_EXPORTER_OTLP_METRICS_ENDPOINT') or (
+    f"{_BASE_ENDPOINT}/v1/metrics" if _BASE_ENDPOINT else '')
+OTLP_HEADERS = os.getenv('OTEL_EXPORTER_OTLP_HEADERS', '')
+OTLP_COMPRESSION = os.getenv('OTEL_EXPORTER_OTLP_COMPRESSION', 'gzip').lower()
+OTLP_TIMEOUT = float(os.getenv('OTEL_EXPORTER_OTLP_TIMEOUT', '10000')) / 1000.0
+SERVICE_NAME = os.getenv('OTEL_SERVICE_NAME', 'dcgm-fake-exporter')
+OTLP_BATCH_SIZE = int(os.getenv('OTLP_BATCH_SIZE', '8192'))
+OTLP_FLUSH_INTERVAL = float(os.getenv('OTLP_FLUSH_INTERVAL', '5'))
+OTLP_MAX_QUEUE = int(os.getenv('OTLP_MAX_QUEUE', '16384'))
+OTLP_MAX_RETRIES = int(os.getenv('OTLP_MAX_RETRIES', '5'))
+OTLP_CONNECTIONS = int(os.getenv('OTLP_CONNECTIONS', '2'))
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+# Registry units as UCUM, the unit syntax OTLP expects; others become {annotations}
+UCUM_UNITS = {
+    'Celsius': 'Cel', 'Watts': 'W', 'mJ': 'mJ', 'us': 'us', 'MHz': 'MHz', 'MB': 'MBy', 'KB': 'KBy',
+    'KB/s': 'KBy/s', 'B/s': 'By/s', 'percentage': '%', 'ratio': '1',
+}
+
+def parse_headers(spec):
+    """`k1=v1,k2=v2` (OTEL_EXPORTER_OTLP_HEADERS) -> dict"""
+    headers = {}
+    for item in spec.split(','):
+        name, sep, value = item.partition('=')
+        if sep and name.strip():
+            headers[name.strip()] = value.strip()
+    return headers
+
+def _attributes(pairs):
+    return [{'key': key, 'value': {'stringValue': value}} for key, value in pairs]
+
+class OtlpEncoder:
+    """Turns queued GPU rows into an ExportMetricsServiceRequest (OTLP JSON mapping).
+
+    Gauges stay gauges; counters become cumulative monotonic sums. A
+    series starts when the encoder is created, and restarts at the previous
+    point's time whenever its value goes down (the counter was reset).
+    """
+
+    def __init__(self, fields=None, service_name=SERVICE_NAME):
+        self.fields = dcgm_field_registry.FIELDS if fields is None else fields
+        self.start_ns = time.time_ns()
+        # (gpu_id, field_id) -> [start_ns, last time_ns, last value]
+        self.counter_starts = {}
+        self.lock = threading.Lock()
+        self.resource = {'attributes': _attributes([('service.name', service_name)])}
+        self.scope = {'name': 'dcgm_exporter'}
+        self.gpu_attributes = {}
+
+    def _gpu_attributes(self, gpu_id):
+        attributes = self.gpu_attributes.get(gpu_id)
+        if attributes is None:
+            attributes = self.gpu_attributes[gpu_id] = _attributes([('gpu', gpu_id), ('device', f'nvidia{gpu_id}')])
+        return attributes
+
+    def _start_ns(self, gpu_id, field_id, time_ns, value):
+        entry = self.counter_starts.get((gpu_id, field_id))
+        if entry is None:
+            entry = self.counter_starts[(gpu_id, field_id)] = [self.start_ns, time_ns, value]
+        elif time_ns > entry[1]:
+            if value < entry[2]:
+                entry[0] = entry[1]
+            entry[1], entry[2] = time_ns, value
+        return str(entry[0])
+
+    def encode(self, rows):
+        """rows: (time_unix_nano, gpu_id, {field_id: value}, points) tuples"""
+        metrics = []
+        with self.lock:
+            for field in self.fields:
+                metric = self._encode_metric(field, rows)
+                if metric is not None:
+                    metrics.append(metric)
+        return {'resourceMetrics': [{'resource': self.resource,
+                                     'scopeMetrics': [{'scope': self.scope, 'metrics': metrics}]}]}
+
+    def _encode_metric(self, field, rows):
+        field_id = field.field_id
+        points = []
+        counter = field.metric_type == dcgm_field_registry.COUNTER
+        for time_ns, gpu_id, values, _ in rows:
+            value = values.get(field_id)
+            if value is None:
+                continue
+            point = {'attributes': self._gpu_attributes(gpu_id), 'timeUnixNano': str(time_ns),
+                     'asDouble': float(value)}
+            if counter:
+                point['startTimeUnixNano'] = self._start_ns(gpu_id, field_id, time_ns, value)
+            points.append(point)
+        if not points:
+            return None
+        metric = {'name': dcgm_field_registry.openmetrics_family(field), 'description': field.help,
+                  'unit': UCUM_UNITS.get(field.unit, f'{{{field.unit}}}')}
+        if counter:
+            metric['sum'] = {'dataPoints': points, 'aggregationTemporality': 2, 'isMonotonic': True}
+        else:
+            metric['gauge'] = {'dataPoints': points}
+        return metric
+
+class OtlpPusher:
+    """Batch snapshots into OTLP/HTTP requests from a few sender threads.
+
+    `publish` is an exporter snapshot listener: it only appends one row per
+    GPU to a bounded deque, so the refresh loop never waits on the network.
+    Each sender owns one keep-alive connection, reconnects on error and
+    retries 429/5xx/connection failures with jittered exponential backoff
+    (honouring Retry-After) before giving the batch up as dropped.
+    """
+
+    def __init__(self, endpoint=OTLP_ENDPOINT, fields=None, service_name=SERVICE_NAME,
+                 headers=None, compression=OTLP_COMPRESSION, timeout=OTLP_TIMEOUT, batch_size=OTLP_BATCH_SIZE,
+                 flush_interval=OTLP_FLUSH_INTERVAL, max_queue=OTLP_MAX_QUEUE, max_retries=OTLP_MAX_RETRIES,
+                 connections=OTLP_CONNECTIONS):
+        url = urlsplit(endpoint)
+        if url.scheme not in ('http', 'https') or not url.hostname:
+            raise ValueError(f"Invalid OTLP endpoint {endpoint!r}: expected http(s)://host[:port]/path")
+        self.endpoint = endpoint
+        self.url = url
+        self.path = url.path or '/v1/metrics'
+        self.encoder = OtlpEncoder(fields, service_name)
+        self.headers = {'Content-Type': 'application/json'}
+        self.headers.update(parse_headers(OTLP_HEADERS) if headers is None else headers)
+        self.compression = compression
+        if compression == 'gzip':
+            self.headers['Content-Encoding'] = 'gzip'
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.queue = collections.deque()
+        self.max_queue = max_queue
+        self.queued_points = 0
+        self.in_flight = 0
+        self.flushing = 0
+        self.cond = threading.Condition()
+        self.stopped = threading.Event()
+        # Delivery counters, updated under the lock
+        self.sent_points = 0
+        self.sent_requests = 0
+        self.dropped_points = 0
+        self.retries = 0
+        self.threads = [threading.Thread(target=self._run, daemon=True, name=f'otlp-push-{n}')
+                        for n in range(max(1, connections))]
+        for thread in self.threads:
+            thread.start()
+
+    def publish(self, snapshot):
+        """Snapshot listener; error snapshots carry no values and are skipped"""
+        if snapshot.gpu_metrics is not None:
+            self.submit(snapshot.gpu_metrics, snapshot.timestamp)
+
+    def submit(self, gpu_metrics, timestamp=None):
+        time_ns = time.time_ns() if timestamp is None else int(timestamp * 1e9)
+        with self.cond:
+            for gpu_id, values in gpu_metrics.items():
+                if len(self.queue) >= self.max_queue:
+                    dropped = self.queue.popleft()
+                    self.queued_points -= dropped[3]
+                    self.dropped_points += dropped[3]
+                self.queue.append((time_ns, gpu_id, values, len(values)))
+                self.queued_points += len(values)
+            if self.queued_points >= self.batch_size or self.flushing:
+                self.cond.notify()
+
+    def flush(self, timeout=None):
+        """Send everything queued now; True once it is all delivered or given up"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            self.flushing += 1
+            self.cond.notify_all()
+            try:
+                while self.queue or self.in_flight:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self.cond.wait(remaining)
+                return True
+            finally:
+                self.flushing -= 1
+
+    def close(self, timeout=5.0):
+        self.flush(timeout)
+        self.stopped.set()
+        with self.cond:
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def stats(self):
+        """Delivery counters, as the exporter's self metrics read them"""
+        with self.cond:
+            return {'samples_sent': self.sent_points, 'samples_dropped': self.dropped_points,
+                    'requests': self.sent_requests, 'retries': self.retries}
+
+    def _take_batch(self):
+        """Pop rows up to batch_size points (at least one row); caller holds the lock"""
+        rows, points = [], 0
+        while self.queue and (not rows or points + self.queue[0][3] <= self.batch_size):
+            row = self.queue.popleft()
+            rows.append(row)
+            points += row[3]
+        self.queued_points -= points
+        return rows, points
+
+    def _wait_for_batch(self):
+        with self.cond:
+            deadline = time.monotonic() + self.flush_interval
+            # A flush sends what is queued at once, but with nothing queued there is nothing to do but wait
+            while not self.stopped.is_set() and (
+                    not self.queue or (self.queued_points < self.batch_size and not self.flushing)):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    if self.queue:
+                        break
+                    deadline = time.monotonic() + self.flush_interval
+                    remaining = self.flush_interval
+                self.cond.wait(remaining)
+            if not self.queue:
+                return None, 0
+            self.in_flight += 1
+            return self._take_batch()
+
+    def _run(self):
+        conn = None
+        while not self.stopped.is_set():
+            rows, points = self._wait_for_batch()
+            if rows is None:
+                continue
+            try:
+                conn = self._send(conn, rows, points)
+            except Exception as e:
+                print(f"OTLP push error: {e}", flush=True)
+                with self.cond:
+                    self.dropped_points += points
+            finally:
+                with self.cond:
+                    self.in_flight -= 1
+                    self.cond.notify_all()
+        if conn is not None:
+            conn.close()
+
+    def _connect(self):
+        port = self.url.port
+        if self.url.scheme == 'https':
+            return http.client.HTTPSConnection(self.url.hostname, port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.url.hostname, port, timeout=self.timeout)
+
+    def _send(self, conn, rows, points):
+        """POST one batch, retrying transient failures; returns the connection to reuse"""
+        body = json.dumps(self.encoder.encode(rows), separators=(',', ':')).encode('utf-8')
+        if self.compression == 'gzip':
+            body = gzip.compress(body, compresslevel=6, mtime=0)
+        delay = RETRY_BASE_DELAY
+        error = None
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                if conn is None:
+                    conn = self._connect()
+                conn.request('POST', self.path, body, self.headers)
+                response = conn.getresponse()
+                response.read()
+                if response.will_close:
+                    conn.close()
+                    conn = None
+                if 200 <= response.status < 300:
+                    with self.cond:
+                        self.sent_points += points
+                        self.sent_requests += 1
+                    return conn
+                error = f"HTTP {response.status}"
+                if response.status not in RETRYABLE_STATUS:
+                    break
+                retry_after = response.getheader('Retry-After')
+            except (OSError, http.client.HTTPException) as e:
+                error = e
+                if conn is not None:
+                    conn.close()
+                    conn = None
+            if attempt == self.max_retries:
+                break
+            with self.cond:
+                self.retries += 1
+            wait = delay * random.uniform(0.5, 1.0)
+            if retry_after and retry_after.isdigit():
+                wait = float(retry_after)
+            if self.stopped.wait(min(wait, RETRY_MAX_DELAY)):
+                break
+            delay *= 2
+        print(f"OTLP push to {self.endpoint} failed ({error}), dropped {points} data points", flush=True)
+        with self.cond:
+            self.dropped_points += points
+        return conn
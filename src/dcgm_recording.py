@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Recording format for the DCGM Fake GPU Manager's metric streams
+
+Usage:
+  METRIC_RECORD_FILE=/tmp/run.dcgmrec  -> the manager appends every
+  injection cycle's profile tick to the file.
+  METRIC_PROFILE=replay REPLAY_FILE=/tmp/run.dcgmrec  -> the 'replay'
+  profile streams it back into injection, REPLAY_SPEED times faster.
+
+  The file is a 16-byte header (magic, version, column count, row size),
+  the column names (16 bytes each), then fixed-width little-endian rows:
+  float64 unix timestamp, uint32 GPU ordinal and one int64 per column. The
+  rows of a cycle share its timestamp. A 7-column tick is 68 bytes per GPU,
+  so 1,000 GPUs every 30s is ~200 MB a day.
+
+  Replay memory-maps the file and reads one cycle at a time from the page
+  cache, so recordings far larger than RAM replay in constant memory. A
+  partly written last row (the recorder was killed) is ignored.
+"""
+
+import mmap
+import os
+import struct
+
+MAGIC = b'DCGMREC\x00'
+VERSION = 1
+HEADER = struct.Struct('<8sHHI')
+COLUMN_NAME = struct.Struct('<16s')
+ROW_PREFIX = struct.Struct('<dI')
+
+def _row_struct(num_columns):
+    return struct.Struct(f'<dI{num_columns}q')
+
+def _header(columns):
+    row = _row_struct(len(columns))
+    return HEADER.pack(MAGIC, VERSION, len(columns), row.size) + b''.join(
+        COLUMN_NAME.pack(name.encode('ascii')) for name in columns)
+
+def read_header(data):
+    """(columns, row struct, header size) of a recording's first bytes; ValueError if it is not one"""
+    if len(data) < HEADER.size:
+        raise ValueError("not a metric recording (file too short)")
+    magic, version, num_columns, row_size = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a metric recording (bad magic)")
+    if version != VERSION:
+        raise ValueError(f"unsupported recording version {version}")
+    size = HEADER.size + num_columns * COLUMN_NAME.size
+    if len(data) < size:
+        raise ValueError("truncated recording header")
+    columns = tuple(COLUMN_NAME.unpack_from(data, HEADER.size + i * COLUMN_NAME.size)[0].rstrip(b'\x00')
+                    .decode('ascii') for i in range(num_columns))
+    row = _row_struct(num_columns)
+    if row.size != row_size:
+        raise ValueError(f"recording row size {row_size} does not match {num_columns} columns")
+    return columns, row, size
+
+class Recorder:
+    """Appends cycles to a recording; an existing file must have the same columns"""
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = tuple(columns)
+        if any(len(name.encode('ascii')) > COLUMN_NAME.size for name in self.columns):
+            raise ValueError(f"column names are limited to {COLUMN_NAME.size} bytes")
+        self.row = _row_struct(len(self.columns))
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(_header(self.columns))
+        else:
+            try:
+                with open(path, 'rb') as f:
+                    head = f.read(HEADER.size)
+                    if len(head) == HEADER.size:
+                        head += f.read(HEADER.unpack(head)[2] * COLUMN_NAME.size)
+                columns, _, header_size = read_header(head)
+            except ValueError:
+                self.file.close()
+                raise
+            if columns != self.columns:
+                self.file.close()
+                raise ValueError(f"{path} records {', '.join(columns)}, not {', '.join(self.columns)}")
+            # Drop a partly written last row so appended rows stay aligned
+            tail = (self.file.tell() - header_size) % self.row.size
+            if tail:
+                self.file.truncate(self.file.tell() - tail)
+                self.file.seek(0, os.SEEK_END)
+
+    def write_cycle(self, timestamp, values_by_gpu):
+        """Append one cycle: {gpu ordinal: {column: int}} taken at unix time `timestamp`"""
+        pack = self.row.pack
+        columns = self.columns
+        self.file.write(b''.join(pack(timestamp, gpu_id, *[int(values[name]) for name in columns])
+                                 for gpu_id, values in sorted(values_by_gpu.items())))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class Replay:
+    """Streams a recording's cycles back from a read-only memory map.
+
+    cycle(index) returns {gpu ordinal: {column: int}}. Consecutive indexes
+    are read in order; once past the last cycle the recording starts over
+    (or, with loop=False, keeps returning the last cycle).
+    """
+
+    def __init__(self, path, speed=1.0, loop=True):
+        if speed <= 0:
+            raise ValueError(f"Replay speed must be positive (got {speed:g})")
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self.file = open(path, 'rb')
+        try:
+            size = os.fstat(self.file.fileno()).st_size
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+            self.columns, self.row, self.header_size = read_header(self.map)
+        except (OSError, ValueError):
+            self.file.close()
+            raise
+        self.rows = (size - self.header_size) // self.row.size
+        if self.rows == 0:
+            self.close()
+            raise ValueError(f"{path} has no recorded cycles")
+        self._rewind()
+
+    def _rewind(self):
+        self.index = -1
+        self.position = 0
+        self.timestamp = None
+        self.current = {}
+
+    def _timestamp_at(self, position):
+        return ROW_PREFIX.unpack_from(self.map, self.header_size + position * self.row.size)[0]
+
+    def _advance(self):
+        if self.position >= self.rows:
+            if not self.loop:
+                self.index += 1
+                return
+            self.position = 0
+        unpack_from, row_size, columns = self.row.unpack_from, self.row.size, self.columns
+        offset = self.header_size + self.position * row_size
+        timestamp = self._timestamp_at(self.position)
+        cycle = {}
+        while self.position < self.rows:
+            row = unpack_from(self.map, offset)
+            if row[0] != timestamp:
+                break
+            cycle[row[1]] = dict(zip(columns, row[2:]))
+            self.position += 1
+            offset += row_size
+        self.index += 1
+        self.timestamp = timestamp
+        self.current = cycle
+
+    def cycle(self, index):
+        if index < self.index:
+            self._rewind()
+        while self.index < index:
+            self._advance()
+        return self.current
+
+    def next_delay(self, default):
+        """Seconds until the next cycle is due: the recorded gap divided by the speed, else `default`"""
+        if self.timestamp is None or self.position >= self.rows:
+            return default
+        gap = self._timestamp_at(self.position) - self.timestamp
+        return gap / self.speed if gap > 0 else default
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self.file.close()
@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+"""
+Prometheus remote-write push for DCGM Fake GPU Exporter
+
+Usage:
+  Exporter: set REMOTE_WRITE_URL (e.g. http://prometheus:9090/api/v1/write,
+  Prometheus started with --web.enable-remote-write-receiver) and every
+  published snapshot is also pushed as a remote-write 1.0 request.
+
+  Fleet driver: `python3 dcgm_remote_write.py --url URL --nodes 1000 --gpus 8`
+  runs the metric profiles for a whole synthetic fleet in one process and
+  pushes every node's GPUs under its own `instance` label, so Prometheus
+  ingests a large fleet without scraping thousands of exporters.
+
+  Series are sharded by GPU across REMOTE_WRITE_SHARDS senders, so each
+  series is always written by the same sender, in order. Each shard has a
+  bounded queue that drops its oldest samples once REMOTE_WRITE_CAPACITY is
+  reached. A batch taken off it is retried by its sender, holding back the
+  rows behind it, until it is acknowledged, rejected or out of retries.
+"""
+
+import argparse
+import collections
+import http.client
+import os
+import random
+import struct
+import sys
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit
+
+import dcgm_field_registry
+from dcgm_self_metrics import pb_field, varint
+
+# Configuration
+REMOTE_WRITE_URL = os.getenv('REMOTE_WRITE_URL', '')
+REMOTE_WRITE_SHARDS = int(os.getenv('REMOTE_WRITE_SHARDS', '4'))
+REMOTE_WRITE_MAX_SAMPLES_PER_SEND = int(os.getenv('REMOTE_WRITE_MAX_SAMPLES_PER_SEND', '2000'))
+REMOTE_WRITE_BATCH_SEND_DEADLINE = float(os.getenv('REMOTE_WRITE_BATCH_SEND_DEADLINE', '5'))
+REMOTE_WRITE_CAPACITY = int(os.getenv('REMOTE_WRITE_CAPACITY', '100000'))
+REMOTE_WRITE_MAX_RETRIES = int(os.getenv('REMOTE_WRITE_MAX_RETRIES', '10'))
+REMOTE_WRITE_TIMEOUT = float(os.getenv('REMOTE_WRITE_TIMEOUT', '30'))
+# `k1=v1,k2=v2` labels added to every series (like Prometheus' external_labels)
+REMOTE_WRITE_EXTERNAL_LABELS = os.getenv('REMOTE_WRITE_EXTERNAL_LABELS', '')
+METADATA_SEND_INTERVAL = 60.0
+MIN_BACKOFF = 0.03
+MAX_BACKOFF = 5.0
+RETRYABLE_STATUS = {429}
+
+def parse_labels(spec):
+    """`k1=v1,k2=v2` -> ((k1, v1), (k2, v2))"""
+    labels = []
+    for item in spec.split(','):
+        name, sep, value = item.partition('=')
+        if sep and name.strip():
+            labels.append((name.strip(), value.strip()))
+    return tuple(labels)
+
+# --- Snappy block format -----------------------------------------------------
+# Remote write bodies are snappy-compressed. python-snappy is used when it is
+# installed; otherwise this pure-Python codec produces the same block format.
+
+def _literal(out, data, start, end):
+    n = end - start - 1
+    if n < 60:
+        out.append(n << 2)
+    elif n < 0x100:
+        out += bytes((60 << 2, n))
+    elif n < 0x10000:
+        out.append(61 << 2)
+        out += n.to_bytes(2, 'little')
+    elif n < 0x1000000:
+        out.append(62 << 2)
+        out += n.to_bytes(3, 'little')
+    else:
+        out.append(63 << 2)
+        out += n.to_bytes(4, 'little')
+    out += data[start:end]
+
+def _copy(out, offset, length):
+    while length >= 68:
+        out += bytes(((63 << 2) | 2, offset & 0xff, offset >> 8))
+        length -= 64
+    if length > 64:
+        out += bytes(((59 << 2) | 2, offset & 0xff, offset >> 8))
+        length -= 60
+    if length < 12 and offset < 2048:
+        out += bytes((((offset >> 8) << 5) | ((length - 4) << 2) | 1, offset & 0xff))
+    else:
+        out += bytes((((length - 1) << 2) | 2, offset & 0xff, offset >> 8))
+
+def snappy_compress(data):
+    """Greedy 4-byte-hash snappy compressor (block format, no framing)"""
+    data = bytes(data)
+    size = len(data)
+    out = bytearray(varint(size))
+    table = {}
+    pos = literal_start = 0
+    while pos + 4 <= size:
+        key = data[pos:pos + 4]
+        candidate = table.get(key)
+        table[key] = pos
+        if candidate is None or pos - candidate > 0xffff:
+            # Skip faster through data that keeps failing to match, like snappy itself
+            pos += 1 + ((pos - literal_start) >> 5)
+            continue
+        length = 4
+        limit = size - pos
+        while length + 16 <= limit and data[candidate + length:candidate + length + 16] == \
+                data[pos + length:pos + length + 16]:
+            length += 16
+        while length < limit and data[candidate + length] == data[pos + length]:
+            length += 1
+        if literal_start < pos:
+            _literal(out, data, literal_start, pos)
+        _copy(out, pos - candidate, length)
+        pos += length
+        literal_start = pos
+    if literal_start < size:
+        _literal(out, data, literal_start, size)
+    return bytes(out)
+
+def snappy_decompress(data):
+    size, pos, shift = 0, 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        size |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    out = bytearray()
+    while pos < len(data):
+        tag = data[pos]
+        pos += 1
+        kind = tag & 3
+        if kind == 0:
+            length = tag >> 2
+            if length >= 60:
+                extra = length - 59
+                length = int.from_bytes(data[pos:pos + extra], 'little')
+                pos += extra
+            length += 1
+            out += data[pos:pos + length]
+            pos += length
+            continue
+        if kind == 1:
+            length = ((tag >> 2) & 7) + 4
+            offset = ((tag >> 5) << 8) | data[pos]
+            pos += 1
+        elif kind == 2:
+            length = (tag >> 2) + 1
+            offset = int.from_bytes(data[pos:pos + 2], 'little')
+            pos += 2
+        else:
+            length = (tag >> 2) + 1
+            offset = int.from_bytes(data[pos:pos + 4], 'little')
+            pos += 4
+        if offset == 0 or offset > len(out):
+            raise ValueError("corrupt snappy input: bad copy offset")
+        start = len(out) - offset
+        if offset >= length:
+            out += out[start:start + length]
+        else:
+            for idx in range(length):
+                out.append(out[start + idx])
+    if len(out) != size:
+        raise ValueError(f"corrupt snappy input: {len(out)} bytes decoded, {size} expected")
+    return bytes(out)
+
+try:
+    import snappy as _snappy
+    compress = _snappy.compress
+except ImportError:
+    compress = snappy_compress
+
+# --- WriteRequest encoding ---------------------------------------------------
+
+def _label(name, value):
+    return pb_field(1, pb_field(1, name) + pb_field(2, value))
+
+# prometheus.MetricMetadata.MetricType
+METADATA_TYPES = {dcgm_field_registry.COUNTER: 1, dcgm_field_registry.GAUGE: 2}
+
+class WriteRequestEncoder:
+    """Encodes queued GPU rows as a prometheus.WriteRequest, one sample per TimeSeries.
+
+    Label bytes are cached per GPU (everything but `__name__`) and per field
+    (`__name__`), and spliced around each other in sorted label order, so
+    a sample costs one double pack plus a few list appends.
+    """
+    pack_double = struct.Struct('<d').pack
+
+    def __init__(self, fields=None, external_labels=()):
+        self.fields = dcgm_field_registry.FIELDS if fields is None else fields
+        self.external_labels = tuple(external_labels)
+        self.name_labels = {field.field_id: _label('__name__', field.metric_name) for field in self.fields}
+        self.field_ids = list(self.name_labels)
+        self.gpu_labels = {}
+        self.varints = [varint(n) for n in range(128)]
+        self.metadata = b''.join(
+            pb_field(3, b'\x08' + varint(METADATA_TYPES[field.metric_type]) + pb_field(2, field.metric_name) +
+                      pb_field(4, field.help) + pb_field(5, dcgm_field_registry.openmetrics_unit(field) or ''))
+            for field in self.fields)
+
+    def _series_labels(self, labels, gpu_id):
+        """(labels sorting before __name__, labels sorting after it) for one GPU"""
+        key = (labels, gpu_id)
+        cached = self.gpu_labels.get(key)
+        if cached is None:
+            pairs = sorted(dict(self.external_labels + labels + (('gpu', gpu_id), ('device', f'nvidia{gpu_id}')))
+                           .items())
+            cached = (b''.join(_label(n, v) for n, v in pairs if n < '__name__'),
+                      b''.join(_label(n, v) for n, v in pairs if n > '__name__'))
+            self.gpu_labels[key] = cached
+        return cached
+
+    def encode(self, rows, metadata=False):
+        """rows: (timestamp_ms, labels, gpu_id, {field_id: value}, samples) tuples"""
+        parts = [self.metadata] if metadata else []
+        extend, pack, name_labels, varints = parts.extend, self.pack_double, self.name_labels, self.varints
+        for timestamp_ms, labels, gpu_id, values, _ in rows:
+            before, after = self._series_labels(labels, gpu_id)
+            tail = b'\x10' + varint(timestamp_ms)
+            sample_header = b'\x12' + varint(9 + len(tail)) + b'\x09'
+            fixed = len(before) + len(after) + len(sample_header) + 8 + len(tail)
+            for field_id in self.field_ids:
+                value = values.get(field_id)
+                if value is None:
+                    continue
+                name = name_labels[field_id]
+                body_length = fixed + len(name)
+                extend((b'\x0a', varints[body_length] if body_length < 128 else varint(body_length),
+                        before, name, after, sample_header, pack(value), tail))
+        return b''.join(parts)
+
+# --- Sharded queue and senders -----------------------------------------------
+
+class Shard:
+    """One sender: a bounded queue of GPU rows and a keep-alive connection"""
+
+    def __init__(self, writer, index):
+        self.writer = writer
+        self.index = index
+        self.queue = collections.deque()
+        self.samples = 0
+        self.in_flight = 0
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True, name=f'remote-write-{index}')
+
+    def append(self, row):
+        """Queue a row, dropping the oldest ones beyond capacity; returns samples dropped"""
+        dropped = 0
+        with self.cond:
+            self.queue.append(row)
+            self.samples += row[4]
+            while self.samples > self.writer.capacity and len(self.queue) > 1:
+                old = self.queue.popleft()
+                self.samples -= old[4]
+                dropped += old[4]
+            if self.samples >= self.writer.max_samples_per_send or self.writer.flushing:
+                self.cond.notify()
+        return dropped
+
+    def _next_batch(self):
+        writer = self.writer
+        with self.cond:
+            deadline = time.monotonic() + writer.batch_send_deadline
+            # A flush sends what is queued at once, but with nothing queued there is nothing to do but wait
+            while not writer.stopped.is_set() and (
+                    not self.queue or (self.samples < writer.max_samples_per_send and not writer.flushing)):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    if self.queue:
+                        break
+                    deadline = time.monotonic() + writer.batch_send_deadline
+                    remaining = writer.batch_send_deadline
+                self.cond.wait(remaining)
+            rows, samples = [], 0
+            while self.queue and (not rows or samples + self.queue[0][4] <= writer.max_samples_per_send):
+                row = self.queue.popleft()
+                rows.append(row)
+                samples += row[4]
+            self.samples -= samples
+            if rows:
+                self.in_flight += 1
+            return rows, samples
+
+    def _run(self):
+        writer = self.writer
+        conn = None
+        last_metadata = 0.0
+        while not writer.stopped.is_set():
+            rows, samples = self._next_batch()
+            if not rows:
+                continue
+            try:
+                metadata = time.monotonic() - last_metadata >= METADATA_SEND_INTERVAL
+                body = compress(writer.encoder.encode(rows, metadata))
+                conn, sent = writer.send(conn, body, samples)
+                if sent and metadata:
+                    last_metadata = time.monotonic()
+            except Exception as e:
+                print(f"Remote write error: {e}", flush=True)
+                writer.count(dropped_samples=samples)
+            finally:
+                with self.cond:
+                    self.in_flight -= 1
+                    self.cond.notify_all()
+        if conn is not None:
+            conn.close()
+
+class RemoteWriter:
+    """Push snapshots with the Prometheus remote-write protocol (snappy-compressed protobuf).
+
+    `publish` is an exporter snapshot listener and `submit` takes raw
+    collector output plus extra labels (the fleet driver's `instance`).
+    Both only route GPU rows to their shard's queue; encoding, compression
+    and HTTP happen on the shard threads. 5xx, 429 and connection errors are
+    retried with exponential backoff from MIN_BACKOFF to MAX_BACKOFF, other
+    4xx drop the batch, as Prometheus does.
+    """
+
+    def __init__(self, url=REMOTE_WRITE_URL, fields=None, external_labels=None, shards=REMOTE_WRITE_SHARDS,
+                 max_samples_per_send=REMOTE_WRITE_MAX_SAMPLES_PER_SEND,
+                 batch_send_deadline=REMOTE_WRITE_BATCH_SEND_DEADLINE, capacity=REMOTE_WRITE_CAPACITY,
+                 max_retries=REMOTE_WRITE_MAX_RETRIES, timeout=REMOTE_WRITE_TIMEOUT, headers=None):
+        self.url = urlsplit(url)
+        if self.url.scheme not in ('http', 'https') or not self.url.hostname:
+            raise ValueError(f"Invalid remote write URL {url!r}: expected http(s)://host[:port]/path")
+        self.endpoint = url
+        self.path = self.url.path or '/api/v1/write'
+        if external_labels is None:
+            external_labels = parse_labels(REMOTE_WRITE_EXTERNAL_LABELS)
+        self.encoder = WriteRequestEncoder(fields, external_labels)
+        self.max_samples_per_send = max_samples_per_send
+        self.batch_send_deadline = batch_send_deadline
+        self.capacity = capacity
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.headers = {
+            'Content-Type': 'application/x-protobuf',
+            'Content-Encoding': 'snappy',
+            'X-Prometheus-Remote-Write-Version': '0.1.0',
+            'User-Agent': 'dcgm-fake-gpu-exporter',
+        }
+        self.headers.update(headers or {})
+        self.stopped = threading.Event()
+        self.flushing = 0
+        self.lock = threading.Lock()
+        self.shard_of = {}
+        # Delivery counters, updated under self.lock
+        self.sent_samples = 0
+        self.sent_requests = 0
+        self.sent_bytes = 0
+        self.dropped_samples = 0
+        self.retries = 0
+        self.shards = [Shard(self, index) for index in range(max(1, shards))]
+        for shard in self.shards:
+            shard.thread.start()
+
+    def publish(self, snapshot):
+        """Snapshot listener; error snapshots carry no values and are skipped"""
+        if snapshot.gpu_metrics is not None:
+            self.submit(snapshot.gpu_metrics, snapshot.timestamp)
+
+    def submit(self, gpu_metrics, timestamp=None, labels=()):
+        timestamp_ms = int((time.time() if timestamp is None else timestamp) * 1000)
+        dropped = 0
+        for gpu_id, values in gpu_metrics.items():
+            shard = self.shard_of.get((labels, gpu_id))
+            if shard is None:
+                shard = self.shard_of[(labels, gpu_id)] = self.shards[
+                    zlib.crc32(repr((labels, gpu_id)).encode()) % len(self.shards)]
+            dropped += shard.append((timestamp_ms, labels, gpu_id, values, len(values)))
+        if dropped:
+            self.count(dropped_samples=dropped)
+
+    def queued_samples(self):
+        return sum(shard.samples for shard in self.shards)
+
+    def flush(self, timeout=None):
+        """Send everything queued now; True once every shard has drained"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.lock:
+            self.flushing += 1
+        try:
+            for shard in self.shards:
+                with shard.cond:
+                    shard.cond.notify_all()
+                    while shard.queue or shard.in_flight:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            return False
+                        shard.cond.wait(remaining)
+            return True
+        finally:
+            with self.lock:
+                self.flushing -= 1
+
+    def close(self, timeout=5.0):
+        self.flush(timeout)
+        self.stopped.set()
+        for shard in self.shards:
+            with shard.cond:
+                shard.cond.notify_all()
+        for shard in self.shards:
+            shard.thread.join(timeout)
+
+    def stats(self):
+        """Delivery counters, as the exporter's self metrics read them"""
+        with self.lock:
+            return {'samples_sent': self.sent_samples, 'samples_dropped': self.dropped_samples,
+                    'requests': self.sent_requests, 'retries': self.retries}
+
+    def count(self, **increments):
+        with self.lock:
+            for name, value in increments.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def _connect(self):
+        if self.url.scheme == 'https':
+            return http.client.HTTPSConnection(self.url.hostname, self.url.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.url.hostname, self.url.port, timeout=self.timeout)
+
+    def send(self, conn, body, samples):
+        """POST one compressed WriteRequest with retries; returns (connection, delivered)"""
+        backoff = MIN_BACKOFF
+        error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                if conn is None:
+                    conn = self._connect()
+                conn.request('POST', self.path, body, self.headers)
+                response = conn.getresponse()
+                detail = response.read()
+                if response.will_close:
+                    conn.close()
+                    conn = None
+                if 200 <= response.status < 300:
+                    self.count(sent_samples=samples, sent_requests=1, sent_bytes=len(body))
+                    return conn, True
+                error = f"HTTP {response.status}: {detail[:200].decode('utf-8', 'replace').strip()}"
+                if response.status < 500 and response.status not in RETRYABLE_STATUS:
+                    break
+            except (OSError, http.client.HTTPException) as e:
+                error = e
+                if conn is not None:
+                    conn.close()
+                    conn = None
+            if attempt == self.max_retries:
+                break
+            self.count(retries=1)
+            if self.stopped.wait(backoff * random.uniform(0.5, 1.0)):
+                break
+            backoff = min(backoff * 2, MAX_BACKOFF)
+        print(f"Remote write to {self.endpoint} failed ({error}), dropped {samples} samples", flush=True)
+        self.count(dropped_samples=samples)
+        return conn, False
+
+# --- Fleet driver --------------------------------------------------------------
+
+class FleetSimulator:
+    """Run the manager's metric profiles for `nodes` x `gpus` fake GPUs in one process.
+
+    Each node is one simulated exporter: its GPUs are numbered from 1 and
+    its series carry `instance="<prefix>-<node>"`. All GPUs tick through a
+    single MetricGenerator (so PROFILE_ENGINE=numpy batches the whole fleet)
+    and one FieldSynthesizer.
+    """
+
+    def __init__(self, nodes, gpus, metric_profile='static', gpu_profiles=None, profile_engine='scalar',
+                 update_interval=15.0, fields=None, instance_prefix='fake-node'):
+        import dcgm_fake_manager
+        self.ordinals = list(range(1, nodes * gpus + 1))
+        profiles = dcgm_fake_manager.create_profiles(len(self.ordinals), metric_profile, gpu_profiles)
+        self.generator = dcgm_fake_manager.MetricGenerator(profiles, profile_engine)
+        self.synthesizer = dcgm_field_registry.FieldSynthesizer(fields or dcgm_field_registry.FIELDS)
+        self.update_interval = update_interval
+        self.placement = {ordinal: ((('instance', f'{instance_prefix}-{(ordinal - 1) // gpus + 1}'),),
+                                    str((ordinal - 1) % gpus + 1))
+                          for ordinal in self.ordinals}
+
+    def tick(self):
+        """One profile tick for the whole fleet: {instance labels: {gpu_id: {field_id: value}}}"""
+        fields_by_ordinal = self.synthesizer.expand(self.generator.generate(self.ordinals), self.update_interval)
+        nodes = {}
+        for ordinal, fields in fields_by_ordinal.items():
+            labels, gpu_id = self.placement[ordinal]
+            nodes.setdefault(labels, {})[gpu_id] = {field_id: float(value) for field_id, value in fields.items()}
+        return nodes
+
+def run_fleet(writer, fleet, interval, duration=None):
+    """Push one fleet tick every `interval` seconds (forever, or for `duration`)"""
+    end = None if duration is None else time.monotonic() + duration
+    while end is None or time.monotonic() < end:
+        started = time.monotonic()
+        timestamp = time.time()
+        for labels, gpu_metrics in fleet.tick().items():
+            writer.submit(gpu_metrics, timestamp, labels)
+        elapsed = time.monotonic() - started
+        print(f"Pushed tick for {len(fleet.ordinals)} GPUs in {elapsed:.2f}s "
+              f"(sent {writer.sent_samples} samples, queued {writer.queued_samples()}, "
+              f"dropped {writer.dropped_samples})", flush=True)
+        if writer.stopped.wait(max(0.0, interval - elapsed)):
+            break
+
+def main():
+    parser = argparse.ArgumentParser(description="Push a synthetic GPU fleet with Prometheus remote write")
+    parser.add_argument('--url', default=REMOTE_WRITE_URL or 'http://localhost:9090/api/v1/write')
+    parser.add_argument('--nodes', type=int, default=100, help='Simulated exporters (instance label values)')
+    parser.add_argument('--gpus', type=int, default=8, help='GPUs per node')
+    parser.add_argument('--profile', default=os.getenv('METRIC_PROFILE', 'static'))
+    parser.add_argument('--gpu-profiles', default=os.getenv('GPU_PROFILES', ''),
+                        help='Comma-separated profiles, assigned to GPUs cyclically across the fleet')
+    parser.add_argument('--profile-engine', choices=['scalar', 'numpy'], default=os.getenv('PROFILE_ENGINE', 'scalar'))
+    parser.add_argument('--interval', type=float, default=15.0, help='Seconds between fleet ticks')
+    parser.add_argument('--duration', type=float, default=None, help='Stop after this many seconds')
+    parser.add_argument('--field-groups', default=os.getenv('DCGM_FIELD_GROUPS', 'all'))
+    args = parser.parse_args()
+
+    try:
+        fields = dcgm_field_registry.select_fields(args.field_groups)
+        writer = RemoteWriter(args.url, fields=fields)
+    except ValueError as e:
+        print(f"✗ {e}", flush=True)
+        sys.exit(1)
+    gpu_profiles = [p.strip() for p in args.gpu_profiles.split(',') if p.strip()]
+    fleet = FleetSimulator(args.nodes, args.gpus, args.profile, gpu_profiles, args.profile_engine,
+                           args.interval, fields)
+    print(f"✓ Pushing {args.nodes} nodes x {args.gpus} GPUs x {len(fields)} fields to {args.url} "
+          f"every {args.interval:g}s over {len(writer.shards)} shards", flush=True)
+    try:
+        run_fleet(writer, fleet, args.interval, args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+
+if __name__ == '__main__':
+    main()
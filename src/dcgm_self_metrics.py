@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Self-instrumentation for DCGM Fake GPU Exporter
+
+Usage:
+  The exporter, its in-process UDS server and the fake manager record
+  their own counters, gauges and histograms here. The exporter renders them
+  once per refresh into every exposition format of the snapshot (after the
+  GPU series), so a scrape still only sends cached bytes. The manager runs
+  in its own process and writes its registry to DCGM_MANAGER_METRICS after
+  each injection cycle; the exporter picks that file up on refresh.
+
+  Recording is a perf_counter() pair at the call site plus a dict update
+  under an uncontended lock: about a microsecond per event.
+"""
+
+import bisect
+import json
+import os
+import struct
+import threading
+
+COUNTER, GAUGE, HISTOGRAM = 'counter', 'gauge', 'histogram'
+# Seconds, from sub-millisecond scrapes up to a dcgmi call hitting its timeout
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Units OpenMetrics declares for families whose name ends in them
+UNIT_SUFFIXES = ('seconds', 'bytes')
+
+class Metric:
+    """One metric family: values keyed by a tuple of label values.
+
+    With `function` the values are not recorded but read at collection
+    time from `function()`, which returns {label values: value} (for
+    counters other objects already keep, e.g. pusher delivery counts).
+    """
+    type = None
+
+    def __init__(self, name, help, labelnames=(), function=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def samples(self):
+        if self.function is not None:
+            return sorted(self.function().items())
+        with self.lock:
+            return sorted((labels, self._copy(value)) for labels, value in self.values.items())
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    def family(self):
+        return {'name': self.name, 'type': self.type, 'help': self.help,
+                'labels': list(self.labelnames), 'samples': [[list(labels), value] for labels, value in self.samples()]}
+
+class Counter(Metric):
+    type = COUNTER
+
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+class Gauge(Metric):
+    type = GAUGE
+
+    def set(self, value, labels=()):
+        with self.lock:
+            self.values[labels] = value
+
+class Histogram(Metric):
+    """Fixed-bucket histogram; each label set keeps per-bucket counts (last one is +Inf) and the sum"""
+    type = HISTOGRAM
+
+    def __init__(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=()):
+        # bisect_left: a value equal to a bound belongs in that bound's `le` bucket
+        idx = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][idx] += 1
+            entry[1] += value
+
+    @staticmethod
+    def _copy(value):
+        return [list(value[0]), value[1]]
+
+    def family(self):
+        family = super().family()
+        family['buckets'] = list(self.buckets)
+        return family
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=(), function=None):
+        return self.register(Counter(name, help, labelnames, function))
+
+    def gauge(self, name, help, labelnames=(), function=None):
+        return self.register(Gauge(name, help, labelnames, function))
+
+    def histogram(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def collect(self):
+        """Every family as a plain dict (JSON-serializable), sorted by name"""
+        return sorted((metric.family() for metric in self.metrics), key=lambda family: family['name'])
+
+# The exporter process' registry (exporter, UDS server, push clients)
+REGISTRY = Registry()
+
+def write_families(path, families):
+    """Atomically replace `path` with `families` as JSON"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'families': families}, f)
+    os.replace(tmp_path, path)
+
+class FamilyFile:
+    """Families another process writes with write_families(), re-read only when the file changes"""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        self.families = []
+
+    def load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime != self.mtime:
+                with open(self.path) as f:
+                    self.families = json.load(f)['families']
+                self.mtime = mtime
+        except (OSError, ValueError, KeyError, TypeError):
+            self.mtime, self.families = None, []
+        return self.families
+
+# --- Rendering --------------------------------------------------------------
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _float(value):
+    return '+Inf' if value == float('inf') else repr(float(value))
+
+def _histogram_lines(name, labelnames, labels, value, buckets):
+    counts, total = value
+    lines, cumulative = [], 0
+    for bound, count in zip(list(buckets) + [float('inf')], counts):
+        cumulative += count
+        le = 'le="' + _float(bound) + '"'
+        lines.append(f"{name}_bucket{_labels(labelnames, labels, le)} {cumulative}\n")
+    lines.append(f"{name}_sum{_labels(labelnames, labels)} {total}\n")
+    lines.append(f"{name}_count{_labels(labelnames, labels)} {cumulative}\n")
+    return lines
+
+def render_text(families):
+    """Text format 0.0.4 lines for `families`"""
+    lines = []
+    for family in families:
+        name, labelnames = family['name'], family['labels']
+        lines.append(f"# HELP {name} {family['help']}\n# TYPE {name} {family['type']}\n")
+        for labels, value in family['samples']:
+            if family['type'] == HISTOGRAM:
+                lines.extend(_histogram_lines(name, labelnames, labels, value, family['buckets']))
+            else:
+                lines.append(f"{name}{_labels(labelnames, labels)} {value}\n")
+    return ''.join(lines)
+
+def openmetrics_unit(name):
+    family = name[:-len('_total')] if name.endswith('_total') else name
+    return next((unit for unit in UNIT_SUFFIXES if family.endswith('_' + unit)), None)
+
+def render_openmetrics(families):
+    """OpenMetrics 1.0 families (without the closing `# EOF`)"""
+    lines = []
+    for family in families:
+        name, labelnames = family['name'], family['labels']
+        family_name = name[:-len('_total')] if family['type'] == COUNTER and name.endswith('_total') else name
+        unit = openmetrics_unit(name)
+        lines.append(f"# TYPE {family_name} {family['type']}\n" + (f"# UNIT {family_name} {unit}\n" if unit else '') +
+                     f"# HELP {family_name} {family['help']}\n")
+        for labels, value in family['samples']:
+            if family['type'] == HISTOGRAM:
+                lines.extend(_histogram_lines(family_name, labelnames, labels, value, family['buckets']))
+            else:
+                lines.append(f"{name}{_labels(labelnames, labels)} {value}\n")
+    return ''.join(lines)
+
+# Protobuf wire-format helpers, shared with the exporter's GPU series renderer and remote write
+def varint(value):
+    """Protobuf base-128 varint"""
+    out = bytearray()
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def pb_field(number, payload):
+    """Length-delimited protobuf field (strings and embedded messages)"""
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    return varint(number << 3 | 2) + varint(len(payload)) + payload
+
+_pack_double = struct.Struct('<d').pack
+# io.prometheus.client.MetricType
+PROTOBUF_METRIC_TYPES = {COUNTER: 0, GAUGE: 1, HISTOGRAM: 4}
+
+def render_protobuf(families):
+    """Length-delimited io.prometheus.client.MetricFamily messages for `families`"""
+    out = []
+    for family in families:
+        unit = openmetrics_unit(family['name'])
+        message = [pb_field(1, family['name']), pb_field(2, family['help']),
+                   b'\x18' + varint(PROTOBUF_METRIC_TYPES[family['type']]), pb_field(5, unit) if unit else b'']
+        for labels, value in family['samples']:
+            metric = b''.join(pb_field(1, pb_field(1, name) + pb_field(2, str(label)))
+                              for name, label in zip(family['labels'], labels))
+            if family['type'] == HISTOGRAM:
+                counts, total = value
+                buckets, cumulative = [], 0
+                # The +Inf bucket is implied by sample_count
+                for bound, count in zip(family['buckets'], counts):
+                    cumulative += count
+                    buckets.append(pb_field(3, b'\x08' + varint(cumulative) + b'\x11' + _pack_double(bound)))
+                histogram = b'\x08' + varint(sum(counts)) + b'\x11' + _pack_double(total) + b''.join(buckets)
+                metric += pb_field(7, histogram)
+            else:
+                metric += pb_field(3 if family['type'] == COUNTER else 2, b'\x09' + _pack_double(value))
+            message.append(pb_field(4, metric))
+        body = b''.join(message)
+        out.append(varint(len(body)) + body)
+    return b''.join(out)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Trace import for the DCGM Fake GPU Manager's 'trace' profile
+
+Usage:
+  METRIC_PROFILE=trace TRACE_FILE=/data/node7.dmon  streams a telemetry
+  trace from real GPUs into injection instead of a synthetic profile:
+    dmon        `dcgmi dmon` output (#Entity header, `GPU <id> ...` rows)
+    prometheus  DCGM-exporter (or this exporter's) /metrics scrapes, one after another
+    csv         `nvidia-smi --query-gpu=... --format=csv` logs, or any CSV with
+                timestamp/gpu columns and one column per metric
+  The format is detected from the file unless TRACE_FORMAT is set; `.gz`
+  files are decompressed on the fly.
+
+  Everything is a chain of generators: lines -> samples -> frames ->
+  resampled ticks, so only the current frame and the last value of each GPU
+  are in memory, whatever the trace size. Rows without a timestamp (dmon,
+  most scrapes) are spaced TRACE_SAMPLE_INTERVAL seconds apart, a new frame
+  starting whenever a GPU (and metric) repeats. Resampling steps through
+  trace time one update interval per tick and keeps each GPU's last value at
+  or before it, as a scrape at that moment would have seen.
+
+  Columns are matched to the profile tick (temp, power, gpu_util, mem_util,
+  sm_clock, mem_clock, fb_used) by dmon short name, DCGM field name, metric
+  name or nvidia-smi query name; `temp=gpu_temp_c` adds an alias and
+  `temp@3=gpu3_temp` maps a wide CSV's per-GPU column.
+"""
+
+import csv
+import gzip
+import re
+from datetime import datetime
+
+import dcgm_field_registry
+
+# Profile tick key -> DCGM field it drives
+TICK_FIELDS = {'temp': '150', 'power': '155', 'gpu_util': '203', 'mem_util': '204',
+               'sm_clock': '100', 'mem_clock': '101', 'fb_used': '252'}
+NVIDIA_SMI_NAMES = {
+    'temperature.gpu': 'temp', 'power.draw': 'power', 'power.draw.instant': 'power', 'utilization.gpu': 'gpu_util',
+    'utilization.memory': 'mem_util', 'clocks.sm': 'sm_clock', 'clocks.current.sm': 'sm_clock',
+    'clocks.mem': 'mem_clock', 'clocks.current.memory': 'mem_clock', 'memory.used': 'fb_used',
+}
+TIMESTAMP_COLUMNS = ('timestamp', 'time', 'ts')
+GPU_COLUMNS = ('gpu', 'index', 'gpu_id', 'gpu_index', 'device')
+PROMETHEUS_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})?\s+(\S+)(?:\s+(-?\d+))?\s*$')
+GPU_LABEL = re.compile(r'\bgpu="([^"]*)"')
+
+def default_aliases():
+    """Lower-cased column/metric name -> tick key"""
+    aliases = {}
+    for key, field_id in TICK_FIELDS.items():
+        field = dcgm_field_registry.FIELDS_BY_ID[field_id]
+        for name in (key, field.short_name, field.dcgm_name, field.metric_name):
+            if name:
+                aliases[name.lower()] = key
+    aliases.update(NVIDIA_SMI_NAMES)
+    return aliases
+
+def parse_columns(spec):
+    """`temp=gpu_temp_c,power@2=gpu2_watts` -> {(column, gpu or None): tick key}"""
+    columns = {}
+    for item in spec.split(','):
+        target, sep, column = item.partition('=')
+        if not sep or not column.strip():
+            continue
+        key, _, gpu = target.strip().partition('@')
+        if key not in TICK_FIELDS:
+            raise ValueError(f"Unknown trace column target '{key}'; choose from {', '.join(TICK_FIELDS)}")
+        columns[(column.strip().lower(), gpu.strip() or None)] = key
+    return columns
+
+def read_lines(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', errors='replace', newline='') as f:
+        yield from f
+
+def detect_format(path):
+    if re.search(r'\.csv(\.gz)?$', path):
+        return 'csv'
+    for line in read_lines(path):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#Entity') or line.split()[0] in ('GPU', 'ID'):
+            return 'dmon'
+        if line.startswith('# HELP') or line.startswith('# TYPE') or PROMETHEUS_SAMPLE.match(line):
+            return 'prometheus'
+        return 'csv'
+    raise ValueError(f"{path} is empty")
+
+def parse_number(text):
+    """First token of a cell as a float (`45 %`, `120.5 W`, `[N/A]` -> None)"""
+    token = text.strip().split(' ', 1)[0]
+    try:
+        return float(token)
+    except ValueError:
+        return None
+
+def parse_timestamp(text):
+    """Unix seconds from a number, ISO 8601 or nvidia-smi's `2024/01/15 10:00:00.123`"""
+    text = text.strip()
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text.replace('/', '-')).timestamp()
+
+class FrameClock:
+    """Timestamps for untimestamped rows: a new frame, `interval` later, whenever a key repeats"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.time = 0.0
+        self.seen = set()
+
+    def stamp(self, key):
+        if key in self.seen:
+            self.time += self.interval
+            self.seen.clear()
+        self.seen.add(key)
+        return self.time
+
+def parse_dmon(lines, aliases, sample_interval):
+    """`dcgmi dmon` lines -> (timestamp, gpu, {tick key: value})"""
+    keys = ()
+    clock = FrameClock(sample_interval)
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 3:
+            continue
+        if parts[0] == '#Entity':
+            keys = tuple(aliases.get(name.lower()) for name in parts[1:])
+        elif parts[0] == 'GPU':
+            values = {}
+            for key, cell in zip(keys, parts[2:]):
+                if key is not None:
+                    value = parse_number(cell)
+                    if value is not None:
+                        values[key] = value
+            yield clock.stamp(parts[1]), parts[1], values
+
+def parse_prometheus(lines, aliases, sample_interval):
+    """Text-format scrapes -> (timestamp, gpu, {tick key: value}), one sample per line"""
+    clock = FrameClock(sample_interval)
+    for line in lines:
+        if line.startswith('#'):
+            continue
+        match = PROMETHEUS_SAMPLE.match(line)
+        if not match:
+            continue
+        key = aliases.get(match.group(1).lower())
+        gpu = GPU_LABEL.search(match.group(2) or '')
+        value = parse_number(match.group(3))
+        if key is None or gpu is None or value is None:
+            continue
+        gpu = gpu.group(1)
+        timestamp = int(match.group(4)) / 1000.0 if match.group(4) else clock.stamp((gpu, key))
+        yield timestamp, gpu, {key: value}
+
+def parse_csv(lines, aliases, sample_interval, columns=None):
+    """CSV rows -> (timestamp, gpu, {tick key: value}); wide rows yield one sample per mapped GPU"""
+    columns = columns or {}
+    rows = csv.reader(lines, skipinitialspace=True)
+    header = next(rows, None)
+    if header is None:
+        return
+    # `power.draw [W]` -> `power.draw`
+    names = [re.sub(r'\s*\[[^\]]*\]$', '', name.strip()).lower() for name in header]
+    time_col = next((names.index(name) for name in TIMESTAMP_COLUMNS if name in names), None)
+    gpu_col = next((names.index(name) for name in GPU_COLUMNS if name in names), None)
+    mapped = []  # (column index, gpu or None, tick key)
+    for idx, name in enumerate(names):
+        for (column, gpu), key in columns.items():
+            if column == name:
+                mapped.append((idx, gpu, key))
+        if not any(column == name for column, _ in columns) and name in aliases:
+            mapped.append((idx, None, aliases[name]))
+    clock = FrameClock(sample_interval)
+    for row in rows:
+        if len(row) < len(names):
+            continue
+        by_gpu = {}
+        for idx, gpu, key in mapped:
+            gpu = gpu or (row[gpu_col].strip() if gpu_col is not None else '0')
+            value = parse_number(row[idx])
+            if value is not None:
+                by_gpu.setdefault(gpu, {})[key] = value
+        for gpu, values in by_gpu.items():
+            if time_col is None:
+                timestamp = clock.stamp(gpu)
+            else:
+                try:
+                    timestamp = parse_timestamp(row[time_col])
+                except ValueError:
+                    break
+            yield timestamp, gpu, values
+
+PARSERS = {'dmon': parse_dmon, 'prometheus': parse_prometheus, 'csv': parse_csv}
+
+def frames(samples):
+    """Consecutive samples with one timestamp -> (timestamp, {gpu: {tick key: value}})"""
+    current, frame = None, {}
+    for timestamp, gpu, values in samples:
+        if timestamp != current and frame:
+            yield current, frame
+            frame = {}
+        current = timestamp
+        frame.setdefault(gpu, {}).update(values)
+    if frame:
+        yield current, frame
+
+def resample(trace_frames, interval):
+    """One {gpu: {tick key: value}} per `interval` of trace time, holding each GPU's last value"""
+    state = {}
+    pending = next(trace_frames, None)
+    if pending is None:
+        return
+    tick_time = pending[0]
+    while pending is not None:
+        while pending is not None and pending[0] <= tick_time:
+            for gpu, values in pending[1].items():
+                state[gpu] = {**state[gpu], **values} if gpu in state else values
+            pending = next(trace_frames, None)
+        yield dict(state)
+        tick_time += interval
+
+class TraceReader:
+    """Streams a trace as resampled ticks; tick(index) reads forward, looping or holding at the end"""
+
+    def __init__(self, path, interval, trace_format='auto', sample_interval=1.0, columns='', loop=True):
+        if interval <= 0 or sample_interval <= 0:
+            raise ValueError("Trace intervals must be positive")
+        self.path = path
+        self.interval = interval
+        self.format = detect_format(path) if trace_format in ('', 'auto') else trace_format
+        if self.format not in PARSERS:
+            raise ValueError(f"Unknown trace format '{self.format}'; choose from {', '.join(PARSERS)}")
+        self.sample_interval = sample_interval
+        self.columns = parse_columns(columns) if isinstance(columns, str) else dict(columns)
+        self.aliases = default_aliases()
+        self.aliases.update({column: key for (column, gpu), key in self.columns.items() if gpu is None})
+        self.loop = loop
+        self.passes = 0
+        self._restart()
+
+    def _open(self):
+        parser = PARSERS[self.format]
+        args = (read_lines(self.path), self.aliases, self.sample_interval)
+        samples = parser(*args, self.columns) if self.format == 'csv' else parser(*args)
+        return resample(frames(samples), self.interval)
+
+    def _restart(self):
+        self.ticks = self._open()
+        self.index = -1
+        self.current = {}
+        self.gpus = []
+
+    def _advance(self):
+        tick = next(self.ticks, None)
+        if tick is None:
+            if self.index < 0:
+                raise ValueError(f"{self.path} has no {self.format} samples for any known metric")
+            if not self.loop:
+                self.index += 1
+                return
+            self.passes += 1
+            self.ticks = self._open()
+            tick = next(self.ticks)
+        self.index += 1
+        if tick.keys() != self.current.keys():
+            self.gpus = sorted(tick, key=lambda gpu: (not gpu.isdigit(), int(gpu) if gpu.isdigit() else 0, gpu))
+        self.current = tick
+
+    def tick(self, index):
+        if index < self.index:
+            self._restart()
+        while self.index < index:
+            self._advance()
+        return self.current
+
+    def gpu_values(self, index, gpu_id, gpu_map=None):
+        """The trace GPU feeding fake GPU ordinal `gpu_id`: mapped, else trace GPUs in order, cyclically"""
+        tick = self.tick(index)
+        gpu = (gpu_map or {}).get(gpu_id)
+        if gpu is None:
+            gpu = self.gpus[(gpu_id - 1) % len(self.gpus)]
+        return tick.get(gpu, {})
@@ -5,40 +5,338 @@ Serves the same Prometheus metrics via Unix Domain Socket
 
 Usage:
   Set ENABLE_UDS=true environment variable
-  The server will automatically start alongside the HTTP exporter
+  The exporter then runs the UDS listener in-process and answers every
+  connection straight from its pre-encoded metrics snapshot.
+
+  GET /subscribe keeps the connection open and pushes every new snapshot
+  as a chunk; GET /subscribe?mode=delta pushes only changed series.
+
+  Running this file directly starts the legacy standalone proxy, which
+  fetches each response from the HTTP endpoint (requires `requests`).
 """
 
+import collections
 import os
+import queue
+import selectors
 import socket
 import threading
 import time
 import sys
 
+import dcgm_self_metrics
+
 # Configuration
 UDS_PATH = os.getenv('UDS_SOCKET_PATH', '/var/run/dcgm/metrics.sock')
 METRICS_URL = f"http://localhost:{os.getenv('EXPORTER_PORT', '9400')}/metrics"
 ENABLE_UDS = os.getenv('ENABLE_UDS', 'false').lower() == 'true'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+MAX_REQUEST_HEAD = 8192
+REQUEST_TIMEOUT = 5.0
+# How long a rejected connection is kept to drain the client's request before it is closed
+REJECT_LINGER = 0.1
+UDS_MAX_CLIENTS = int(os.getenv('UDS_MAX_CLIENTS', '16'))
+UDS_MAX_QUEUED = int(os.getenv('UDS_MAX_QUEUED', '1024'))
+UDS_WRITE_TIMEOUT = float(os.getenv('UDS_WRITE_TIMEOUT', '5'))
+UDS_LISTEN_BACKLOG = int(os.getenv('UDS_LISTEN_BACKLOG', '1024'))
+UDS_MAX_SUBSCRIBERS = int(os.getenv('UDS_MAX_SUBSCRIBERS', '256'))
+UDS_SUBSCRIBER_BACKLOG = int(os.getenv('UDS_SUBSCRIBER_BACKLOG', '8'))
+# How often frames queued for subscribers that are behind are retried
+BACKLOG_RETRY_INTERVAL = 0.01
+SUBSCRIBE_PATH = '/subscribe'
+REJECT_RESPONSE = (b"HTTP/1.1 503 Service Unavailable\r\n"
+                   b"Retry-After: 1\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+
+# Self-instrumentation; exported by the exporter when the server runs in-process
+UDS_CONNECTIONS = dcgm_self_metrics.REGISTRY.counter(
+    'dcgm_exporter_uds_connections_total',
+    'UDS connections by outcome: snapshot, subscribe, rejected (busy) or error', ['result'])
+UDS_BYTES = dcgm_self_metrics.REGISTRY.counter(
+    'dcgm_exporter_uds_bytes_total', 'Bytes sent to UDS clients, snapshots and subscription frames')
+UDS_SUBSCRIBERS = dcgm_self_metrics.REGISTRY.gauge(
+    'dcgm_exporter_uds_subscribers', 'UDS clients currently subscribed to snapshot pushes')
+
+def read_request(client_socket):
+    """Read the HTTP request head (up to the blank line); returns the request line and lowercased headers.
+
+    The request line is empty when the client closed without sending anything.
+    """
+    client_socket.settimeout(REQUEST_TIMEOUT)
+    data = b''
+    while b'\r\n\r\n' not in data and b'\n\n' not in data and len(data) < MAX_REQUEST_HEAD:
+        received = client_socket.recv(4096)
+        if not received:
+            break
+        data += received
+    lines = data.split(b'\n\n', 1)[0].split(b'\r\n\r\n', 1)[0].decode('latin-1').splitlines()
+    if not lines:
+        return '', {}
+    request_line, *lines = lines
+    headers = {}
+    for line in lines:
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return request_line.strip(), headers
+
+def send_snapshot(client_socket, body, content_type=CONTENT_TYPE):
+    """Send pre-encoded metrics bytes without copying them into a new buffer"""
+    header = (
+        f"HTTP/1.1 200 OK\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: close\r\n"
+        f"\r\n"
+    ).encode('ascii')
+    view = memoryview(body)
+    sent = client_socket.sendmsg([header, view])
+    if sent < len(header):
+        client_socket.sendall(header[sent:])
+        sent = len(header)
+    client_socket.sendall(view[sent - len(header):])
+    UDS_BYTES.inc(amount=len(header) + len(body))
+
+def parse_series(body):
+    """Map each sample line's `name{labels}` to its value, skipping comments"""
+    series = {}
+    for line in body.split(b'\n'):
+        if line and not line.startswith(b'#'):
+            key, _, value = line.rpartition(b' ')
+            series[key] = value
+    return series
+
+def build_delta(previous, current):
+    """Series lines that are new or changed, plus `# removed` markers for dropped ones"""
+    lines = [key + b' ' + value for key, value in current.items() if previous.get(key) != value]
+    lines.extend(b'# removed ' + key for key in previous if key not in current)
+    return b'\n'.join(lines) + b'\n' if lines else b''
+
+def chunk(frame):
+    return f"{len(frame):x}\r\n".encode('ascii') + frame + b"\r\n"
+
+def full_frame(snapshot):
+    return chunk(f"# dcgm-snapshot full {snapshot.etag}\n".encode('ascii') + snapshot.body)
+
+class Subscriber:
+    __slots__ = ('sock', 'delta', 'base', 'lock', 'backlog', 'stalled_since')
 
-# Import requests only if UDS is enabled
-if ENABLE_UDS:
+    def __init__(self, sock, delta, base):
+        self.sock = sock
+        self.delta = delta
+        self.base = base
+        # Held while writing so the initial frame and pushed frames never interleave
+        self.lock = threading.Lock()
+        # Frames (the first possibly part-sent) the socket could not take yet
+        self.backlog = collections.deque()
+        self.stalled_since = None
+
+    def write(self, frame):
+        self.backlog.append(memoryview(frame))
+        return self.flush()
+
+    def flush(self):
+        """Send as much of the backlog as the socket takes without blocking; returns the bytes sent"""
+        sent = 0
+        try:
+            while self.backlog:
+                count = self.sock.send(self.backlog[0])
+                sent += count
+                if count < len(self.backlog[0]):
+                    self.backlog[0] = self.backlog[0][count:]
+                    break
+                self.backlog.popleft()
+        except BlockingIOError:
+            pass
+        if sent or not self.backlog:
+            self.stalled_since = None if not self.backlog else time.monotonic()
+        elif self.stalled_since is None:
+            self.stalled_since = time.monotonic()
+        return sent
+
+    def stalled(self):
+        """Frames are waiting and the client has taken nothing for UDS_WRITE_TIMEOUT"""
+        return self.stalled_since is not None and time.monotonic() - self.stalled_since > UDS_WRITE_TIMEOUT
+
+class SnapshotBroadcaster:
+    """Push every new snapshot to subscribed UDS clients from a single thread.
+
+    Subscribers hold one connection open and receive a chunked HTTP stream:
+    a full frame first, then one frame per published snapshot. Delta
+    subscribers get only new/changed series (and `# removed` markers) when
+    they are known to hold the previous snapshot, and a full frame otherwise.
+    Frames are built once per snapshot and shared by all subscribers, and
+    sent without blocking: what a socket cannot take is queued on its
+    subscriber and retried, so a slow client never delays the others. A
+    subscriber more than UDS_SUBSCRIBER_BACKLOG frames behind, or that
+    takes nothing for UDS_WRITE_TIMEOUT, is dropped.
+    """
+
+    def __init__(self, max_subscribers=UDS_MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self.subscribers = []
+        self.cond = threading.Condition()
+        self.pending = None
+        self.current = None
+        self.current_series = {}
+        self.thread = threading.Thread(target=self._run, daemon=True, name='uds-broadcast')
+        self.thread.start()
+
+    def publish(self, snapshot):
+        """Called by the exporter after each refresh; unchanged payloads are not pushed"""
+        with self.cond:
+            latest = self.pending or self.current
+            if latest is not None and latest.etag == snapshot.etag:
+                return
+            self.pending = snapshot
+            self.cond.notify()
+
+    def subscribe(self, client_socket, snapshot, delta=False):
+        subscriber = Subscriber(client_socket, delta, snapshot)
+        with subscriber.lock:
+            # Register before sending so no snapshot published meanwhile is missed
+            with self.cond:
+                if len(self.subscribers) >= self.max_subscribers:
+                    return False
+                self.subscribers.append(subscriber)
+                UDS_SUBSCRIBERS.set(len(self.subscribers))
+            try:
+                client_socket.settimeout(UDS_WRITE_TIMEOUT)
+                response = (f"HTTP/1.1 200 OK\r\n"
+                            f"Content-Type: {CONTENT_TYPE}\r\n"
+                            f"Transfer-Encoding: chunked\r\n"
+                            f"X-DCGM-Stream: {'delta' if delta else 'full'}\r\n"
+                            f"\r\n").encode('ascii') + full_frame(snapshot)
+                client_socket.sendall(response)
+                UDS_BYTES.inc(amount=len(response))
+                # From here on only the broadcaster writes, and it must never wait on one client
+                client_socket.setblocking(False)
+            except OSError:
+                with self.cond:
+                    self.subscribers.remove(subscriber)
+                    UDS_SUBSCRIBERS.set(len(self.subscribers))
+                raise
+        return True
+
+    def _drop(self, subscriber):
+        with self.cond:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+                UDS_SUBSCRIBERS.set(len(self.subscribers))
+        try:
+            subscriber.sock.close()
+        except OSError:
+            pass
+
+    def _run(self):
+        while True:
+            with self.cond:
+                behind = [subscriber for subscriber in self.subscribers if subscriber.backlog]
+                if self.pending is None:
+                    self.cond.wait(BACKLOG_RETRY_INTERVAL if behind else None)
+                snapshot, self.pending = self.pending, None
+                subscribers = list(self.subscribers)
+            for subscriber in behind:
+                with subscriber.lock:
+                    self._send(subscriber)
+            if snapshot is not None:
+                self._push(snapshot, subscribers)
+
+    def _send(self, subscriber, frame=None):
+        """Queue `frame` (if any) and send what the socket takes; drops the subscriber if it is too far behind"""
+        try:
+            if frame is not None:
+                if len(subscriber.backlog) >= UDS_SUBSCRIBER_BACKLOG:
+                    raise BlockingIOError("subscriber backlog full")
+                sent = subscriber.write(frame)
+            else:
+                sent = subscriber.flush()
+            if subscriber.stalled():
+                raise BlockingIOError("subscriber stalled")
+        except OSError:
+            self._drop(subscriber)
+            return False
+        UDS_BYTES.inc(amount=sent)
+        return True
+
+    def _push(self, snapshot, subscribers):
+        series = parse_series(snapshot.body)
+        full = full_frame(snapshot)
+        delta = None
+        if self.current is not None:
+            delta = chunk(f"# dcgm-snapshot delta {snapshot.etag}\n".encode('ascii') +
+                          build_delta(self.current_series, series))
+        for subscriber in subscribers:
+            with subscriber.lock:
+                if subscriber.base.etag == snapshot.etag:
+                    # Subscribed after this snapshot was published; it already has it
+                    subscriber.base = snapshot
+                    continue
+                use_delta = subscriber.delta and delta is not None and subscriber.base is self.current
+                # Frames go out in order, so a queued frame counts as delivered for the next delta
+                if self._send(subscriber, delta if use_delta else full):
+                    subscriber.base = snapshot
+        self.current, self.current_series = snapshot, series
+
+def handle_snapshot_client(client_socket, get_snapshot, broadcaster=None):
+    """Answer one UDS client from the exporter's in-memory snapshot"""
+    keep_open = False
     try:
-        import requests
-    except ImportError:
-        print("ERROR: requests module not found. Install with: pip3 install requests", file=sys.stderr)
-        sys.exit(1)
+        request_line, headers = read_request(client_socket)
+        if not request_line:
+            # Connected and closed without a request (e.g. a health probe); nothing to answer
+            return
+        request_line = request_line.split()
+        path = request_line[1] if len(request_line) > 1 else '/metrics'
+        if broadcaster is not None and path.split('?')[0] == SUBSCRIBE_PATH:
+            delta = 'mode=delta' in path.partition('?')[2].split('&')
+            keep_open = broadcaster.subscribe(client_socket, get_snapshot(), delta)
+            if not keep_open:
+                UDS_CONNECTIONS.inc(('rejected',))
+                client_socket.sendall(REJECT_RESPONSE)
+            else:
+                UDS_CONNECTIONS.inc(('subscribe',))
+            return
+        client_socket.settimeout(UDS_WRITE_TIMEOUT)
+        payload = get_snapshot().negotiate(headers.get('accept', ''))
+        send_snapshot(client_socket, payload.body, payload.content_type)
+        UDS_CONNECTIONS.inc(('snapshot',))
+        try:
+            client_socket.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+    except Exception as e:
+        keep_open = False
+        UDS_CONNECTIONS.inc(('error',))
+        error_msg = f"HTTP/1.1 500 Internal Server Error\r\nConnection: close\r\n\r\nError: {str(e)}\r\n"
+        try:
+            client_socket.sendall(error_msg.encode('utf-8'))
+        except OSError:
+            pass
+    finally:
+        if not keep_open:
+            try:
+                client_socket.close()
+            except OSError:
+                pass
 
 def handle_client(client_socket):
-    """Handle a single UDS client connection"""
+    """Handle a single UDS client connection by proxying the HTTP endpoint"""
     import requests
-    
+
     try:
+        # Drain the request so closing the socket doesn't reset the client
+        request_line, headers = read_request(client_socket)
+        if not request_line:
+            return
+        accept = {'Accept': headers['accept']} if 'accept' in headers else {}
+
         # Fetch metrics from HTTP endpoint with retry logic
         max_retries = 10
         retry_delay = 0.5
-        
+
         for attempt in range(max_retries):
             try:
-                response = requests.get(METRICS_URL, timeout=5)
+                response = requests.get(METRICS_URL, headers=accept, timeout=5)
                 break  # Success
             except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
                 if attempt < max_retries - 1:
@@ -46,24 +344,24 @@ def handle_client(client_socket):
                     retry_delay = min(retry_delay * 1.5, 5.0)
                 else:
                     raise
-        
-        # Send HTTP-style response
+
+        # Send HTTP-style response; the body may be protobuf, so relay its bytes
         http_response = (
             f"HTTP/1.1 {response.status_code} OK\r\n"
-            f"Content-Type: text/plain; version=0.0.4\r\n"
-            f"Content-Length: {len(response.text)}\r\n"
+            f"Content-Type: {response.headers.get('Content-Type', CONTENT_TYPE)}\r\n"
+            f"Content-Length: {len(response.content)}\r\n"
             f"\r\n"
-            f"{response.text}"
-        )
-        
-        client_socket.sendall(http_response.encode('utf-8'))
-        
+        ).encode('utf-8')
+
+        client_socket.settimeout(UDS_WRITE_TIMEOUT)
+        client_socket.sendall(http_response + response.content)
+
         # Shutdown write side to signal EOF
         try:
             client_socket.shutdown(socket.SHUT_WR)
         except:
             pass
-            
+
     except Exception as e:
         error_msg = f"HTTP/1.1 500 Internal Server Error\r\n\r\nError: {str(e)}\r\n"
         try:
@@ -77,61 +375,197 @@ def handle_client(client_socket):
         except:
             pass
 
-def start_uds_server():
-    """Start UDS server listening for connections"""
-    # Remove old socket if exists
-    if os.path.exists(UDS_PATH):
+class UDSServer:
+    """UDS listener with a fixed worker pool and a bounded accept queue.
+
+    At most `max_clients` connections are served at once and `max_queued`
+    more wait for a worker. Connections beyond that are answered with a
+    non-blocking 503 straight from the accept loop, counted in `rejected`
+    and handed to one thread that drains and closes them, so a burst of
+    local consumers cannot exhaust threads or memory, nor stall accepts
+    behind clients that never send or read.
+    """
+
+    def __init__(self, uds_path, handler, handler_args=(), max_clients=UDS_MAX_CLIENTS,
+                 max_queued=UDS_MAX_QUEUED, backlog=UDS_LISTEN_BACKLOG):
+        self.uds_path = uds_path
+        self.handler = handler
+        self.handler_args = handler_args
+        self.max_clients = max_clients
+        self.backlog = backlog
+        self.pending = queue.Queue(maxsize=max_queued)
+        self.rejects = queue.Queue(maxsize=max_queued)
+        self.accepted = 0
+        self.rejected = 0
+        self.stopped = threading.Event()
+        self.sock = None
+
+    def bind(self):
+        # Remove old socket if exists
+        if os.path.exists(self.uds_path):
+            try:
+                os.unlink(self.uds_path)
+            except OSError as e:
+                print(f"Warning: Could not remove old socket: {e}", file=sys.stderr)
+
+        # Create directory if needed
+        socket_dir = os.path.dirname(self.uds_path)
+        if socket_dir and not os.path.exists(socket_dir):
+            os.makedirs(socket_dir, exist_ok=True)
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.uds_path)
+        self.sock.listen(self.backlog)
+        os.chmod(self.uds_path, 0o666)
+
+    def _worker(self):
+        while True:
+            client = self.pending.get()
+            if client is None:
+                return
+            self.handler(client, *self.handler_args)
+
+    def _reject(self, client):
+        self.rejected += 1
+        UDS_CONNECTIONS.inc(('rejected',))
         try:
-            os.unlink(UDS_PATH)
-        except OSError as e:
-            print(f"Warning: Could not remove old socket: {e}", file=sys.stderr)
-    
-    # Create directory if needed
-    socket_dir = os.path.dirname(UDS_PATH)
-    if socket_dir and not os.path.exists(socket_dir):
-        os.makedirs(socket_dir, exist_ok=True)
-    
-    # Create Unix domain socket
-    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    
-    try:
-        server.bind(UDS_PATH)
-        server.listen(10)
-        os.chmod(UDS_PATH, 0o666)
-        
-        print(f"UDS server listening on {UDS_PATH}", flush=True)
-        
-        # Accept connections forever
+            # This runs on the accept loop, so never wait on the client: the 503 fits an empty
+            # socket buffer, and one that cannot take it just sees the close
+            client.setblocking(False)
+            client.send(REJECT_RESPONSE)
+            client.shutdown(socket.SHUT_WR)
+            self.rejects.put_nowait(client)
+        except (OSError, queue.Full):
+            client.close()
+
+    def _linger(self):
+        """Drain rejected clients' requests until they close or REJECT_LINGER passes.
+
+        Closing right after the 503 would fail a client that is still
+        writing its request before it reads the answer. One thread waits on
+        all of them at once, so a client that never sends or closes delays
+        nobody.
+        """
+        selector = selectors.DefaultSelector()
+        deadlines = {}
+
+        def close(client):
+            selector.unregister(client)
+            del deadlines[client]
+            client.close()
+
         while True:
-            try:
-                client, _ = server.accept()
-                thread = threading.Thread(target=handle_client, args=(client,), daemon=True)
-                thread.start()
-            except KeyboardInterrupt:
-                break
-            except Exception as e:
-                print(f"Error accepting connection: {e}", file=sys.stderr)
-                time.sleep(0.1)
-                
-    finally:
+            # Block while nothing lingers; otherwise pick up new rejects between selects
+            clients = [] if deadlines else [self.rejects.get()]
+            while True:
+                try:
+                    clients.append(self.rejects.get_nowait())
+                except queue.Empty:
+                    break
+            for client in clients:
+                if client is None:
+                    for lingering in list(deadlines):
+                        close(lingering)
+                    return
+                selector.register(client, selectors.EVENT_READ)
+                deadlines[client] = time.monotonic() + REJECT_LINGER
+            for key, _ in selector.select(timeout=0.005):
+                try:
+                    if key.fileobj.recv(MAX_REQUEST_HEAD):
+                        continue
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    pass
+                close(key.fileobj)
+            now = time.monotonic()
+            for client in [client for client, deadline in deadlines.items() if deadline <= now]:
+                close(client)
+
+    def serve_forever(self, ready=None):
+        if self.sock is None:
+            self.bind()
+        workers = [threading.Thread(target=self._worker, daemon=True, name=f'uds-{i}')
+                   for i in range(self.max_clients)]
+        for worker in workers:
+            worker.start()
+        threading.Thread(target=self._linger, daemon=True, name='uds-reject').start()
+        print(f"UDS server listening on {self.uds_path} "
+              f"(workers: {self.max_clients}, queue: {self.pending.maxsize})", flush=True)
+        if ready is not None:
+            ready.set()
+
         try:
-            server.close()
-        except:
+            while not self.stopped.is_set():
+                try:
+                    client, _ = self.sock.accept()
+                except OSError as e:
+                    if self.stopped.is_set():
+                        break
+                    print(f"Error accepting connection: {e}", file=sys.stderr)
+                    time.sleep(0.1)
+                    continue
+                self.accepted += 1
+                try:
+                    self.pending.put_nowait(client)
+                except queue.Full:
+                    self._reject(client)
+        finally:
+            for _ in workers:
+                self.pending.put(None)
+            self.rejects.put(None)
+            self.close()
+
+    def shutdown(self):
+        self.stopped.set()
+        try:
+            # Wake up accept() so the loop notices the stop flag
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
             pass
+
+    def close(self):
         try:
-            if os.path.exists(UDS_PATH):
-                os.unlink(UDS_PATH)
-        except:
+            self.sock.close()
+        except OSError:
+            pass
+        try:
+            if os.path.exists(self.uds_path):
+                os.unlink(self.uds_path)
+        except OSError:
             pass
 
+def start_uds_server(get_snapshot=None, uds_path=None, ready=None, broadcaster=None):
+    """Start UDS server listening for connections.
+
+    With `get_snapshot` (a callable returning the exporter's current
+    MetricsSnapshot) clients are served in-process from memory, and
+    `broadcaster` enables push subscriptions on /subscribe; without it
+    every client is proxied to the HTTP endpoint.
+    """
+    if get_snapshot is not None:
+        server = UDSServer(uds_path or UDS_PATH, handle_snapshot_client, (get_snapshot, broadcaster))
+    else:
+        server = UDSServer(uds_path or UDS_PATH, handle_client)
+    try:
+        server.serve_forever(ready)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return server
+
 def main():
     if not ENABLE_UDS:
         return
-    
-    print(f"Starting DCGM UDS server...", flush=True)
+
+    try:
+        import requests  # noqa: F401
+    except ImportError:
+        print("ERROR: requests module not found. Install with: pip3 install requests", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Starting DCGM UDS proxy server...", flush=True)
     print(f"Socket: {UDS_PATH}", flush=True)
-    
+
     try:
         start_uds_server()
     except KeyboardInterrupt:
@@ -6,40 +6,52 @@ echo "DCGM OTel Exporter Container"
 echo "=========================================="
 echo ""
 
+# The simulate backend drives the metric profiles inside the exporter:
+# no hostengine, fake GPUs or dcgmi, so skip straight to the exporter
+if [ "${COLLECTOR_BACKEND:-auto}" = "simulate" ]; then
+    echo "✓ COLLECTOR_BACKEND=simulate: skipping DCGM initialization"
+    echo ""
+    echo "=========================================="
+    echo "Starting Exporter"
+    echo "=========================================="
+    exec /root/Workspace/DCGM/_out/Linux-amd64-debug/dcgm_exporter.py
+fi
+
 # Create fake GPUs using dcgm_fake_manager.py
 # This will start nv-hostengine and create the fake GPUs
 echo "Initializing DCGM with fake GPUs..."
+READY_FILE="${DCGM_READY_FILE:-/tmp/dcgm-fake-ready.json}"
+rm -f "$READY_FILE"
 python3 /root/Workspace/DCGM/_out/Linux-amd64-debug/dcgm_fake_manager.py start &
 MANAGER_PID=$!
 
-# Wait for initialization
-sleep 15
-
-# Check if manager is still running
-if ! kill -0 $MANAGER_PID 2>/dev/null; then
-    echo ""
-    echo "✗ Failed to initialize DCGM fake GPUs"
-    echo "Check logs above for details"
-    exit 1
-fi
+# Wait for initialization: the manager writes the ready file once the
+# hostengines are up, the GPUs exist and the first cycle is injected
+DEADLINE=$((SECONDS + ${STARTUP_TIMEOUT:-30} + 30))
+until [ -f "$READY_FILE" ]; do
+    # Check if manager is still running
+    if ! kill -0 $MANAGER_PID 2>/dev/null; then
+        echo ""
+        echo "✗ Failed to initialize DCGM fake GPUs"
+        echo "Check logs above for details"
+        exit 1
+    fi
+    if [ $SECONDS -ge $DEADLINE ]; then
+        echo ""
+        echo "✗ Timed out waiting for DCGM fake GPUs ($READY_FILE never appeared)"
+        exit 1
+    fi
+    sleep 0.05
+done
 
 echo ""
 echo "✓ DCGM fake GPUs created successfully"
 echo "✓ Metric updater running in background (PID: $MANAGER_PID)"
-echo ""
-echo "Waiting for metrics to be fully available..."
-sleep 5
 
-# Start UDS server if enabled
+# The UDS server runs inside the exporter process when enabled
 if [ "${ENABLE_UDS:-false}" = "true" ]; then
     echo ""
-    echo "=========================================="
-    echo "Starting UDS Server"
-    echo "=========================================="
-    python3 /root/Workspace/DCGM/_out/Linux-amd64-debug/dcgm_uds_server.py &
-    UDS_PID=$!
-    echo "✓ UDS server started (PID: $UDS_PID)"
-    sleep 2
+    echo "✓ UDS enabled: exporter will serve metrics on ${UDS_SOCKET_PATH:-/var/run/dcgm/metrics.sock}"
 fi
 
 echo ""
@@ -0,0 +1,187 @@
+"""Helpers shared by the tests: a minimal protobuf decoder, a stand-in HTTP push receiver and stub DCGM bindings"""
+
+import os
+import struct
+import sys
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import dcgm_field_registry as registry  # noqa: E402
+
+
+def read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def decode_message(data):
+    """Minimal protobuf wire decoder: {field number: [values]} (bytes for length-delimited)"""
+    fields, pos = {}, 0
+    while pos < len(data):
+        key, pos = read_varint(data, pos)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = read_varint(data, pos)
+        elif wire_type == 1:
+            value, pos = struct.unpack('<d', data[pos:pos + 8])[0], pos + 8
+        elif wire_type == 2:
+            length, pos = read_varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        else:
+            raise ValueError(f"unexpected wire type {wire_type}")
+        fields.setdefault(number, []).append(value)
+    return fields
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.005)
+
+
+def gpu_metrics(gpus, offset=0.0):
+    """Collector-shaped {gpu_id: {field_id: value}} for every registry field, distinct per GPU and field"""
+    return {str(gpu): {field.field_id: float(gpu * 100 + idx) + offset for idx, field in enumerate(registry.FIELDS)}
+            for gpu in range(1, gpus + 1)}
+
+
+class ReceiverHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        receiver = self.server
+        time.sleep(receiver.delay)
+        with receiver.lock:
+            receiver.attempts += 1
+            status = receiver.statuses.pop(0) if receiver.statuses else receiver.ok_status
+            if status == receiver.ok_status:
+                receiver.headers.append(dict(self.headers))
+                receiver.clients.add(self.client_address)
+                receiver.record(self.headers, body)
+        self.send_response(status)
+        for name, value in receiver.reply_headers(status):
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(receiver.reply)))
+        self.end_headers()
+        self.wfile.write(receiver.reply)
+
+    def log_message(self, *args):
+        pass
+
+
+class Receiver(ThreadingHTTPServer):
+    """Stand-in push receiver on a free local port.
+
+    Answers each POST with the next of `statuses` (then `ok_status`) after
+    `delay` seconds, and hands accepted bodies to `record`, which each
+    protocol's subclass implements.
+    """
+    daemon_threads = True
+    ok_status = 200
+    reply = b''
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), ReceiverHandler)
+        self.lock = threading.Lock()
+        self.headers, self.clients, self.statuses = [], set(), []
+        self.attempts = 0
+        # Seconds each request takes to answer
+        self.delay = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def record(self, headers, body):
+        """Decode an accepted request body; called under the lock"""
+        raise NotImplementedError
+
+    def reply_headers(self, status):
+        return ()
+
+
+class FakeDcgm:
+    """Stub pydcgm and DCGM binding modules that record what they are asked to do.
+
+    Patch `modules` into sys.modules (e.g. with mock.patch.dict). Every
+    DcgmHandle opened lands in `connections`, every injected value in
+    `injected` as (struct id, gpu id, field id, value), and GetLatest()
+    serves `latest`: {gpu id: {field id: value}}. Setting `error` makes the
+    next connect or inject raise it.
+    """
+
+    def __init__(self, gpu_ids=(0, 1, 2), latest=None):
+        self.gpu_ids = list(gpu_ids)
+        self.latest = latest or {}
+        self.connections, self.injected = [], []
+        self.shutdowns = self.reads = 0
+        self.error = None
+        self.modules = self._modules()
+
+    def _raise(self):
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def _modules(self):
+        fake = self
+
+        class DcgmHandle:
+            def __init__(self, handle, host, mode):
+                fake._raise()
+                fake.connections.append(host)
+                self.handle = len(fake.connections)
+
+            def GetSystem(self):
+                return types.SimpleNamespace(discovery=types.SimpleNamespace(GetAllGpuIds=lambda: fake.gpu_ids),
+                                             GetGroupWithGpuIds=lambda name, gpu_ids: Group())
+
+            def Shutdown(self):
+                fake.shutdowns += 1
+
+        class Group:
+            def __init__(self):
+                self.samples = types.SimpleNamespace(WatchFields=lambda *args: None, GetLatest=self.get_latest)
+
+            def get_latest(self, field_group):
+                fake.reads += 1
+                return types.SimpleNamespace(values={
+                    gpu_id: {int(field_id): [types.SimpleNamespace(isBlank=False, value=value)]
+                             for field_id, value in fields.items()}
+                    for gpu_id, fields in fake.latest.items()})
+
+            def Delete(self):
+                pass
+
+        class InjectFieldValue:
+            def __init__(self):
+                self.value = types.SimpleNamespace()
+
+        def inject(handle, entity_group, gpu_id, field):
+            fake._raise()
+            value = field.value.dbl if hasattr(field.value, 'dbl') else field.value.i64
+            fake.injected.append((id(field), gpu_id, field.fieldId, value))
+
+        fields = {field.dcgm_name: int(field.field_id) for field in registry.FIELDS}
+        return {
+            'pydcgm': types.SimpleNamespace(DcgmHandle=DcgmHandle, DcgmFieldGroup=lambda *args: Group()),
+            'dcgm_structs': types.SimpleNamespace(DCGM_OPERATION_MODE_AUTO=1),
+            'dcgm_structs_internal': types.SimpleNamespace(c_dcgmInjectFieldValue_v1=InjectFieldValue,
+                                                           dcgmInjectFieldValue_version1=1),
+            'dcgm_agent': types.SimpleNamespace(dcgmGetAllDevices=lambda handle: fake.gpu_ids),
+            'dcgm_agent_internal': types.SimpleNamespace(dcgmInjectEntityFieldValue=inject),
+            'dcgm_fields': types.SimpleNamespace(DCGM_FE_GPU=1, DCGM_FT_INT64='i', DCGM_FT_DOUBLE='d', **fields),
+        }
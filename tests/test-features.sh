@@ -22,6 +22,15 @@ if ! docker info > /dev/null 2>&1; then
     exit 1
 fi
 
+# Poll /health instead of sleeping; the exporter only starts once the manager is ready
+wait_for_startup() {
+    for _ in $(seq 1 600); do
+        curl -sf http://localhost:9400/health > /dev/null 2>&1 && return 0
+        sleep 0.1
+    done
+    echo -e "${RED}✗ Exporter did not start within 60 seconds${NC}"
+}
+
 echo -e "${GREEN}✓ Docker is running${NC}"
 echo ""
 
@@ -32,8 +41,8 @@ docker run -d --name dcgm-test-static \
     -p 9400:9400 \
     dcgm-fake-gpu-exporter
 
-echo "Waiting for startup (20 seconds)..."
-sleep 20
+echo "Waiting for startup..."
+wait_for_startup
 
 echo "Checking metrics..."
 METRICS=$(curl -s http://localhost:9400/metrics | grep dcgm_gpu_temp || true)
@@ -56,8 +65,8 @@ docker run -d --name dcgm-test-spike \
     -e METRIC_PROFILE=spike \
     dcgm-fake-gpu-exporter
 
-echo "Waiting for startup (20 seconds)..."
-sleep 20
+echo "Waiting for startup..."
+wait_for_startup
 
 echo "Checking metrics..."
 METRICS=$(curl -s http://localhost:9400/metrics | grep dcgm_gpu_temp || true)
@@ -81,8 +90,8 @@ docker run -d --name dcgm-test-count \
     -e METRIC_PROFILE=stable \
     dcgm-fake-gpu-exporter
 
-echo "Waiting for startup (20 seconds)..."
-sleep 20
+echo "Waiting for startup..."
+wait_for_startup
 
 echo "Checking GPU count..."
 GPU_COUNT=$(curl -s http://localhost:9400/metrics | grep -c 'dcgm_gpu_temp{gpu="[1-8]"' || true)
@@ -105,8 +114,8 @@ docker run -d --name dcgm-test-mixed \
     -e GPU_PROFILES=stable,spike,faulty,degrading \
     dcgm-fake-gpu-exporter
 
-echo "Waiting for startup (20 seconds)..."
-sleep 20
+echo "Waiting for startup..."
+wait_for_startup
 
 echo "Checking metrics..."
 METRICS=$(curl -s http://localhost:9400/metrics | grep dcgm_gpu_temp || true)
@@ -130,8 +139,8 @@ docker run -d --name dcgm-test-interval \
     -e METRIC_PROFILE=wave \
     dcgm-fake-gpu-exporter
 
-echo "Waiting for startup (20 seconds)..."
-sleep 20
+echo "Waiting for startup..."
+wait_for_startup
 
 echo "Collecting metrics at T=0..."
 TEMP1=$(curl -s http://localhost:9400/metrics | grep 'dcgm_gpu_temp{gpu="1"' | awk '{print $2}')
@@ -162,7 +171,7 @@ for profile in "${PROFILES[@]}"; do
         -e METRIC_PROFILE=$profile \
         dcgm-fake-gpu-exporter > /dev/null 2>&1
     
-    sleep 20
+    wait_for_startup
     
     METRICS=$(curl -s http://localhost:9400/metrics | grep dcgm_gpu_temp || true)
     if [ -n "$METRICS" ]; then
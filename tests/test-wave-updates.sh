@@ -19,10 +19,11 @@ docker run -d \
   -e NUM_FAKE_GPUS=4 \
   -e METRIC_PROFILE=wave \
   -e METRIC_UPDATE_INTERVAL=10 \
+  -e METRIC_TIME_SCALE=3 \
   ghcr.io/saiakhil2012/dcgm-fake-gpu-exporter:latest
 
 echo "Waiting for container to start..."
-sleep 15
+until curl -sf http://localhost:$PORT/health > /dev/null 2>&1; do sleep 0.1; done
 
 echo ""
 echo "Collecting 5 samples (10 seconds apart)..."
@@ -0,0 +1,169 @@
+"""Tests for the simulated profile clock, src/dcgm_backfill.py and the manager's backfill action (no DCGM required)"""
+
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import dcgm_backfill  # noqa: E402
+import dcgm_fake_manager  # noqa: E402
+import dcgm_field_registry  # noqa: E402
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+OPENMETRICS_SAMPLE = re.compile(r'^([a-z0-9_]+)\{gpu="(\d+)",device="nvidia\d+"\} (\S+) (\d+\.\d{3})$')
+
+
+def wave_generator(step, time_offset=1.0, engine='scalar'):
+    profiles = dcgm_fake_manager.create_profiles(2, 'wave')
+    for profile in profiles.values():
+        profile.time_offset = time_offset
+    generator = dcgm_fake_manager.MetricGenerator(profiles, engine, dcgm_fake_manager.SimulatedClock(step))
+    if engine == 'numpy':
+        generator.generate([1, 2])
+        generator.batch_groups[1][0][0].time_offsets = {1: time_offset, 2: time_offset}
+        generator.clock.elapsed = 0.0
+    return generator
+
+
+def tick_at(generator, seconds):
+    """The tick generated once `seconds` of simulated time have passed"""
+    for _ in range(round(seconds / generator.clock.step) - 1):
+        generator.generate([1, 2])
+    return generator.generate([1, 2])
+
+
+class SimulatedClockTest(unittest.TestCase):
+    def test_wave_period_is_simulated_time_not_ticks(self):
+        # 5s and 30s updates land on the same point of the wave after the same simulated time
+        self.assertEqual(tick_at(wave_generator(5), 900), tick_at(wave_generator(30), 900))
+        self.assertNotEqual(tick_at(wave_generator(5), 150), tick_at(wave_generator(30), 900))
+
+    def test_degrading_plateau_follows_the_clock(self):
+        profiles = dcgm_fake_manager.create_profiles(1, 'degrading')
+        generator = dcgm_fake_manager.MetricGenerator(profiles, clock=dcgm_fake_manager.SimulatedClock(3600))
+        generator.generate([1])
+        self.assertEqual(profiles[1].elapsed(), 3600)
+        self.assertEqual(profiles[1].iteration, 1)
+        # Past the 50% plateau after one hour-long tick: clocks throttled to ~1250 MHz
+        self.assertLess(generator.generate([1])[1]['sm_clock'], 1310)
+
+    def test_profiles_without_a_clock_keep_the_default_interval(self):
+        profile = dcgm_fake_manager.WaveProfile()
+        profile.time_offset = 1.0
+        values = [profile.apply(1, {}) for _ in range(30)][-1]
+        self.assertEqual(profile.elapsed(), 30 * dcgm_fake_manager.PROFILE_TICK_SECONDS)
+        self.assertEqual(values, tick_at(wave_generator(30), 900)[1])
+
+    @unittest.skipIf(np is None, "numpy not installed")
+    def test_batched_profiles_share_the_clock(self):
+        self.assertEqual(tick_at(wave_generator(5, engine='numpy'), 900), tick_at(wave_generator(30), 900))
+
+    def test_manager_time_scale(self):
+        workdir = tempfile.mkdtemp(prefix='dcgm-backfill-')
+        try:
+            manager = dcgm_fake_manager.DCGMFakeManager(dcgm_dir=workdir, num_gpus=2, metric_profile='wave',
+                                                        update_interval=2, time_scale=15)
+            self.assertEqual(manager.clock.step, 30)
+            manager.generate_metrics([1, 2])
+            self.assertEqual(manager.profiles[2].elapsed(), 30)
+        finally:
+            shutil.rmtree(workdir)
+        with self.assertRaises(ValueError):
+            dcgm_fake_manager.SimulatedClock(0)
+
+
+class BackfillTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='dcgm-backfill-')
+        self.path = os.path.join(self.workdir, 'gpus.om')
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def read_families(self):
+        """{family: [(name, gpu, value, timestamp)]}, checking the file is well-formed OpenMetrics"""
+        with open(self.path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[-1], '# EOF')
+        families, family = {}, None
+        for line in lines[:-1]:
+            if line.startswith('# TYPE '):
+                family = line.split()[2]
+                self.assertNotIn(family, families, "families must not be interleaved")
+                families[family] = []
+            elif not line.startswith('#'):
+                name, gpu, value, timestamp = OPENMETRICS_SAMPLE.match(line).groups()
+                self.assertTrue(name == family or name == family + '_total', line)
+                families[family].append((name, gpu, float(value), float(timestamp)))
+        return families
+
+    def test_simulated_hours_as_openmetrics(self):
+        fields = dcgm_field_registry.select_fields('thermal,power')
+        ticks = dcgm_fake_manager.simulate(3, 2 * 3600, 'degrading', update_interval=60, start=1_700_000_000,
+                                           gpu_start_index=5, fields=fields)
+        samples = dcgm_backfill.write_backfill(self.path, ticks, fields)
+        self.assertEqual(samples, 120 * 3 * len(fields))
+        families = self.read_families()
+        self.assertEqual(set(families), {dcgm_field_registry.openmetrics_family(field) for field in fields})
+        temps = [sample for sample in families['dcgm_gpu_temp'] if sample[1] == '7']
+        self.assertEqual([timestamp for *_, timestamp in temps],
+                         [1_700_000_000 + 60.0 * tick for tick in range(1, 121)])
+        # Two simulated hours degrade the GPU: hotter at the end than at the start
+        self.assertGreater(sum(v for _, _, v, _ in temps[-10:]), sum(v for _, _, v, _ in temps[:10]) + 100)
+        energy = [value for _, gpu, value, _ in families['dcgm_total_energy_consumption_millijoules'] if gpu == '5']
+        self.assertEqual(energy, sorted(energy))
+        self.assertEqual(os.listdir(self.workdir), ['gpus.om'])
+
+    def test_backfill_command_runs_hours_in_seconds(self):
+        argv = ['dcgm_fake_manager.py', 'backfill', '-n', '4', '-p', 'wave', '--hours', '24', '-o', self.path]
+        start = time.perf_counter()
+        with mock.patch.object(sys, 'argv', argv), mock.patch('builtins.print'):
+            dcgm_fake_manager.main()
+        elapsed = time.perf_counter() - start
+        families = self.read_families()
+        temps = [sample for sample in families['dcgm_gpu_temp'] if sample[1] == '1']
+        self.assertEqual(len(temps), 24 * 3600 // 30)
+        self.assertLess(abs(temps[-1][3] - time.time()), 60)
+        # 48 wave periods in 24h: the full 45-80C swing shows up
+        self.assertEqual(min(v for _, _, v, _ in temps), 45)
+        self.assertGreaterEqual(max(v for _, _, v, _ in temps), 79)
+        self.assertLess(elapsed, 20, f"{elapsed:.1f}s for 24 simulated hours of 4 GPUs")
+
+    def run_backfill(self, *options):
+        argv = ['dcgm_fake_manager.py', 'backfill', '-n', '2', '--hours', '0.1', '-o', self.path, *options]
+        with mock.patch.object(sys, 'argv', argv), mock.patch('builtins.print'):
+            dcgm_fake_manager.main()
+
+    def test_backfill_command_replays_a_trace(self):
+        trace = os.path.join(self.workdir, 'node7.dmon')
+        with open(trace, 'w') as f:
+            f.write("#Entity TMPTR POWER GPUTL MCUTL SMCLK MMCLK FBUSD\n")
+            f.writelines(f"GPU 0 61 100.0 50 10 1410 877 1024\nGPU 1 72 250.0 99 40 1410 877 2048\n"
+                         for _ in range(5))
+        self.addCleanup(dcgm_fake_manager.TraceProfile.readers.clear)
+        self.run_backfill('--trace', trace)
+        temps = {}
+        for _, gpu, value, _ in self.read_families()['dcgm_gpu_temp']:
+            temps.setdefault(gpu, set()).add(value)
+        self.assertEqual(temps, {'1': {61}, '2': {72}})
+
+    def test_backfill_command_fails_on_a_missing_source(self):
+        self.addCleanup(dcgm_fake_manager.TraceProfile.readers.clear)
+        self.addCleanup(dcgm_fake_manager.ReplayProfile.readers.clear)
+        for option in ('--trace', '--replay'):
+            with self.subTest(option=option), self.assertRaises(SystemExit) as raised:
+                self.run_backfill(option, os.path.join(self.workdir, 'missing'))
+            self.assertEqual(raised.exception.code, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
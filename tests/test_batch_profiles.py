@@ -0,0 +1,146 @@
+"""Equivalence tests for src/dcgm_batch_profiles.py against the scalar profiles"""
+
+import math
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import dcgm_fake_manager  # noqa: E402
+
+try:
+    import numpy as np
+    import dcgm_batch_profiles
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+NUM_GPUS = 16
+CYCLES = 600
+
+
+def run_scalar(profile_name, cycles=CYCLES, seed=1234):
+    """One scalar profile instance per GPU, ticked like the manager does"""
+    random.seed(seed)
+    profiles = {gpu_id: dcgm_fake_manager.ProfileFactory.create(profile_name)
+                for gpu_id in range(1, NUM_GPUS + 1)}
+    samples = {gpu_id: [] for gpu_id in profiles}
+    for _ in range(cycles):
+        for gpu_id, profile in profiles.items():
+            samples[gpu_id].append(profile.apply(gpu_id, {}))
+    return profiles, samples
+
+
+def run_batched(profile_name, cycles=CYCLES, seed=1234):
+    profile = dcgm_batch_profiles.create_batch_profile(profile_name, seed=seed)
+    gpu_ids = np.arange(1, NUM_GPUS + 1)
+    return profile, np.stack([profile.apply_batch(gpu_ids) for _ in range(cycles)])
+
+
+def mean_std(values):
+    mean = sum(values) / len(values)
+    return mean, math.sqrt(sum((v - mean) ** 2 for v in values) / len(values))
+
+
+def ks_statistic(a, b):
+    """Two-sample Kolmogorov-Smirnov distance between the empirical CDFs"""
+    a, b = sorted(a), sorted(b)
+    i = j = 0
+    distance = 0.0
+    while i < len(a) and j < len(b):
+        value = min(a[i], b[j])
+        while i < len(a) and a[i] == value:
+            i += 1
+        while j < len(b) and b[j] == value:
+            j += 1
+        distance = max(distance, abs(i / len(a) - j / len(b)))
+    return distance
+
+
+@unittest.skipIf(np is None, "numpy not installed")
+class BatchProfileShapeTest(unittest.TestCase):
+    def test_structured_array_has_one_column_per_metric(self):
+        gpu_ids = np.arange(1, 1025)
+        for name in dcgm_fake_manager.ProfileFactory.list_profiles():
+            rows = dcgm_batch_profiles.create_batch_profile(name, seed=0).apply_batch(gpu_ids)
+            self.assertEqual(rows.shape, (1024,))
+            self.assertEqual(rows.dtype.names, dcgm_batch_profiles.METRIC_COLUMNS)
+
+    def test_every_scalar_profile_has_a_batched_counterpart(self):
+        # replay and trace stream recorded values instead of generating them; the numpy engine runs them per GPU
+        self.assertEqual(set(dcgm_batch_profiles.BATCH_PROFILES),
+                         set(dcgm_fake_manager.ProfileFactory.PROFILES) - {'replay', 'trace'})
+        self.assertEqual(dcgm_batch_profiles.METRIC_COLUMNS, dcgm_fake_manager.RECORDED_METRICS)
+        self.assertEqual(dcgm_batch_profiles.PROFILE_TICK_SECONDS, dcgm_fake_manager.PROFILE_TICK_SECONDS)
+
+    def test_rows_to_dicts_matches_scalar_shape(self):
+        gpu_ids = np.array([1, 2, 3])
+        rows = dcgm_batch_profiles.create_batch_profile('chaos', seed=0).apply_batch(gpu_ids)
+        values = dcgm_batch_profiles.rows_to_dicts(gpu_ids, rows)
+        self.assertEqual(sorted(values), [1, 2, 3])
+        self.assertEqual(set(values[1]), set(dcgm_fake_manager.ChaosProfile().apply(1, {})))
+        self.assertIsInstance(values[1]['temp'], int)
+
+    def test_same_seed_is_reproducible(self):
+        first = run_batched('faulty', cycles=20, seed=7)[1]
+        second = run_batched('faulty', cycles=20, seed=7)[1]
+        self.assertTrue(np.array_equal(first, second))
+
+
+@unittest.skipIf(np is None, "numpy not installed")
+class BatchScalarEquivalenceTest(unittest.TestCase):
+    def assert_same_distribution(self, profile_name, sigmas=6.0, max_ks=0.16):
+        """Per GPU and metric: means within `sigmas` standard errors, CDFs within `max_ks`"""
+        _, scalar = run_scalar(profile_name)
+        _, batched = run_batched(profile_name)
+        for gpu_id in range(1, NUM_GPUS + 1):
+            for column in dcgm_batch_profiles.METRIC_COLUMNS:
+                s_values = [sample[column] for sample in scalar[gpu_id]]
+                b_values = batched[:, gpu_id - 1][column].tolist()
+                s_mean, s_std = mean_std(s_values)
+                b_mean, b_std = mean_std(b_values)
+                stderr = math.sqrt((s_std ** 2 + b_std ** 2) / CYCLES)
+                label = f"{profile_name} gpu={gpu_id} {column}"
+                self.assertLessEqual(abs(s_mean - b_mean), sigmas * stderr + 0.5, label)
+                self.assertLessEqual(ks_statistic(s_values, b_values), max_ks, label)
+
+    def test_static(self):
+        self.assert_same_distribution('static')
+
+    def test_stable(self):
+        self.assert_same_distribution('stable')
+
+    def test_spike(self):
+        self.assert_same_distribution('spike')
+
+    def test_degrading(self):
+        self.assert_same_distribution('degrading')
+
+    def test_faulty(self):
+        # Fault episodes span several ticks, so samples are autocorrelated
+        self.assert_same_distribution('faulty', sigmas=12.0, max_ks=0.3)
+
+    def test_chaos(self):
+        self.assert_same_distribution('chaos')
+
+    def test_wave_matches_exactly_with_same_phase_offsets(self):
+        profiles, scalar = run_scalar('wave', cycles=120)
+        batch = dcgm_batch_profiles.create_batch_profile('wave')
+        batch.time_offsets = {gpu_id: profile.time_offset for gpu_id, profile in profiles.items()}
+        gpu_ids = np.arange(1, NUM_GPUS + 1)
+        for cycle in range(120):
+            rows = dcgm_batch_profiles.rows_to_dicts(gpu_ids, batch.apply_batch(gpu_ids))
+            for gpu_id in range(1, NUM_GPUS + 1):
+                self.assertEqual(rows[gpu_id], scalar[gpu_id][cycle], f"cycle={cycle} gpu={gpu_id}")
+
+    def test_degrading_trend_per_cycle(self):
+        _, scalar = run_scalar('degrading')
+        _, batched = run_batched('degrading')
+        for cycle in (0, 99, 599):
+            s_temp = sum(scalar[gpu_id][cycle]['temp'] for gpu_id in scalar) / NUM_GPUS
+            b_temp = float(batched[cycle]['temp'].mean())
+            self.assertLess(abs(s_temp - b_temp), 2.0, f"cycle={cycle}")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+"""Tests for the header-driven dcgmi dmon parser in src/dcgm_exporter.py"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import dcgm_exporter  # noqa: E402
+
+SAMPLE = """\
+#Entity   TMPTR  POWER    GPUTL  MCUTL  SMCLK  MMCLK  FBFRE  FBUSD  FBRSV
+ID        C      W        %      %      MHZ    MHZ    MB     MB     MB
+GPU 0     N/A    N/A      N/A    N/A    N/A    N/A    N/A    N/A    N/A
+GPU 1     55     180.250  50     45     1400   877    16384  6144   10240
+GPU 2     58     195.000  55     48     1410   870    16384  6656   9728
+"""
+
+SHORT_NAME_BY_FIELD = {field_id: name for name, field_id in dcgm_exporter.DMON_SHORT_NAMES.items()}
+
+
+class DmonParserTest(unittest.TestCase):
+    def test_sample_output(self):
+        metrics = dcgm_exporter.parse_dcgmi_output(SAMPLE)
+        self.assertEqual(sorted(metrics), ['1', '2'])
+        self.assertEqual(metrics['1'], {'150': 55.0, '155': 180.25, '203': 50.0, '204': 45.0, '100': 1400.0,
+                                        '101': 877.0, '251': 16384.0, '252': 6144.0, '253': 10240.0})
+
+    def test_header_order_wins_over_requested_order(self):
+        output = ("#Entity   POWER  TMPTR\n"
+                  "ID        W      C\n"
+                  "GPU 1     200    60\n")
+        self.assertEqual(dcgm_exporter.parse_dcgmi_output(output, ['150', '155']),
+                         {'1': {'155': 200.0, '150': 60.0}})
+
+    def test_unknown_header_names_fall_back_to_position(self):
+        output = ("#Entity   XXXXX  TMPTR  YYYYY\n"
+                  "GPU 3     1      2      3\n")
+        self.assertEqual(dcgm_exporter.parse_dcgmi_output(output, ['900', '901', '902']),
+                         {'3': {'900': 1.0, '150': 2.0, '902': 3.0}})
+
+    def test_positional_without_header(self):
+        self.assertEqual(dcgm_exporter.parse_dcgmi_output("GPU 4  1  2\n", ['150', '155']),
+                         {'4': {'150': 1.0, '155': 2.0}})
+
+    def test_mixed_entities_and_na(self):
+        output = ("#Entity   TMPTR  POWER\n"
+                  "GPU 1     50     N/A\n"
+                  "GPU-I 0   70     100\n"
+                  "GPU_I 1   71     101\n"
+                  "GPU 2     N/A    150\n")
+        parser = dcgm_exporter.DmonParser(['150', '155'])
+        rows = [parser.parse_row(line) for line in output.splitlines()]
+        self.assertEqual(rows[2], ('GPU-I', '0', {'150': 70.0, '155': 100.0}))
+        self.assertEqual(dcgm_exporter.parse_dcgmi_output(output, ['150', '155']),
+                         {'1': {'150': 50.0}, '2': {'155': 150.0}})
+
+    def test_repeated_header_remaps_columns(self):
+        output = ("#Entity   TMPTR  POWER\n"
+                  "GPU 1     50     100\n"
+                  "#Entity   POWER  TMPTR\n"
+                  "GPU 1     110    51\n")
+        self.assertEqual(dcgm_exporter.parse_dcgmi_output(output, ['150', '155']),
+                         {'1': {'150': 51.0, '155': 110.0}})
+
+
+class DmonParserFuzzTest(unittest.TestCase):
+    """Seeded random dmon outputs: shuffled headers, N/A, foreign entities and junk lines"""
+    ITERATIONS = 300
+
+    def random_output(self, rng):
+        field_ids = list(SHORT_NAME_BY_FIELD)
+        rng.shuffle(field_ids)
+        field_ids = field_ids[:rng.randint(1, len(field_ids))]
+        # The header may list the columns in a different order than requested
+        columns = list(field_ids)
+        if rng.random() < 0.5:
+            rng.shuffle(columns)
+        lines = ['#Entity ' + ' '.join(SHORT_NAME_BY_FIELD[f] for f in columns),
+                 'ID      ' + ' '.join('X' for _ in columns)]
+        expected = {}
+        for _ in range(rng.randint(0, 20)):
+            kind = rng.random()
+            if kind < 0.1:
+                lines.append(rng.choice(['', 'Error: connection lost', '   ', 'GPU', '#', 'N/A N/A',
+                                         ''.join(chr(rng.randint(32, 126)) for _ in range(rng.randint(1, 40)))]))
+                continue
+            entity = 'GPU' if kind < 0.8 else rng.choice(['GPU-I', 'GPU_CI', 'SWITCH'])
+            entity_id = str(rng.randint(0, 1023))
+            values = []
+            row = {}
+            for field_id in columns:
+                if rng.random() < 0.15:
+                    values.append('N/A')
+                else:
+                    value = round(rng.uniform(-1e6, 1e6), rng.randint(0, 3))
+                    values.append(repr(value))
+                    row[field_id] = value
+            lines.append(f"{entity} {entity_id} " + (' ' * rng.randint(1, 4)).join(values))
+            if entity == 'GPU' and entity_id != '0':
+                expected.setdefault(entity_id, {}).update(row)
+        return field_ids, '\n'.join(lines) + '\n', expected
+
+    def test_random_outputs(self):
+        rng = random.Random(20240613)
+        for iteration in range(self.ITERATIONS):
+            field_ids, output, expected = self.random_output(rng)
+            with self.subTest(iteration=iteration):
+                self.assertEqual(dcgm_exporter.parse_dcgmi_output(output, field_ids), expected)
+
+    def test_arbitrary_bytes_never_raise(self):
+        rng = random.Random(7)
+        parser = dcgm_exporter.DmonParser()
+        alphabet = 'GPU-I_#Entity N/A0123456789.e+- \t'
+        for _ in range(2000):
+            line = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+            row = parser.parse_row(line)
+            if row is not None:
+                self.assertIn(row[0], dcgm_exporter.DMON_ENTITY_TYPES)
+
+
+if __name__ == '__main__':
+    unittest.main()
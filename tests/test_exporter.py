@@ -0,0 +1,565 @@
+"""Unit tests for src/dcgm_exporter.py (no DCGM required)"""
+
+import http.client
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import dcgm_exporter  # noqa: E402
+from common import FakeDcgm, wait_until  # noqa: E402
+
+
+class SlowCollector:
+    """Stands in for a dcgmi call that takes most of its timeout"""
+    name = 'slow'
+    requires_dcgmi = False
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = 0
+
+    def collect(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return {'1': {'150': 50.0 + self.calls}}
+
+    def close(self):
+        pass
+
+
+class FlakyCollector:
+    """Fails `failures` times in a row, then succeeds"""
+    name = 'flaky'
+    requires_dcgmi = False
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = []
+
+    def collect(self):
+        self.calls.append(time.monotonic())
+        if len(self.calls) <= self.failures:
+            raise RuntimeError("dcgmi dmon failed")
+        return {'1': {'150': 60.0}}
+
+    def close(self):
+        pass
+
+
+class FakeShardCollector:
+    """Per-shard collector reporting shard-local GPU ids 1..2 after a fixed delay"""
+    name = 'fake-shard'
+    requires_dcgmi = False
+    delay = 0.0
+
+    def __init__(self, host):
+        self.host = host
+        self.port = int(host.rsplit(':', 1)[1])
+
+    def collect(self):
+        time.sleep(self.delay)
+        if self.port == 9999:
+            raise RuntimeError("shard down")
+        return {'1': {'150': float(self.port)}, '2': {'150': float(self.port) + 0.5}}
+
+    def close(self):
+        pass
+
+
+class ExporterServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.saved_collector = dcgm_exporter.collector
+        self.saved_cache = dcgm_exporter.metrics_cache
+        self.saved_last_good = dcgm_exporter.last_good
+        self.server = dcgm_exporter.ExporterHTTPServer(('127.0.0.1', 0), dcgm_exporter.MetricsHandler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        dcgm_exporter.collector = self.saved_collector
+        dcgm_exporter.metrics_cache = self.saved_cache
+        dcgm_exporter.last_good = self.saved_last_good
+
+    def get(self, path, headers=None):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+        try:
+            conn.request('GET', path, headers=headers or {})
+            response = conn.getresponse()
+            return response, response.read()
+        finally:
+            conn.close()
+
+
+class SnapshotPublicationTest(ExporterServerTestCase):
+    def test_scrapes_do_not_wait_for_slow_collection(self):
+        dcgm_exporter.metrics_cache = dcgm_exporter.MetricsSnapshot(
+            dcgm_exporter.render_metrics({'1': {'150': 42.0}}))
+        dcgm_exporter.collector = SlowCollector(delay=1.0)
+        stop = threading.Event()
+        updater = threading.Thread(target=dcgm_exporter.update_metrics_cache, args=(stop,), daemon=True)
+        saved_interval = dcgm_exporter.METRICS_REFRESH_INTERVAL
+        dcgm_exporter.METRICS_REFRESH_INTERVAL = 0
+        updater.start()
+        try:
+            time.sleep(0.1)  # updater is now inside the slow collect()
+            latencies = []
+            for _ in range(20):
+                start = time.perf_counter()
+                response, body = self.get('/metrics')
+                latencies.append(time.perf_counter() - start)
+                self.assertEqual(response.status, 200)
+                self.assertIn(b'dcgm_gpu_temp{gpu="1"', body)
+            self.assertLess(max(latencies), 0.25,
+                            f"/metrics blocked behind collection: max {max(latencies):.3f}s")
+        finally:
+            stop.set()
+            dcgm_exporter.METRICS_REFRESH_INTERVAL = saved_interval
+            updater.join(timeout=5)
+
+    def test_refresh_publishes_new_snapshot(self):
+        dcgm_exporter.collector = SlowCollector(delay=0)
+        before = dcgm_exporter.metrics_cache
+        dcgm_exporter.refresh_metrics_cache()
+        self.assertIsNot(dcgm_exporter.metrics_cache, before)
+        self.assertIn(b'dcgm_gpu_temp{gpu="1",device="nvidia1"} 51.0', dcgm_exporter.metrics_cache.body)
+
+
+class LastGoodSnapshotTest(ExporterServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.saved_staleness = dcgm_exporter.METRICS_MAX_STALENESS
+        dcgm_exporter.last_good = None
+        self.published = []
+        dcgm_exporter.snapshot_listeners.append(self.published.append)
+
+    def tearDown(self):
+        dcgm_exporter.snapshot_listeners.remove(self.published.append)
+        dcgm_exporter.METRICS_MAX_STALENESS = self.saved_staleness
+        super().tearDown()
+
+    def refresh(self, collector):
+        dcgm_exporter.collector = collector
+        return dcgm_exporter.refresh_metrics_cache()
+
+    def test_failed_collection_keeps_last_good_series(self):
+        self.assertTrue(self.refresh(SlowCollector(delay=0)))
+        self.assertFalse(self.refresh(FlakyCollector(failures=1)))
+        response, body = self.get('/metrics')
+        self.assertEqual(response.status, 200)
+        self.assertTrue(body.startswith(b'# Error: dcgmi command failed\n# Serving the last good collection'))
+        self.assertIn(b'dcgm_gpu_temp{gpu="1",device="nvidia1"} 51.0', body)
+        self.assertIn(b'\ndcgm_exporter_up 0\n', body)
+        self.assertRegex(body.decode(), r'\ndcgm_exporter_cache_age_seconds 0\.\d+\n')
+        _, openmetrics = self.get('/metrics', {'Accept': 'application/openmetrics-text'})
+        self.assertIn(b'dcgm_gpu_temp{gpu="1",device="nvidia1"} 51.0', openmetrics)
+        self.assertNotIn(b'# Error', openmetrics)
+        # Listeners only get values from the refresh that collected them
+        self.assertEqual([snapshot.gpu_metrics is not None for snapshot in self.published], [True, False])
+        self.assertTrue(self.refresh(FlakyCollector(failures=0)))
+        self.assertIn(b'\ndcgm_exporter_up 1\n', dcgm_exporter.metrics_cache.body)
+
+    def test_series_are_dropped_after_max_staleness(self):
+        dcgm_exporter.METRICS_MAX_STALENESS = 0.05
+        self.refresh(SlowCollector(delay=0))
+        time.sleep(0.1)
+        self.refresh(FlakyCollector(failures=1))
+        body = dcgm_exporter.metrics_cache.body
+        self.assertTrue(body.startswith(b'# Error: dcgmi command failed\n'))
+        self.assertNotIn(b'dcgm_gpu_temp', body)
+        self.assertIn(b'\ndcgm_exporter_up 0\n', body)
+
+    def test_failing_listener_does_not_fail_the_collection(self):
+        def broken(snapshot):
+            raise RuntimeError("receiver exploded")
+        dcgm_exporter.snapshot_listeners.insert(0, broken)
+        self.addCleanup(dcgm_exporter.snapshot_listeners.remove, broken)
+        name = broken.__qualname__
+        errors = dcgm_exporter.LISTENER_ERRORS.values.get((name,), 0)
+        collection_errors = dict(dcgm_exporter.COLLECTION_ERRORS.values)
+        self.assertTrue(self.refresh(SlowCollector(delay=0)))
+        # Later listeners still run, and the failure is counted against the listener, not the collection
+        self.assertEqual(len(self.published), 1)
+        self.assertEqual(dcgm_exporter.LISTENER_ERRORS.values[(name,)], errors + 1)
+        self.assertEqual(dcgm_exporter.COLLECTION_ERRORS.values, collection_errors)
+
+    def test_no_collection_yet_serves_the_error(self):
+        self.refresh(FlakyCollector(failures=1))
+        self.assertNotIn(b'dcgm_gpu_temp', dcgm_exporter.metrics_cache.body)
+        self.assertTrue(dcgm_exporter.metrics_cache.body.startswith(b'# Error: dcgmi command failed\n'))
+
+    def test_failed_collections_are_retried_with_backoff(self):
+        collector = FlakyCollector(failures=3)
+        dcgm_exporter.collector = collector
+        saved = dcgm_exporter.METRICS_REFRESH_INTERVAL, dcgm_exporter.COLLECT_RETRY_BACKOFF
+        dcgm_exporter.METRICS_REFRESH_INTERVAL, dcgm_exporter.COLLECT_RETRY_BACKOFF = 30, 0.05
+        stop = threading.Event()
+        updater = threading.Thread(target=dcgm_exporter.update_metrics_cache, args=(stop,), daemon=True)
+        updater.start()
+        try:
+            deadline = time.monotonic() + 5
+            while len(collector.calls) < 4 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            stop.set()
+            updater.join(timeout=5)
+            dcgm_exporter.METRICS_REFRESH_INTERVAL, dcgm_exporter.COLLECT_RETRY_BACKOFF = saved
+        self.assertEqual(len(collector.calls), 4, "failed collections waited for the refresh interval")
+        gaps = [later - earlier for earlier, later in zip(collector.calls, collector.calls[1:])]
+        self.assertLess(gaps[0], gaps[1])
+        self.assertLess(gaps[1], gaps[2])
+        self.assertIn(b'dcgm_gpu_temp{gpu="1",device="nvidia1"} 60.0', dcgm_exporter.metrics_cache.body)
+
+
+def sorted_render(gpu_metrics):
+    """The exporter's original renderer: build every line, then sort them all"""
+    lines = []
+    for gpu_id, fields in gpu_metrics.items():
+        for field_id, value in fields.items():
+            if field_id in dcgm_exporter.FIELD_MAPPING:
+                name = dcgm_exporter.FIELD_MAPPING[field_id][0]
+                lines.append(f'{name}{{gpu="{gpu_id}",device="nvidia{gpu_id}"}} {value}\n')
+    return dcgm_exporter.EXPOSITION_HEADER + ''.join(sorted(lines))
+
+
+class WorkerPoolTest(unittest.TestCase):
+    def start(self, **kwargs):
+        server = dcgm_exporter.ExporterHTTPServer(('127.0.0.1', 0), dcgm_exporter.MetricsHandler, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.port = server.server_address[1]
+        return server
+
+    def connect(self):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+        self.addCleanup(conn.close)
+        return conn
+
+    def health(self, conn):
+        conn.request('GET', '/health')
+        response = conn.getresponse()
+        return response.status, response.read()
+
+    def stall(self):
+        """A connection that sent half a request, holding a worker until its timeout"""
+        sock = socket.create_connection(('127.0.0.1', self.port))
+        self.addCleanup(sock.close)
+        sock.sendall(b'GET /health HTTP/1.1\r\n')
+        return sock
+
+    def test_busy_workers_and_queue_get_503(self):
+        server = self.start(max_workers=1, max_pending=1)
+        rejected = dcgm_exporter.HTTP_REJECTED.values.get((), 0)
+        stalled = [self.stall(), self.stall()]
+        wait_until(lambda: server.slots._value == 0)
+        self.assertEqual(self.health(self.connect())[0], 503)
+        self.assertEqual(server.rejected, 1)
+        self.assertEqual(dcgm_exporter.HTTP_REJECTED.values.get((), 0), rejected + 1)
+        for sock in stalled:
+            sock.sendall(b'\r\n')
+            self.assertIn(b' 200 OK', sock.recv(4096))
+        self.assertEqual(self.health(self.connect()), (200, b'OK\n'))
+
+    def test_idle_keep_alive_connections_hold_no_worker(self):
+        server = self.start(max_workers=2, max_pending=1)
+        idle = [self.connect() for _ in range(5)]
+        for conn in idle:
+            self.assertEqual(self.health(conn)[0], 200)
+        wait_until(lambda: len(server.idle) == 5)
+        self.assertEqual(self.health(self.connect())[0], 200)
+        # Each idle connection is reused for its next request, not reconnected
+        for conn in idle:
+            sock = conn.sock
+            self.assertEqual(self.health(conn)[0], 200)
+            self.assertIs(conn.sock, sock)
+        self.assertEqual(server.rejected, 0)
+
+    def test_pipelined_requests_are_all_answered(self):
+        self.start()
+        sock = socket.create_connection(('127.0.0.1', self.port), timeout=5)
+        self.addCleanup(sock.close)
+        sock.sendall(b'GET /health HTTP/1.1\r\n\r\n' * 3)
+        received = b''
+        while received.count(b'OK\n') < 3:
+            chunk = sock.recv(4096)
+            self.assertTrue(chunk, "connection closed early")
+            received += chunk
+
+    def test_slow_and_idle_connections_time_out(self):
+        with mock.patch.object(dcgm_exporter.MetricsHandler, 'timeout', 0.3):
+            server = self.start(max_workers=1, max_pending=0, idle_timeout=0.3)
+            start = time.monotonic()
+            stalled = self.stall()
+            stalled.settimeout(5)
+            self.assertEqual(stalled.recv(4096), b'')
+            self.assertLess(time.monotonic() - start, 2)
+            # The timed out request gave its worker back
+            conn = self.connect()
+            self.assertEqual(self.health(conn)[0], 200)
+            wait_until(lambda: not server.idle)
+            conn.sock.settimeout(5)
+            self.assertEqual(conn.sock.recv(4096), b'')
+
+    def test_longest_idle_connection_is_closed_beyond_max_idle(self):
+        server = self.start(max_idle=2)
+        idle = [self.connect() for _ in range(3)]
+        for count, conn in enumerate(idle, 1):
+            self.assertEqual(self.health(conn)[0], 200)
+            wait_until(lambda: len(server.idle) == min(count, 2))
+        idle[0].sock.settimeout(5)
+        self.assertEqual(idle[0].sock.recv(4096), b'')
+        self.assertEqual(len(server.idle), 2)
+
+
+class ExpositionRendererTest(unittest.TestCase):
+    def setUp(self):
+        self.renderer = dcgm_exporter.ExpositionRenderer()
+        self.metrics = {str(gpu): {field_id: float(gpu * 100 + idx)
+                                   for idx, field_id in enumerate(dcgm_exporter.FIELD_MAPPING)}
+                        for gpu in range(1, 13)}
+
+    def test_matches_sorted_line_output(self):
+        self.assertEqual(self.renderer.render(self.metrics), sorted_render(self.metrics))
+
+    def test_only_changed_values_are_reformatted(self):
+        self.renderer.render(self.metrics)
+        parts = list(self.renderer.parts)
+        self.metrics['3'] = dict(self.metrics['3'], **{'150': 1.5})
+        text = self.renderer.render(self.metrics)
+        changed = [idx for idx, part in enumerate(self.renderer.parts) if part is not parts[idx]]
+        self.assertEqual(len(changed), 1)
+        self.assertIn('dcgm_gpu_temp{gpu="3",device="nvidia3"} 1.5\n', text)
+        self.assertEqual(text, sorted_render(self.metrics))
+
+    def test_missing_fields_and_new_gpus(self):
+        self.renderer.render(self.metrics)
+        del self.metrics['2']['150']
+        self.metrics['1'] = {'150': 7.0, '999': 1.0}
+        self.assertEqual(self.renderer.render(self.metrics), sorted_render(self.metrics))
+        self.metrics['2']['150'] = 8.0
+        self.metrics['13'] = {'155': 250.0}
+        self.assertEqual(self.renderer.render(self.metrics), sorted_render(self.metrics))
+        self.assertEqual(self.renderer.render({}), dcgm_exporter.EXPOSITION_HEADER)
+
+
+class SimulateCollectorTest(unittest.TestCase):
+    def test_renders_every_field_with_dcgm_names_and_labels(self):
+        collector = dcgm_exporter.SimulateCollector(num_gpus=3, metric_profile='stable', gpu_profiles=[],
+                                                    update_interval=30, gpu_start_index=1)
+        metrics = collector.collect()
+        self.assertEqual(sorted(metrics), ['1', '2', '3'])
+        for fields in metrics.values():
+            self.assertEqual(set(fields), set(dcgm_exporter.FIELD_MAPPING))
+            # FB_TOTAL = FB_USED + FB_FREE + FB_RESERVED
+            self.assertEqual(fields['250'], fields['252'] + fields['251'] + fields['253'])
+        text = dcgm_exporter.render_metrics(metrics)
+        for metric_name, _ in dcgm_exporter.FIELD_MAPPING.values():
+            self.assertIn(f'{metric_name}{{gpu="3",device="nvidia3"}} ', text)
+
+    def test_gpu_start_index_and_per_gpu_profiles(self):
+        collector = dcgm_exporter.SimulateCollector(num_gpus=4, gpu_profiles=['stable', 'chaos'],
+                                                    update_interval=30, gpu_start_index=17)
+        self.assertEqual(sorted(collector.collect(), key=int), ['17', '18', '19', '20'])
+        profiles = collector.generator.profiles
+        self.assertEqual([profiles[i].name for i in range(1, 5)], ['stable', 'chaos', 'stable', 'chaos'])
+
+    def test_profiles_tick_on_update_interval(self):
+        collector = dcgm_exporter.SimulateCollector(num_gpus=2, metric_profile='wave', gpu_profiles=[],
+                                                    update_interval=30)
+        first = collector.collect()
+        self.assertIs(collector.collect(), first)
+        self.assertEqual(collector.generator.profiles[1].iteration, 1)
+        collector.update_interval = 0
+        collector.next_tick = 0
+        self.assertIsNot(collector.collect(), first)
+        self.assertEqual(collector.generator.profiles[1].iteration, 2)
+
+    def test_shard_map_is_ignored(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump({'shards': [{'shard': 0, 'host': 'localhost:5555', 'gpus': {'1': 1}}]}, f)
+        saved_path = dcgm_exporter.DCGM_SHARD_MAP
+        dcgm_exporter.DCGM_SHARD_MAP = f.name
+        try:
+            self.assertIsNotNone(dcgm_exporter.load_shard_map())
+            self.assertIsInstance(dcgm_exporter.create_collector('simulate'), dcgm_exporter.SimulateCollector)
+        finally:
+            dcgm_exporter.DCGM_SHARD_MAP = saved_path
+            os.unlink(f.name)
+
+
+class PydcgmCollectorTest(unittest.TestCase):
+    def setUp(self):
+        self.dcgm = FakeDcgm(latest={1: {150: 55.0}, 2: {150: 60.0, 155: 250.5}})
+        for patch in (mock.patch.dict(sys.modules, self.dcgm.modules),
+                      mock.patch.object(dcgm_exporter, 'DCGM_SHARD_MAP', os.path.join(tempfile.gettempdir(), 'none')),
+                      mock.patch('builtins.print')):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_auto_keeps_one_handle_across_collections(self):
+        collector = dcgm_exporter.create_collector('auto')
+        self.assertIsInstance(collector, dcgm_exporter.PydcgmCollector)
+        for _ in range(3):
+            self.assertEqual(collector.collect(), {'1': {'150': 55.0}, '2': {'150': 60.0, '155': 250.5}})
+        self.assertEqual(self.dcgm.connections, [dcgm_exporter.DCGM_HOST])
+        self.assertEqual(self.dcgm.reads, 3)
+        collector.close()
+        self.assertEqual(self.dcgm.shutdowns, 1)
+
+    def test_auto_falls_back_to_dcgmi_without_pydcgm(self):
+        with mock.patch.dict(sys.modules, {'pydcgm': None}):
+            self.assertIsInstance(dcgm_exporter.create_collector('auto'), dcgm_exporter.SubprocessCollector)
+
+    def test_auto_falls_back_to_dcgmi_when_the_hostengine_is_down(self):
+        self.dcgm.error = RuntimeError("connection refused")
+        self.assertIsInstance(dcgm_exporter.create_collector('auto'), dcgm_exporter.SubprocessCollector)
+        self.assertEqual(self.dcgm.connections, [])
+        with self.assertRaises(RuntimeError):
+            self.dcgm.error = RuntimeError("connection refused")
+            dcgm_exporter.create_collector('pydcgm')
+
+
+class DmonStreamCollectorTest(unittest.TestCase):
+    HEADER = 'echo "#Entity TMPTR"\n'
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='dcgm-dmon-')
+        self.addCleanup(shutil.rmtree, self.workdir)
+        self.processes, self.launches = [], []
+        popen = subprocess.Popen
+
+        def launch(*args, **kwargs):
+            self.launches.append(time.monotonic())
+            self.processes.append(popen(*args, **kwargs))
+            return self.processes[-1]
+
+        for patch in (mock.patch.object(dcgm_exporter.subprocess, 'Popen', launch),
+                      mock.patch.object(dcgm_exporter, 'DCGMI_PATH', os.path.join(self.workdir, 'dcgmi')),
+                      mock.patch('builtins.print')):
+            self.printed = patch.start()
+            self.addCleanup(patch.stop)
+
+    def fake_dcgmi(self, body):
+        """A dcgmi stand-in running `body`, with $n the number of times it has been started"""
+        runs = os.path.join(self.workdir, 'runs')
+        with open(dcgm_exporter.DCGMI_PATH, 'w') as f:
+            f.write(f'#!/bin/sh\nn=$(cat {runs} 2>/dev/null || echo 0); n=$((n + 1)); echo $n > {runs}\n{body}')
+        os.chmod(dcgm_exporter.DCGMI_PATH, 0o755)
+
+    def start(self, stall_timeout=5.0):
+        collector = dcgm_exporter.DmonStreamCollector(delay_ms=100, stall_timeout=stall_timeout)
+        self.addCleanup(collector.close)
+        return collector
+
+    def gaps(self):
+        return [later - earlier for earlier, later in zip(self.launches, self.launches[1:])]
+
+    def test_exited_child_restarts_with_doubling_backoff(self):
+        self.fake_dcgmi(self.HEADER + 'echo "GPU 1 50"\n')
+        restarts = dcgm_exporter.DMON_RESTARTS.values.get((), 0)
+        collector = self.start()
+        wait_until(lambda: len(self.launches) == 4, timeout=6)
+        collector.close()
+        for gap, backoff in zip(self.gaps(), (0.5, 1.0, 2.0)):
+            self.assertGreaterEqual(gap, backoff)
+            self.assertLess(gap, backoff + 0.3)
+        self.assertEqual(collector.collect(), {'1': {'150': 50.0}})
+        self.assertGreaterEqual(dcgm_exporter.DMON_RESTARTS.values.get((), 0) - restarts, 3)
+
+    def test_hung_child_is_killed_and_restarted(self):
+        self.fake_dcgmi('if [ $n -eq 1 ]; then\n' + self.HEADER + 'echo "GPU 1 50"\nfi\nexec sleep 30\n')
+        collector = self.start(stall_timeout=0.5)
+        wait_until(lambda: collector.latest)
+        self.assertEqual(collector.collect(), {'1': {'150': 50.0}})
+        wait_until(lambda: len(self.launches) == 2)
+        self.assertEqual(self.processes[0].returncode, -9)
+        self.printed.assert_any_call("dcgmi dmon produced no output for 0.5s, restarting", flush=True)
+        with self.assertRaisesRegex(RuntimeError, 'stale for more than 0.5s'):
+            collector.collect()
+
+    def test_healthy_run_resets_the_backoff(self):
+        # The third child runs past healthy_after before exiting
+        self.fake_dcgmi(self.HEADER + 'echo "GPU 1 50"\nif [ $n -eq 3 ]; then sleep 0.6; fi\n')
+        with mock.patch.object(dcgm_exporter.DmonStreamCollector, 'healthy_after', 0.3):
+            self.start()
+            wait_until(lambda: len(self.launches) == 5, timeout=6)
+        gaps = self.gaps()
+        # Third gap: 0.6s of running plus a fresh 0.5s backoff (not 2s), which then doubles again
+        for gap, expected in zip(gaps, (0.5, 1.0, 1.1, 1.0)):
+            self.assertGreaterEqual(gap, expected)
+            self.assertLess(gap, expected + 0.3)
+
+    def test_gpu_missing_from_a_frame_is_evicted(self):
+        self.fake_dcgmi(self.HEADER + 'echo "GPU 1 50"\necho "GPU 2 60"\necho "GPU 1 51"\necho "GPU 1 52"\n'
+                        'exec sleep 30\n')
+        collector = self.start()
+        wait_until(lambda: collector.latest.get('1') == {'150': 52.0})
+        self.assertEqual(collector.collect(), {'1': {'150': 52.0}})
+
+
+class ShardedCollectorTest(unittest.TestCase):
+    def setUp(self):
+        dcgm_exporter.COLLECTORS['fake-shard'] = FakeShardCollector
+        self.shards = [
+            {'shard': index, 'host': f'localhost:{5555 + index}', 'gpus': {'1': 17 + 2 * index, '2': 18 + 2 * index}}
+            for index in range(4)
+        ]
+
+    def tearDown(self):
+        del dcgm_exporter.COLLECTORS['fake-shard']
+        FakeShardCollector.delay = 0.0
+
+    def test_shards_are_merged_under_global_ids(self):
+        collector = dcgm_exporter.ShardedCollector('fake-shard', self.shards)
+        try:
+            metrics = collector.collect()
+        finally:
+            collector.close()
+        self.assertEqual(sorted(metrics, key=int), [str(gpu) for gpu in range(17, 25)])
+        self.assertEqual(metrics['17'], {'150': 5555.0})
+        self.assertEqual(metrics['24'], {'150': 5558.5})
+
+    def test_shards_are_collected_concurrently(self):
+        FakeShardCollector.delay = 0.3
+        collector = dcgm_exporter.ShardedCollector('fake-shard', self.shards)
+        try:
+            start = time.perf_counter()
+            collector.collect()
+            elapsed = time.perf_counter() - start
+        finally:
+            collector.close()
+        self.assertLess(elapsed, 0.3 * len(self.shards) / 2, f"shards collected serially: {elapsed:.2f}s")
+
+    def test_failed_shard_is_skipped(self):
+        self.shards[1]['host'] = 'localhost:9999'
+        collector = dcgm_exporter.ShardedCollector('fake-shard', self.shards)
+        try:
+            metrics = collector.collect()
+        finally:
+            collector.close()
+        self.assertNotIn('19', metrics)
+        self.assertIn('21', metrics)
+
+    def test_load_shard_map(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump({'gpu_start_index': 17, 'shards': self.shards}, f)
+        try:
+            self.assertEqual(dcgm_exporter.load_shard_map(f.name), self.shards)
+            self.assertIsNone(dcgm_exporter.load_shard_map(f.name + '.missing'))
+        finally:
+            os.unlink(f.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,245 @@
+"""Tests for the text, OpenMetrics and protobuf exposition formats in src/dcgm_exporter.py"""
+
+import gzip
+import os
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import dcgm_exporter  # noqa: E402
+import dcgm_field_registry as registry  # noqa: E402
+import dcgm_self_metrics  # noqa: E402
+from common import decode_message, read_varint  # noqa: E402
+from test_exporter import ExporterServerTestCase  # noqa: E402
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)\{gpu="([^"]*)",device="([^"]*)"\} (\S+)$')
+
+
+def decode_delimited(body):
+    """Length-delimited MetricFamily messages -> (families, {(name, gpu, device): value}, created)"""
+    families, series, created, pos = {}, {}, {}, 0
+    while pos < len(body):
+        length, pos = read_varint(body, pos)
+        family = decode_message(body[pos:pos + length])
+        pos += length
+        name = family[1][0].decode()
+        families[name] = {'help': family[2][0].decode(), 'type': family[3][0],
+                          'unit': family[5][0].decode() if 5 in family else None}
+        for raw in family.get(4, []):
+            metric = decode_message(raw)
+            labels = {}
+            for pair in metric[1]:
+                label = decode_message(pair)
+                labels[label[1][0].decode()] = label[2][0].decode()
+            key = (name, labels['gpu'], labels['device'])
+            if 3 in metric:
+                counter = decode_message(metric[3][0])
+                series[key] = counter[1][0]
+                timestamp = decode_message(counter[3][0])
+                created[key] = timestamp[1][0] + timestamp.get(2, [0])[0] / 1e9
+            else:
+                series[key] = decode_message(metric[2][0])[1][0]
+    return families, series, created
+
+
+def parse_text(text):
+    return {(m.group(1), m.group(2), m.group(3)): float(m.group(4))
+            for m in map(SAMPLE.match, text.splitlines()) if m}
+
+
+def parse_openmetrics(text):
+    """-> (families {name: {type, unit, help}}, series, created) with counter samples named `<family>_total`"""
+    families, series, created = {}, {}, {}
+    for line in text.splitlines():
+        if line == '# EOF':
+            continue
+        if line.startswith('# '):
+            _, keyword, name, rest = line.split(' ', 3)
+            families.setdefault(name, {'unit': None})[keyword.lower()] = rest
+            continue
+        match = SAMPLE.match(line)
+        if match is None:
+            continue
+        key, value = (match.group(1), match.group(2), match.group(3)), float(match.group(4))
+        if key[0].endswith('_created') and families.get(key[0][:-len('_created')], {}).get('type') == 'counter':
+            created[(key[0][:-len('_created')] + '_total',) + key[1:]] = value
+        else:
+            series[key] = value
+    return families, series, created
+
+
+def sample_metrics(gpus=8):
+    return {str(gpu): {field_id: float(gpu * 1000 + idx) for idx, field_id in enumerate(dcgm_exporter.FIELD_MAPPING)}
+            for gpu in range(1, gpus + 1)}
+
+
+class ExpositionFormatsTest(unittest.TestCase):
+    def setUp(self):
+        self.starts = dcgm_exporter.CounterStarts()
+        self.text = dcgm_exporter.ExpositionRenderer()
+        self.openmetrics = dcgm_exporter.ExpositionRenderer(openmetrics=True, starts=self.starts)
+        self.protobuf = dcgm_exporter.ProtobufRenderer(starts=self.starts)
+        self.metrics = sample_metrics()
+
+    def render_all(self):
+        return (parse_text(self.text.render(self.metrics)),
+                parse_openmetrics(self.openmetrics.render(self.metrics)),
+                decode_delimited(self.protobuf.render(self.metrics)))
+
+    def test_every_format_carries_the_same_series(self):
+        text, (_, om_series, om_created), (_, pb_series, pb_created) = self.render_all()
+        self.assertEqual(len(text), len(self.metrics) * len(dcgm_exporter.FIELD_MAPPING))
+        self.assertEqual(om_series, text)
+        self.assertEqual(pb_series, text)
+        counter_names = {field.metric_name for field in registry.FIELDS if field.metric_type == registry.COUNTER}
+        counters = {key for key in text if key[0] in counter_names}
+        self.assertEqual(set(om_created), counters)
+        self.assertEqual(set(pb_created), counters)
+        for key, created in om_created.items():
+            self.assertAlmostEqual(pb_created[key], created, places=2)
+
+    def test_openmetrics_metadata_and_eof(self):
+        body = self.openmetrics.render(self.metrics)
+        self.assertTrue(body.endswith('\n# EOF\n'))
+        self.assertEqual(body.count('# EOF'), 1)
+        families, _, _ = parse_openmetrics(body)
+        for field in registry.FIELDS:
+            family = families[registry.openmetrics_family(field)]
+            self.assertEqual(family['type'], field.metric_type)
+            self.assertEqual(family['unit'], registry.openmetrics_unit(field))
+        self.assertEqual(families['dcgm_total_energy_consumption_millijoules']['unit'], 'millijoules')
+        self.assertEqual(families['dcgm_power_usage']['unit'], None)
+
+    def test_protobuf_family_metadata(self):
+        families, _, _ = decode_delimited(self.protobuf.render(self.metrics))
+        self.assertEqual(set(families), {field.metric_name for field in registry.FIELDS})
+        for field in registry.FIELDS:
+            family = families[field.metric_name]
+            self.assertEqual(family['type'], dcgm_self_metrics.PROTOBUF_METRIC_TYPES[field.metric_type])
+            self.assertEqual(family['help'], field.help)
+            self.assertEqual(family['unit'], registry.openmetrics_unit(field))
+
+    def test_formats_agree_after_partial_updates(self):
+        self.render_all()
+        self.metrics['3']['150'] = 12.5
+        self.metrics['4']['156'] += 1000.0
+        del self.metrics['5']['155']
+        self.metrics['9'] = {'150': 40.0, '156': 5.0}
+        text, (_, om_series, _), (_, pb_series, _) = self.render_all()
+        self.assertEqual(text[('dcgm_gpu_temp', '3', 'nvidia3')], 12.5)
+        self.assertNotIn(('dcgm_power_usage', '5', 'nvidia5'), text)
+        self.assertEqual(om_series, text)
+        self.assertEqual(pb_series, text)
+        del self.metrics['9']
+        self.metrics['2']['150'] = 1.0
+        text, (_, om_series, _), (_, pb_series, _) = self.render_all()
+        self.assertEqual(om_series, text)
+        self.assertEqual(pb_series, text)
+
+    def test_counter_reset_moves_created_timestamp(self):
+        key = ('dcgm_total_energy_consumption_millijoules_total', '2', 'nvidia2')
+        _, (_, _, om_before), (_, _, pb_before) = self.render_all()
+        self.metrics['2']['156'] += 10.0
+        _, (_, _, om_same), _ = self.render_all()
+        self.assertEqual(om_same[key], om_before[key])
+        self.starts.series[('2', '156')][0] -= 100  # pretend the series started earlier
+        self.metrics['2']['156'] = 0.0
+        _, (_, _, om_after), (_, pb_series, pb_after) = self.render_all()
+        self.assertGreater(om_after[key], om_before[key] - 50, "reset did not restart the series")
+        self.assertAlmostEqual(pb_after[key], om_after[key], places=2)
+        self.assertEqual(pb_series[key], 0.0)
+
+
+class NegotiationTest(unittest.TestCase):
+    def test_accept_headers(self):
+        cases = {
+            '': 'text',
+            '*/*': 'text',
+            'text/plain;version=0.0.4;q=0.5,*/*;q=0.1': 'text',
+            'application/openmetrics-text; version=1.0.0; charset=utf-8': 'openmetrics',
+            # Prometheus' own scrape Accept header
+            'application/openmetrics-text;version=1.0.0,application/openmetrics-text;version=0.0.1;q=0.75,'
+            'text/plain;version=0.0.4;q=0.5,*/*;q=0.1': 'openmetrics',
+            'application/vnd.google.protobuf;proto=io.prometheus.client.MetricFamily;encoding=delimited;q=0.7,'
+            'text/plain;version=0.0.4;q=0.3': 'protobuf',
+            'application/vnd.google.protobuf;proto=io.prometheus.client.MetricFamily;encoding=text': 'text',
+            'application/*': 'openmetrics',
+            'text/plain;q=0, application/json': 'text',
+            'application/openmetrics-text;q=bogus': 'text',
+        }
+        for accept, expected in cases.items():
+            with self.subTest(accept=accept):
+                self.assertEqual(dcgm_exporter.negotiate_format(accept), expected)
+
+    def test_accept_encoding(self):
+        cases = {
+            'gzip': True,
+            'gzip, deflate, br': True,
+            'deflate;q=1.0, gzip;q=0.5': True,
+            '*': True,
+            'gzip;q=0': False,
+            'gzip;Q=0': False,
+            'gzip; q = 0.0': False,
+            '*;q=0, gzip': True,
+            'gzip;q=0, *': False,
+            'gzip;q=abc': True,
+            'gzip;q=': True,
+            'deflate, identity': False,
+            '': False,
+            ';;,,;q=': False,
+        }
+        for accept_encoding, expected in cases.items():
+            with self.subTest(accept_encoding=accept_encoding):
+                self.assertIs(dcgm_exporter.accepts_gzip(accept_encoding), expected)
+
+    def test_unavailable_formats_fall_back_to_text(self):
+        snapshot = dcgm_exporter.MetricsSnapshot('# Error: dcgmi timeout\n')
+        payload = snapshot.negotiate('application/openmetrics-text')
+        self.assertEqual(payload.content_type, dcgm_exporter.TEXT_CONTENT_TYPE)
+        self.assertIs(payload.body, snapshot.body)
+
+
+class ContentNegotiationServerTest(ExporterServerTestCase):
+    def setUp(self):
+        super().setUp()
+        dcgm_exporter.metrics_cache = dcgm_exporter.build_snapshot(sample_metrics(2), ['openmetrics', 'protobuf'])
+
+    def test_metrics_served_per_accept_header(self):
+        accepts = {
+            'text/plain': dcgm_exporter.TEXT_CONTENT_TYPE,
+            'application/openmetrics-text; version=1.0.0': dcgm_exporter.OPENMETRICS_CONTENT_TYPE,
+            'application/vnd.google.protobuf; proto=io.prometheus.client.MetricFamily; encoding=delimited':
+                dcgm_exporter.PROTOBUF_CONTENT_TYPE,
+        }
+        etags = set()
+        for accept, content_type in accepts.items():
+            with self.subTest(accept=accept):
+                response, body = self.get('/metrics', {'Accept': accept})
+                self.assertEqual(response.status, 200)
+                self.assertEqual(response.getheader('Content-Type'), content_type)
+                self.assertEqual(response.getheader('Vary'), 'Accept, Accept-Encoding')
+                etag = response.getheader('ETag')
+                etags.add(etag)
+                response, _ = self.get('/metrics', {'Accept': accept, 'If-None-Match': etag})
+                self.assertEqual(response.status, 304)
+        self.assertEqual(len(etags), 3)
+        _, text = self.get('/metrics')
+        _, protobuf = self.get('/metrics', {'Accept': 'application/vnd.google.protobuf'})
+        self.assertEqual(decode_delimited(protobuf)[1], parse_text(text.decode()))
+
+    def test_gzip_per_accept_encoding(self):
+        _, plain = self.get('/metrics')
+        for accept_encoding, gzipped in (('gzip', True), ('*;q=0, gzip', True), ('gzip;q=0', False),
+                                         ('gzip;Q=0', False), ('gzip;q=abc', True), ('gzip;q', True),
+                                         (';,;', False)):
+            with self.subTest(accept_encoding=accept_encoding):
+                response, body = self.get('/metrics', {'Accept-Encoding': accept_encoding})
+                self.assertEqual(response.status, 200)
+                self.assertEqual(response.getheader('Vary'), 'Accept, Accept-Encoding')
+                self.assertEqual(response.getheader('Content-Encoding'), 'gzip' if gzipped else None)
+                self.assertEqual(gzip.decompress(body) if gzipped else body, plain)
+
+
+if __name__ == '__main__':
+    unittest.main()
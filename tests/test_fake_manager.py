@@ -0,0 +1,291 @@
+"""Unit tests for src/dcgm_fake_manager.py (no DCGM required)"""
+
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import dcgm_fake_manager  # noqa: E402
+from common import FakeDcgm  # noqa: E402
+
+
+class ShardPlanTest(unittest.TestCase):
+    def test_small_counts_use_one_hostengine_on_the_default_port(self):
+        shards = dcgm_fake_manager.plan_shards(4)
+        self.assertEqual([(s.index, s.port, s.first_ordinal, s.num_gpus) for s in shards], [(0, 5555, 1, 4)])
+        self.assertEqual(shards[0].log_file, '/tmp/dcgm-fake.log')
+        self.assertIsNone(shards[0].hostengine_pid_file)
+
+    def test_large_counts_are_spread_evenly(self):
+        shards = dcgm_fake_manager.plan_shards(1000)
+        self.assertEqual(len(shards), 63)
+        self.assertEqual(sum(s.num_gpus for s in shards), 1000)
+        self.assertLessEqual(max(s.num_gpus for s in shards), dcgm_fake_manager.MAX_FAKE_GPUS_PER_HOSTENGINE)
+        self.assertLessEqual(max(s.num_gpus for s in shards) - min(s.num_gpus for s in shards), 1)
+        self.assertEqual([s.port for s in shards], list(range(5555, 5555 + 63)))
+
+    def test_ordinals_are_contiguous_across_shards(self):
+        shards = dcgm_fake_manager.plan_shards(40, gpus_per_shard=8, base_port=6000)
+        ordinals = [s.ordinal(pos) for s in shards for pos in range(s.num_gpus)]
+        self.assertEqual(ordinals, list(range(1, 41)))
+        self.assertEqual(shards[-1].host, 'localhost:6004')
+
+    def test_gpus_per_shard_is_capped_at_dcgm_limit(self):
+        shards = dcgm_fake_manager.plan_shards(64, gpus_per_shard=64)
+        self.assertEqual(len(shards), 4)
+
+
+class InjectionFieldsTest(unittest.TestCase):
+    def test_dcgm_field_groups_narrows_the_injected_fields(self):
+        script = "import dcgm_fake_manager; print(sorted({f.group for f in dcgm_fake_manager.INJECTION_FIELDS}))"
+        result = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(dcgm_fake_manager.__file__),
+                                env=dict(os.environ, DCGM_FIELD_GROUPS='thermal,power'), capture_output=True,
+                                text=True, check=True)
+        self.assertEqual(result.stdout.splitlines()[-1], "['power', 'thermal']")
+
+    def test_manager_synthesizes_only_its_fields(self):
+        fields = dcgm_fake_manager.dcgm_field_registry.select_fields('thermal')
+        workdir = tempfile.mkdtemp(prefix='dcgm-fields-')
+        try:
+            with mock.patch('builtins.print'):
+                manager = dcgm_fake_manager.DCGMFakeManager(dcgm_dir=workdir, num_gpus=2, fields=fields)
+            expanded = manager.synthesizer.expand(manager.generate_metrics([1, 2]), manager.clock.step)
+        finally:
+            shutil.rmtree(workdir)
+        self.assertEqual(set(expanded[2]), {field.field_id for field in fields})
+
+
+class FieldInjectorTest(unittest.TestCase):
+    def setUp(self):
+        self.dcgm = FakeDcgm(gpu_ids=(0, 1, 2))
+        self.workdir = tempfile.mkdtemp(prefix='dcgm-inject-')
+        self.addCleanup(shutil.rmtree, self.workdir)
+        for patch in (mock.patch.dict(sys.modules, self.dcgm.modules), mock.patch('builtins.print')):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.fields = dcgm_fake_manager.dcgm_field_registry.select_fields('thermal,power')
+
+    def test_one_connection_and_one_call_per_value(self):
+        injector = dcgm_fake_manager.FieldInjector(self.workdir, 'localhost:5556', self.fields)
+        self.assertEqual(injector.gpu_ids, [1, 2])
+        for cycle in range(3):
+            values = {gpu_id: {field.field_id: cycle * 10 + gpu_id for field in self.fields} for gpu_id in (1, 2)}
+            self.assertEqual(injector.inject(values), 2 * len(self.fields))
+        self.assertEqual(self.dcgm.connections, ['localhost:5556'])
+        self.assertEqual(len(self.dcgm.injected), 3 * 2 * len(self.fields))
+        self.assertEqual({value for _, gpu_id, _, value in self.dcgm.injected[-2 * len(self.fields):]}, {21, 22})
+        # One struct per (GPU, field), reused by every cycle
+        structs = {}
+        for struct_id, gpu_id, field_id, _ in self.dcgm.injected:
+            structs.setdefault((gpu_id, field_id), set()).add(struct_id)
+        self.assertEqual(len(structs), 2 * len(self.fields))
+        self.assertTrue(all(len(ids) == 1 for ids in structs.values()))
+        self.assertEqual(len({next(iter(ids)) for ids in structs.values()}), len(structs))
+        injector.close()
+        self.assertEqual(self.dcgm.shutdowns, 1)
+
+    def test_manager_reconnects_after_a_failed_cycle(self):
+        manager = dcgm_fake_manager.DCGMFakeManager(dcgm_dir=self.workdir, num_gpus=2, fields=self.fields)
+        manager.metrics_file = os.path.join(self.workdir, 'metrics.json')
+        with mock.patch('traceback.print_exc'):
+            self.assertTrue(manager.inject_metrics())
+            self.assertTrue(manager.inject_metrics())
+            self.assertEqual(len(self.dcgm.connections), 1)
+            self.dcgm.error = RuntimeError("hostengine went away")
+            self.assertFalse(manager.inject_metrics())
+            self.assertEqual(self.dcgm.shutdowns, 1)
+            self.assertIsNone(manager.shards[0].injector)
+            self.assertTrue(manager.inject_metrics())
+        self.assertEqual(len(self.dcgm.connections), 2)
+        self.assertEqual(len(self.dcgm.injected), 3 * 2 * len(self.fields))
+
+
+# Stands in for nv-hostengine: listens on `-p PORT` after a short delay. With --die it exits at once,
+# --die-on=PORT / --hang-on=PORT make just that shard exit or never listen.
+FAKE_HOSTENGINE = """#!{python}
+import socket, sys, time
+args = open(sys.argv[0] + '.args').read().split()
+port = sys.argv[sys.argv.index('-p') + 1]
+if '--die' in args or '--die-on=' + port in args:
+    sys.exit(3)
+if '--hang-on=' + port in args:
+    time.sleep(60)
+time.sleep(0.2)
+server = socket.socket()
+server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+server.bind(('localhost', int(sys.argv[sys.argv.index('-p') + 1])))
+server.listen()
+time.sleep(60)
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+class StartupTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='dcgm-startup-')
+        os.makedirs(os.path.join(self.workdir, 'bin'))
+        self.hostengine = os.path.join(self.workdir, 'bin', 'nv-hostengine')
+        with open(self.hostengine, 'w') as f:
+            f.write(FAKE_HOSTENGINE.format(python=sys.executable))
+        os.chmod(self.hostengine, 0o755)
+        self.set_args('')
+        with mock.patch('builtins.print'):
+            self.manager = dcgm_fake_manager.DCGMFakeManager(dcgm_dir=self.workdir, num_gpus=2,
+                                                             base_port=free_port())
+        self.manager.env.pop('LD_PRELOAD')
+        for name in ('pid_file', 'shard_map_file', 'metrics_file', 'ready_file'):
+            setattr(self.manager, name, os.path.join(self.workdir, name))
+        for shard in self.manager.shards:
+            shard.log_file = os.path.join(self.workdir, f'hostengine-{shard.index}.log')
+
+    def tearDown(self):
+        for shard in self.manager.shards:
+            if getattr(shard, 'process', None) is not None and shard.process.poll() is None:
+                shard.process.kill()
+                shard.process.wait()
+        shutil.rmtree(self.workdir)
+
+    def set_args(self, args):
+        with open(self.hostengine + '.args', 'w') as f:
+            f.write(args)
+
+    def test_poll_returns_as_soon_as_the_condition_holds(self):
+        ready_at = time.monotonic() + 0.05
+        start = time.monotonic()
+        self.assertTrue(dcgm_fake_manager.poll(lambda: time.monotonic() >= ready_at, timeout=5))
+        self.assertLess(time.monotonic() - start, 0.3)
+        start = time.monotonic()
+        self.assertIsNone(dcgm_fake_manager.poll(lambda: None, timeout=0.1))
+        self.assertLess(time.monotonic() - start, 0.3)
+
+    def test_hostengine_readiness_is_polled_not_slept(self):
+        with mock.patch('builtins.print'):
+            start = time.monotonic()
+            self.assertTrue(self.manager.start_host_engine())
+            started = time.monotonic() - start
+            # The fake hostengine listens after 0.2s; the old loop slept 2s before its first check
+            self.assertLess(started, 1.5)
+            self.assertTrue(self.manager.is_port_open(self.manager.shards[0].port))
+            pid = self.manager.shards[0].pid
+            start = time.monotonic()
+            self.manager.stop()
+            stopped = time.monotonic() - start
+        self.assertFalse(dcgm_fake_manager.pid_alive(pid))
+        self.assertLess(stopped, 1.0)
+        self.assertFalse(os.path.exists(self.manager.shard_map_file))
+
+    def test_dead_hostengine_fails_fast(self):
+        self.set_args('--die')
+        with mock.patch('builtins.print'):
+            start = time.monotonic()
+            self.assertFalse(self.manager.start_host_engine())
+        self.assertLess(time.monotonic() - start, 1.5)
+
+    def sharded_manager(self):
+        base_port = free_port()
+        with mock.patch('builtins.print'):
+            manager = dcgm_fake_manager.DCGMFakeManager(dcgm_dir=self.workdir, num_gpus=4, gpus_per_shard=2,
+                                                        base_port=base_port)
+        manager.env.pop('LD_PRELOAD')
+        for name in ('pid_file', 'shard_map_file', 'metrics_file', 'ready_file'):
+            setattr(manager, name, getattr(self.manager, name))
+        for shard in manager.shards:
+            shard.log_file = os.path.join(self.workdir, f'hostengine-{shard.index}.log')
+        self.manager = manager
+        return manager
+
+    def open_logs(self):
+        fd_dir = f'/proc/{os.getpid()}/fd'
+        logs = []
+        for fd in os.listdir(fd_dir):
+            try:
+                logs.append(os.readlink(os.path.join(fd_dir, fd)))
+            except OSError:
+                pass
+        return [path for path in logs if path.startswith(self.workdir) and path.endswith('.log')]
+
+    def test_failed_startup_stops_the_shards_that_came_up(self):
+        manager = self.sharded_manager()
+        for args in (f'--die-on={manager.shards[1].port}', f'--hang-on={manager.shards[1].port}'):
+            with self.subTest(args=args):
+                self.set_args(args)
+                with mock.patch('builtins.print'), mock.patch.object(manager, 'time_left', return_value=1.0):
+                    self.assertFalse(manager.start_host_engine())
+                self.assertTrue(all(shard.process.poll() is not None for shard in manager.shards))
+                self.assertFalse(dcgm_fake_manager.pid_alive(manager.shards[0].pid))
+                self.assertEqual(self.open_logs(), [])
+                self.assertFalse(os.path.exists(manager.shard_map_file))
+        # Nothing left holding the ports: a retry comes straight up
+        self.set_args('')
+        with mock.patch('builtins.print'):
+            self.assertTrue(manager.start_host_engine())
+            self.assertEqual(self.open_logs(), [])
+            manager.stop()
+
+    def test_stop_kills_a_hostengine_that_ignores_sigterm(self):
+        process = subprocess.Popen([sys.executable, '-c', 'import signal, time; '
+                                    'signal.signal(signal.SIGTERM, signal.SIG_IGN); print(flush=True); time.sleep(60)'],
+                                   stdout=subprocess.PIPE)
+        process.stdout.readline()
+        process.stdout.close()
+        with open(self.manager.pid_file, 'w') as f:
+            f.write(str(process.pid))
+        with mock.patch('builtins.print'), mock.patch.object(dcgm_fake_manager, 'STOP_GRACE_PERIOD', 0.2):
+            start = time.monotonic()
+            self.manager.stop()
+        # Only SIGKILL ends it; stop() reaped it, so it is gone without a wait()
+        self.assertFalse(dcgm_fake_manager.pid_alive(process.pid))
+        self.assertLess(time.monotonic() - start, 1.0)
+
+    def test_another_users_process_is_alive(self):
+        # Signalling a hostengine started as root fails with EPERM; it is still running
+        with mock.patch('os.kill', side_effect=PermissionError):
+            self.assertTrue(dcgm_fake_manager.pid_alive(os.getpid()))
+        with mock.patch('os.kill', side_effect=ProcessLookupError):
+            self.assertFalse(dcgm_fake_manager.pid_alive(os.getpid()))
+
+    def test_another_users_hostengine_is_running(self):
+        with open(self.manager.pid_file, 'w') as f:
+            f.write(str(os.getpid()))
+        with mock.patch('os.kill', side_effect=PermissionError):
+            self.assertEqual(self.manager.is_running(), (True, os.getpid()))
+            self.assertEqual(self.manager.running_pids(), [os.getpid()])
+        with mock.patch('os.kill', side_effect=ProcessLookupError):
+            self.assertEqual(self.manager.is_running(), (False, None))
+            self.assertEqual(self.manager.running_pids(), [])
+
+    def test_stop_cleans_up_after_a_shard_that_exits_before_sigterm(self):
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        for name in ('pid_file', 'shard_map_file', 'metrics_file', 'ready_file'):
+            with open(getattr(self.manager, name), 'w') as f:
+                f.write('{}')
+        # Alive when listed, gone by the time it is signalled
+        with mock.patch('builtins.print'), mock.patch.object(self.manager, 'running_pids', return_value=[process.pid]):
+            self.manager.stop()
+        for name in ('pid_file', 'shard_map_file', 'metrics_file', 'ready_file'):
+            self.assertFalse(os.path.exists(getattr(self.manager, name)), name)
+
+    def test_ready_file_carries_the_startup_breakdown(self):
+        self.manager.shards[0].pid = 1234
+        self.manager.write_ready_file({'hostengine': 0.21, 'gpus': 0.05, 'inject': 0.01, 'total': 0.27})
+        with open(self.manager.ready_file) as f:
+            ready = json.load(f)
+        self.assertEqual(ready['hostengine_pids'], [1234])
+        self.assertEqual(ready['startup_seconds']['total'], 0.27)
+
+
+if __name__ == '__main__':
+    unittest.main()
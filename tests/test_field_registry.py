@@ -0,0 +1,89 @@
+"""Tests for the shared DCGM field registry in src/dcgm_field_registry.py"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import dcgm_exporter  # noqa: E402
+import dcgm_fake_manager  # noqa: E402
+import dcgm_field_registry as registry  # noqa: E402
+
+TICK = {'temp': 60, 'power': 200, 'gpu_util': 50, 'mem_util': 40, 'sm_clock': 1400, 'mem_clock': 877,
+        'fb_used': 4096}
+
+
+class FieldRegistryTest(unittest.TestCase):
+    def test_catalogue_is_consistent(self):
+        self.assertGreaterEqual(len(registry.FIELDS), 50)
+        for attr in ('field_id', 'dcgm_name', 'metric_name'):
+            values = [getattr(field, attr) for field in registry.FIELDS]
+            self.assertEqual(len(values), len(set(values)), attr)
+        short_names = [field.short_name for field in registry.FIELDS if field.short_name]
+        self.assertEqual(len(short_names), len(set(short_names)))
+        for field in registry.FIELDS:
+            self.assertTrue(field.dcgm_name.startswith('DCGM_FI_'), field.dcgm_name)
+            self.assertIn(field.metric_type, (registry.GAUGE, registry.COUNTER))
+            self.assertIn(field.value_type, (registry.INT64, registry.DOUBLE))
+            if field.metric_type == registry.COUNTER:
+                self.assertTrue(field.metric_name.endswith('_total'), field.metric_name)
+
+    def test_manager_and_exporter_share_the_registry(self):
+        self.assertEqual(dcgm_fake_manager.INJECTION_FIELDS, registry.FIELDS)
+        self.assertEqual(set(dcgm_exporter.FIELD_MAPPING), set(registry.FIELDS_BY_ID))
+        self.assertEqual(dcgm_exporter.DMON_SHORT_NAMES['FBUSD'], '252')
+        for field in registry.FIELDS:
+            self.assertIn(f"# TYPE {field.metric_name} {field.metric_type}\n", dcgm_exporter.EXPOSITION_HEADER)
+
+    def test_openmetrics_units_suffix_their_family(self):
+        units = {}
+        for field in registry.FIELDS:
+            family = registry.openmetrics_family(field)
+            unit = registry.openmetrics_unit(field)
+            if field.metric_type == registry.COUNTER:
+                self.assertEqual(family + '_total', field.metric_name)
+            if unit:
+                self.assertTrue(family.endswith('_' + unit), family)
+                units[field.field_id] = unit
+        self.assertEqual(units['156'], 'millijoules')
+        self.assertEqual(units['1009'], 'bytes_per_second')
+        self.assertNotIn('155', units)  # dcgm_power_usage keeps its name, so no UNIT
+
+    def test_select_fields_by_group(self):
+        self.assertEqual(registry.select_fields('all'), registry.FIELDS)
+        self.assertEqual(registry.select_fields(''), registry.FIELDS)
+        selected = registry.select_fields('memory, thermal')
+        self.assertEqual({field.group for field in selected}, {'memory', 'thermal'})
+        self.assertIn('150', {field.field_id for field in selected})
+        with self.assertRaises(ValueError):
+            registry.select_fields('memory,bogus')
+
+    def test_synthesizer_fills_every_field_with_its_value_type(self):
+        row = registry.FieldSynthesizer().expand({1: TICK}, elapsed=30)[1]
+        self.assertEqual(set(row), set(registry.FIELDS_BY_ID))
+        for field_id, value in row.items():
+            expected = int if registry.FIELDS_BY_ID[field_id].value_type == registry.INT64 else float
+            self.assertIs(type(value), expected, field_id)
+        self.assertEqual(row['150'], 60)
+        self.assertEqual(row['155'], 200.0)
+        self.assertEqual(row['250'], row['251'] + row['252'] + row['253'])
+        self.assertAlmostEqual(row['1002'], 0.475)
+
+    def test_counters_integrate_over_elapsed_time_and_never_decrease(self):
+        synthesizer = registry.FieldSynthesizer()
+        hot = dict(TICK, temp=95, power=300, gpu_util=10)
+        first = synthesizer.expand({1: hot, 2: TICK}, elapsed=30)
+        second = synthesizer.expand({1: TICK, 2: TICK}, elapsed=30)
+        self.assertEqual(first[1]['156'], 300 * 1000 * 30)
+        self.assertEqual(second[1]['156'], (300 + 200) * 1000 * 30)
+        self.assertEqual(first[1]['241'], 30 * 1000000)
+        self.assertGreater(first[1]['310'], 0)
+        self.assertEqual(first[2]['310'], 0)
+        self.assertEqual(first[1]['112'] & registry.THROTTLE_SW_THERMAL, registry.THROTTLE_SW_THERMAL)
+        for field in registry.FIELDS:
+            if field.metric_type == registry.COUNTER:
+                self.assertGreaterEqual(second[1][field.field_id], first[1][field.field_id], field.metric_name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+"""Tests for src/dcgm_history.py and the exporter's /api/v1/history endpoint"""
+
+import json
+import math
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import dcgm_exporter  # noqa: E402
+import dcgm_history  # noqa: E402
+from test_exporter import ExporterServerTestCase, SlowCollector  # noqa: E402
+
+
+def values(history, gpu='1', field='150', **bounds):
+    (_, _, times, series), = history.query(gpu, field, **bounds)
+    return list(times), list(series)
+
+
+class RingBufferTest(unittest.TestCase):
+    def test_wraps_around_keeping_the_newest_slots(self):
+        history = dcgm_history.History(retention=20, resolution=5)
+        self.assertEqual(history.slots, 4)
+        for tick in range(7):
+            history.record({'1': {'150': float(tick)}}, 1000.0 + 5 * tick)
+        times, series = values(history)
+        self.assertEqual(times, [1015.0, 1020.0, 1025.0, 1030.0])
+        self.assertEqual(series, [3.0, 4.0, 5.0, 6.0])
+
+    def test_collections_in_one_bucket_share_a_slot(self):
+        history = dcgm_history.History(retention=60, resolution=10)
+        for timestamp, value in ((1000.0, 1.0), (1004.0, 2.0), (1009.9, 3.0), (1010.0, 4.0)):
+            history.record({'1': {'150': value}}, timestamp)
+        self.assertEqual(values(history), ([1009.9, 1010.0], [3.0, 4.0]))
+
+    def test_range_and_series_filters(self):
+        history = dcgm_history.History(retention=100, resolution=1)
+        for tick in range(10):
+            history.record({'1': {'150': float(tick), '155': 100.0 + tick}, '2': {'150': 20.0 + tick}}, 1000.0 + tick)
+        self.assertEqual(values(history, start=1003, end=1005), ([1003.0, 1004.0, 1005.0], [3.0, 4.0, 5.0]))
+        self.assertEqual(values(history, start=1008.5), ([1009.0], [9.0]))
+        self.assertEqual(values(history, start=2000), ([], []))
+        self.assertEqual([(gpu, field) for gpu, field, _, _ in history.query(field='150')],
+                         [('1', '150'), ('2', '150')])
+        self.assertEqual(len(history.query()), 3)
+
+    def test_missing_series_are_nan(self):
+        history = dcgm_history.History(retention=100, resolution=1)
+        history.record({'1': {'150': 1.0}, '2': {'150': 2.0}}, 1000.0)
+        history.record({'1': {'150': 3.0}}, 1001.0)
+        history.record({'1': {'150': 5.0}, '2': {'150': 6.0}}, 1002.0)
+        _, series = values(history, gpu='2')
+        self.assertEqual(series[0], 2.0)
+        self.assertTrue(math.isnan(series[1]))
+        self.assertEqual(series[2], 6.0)
+
+    def test_memory_is_bounded(self):
+        history = dcgm_history.History(retention=60, resolution=5, max_series=3)
+        history.record({'1': {'150': 1.0, '155': 2.0}, '2': {'150': 3.0, '155': 4.0}}, 1000.0)
+        self.assertEqual(len(history.series), 3)
+        self.assertEqual(history.dropped_series, 1)
+        self.assertEqual(history.memory_bytes(), history.max_memory_bytes())
+        self.assertEqual(history.memory_bytes(), 4 * 12 * 8)
+        with self.assertRaises(ValueError):
+            dcgm_history.History(retention=0, resolution=5)
+
+    def test_fleet_scale(self):
+        """1,024 GPUs x 50 fields: fixed footprint, cheap recording, fast range queries"""
+        history = dcgm_history.History(retention=300, resolution=5)
+        collection = {str(gpu): {str(field): float(gpu + field) for field in range(50)} for gpu in range(1024)}
+        start = time.perf_counter()
+        for tick in range(history.slots + 10):
+            history.record(collection, 1000.0 + 5 * tick)
+        per_record = (time.perf_counter() - start) / (history.slots + 10)
+        self.assertEqual(history.memory_bytes(), (1024 * 50 + 1) * 60 * 8)
+        self.assertLess(per_record, 0.5, f"{per_record * 1000:.0f} ms per collection")
+        start = time.perf_counter()
+        times, series = values(history, gpu='512', field='7', start=1100, end=1200)
+        self.assertLess(time.perf_counter() - start, 0.01)
+        self.assertEqual(len(times), 21)
+        self.assertEqual(set(series), {519.0})
+
+
+class HistoryEndpointTest(ExporterServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.saved_history = dcgm_exporter.history
+        self.history = dcgm_exporter.history = dcgm_history.History(retention=60, resolution=0.001)
+        dcgm_exporter.snapshot_listeners.append(self.history.publish)
+
+    def tearDown(self):
+        dcgm_exporter.snapshot_listeners.remove(self.history.publish)
+        dcgm_exporter.history = self.saved_history
+        super().tearDown()
+
+    def get_json(self, path):
+        response, body = self.get(path)
+        self.assertEqual(response.getheader('Content-Type'), 'application/json')
+        return response.status, json.loads(body)
+
+    def test_collections_are_served_as_series(self):
+        dcgm_exporter.collector = SlowCollector(delay=0)
+        for _ in range(3):
+            dcgm_exporter.refresh_metrics_cache()
+            time.sleep(0.002)
+        status, answer = self.get_json('/api/v1/history?gpu=1&field=dcgm_gpu_temp')
+        self.assertEqual(status, 200)
+        self.assertEqual(answer['status'], 'success')
+        (series,) = answer['data']['result']
+        self.assertEqual(series['metric'], {'__name__': 'dcgm_gpu_temp', 'gpu': '1', 'device': 'nvidia1',
+                                            'field': '150'})
+        self.assertEqual([value for _, value in series['values']], [51.0, 52.0, 53.0])
+        first, last = series['values'][0][0], series['values'][-1][0]
+        _, answer = self.get_json(f'/api/v1/history?field=150&start={first + 0.0005}&end={last}')
+        self.assertEqual([value for _, value in answer['data']['result'][0]['values']], [52.0, 53.0])
+        _, answer = self.get_json('/api/v1/history?gpu=7')
+        self.assertEqual(answer['data']['result'], [])
+
+    def test_bad_queries(self):
+        status, answer = self.get_json('/api/v1/history?field=dcgm_nonexistent')
+        self.assertEqual((status, answer['status']), (400, 'error'))
+        status, _ = self.get_json('/api/v1/history?start=yesterday')
+        self.assertEqual(status, 400)
+        dcgm_exporter.history = None
+        status, _ = self.get_json('/api/v1/history')
+        self.assertEqual(status, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,203 @@
+"""Tests for src/dcgm_otlp_push.py against a local stand-in OTLP/HTTP receiver"""
+
+import gzip
+import json
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import dcgm_exporter  # noqa: E402
+import dcgm_field_registry as registry  # noqa: E402
+import dcgm_otlp_push  # noqa: E402
+import common  # noqa: E402
+from common import gpu_metrics  # noqa: E402
+
+
+class Receiver(common.Receiver):
+    """Stand-in OTLP/HTTP receiver: records decoded requests, optionally fails the first few"""
+    reply = b'{}'
+
+    def __init__(self):
+        self.requests = []
+        super().__init__()
+
+    @property
+    def endpoint(self):
+        return f'{self.base_url}/v1/metrics'
+
+    def record(self, headers, body):
+        if headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        self.requests.append(json.loads(body))
+
+    def reply_headers(self, status):
+        headers = [('Content-Type', 'application/json')]
+        if status == 503:
+            headers.append(('Retry-After', '0'))
+        return headers
+
+    def points(self):
+        """{(metric name, gpu, time): (kind, value, start)} over every request received"""
+        points = {}
+        for request in self.requests:
+            for metric in request['resourceMetrics'][0]['scopeMetrics'][0]['metrics']:
+                kind = 'sum' if 'sum' in metric else 'gauge'
+                for point in metric[kind]['dataPoints']:
+                    attributes = {a['key']: a['value']['stringValue'] for a in point['attributes']}
+                    key = (metric['name'], attributes['gpu'], int(point['timeUnixNano']))
+                    points[key] = (kind, point['asDouble'], point.get('startTimeUnixNano'))
+        return points
+
+
+class OtlpPushTest(unittest.TestCase):
+    def setUp(self):
+        self.receiver = Receiver()
+        self.pushers = []
+
+    def tearDown(self):
+        for pusher in self.pushers:
+            pusher.close(timeout=1)
+        self.receiver.shutdown()
+        self.receiver.server_close()
+
+    def pusher(self, **kwargs):
+        kwargs.setdefault('flush_interval', 60)
+        kwargs.setdefault('headers', {})
+        pusher = dcgm_otlp_push.OtlpPusher(self.receiver.endpoint, **kwargs)
+        self.pushers.append(pusher)
+        return pusher
+
+    def test_snapshots_become_otlp_gauges_and_sums(self):
+        pusher = self.pusher(headers={'x-api-key': 'secret'})
+        first = dcgm_exporter.MetricsSnapshot('', gpu_metrics=gpu_metrics(2))
+        second = dcgm_exporter.MetricsSnapshot('', gpu_metrics=gpu_metrics(2, offset=5.0))
+        second.timestamp = first.timestamp + 30
+        pusher.publish(first)
+        pusher.publish(second)
+        pusher.publish(dcgm_exporter.MetricsSnapshot('# Error: dcgmi timeout\n'))
+        self.assertTrue(pusher.flush(timeout=10))
+        points = self.receiver.points()
+        self.assertEqual(len(points), 2 * 2 * len(registry.FIELDS))
+        self.assertEqual(self.receiver.headers[0]['x-api-key'], 'secret')
+        resource = self.receiver.requests[0]['resourceMetrics'][0]['resource']
+        self.assertIn({'key': 'service.name', 'value': {'stringValue': 'dcgm-fake-exporter'}}, resource['attributes'])
+        time_ns = int(second.timestamp * 1e9)
+        self.assertEqual(points[('dcgm_gpu_temp', '2', time_ns)][:2],
+                         ('gauge', gpu_metrics(2, 5.0)['2']['150']))
+        kind, value, start = points[('dcgm_total_energy_consumption_millijoules', '1', time_ns)]
+        self.assertEqual((kind, value), ('sum', gpu_metrics(2, 5.0)['1']['156']))
+        self.assertLessEqual(int(start), int(first.timestamp * 1e9))
+        metrics = {metric['name']: metric
+                   for metric in self.receiver.requests[0]['resourceMetrics'][0]['scopeMetrics'][0]['metrics']}
+        self.assertEqual(metrics['dcgm_gpu_temp']['unit'], 'Cel')
+        self.assertEqual(metrics['dcgm_total_energy_consumption_millijoules']['sum']['aggregationTemporality'], 2)
+        self.assertTrue(metrics['dcgm_total_energy_consumption_millijoules']['sum']['isMonotonic'])
+
+    def test_idle_connections_wait_during_a_flush(self):
+        self.receiver.delay = 0.5
+        pusher = self.pusher(connections=4)
+        pusher.submit(gpu_metrics(1), timestamp=1000.0)
+        cpu = time.process_time()
+        self.assertTrue(pusher.flush(timeout=10))
+        # The three connections with nothing to send must not spin while the fourth is in flight
+        self.assertLess(time.process_time() - cpu, 0.2)
+
+    def test_counter_reset_restarts_the_series(self):
+        encoder = dcgm_otlp_push.OtlpEncoder()
+        rows = [(1000, '1', {'156': 50.0}, 1), (2000, '1', {'156': 80.0}, 1), (3000, '1', {'156': 10.0}, 1)]
+        starts = [encoder.encode([row])['resourceMetrics'][0]['scopeMetrics'][0]['metrics'][0]['sum']
+                  ['dataPoints'][0]['startTimeUnixNano'] for row in rows]
+        self.assertEqual(starts[0], starts[1])
+        self.assertEqual(starts[2], '2000')
+
+    def test_batches_respect_size_and_reuse_connections(self):
+        pusher = self.pusher(batch_size=3 * len(registry.FIELDS), connections=1)
+        for refresh in range(4):
+            pusher.submit(gpu_metrics(8, offset=refresh), timestamp=1000.0 + refresh)
+        self.assertTrue(pusher.flush(timeout=10))
+        self.assertEqual(len(self.receiver.points()), 4 * 8 * len(registry.FIELDS))
+        self.assertEqual(pusher.sent_points, 4 * 8 * len(registry.FIELDS))
+        self.assertEqual(pusher.sent_requests, len(self.receiver.requests))
+        self.assertGreaterEqual(len(self.receiver.requests), 11)
+        for request in self.receiver.requests:
+            metrics = request['resourceMetrics'][0]['scopeMetrics'][0]['metrics']
+            count = sum(len((metric.get('gauge') or metric['sum'])['dataPoints']) for metric in metrics)
+            self.assertLessEqual(count, 3 * len(registry.FIELDS))
+        self.assertEqual(len(self.receiver.clients), 1, "each request opened a new connection")
+
+    def test_full_batch_is_sent_without_waiting_for_the_interval(self):
+        pusher = self.pusher(batch_size=len(registry.FIELDS))
+        pusher.submit(gpu_metrics(1))
+        deadline = time.monotonic() + 5
+        while not self.receiver.requests and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self.receiver.requests), 1)
+
+    def test_flush_interval_sends_partial_batches(self):
+        pusher = self.pusher(flush_interval=0.1)
+        pusher.submit(gpu_metrics(1))
+        deadline = time.monotonic() + 5
+        while not self.receiver.requests and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self.receiver.requests), 1)
+
+    def test_transient_failures_are_retried(self):
+        self.receiver.statuses = [503, 503]
+        pusher = self.pusher(connections=1)
+        pusher.submit(gpu_metrics(2))
+        self.assertTrue(pusher.flush(timeout=10))
+        self.assertEqual(self.receiver.attempts, 3)
+        self.assertEqual(pusher.retries, 2)
+        self.assertEqual(len(self.receiver.points()), 2 * len(registry.FIELDS))
+
+    def test_rejected_batches_are_dropped_not_retried(self):
+        self.receiver.statuses = [400]
+        pusher = self.pusher(connections=1)
+        pusher.submit(gpu_metrics(1))
+        self.assertTrue(pusher.flush(timeout=10))
+        self.assertEqual(self.receiver.attempts, 1)
+        self.assertEqual(pusher.dropped_points, len(registry.FIELDS))
+
+    def test_bounded_queue_drops_oldest(self):
+        pusher = self.pusher(max_queue=4, batch_size=10 ** 6)
+        for refresh in range(3):
+            pusher.submit(gpu_metrics(2), timestamp=1000.0 + refresh)
+        self.assertEqual(len(pusher.queue), 4)
+        self.assertEqual(pusher.dropped_points, 2 * len(registry.FIELDS))
+        self.assertTrue(pusher.flush(timeout=10))
+        times = {key[2] for key in self.receiver.points()}
+        self.assertEqual(times, {1001 * 10 ** 9, 1002 * 10 ** 9})
+
+    def test_unreachable_receiver_gives_up(self):
+        pusher = dcgm_otlp_push.OtlpPusher('http://127.0.0.1:9/v1/metrics', headers={}, flush_interval=60,
+                                           max_retries=1, connections=1)
+        self.pushers.append(pusher)
+        saved_delay = dcgm_otlp_push.RETRY_BASE_DELAY
+        dcgm_otlp_push.RETRY_BASE_DELAY = 0.01
+        try:
+            pusher.submit(gpu_metrics(1))
+            self.assertTrue(pusher.flush(timeout=10))
+        finally:
+            dcgm_otlp_push.RETRY_BASE_DELAY = saved_delay
+        self.assertEqual(pusher.dropped_points, len(registry.FIELDS))
+
+    def test_invalid_endpoint(self):
+        with self.assertRaises(ValueError):
+            dcgm_otlp_push.OtlpPusher('otel-collector:4318')
+
+    def test_throughput(self):
+        pusher = self.pusher(batch_size=8192, connections=2)
+        start = time.perf_counter()
+        for refresh in range(5):
+            pusher.submit(gpu_metrics(256, offset=refresh), timestamp=1000.0 + refresh)
+        self.assertTrue(pusher.flush(timeout=60))
+        elapsed = time.perf_counter() - start
+        total = 5 * 256 * len(registry.FIELDS)
+        self.assertEqual(len(self.receiver.points()), total)
+        self.assertLess(elapsed, 20, f"{total / elapsed:.0f} points/s")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+"""Tests for src/dcgm_recording.py and the manager's recording and replay profile (no DCGM required)"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import dcgm_fake_manager  # noqa: E402
+import dcgm_recording  # noqa: E402
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+COLUMNS = dcgm_fake_manager.RECORDED_METRICS
+
+
+def tick(gpu_id, cycle):
+    return {name: gpu_id * 1000 + cycle * 10 + idx for idx, name in enumerate(COLUMNS)}
+
+
+class FakeInjector:
+    """Captures what the manager would inject into one hostengine shard"""
+
+    def __init__(self, gpu_ids):
+        self.gpu_ids = gpu_ids
+        self.cycles = []
+
+    def inject(self, values_by_gpu):
+        self.cycles.append(values_by_gpu)
+        return sum(len(values) for values in values_by_gpu.values())
+
+    def close(self):
+        pass
+
+
+class RecordingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='dcgm-recording-')
+        self.path = os.path.join(self.workdir, 'run.bin')
+        dcgm_fake_manager.ReplayProfile.readers.clear()
+
+    def tearDown(self):
+        for reader in dcgm_fake_manager.ReplayProfile.readers.values():
+            reader.close()
+        dcgm_fake_manager.ReplayProfile.readers.clear()
+        shutil.rmtree(self.workdir)
+
+    def record(self, cycles, gpus=2, interval=30.0):
+        recorder = dcgm_recording.Recorder(self.path, COLUMNS)
+        for cycle in range(cycles):
+            recorder.write_cycle(1000.0 + cycle * interval, {gpu: tick(gpu, cycle) for gpu in range(1, gpus + 1)})
+        recorder.close()
+
+
+class FormatTest(RecordingTestCase):
+    def test_cycles_round_trip(self):
+        self.record(3)
+        header = dcgm_recording.HEADER.size + len(COLUMNS) * dcgm_recording.COLUMN_NAME.size
+        self.assertEqual(os.path.getsize(self.path), header + 3 * 2 * (12 + 8 * len(COLUMNS)))
+        replay = dcgm_recording.Replay(self.path)
+        try:
+            self.assertEqual(replay.columns, COLUMNS)
+            for cycle in range(3):
+                self.assertEqual(replay.cycle(cycle), {1: tick(1, cycle), 2: tick(2, cycle)})
+            # Loops back to the start, and can be rewound
+            self.assertEqual(replay.cycle(3), {1: tick(1, 0), 2: tick(2, 0)})
+            self.assertEqual(replay.cycle(1)[2], tick(2, 1))
+        finally:
+            replay.close()
+
+    def test_without_loop_the_last_cycle_repeats(self):
+        self.record(2)
+        replay = dcgm_recording.Replay(self.path, loop=False)
+        self.assertEqual(replay.cycle(5), {1: tick(1, 1), 2: tick(2, 1)})
+        replay.close()
+
+    def test_appending_continues_the_recording(self):
+        self.record(2)
+        with open(self.path, 'ab') as f:
+            f.write(b'\x01\x02\x03')  # a row cut short by a crash
+        recorder = dcgm_recording.Recorder(self.path, COLUMNS)
+        recorder.write_cycle(2000.0, {1: tick(1, 9)})
+        recorder.close()
+        replay = dcgm_recording.Replay(self.path)
+        self.assertEqual(replay.cycle(2), {1: tick(1, 9)})
+        replay.close()
+        with self.assertRaises(ValueError):
+            dcgm_recording.Recorder(self.path, ('temp', 'power'))
+
+    def test_rejects_other_files(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a recording at all')
+        with self.assertRaises(ValueError):
+            dcgm_recording.Replay(self.path)
+        dcgm_recording.Recorder(self.path + '.empty', COLUMNS).close()
+        with self.assertRaises(ValueError):
+            dcgm_recording.Replay(self.path + '.empty')
+
+    def test_delay_follows_the_recording_and_speed(self):
+        self.record(3, interval=30.0)
+        replay = dcgm_recording.Replay(self.path, speed=10)
+        self.assertEqual(replay.next_delay(5), 5)
+        replay.cycle(0)
+        self.assertAlmostEqual(replay.next_delay(5), 3.0)
+        replay.cycle(2)
+        self.assertEqual(replay.next_delay(5), 5)
+        replay.close()
+
+    def test_large_recordings_are_not_read_into_memory(self):
+        self.record(2)
+        # Sparse multi-GB tail: opening and streaming the first cycles must not touch it
+        with open(self.path, 'r+b') as f:
+            f.truncate(4 * 1024 ** 3)
+        start = time.perf_counter()
+        replay = dcgm_recording.Replay(self.path)
+        try:
+            self.assertEqual(replay.cycle(1), {1: tick(1, 1), 2: tick(2, 1)})
+            self.assertGreater(replay.rows, 60 * 1000 * 1000)
+        finally:
+            replay.close()
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+
+class ReplayProfileTest(RecordingTestCase):
+    def manager(self, profile, **kwargs):
+        manager = dcgm_fake_manager.DCGMFakeManager(dcgm_dir=self.workdir, num_gpus=3, metric_profile=profile,
+                                                    **kwargs)
+        manager.metrics_file = os.path.join(self.workdir, 'manager-metrics.json')
+        manager.shards[0].injector = FakeInjector([1, 2, 3])
+        return manager
+
+    def test_recorded_run_replays_identically(self):
+        recording = self.manager('chaos', record_file=self.path)
+        for _ in range(4):
+            self.assertTrue(recording.inject_metrics())
+        recording.recorder.close()
+        replaying = self.manager('replay', replay_file=self.path, replay_speed=4)
+        for _ in range(4):
+            self.assertTrue(replaying.inject_metrics())
+        self.assertEqual(replaying.shards[0].injector.cycles, recording.shards[0].injector.cycles)
+        self.assertEqual(replaying.next_update_delay(30), 30)
+
+    @unittest.skipIf(np is None, "numpy not installed")
+    def test_numpy_engine_replays_per_gpu(self):
+        self.record(2, gpus=2)
+        profiles = dcgm_fake_manager.create_profiles(3, 'replay')
+        for profile in profiles.values():
+            profile.path = self.path
+        generator = dcgm_fake_manager.MetricGenerator(profiles, engine='numpy')
+        self.assertEqual(generator.generate([1, 2, 3]), {1: tick(1, 0), 2: tick(2, 0), 3: tick(1, 0)})
+        self.assertEqual(generator.generate([1, 2, 3])[2], tick(2, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
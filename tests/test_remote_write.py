@@ -0,0 +1,205 @@
+"""Tests for src/dcgm_remote_write.py against a local stand-in remote-write receiver"""
+
+import os
+import random
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import dcgm_exporter  # noqa: E402
+import dcgm_field_registry as registry  # noqa: E402
+import dcgm_remote_write as remote_write  # noqa: E402
+import common  # noqa: E402
+from common import decode_message, gpu_metrics  # noqa: E402
+
+
+def decode_write_request(body):
+    """-> ([(labels dict, label name order, [(value, timestamp)])], {family: (type, help, unit)})"""
+    request = decode_message(body)
+    series = []
+    for raw in request.get(1, []):
+        timeseries = decode_message(raw)
+        names, labels = [], {}
+        for raw_label in timeseries[1]:
+            label = decode_message(raw_label)
+            names.append(label[1][0].decode())
+            labels[names[-1]] = label[2][0].decode()
+        samples = []
+        for raw_sample in timeseries[2]:
+            sample = decode_message(raw_sample)
+            samples.append((sample[1][0], sample[2][0]))
+        series.append((labels, names, samples))
+    metadata = {}
+    for raw in request.get(3, []):
+        entry = decode_message(raw)
+        metadata[entry[2][0].decode()] = (entry[1][0], entry[4][0].decode(), entry.get(5, [b''])[0].decode())
+    return series, metadata
+
+
+class Receiver(common.Receiver):
+    """Stand-in remote-write receiver: decompresses and decodes every WriteRequest"""
+    ok_status = 204
+
+    def __init__(self):
+        self.series, self.metadata, self.batches = [], {}, []
+        super().__init__()
+
+    @property
+    def url(self):
+        return f'{self.base_url}/api/v1/write'
+
+    def record(self, headers, body):
+        series, metadata = decode_write_request(remote_write.snappy_decompress(body))
+        self.series.extend(series)
+        self.metadata.update(metadata)
+        self.batches.append(len(series))
+
+    def samples(self):
+        """{(name, instance, gpu, timestamp): value}"""
+        return {(labels['__name__'], labels.get('instance'), labels['gpu'], timestamp): value
+                for labels, _, samples in self.series for value, timestamp in samples}
+
+
+class SnappyTest(unittest.TestCase):
+    def test_round_trip(self):
+        rng = random.Random(7)
+        cases = [b'', b'a', b'abcd' * 1000, bytes(rng.getrandbits(8) for _ in range(5000)), b'x' * 100000,
+                 remote_write.WriteRequestEncoder().encode(
+                     [(1700000000000, (), gpu, values, len(values)) for gpu, values in gpu_metrics(4).items()], True)]
+        for data in cases:
+            with self.subTest(size=len(data)):
+                compressed = remote_write.snappy_compress(data)
+                self.assertEqual(remote_write.snappy_decompress(compressed), data)
+        self.assertLess(len(remote_write.snappy_compress(cases[-1])), len(cases[-1]) / 4)
+
+    def test_decodes_reference_encoding(self):
+        # Hand-assembled block: literal "abcd", 2-byte-offset copy (len 8, offset 4), 1-byte-offset copy (len 4)
+        block = bytes([16, 0x0c]) + b'abcd' +bytes([(7 << 2) | 2, 4, 0]) + bytes([1, 4])
+        self.assertEqual(remote_write.snappy_decompress(block), b'abcd' * 4)
+        with self.assertRaises(ValueError):
+            remote_write.snappy_decompress(bytes([8, (7 << 2) | 2, 4, 0]))
+
+
+class RemoteWriteTest(unittest.TestCase):
+    def setUp(self):
+        self.receiver = Receiver()
+        self.writers = []
+
+    def tearDown(self):
+        for writer in self.writers:
+            writer.close(timeout=1)
+        self.receiver.shutdown()
+        self.receiver.server_close()
+
+    def writer(self, **kwargs):
+        kwargs.setdefault('batch_send_deadline', 60)
+        kwargs.setdefault('external_labels', ())
+        writer = remote_write.RemoteWriter(self.receiver.url, **kwargs)
+        self.writers.append(writer)
+        return writer
+
+    def test_snapshots_arrive_as_labelled_samples(self):
+        writer = self.writer(external_labels=(('job', 'dcgm'),))
+        snapshot = dcgm_exporter.MetricsSnapshot('', gpu_metrics=gpu_metrics(3))
+        writer.publish(snapshot)
+        writer.publish(dcgm_exporter.MetricsSnapshot('# Error: dcgmi timeout\n'))
+        self.assertTrue(writer.flush(timeout=10))
+        headers = self.receiver.headers[0]
+        self.assertEqual(headers['Content-Encoding'], 'snappy')
+        self.assertEqual(headers['Content-Type'], 'application/x-protobuf')
+        self.assertEqual(headers['X-Prometheus-Remote-Write-Version'], '0.1.0')
+        self.assertEqual(len(self.receiver.series), 3 * len(registry.FIELDS))
+        timestamp = int(snapshot.timestamp * 1000)
+        samples = self.receiver.samples()
+        self.assertEqual(samples[('dcgm_gpu_temp', None, '2', timestamp)], gpu_metrics(3)['2']['150'])
+        for labels, names, _ in self.receiver.series:
+            self.assertEqual(names, sorted(names))
+            self.assertEqual(labels['job'], 'dcgm')
+            self.assertEqual(labels['device'], f"nvidia{labels['gpu']}")
+        energy = self.receiver.metadata['dcgm_total_energy_consumption_millijoules_total']
+        self.assertEqual(energy[0], remote_write.METADATA_TYPES['counter'])
+        self.assertEqual(energy[2], 'millijoules')
+        self.assertEqual(self.receiver.metadata['dcgm_gpu_temp'][0], remote_write.METADATA_TYPES['gauge'])
+
+    def test_series_are_sharded_by_gpu_and_batches_bounded(self):
+        per_send = 2 * len(registry.FIELDS)
+        writer = self.writer(shards=4, max_samples_per_send=per_send)
+        for refresh in range(3):
+            writer.submit(gpu_metrics(16, refresh), timestamp=1000.0 + refresh)
+        self.assertTrue(writer.flush(timeout=20))
+        self.assertEqual(len(self.receiver.samples()), 3 * 16 * len(registry.FIELDS))
+        self.assertEqual(writer.sent_samples, 3 * 16 * len(registry.FIELDS))
+        self.assertTrue(all(batch <= per_send for batch in self.receiver.batches))
+        self.assertGreater(len({shard.index for shard in writer.shard_of.values()}), 1)
+        self.assertLessEqual(len(self.receiver.clients), 4, "senders did not keep their connections alive")
+        # Every sample of a series went out in timestamp order
+        order = {}
+        for labels, _, samples in self.receiver.series:
+            order.setdefault((labels['__name__'], labels['gpu']), []).extend(ts for _, ts in samples)
+        for timestamps in order.values():
+            self.assertEqual(timestamps, sorted(timestamps))
+
+    def test_idle_shards_wait_during_a_flush(self):
+        self.receiver.delay = 0.5
+        writer = self.writer(shards=4)
+        writer.submit(gpu_metrics(1), timestamp=1000.0)
+        cpu = time.process_time()
+        self.assertTrue(writer.flush(timeout=10))
+        # The three shards with nothing queued must not spin while the fourth is in flight
+        self.assertLess(time.process_time() - cpu, 0.2)
+
+    def test_fleet_driver_labels_instances(self):
+        fleet = remote_write.FleetSimulator(nodes=3, gpus=2, metric_profile='stable', update_interval=15)
+        writer = self.writer(shards=2)
+        nodes = fleet.tick()
+        self.assertEqual(sorted(dict(labels)['instance'] for labels in nodes),
+                         ['fake-node-1', 'fake-node-2', 'fake-node-3'])
+        for labels, metrics in nodes.items():
+            self.assertEqual(sorted(metrics), ['1', '2'])
+            writer.submit(metrics, 1000.0, labels)
+        self.assertTrue(writer.flush(timeout=10))
+        keys = {(name, instance, gpu) for name, instance, gpu, _ in self.receiver.samples()}
+        self.assertEqual(len(keys), 3 * 2 * len(registry.FIELDS))
+        self.assertIn(('dcgm_gpu_temp', 'fake-node-3', '2'), keys)
+
+    def test_server_errors_are_retried_and_bad_requests_dropped(self):
+        self.receiver.statuses = [500, 429]
+        writer = self.writer(shards=1)
+        writer.submit(gpu_metrics(1))
+        self.assertTrue(writer.flush(timeout=10))
+        self.assertEqual(self.receiver.attempts, 3)
+        self.assertEqual(writer.retries, 2)
+        self.assertEqual(writer.sent_samples, len(registry.FIELDS))
+        self.receiver.statuses = [400]
+        writer.submit(gpu_metrics(1))
+        self.assertTrue(writer.flush(timeout=10))
+        self.assertEqual(self.receiver.attempts, 4)
+        self.assertEqual(writer.dropped_samples, len(registry.FIELDS))
+
+    def test_queue_capacity_drops_oldest(self):
+        writer = self.writer(shards=1, capacity=2 * len(registry.FIELDS), max_samples_per_send=10 ** 6)
+        for refresh in range(3):
+            writer.submit({'1': gpu_metrics(1)['1']}, timestamp=1000.0 + refresh)
+        self.assertEqual(writer.queued_samples(), 2 * len(registry.FIELDS))
+        self.assertEqual(writer.dropped_samples, len(registry.FIELDS))
+        self.assertTrue(writer.flush(timeout=10))
+        self.assertEqual({ts for _, _, _, ts in self.receiver.samples()}, {1001000, 1002000})
+
+    def test_invalid_url(self):
+        with self.assertRaises(ValueError):
+            remote_write.RemoteWriter('prometheus:9090')
+
+    def test_sustained_throughput(self):
+        writer = self.writer(shards=4, max_samples_per_send=2000)
+        start = time.perf_counter()
+        for refresh in range(3):
+            writer.submit(gpu_metrics(128, refresh), timestamp=1000.0 + refresh)
+        self.assertTrue(writer.flush(timeout=60))
+        elapsed = time.perf_counter() - start
+        self.assertEqual(writer.sent_samples, 3 * 128 * len(registry.FIELDS))
+        self.assertLess(elapsed, 20, f"{writer.sent_samples / elapsed:.0f} samples/s")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,262 @@
+"""Tests for src/dcgm_self_metrics.py and the exporter, UDS server and manager instrumentation"""
+
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import dcgm_exporter  # noqa: E402
+import dcgm_fake_manager  # noqa: E402
+import dcgm_self_metrics  # noqa: E402
+import dcgm_uds_server  # noqa: E402
+from common import decode_message, read_varint  # noqa: E402
+from test_exporter import ExporterServerTestCase, SlowCollector  # noqa: E402
+from test_uds_server import UDSServerTestCase, fetch  # noqa: E402
+
+LINE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})? (\S+)$')
+
+
+def parse_samples(text):
+    """{(name, labels): value} for every sample line; labels as a sorted tuple of pairs"""
+    samples = {}
+    for match in map(LINE.match, text.splitlines()):
+        if match:
+            labels = tuple(sorted(re.findall(r'(\w+)="([^"]*)"', match.group(2) or '')))
+            samples[(match.group(1), labels)] = float(match.group(3))
+    return samples
+
+
+def value(metric, labels=()):
+    return dict(metric.samples()).get(labels, 0)
+
+
+class FailingCollector:
+    name = 'failing'
+    requires_dcgmi = False
+
+    def collect(self):
+        raise RuntimeError("dcgmi dmon failed")
+
+    def close(self):
+        pass
+
+
+class FixedCollector:
+    """Collects the same `metrics` every time"""
+    name = 'fixed'
+    requires_dcgmi = False
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def collect(self):
+        return self.metrics
+
+    def close(self):
+        pass
+
+
+class FakePushClient:
+    def stats(self):
+        return {'samples_sent': 120, 'samples_dropped': 3, 'requests': 2, 'retries': 1}
+
+
+class RegistryRenderingTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = dcgm_self_metrics.Registry()
+        self.requests = self.registry.counter('demo_requests_total', 'Requests', ['code'])
+        self.temperature = self.registry.gauge('demo_temperature', 'Temperature')
+        self.latency = self.registry.histogram('demo_latency_seconds', 'Latency', ['phase'], buckets=(0.1, 1.0))
+        self.requests.inc(('200',))
+        self.requests.inc(('200',), 2)
+        self.temperature.set(21.5)
+        for seconds in (0.05, 0.1, 0.5, 3.0):
+            self.latency.observe(seconds, ('parse',))
+
+    def test_text_format(self):
+        samples = parse_samples(dcgm_self_metrics.render_text(self.registry.collect()))
+        self.assertEqual(samples[('demo_requests_total', (('code', '200'),))], 3)
+        self.assertEqual(samples[('demo_temperature', ())], 21.5)
+        buckets = [samples[('demo_latency_seconds_bucket', (('le', le), ('phase', 'parse')))]
+                   for le in ('0.1', '1.0', '+Inf')]
+        self.assertEqual(buckets, [2, 3, 4])
+        self.assertEqual(samples[('demo_latency_seconds_count', (('phase', 'parse'),))], 4)
+        self.assertAlmostEqual(samples[('demo_latency_seconds_sum', (('phase', 'parse'),))], 3.65)
+
+    def test_openmetrics_families(self):
+        text = dcgm_self_metrics.render_openmetrics(self.registry.collect())
+        self.assertIn('# TYPE demo_requests counter\n', text)
+        self.assertIn('demo_requests_total{code="200"} 3\n', text)
+        self.assertIn('# TYPE demo_latency_seconds histogram\n# UNIT demo_latency_seconds seconds\n', text)
+        self.assertNotIn('# UNIT demo_temperature', text)
+
+    def test_protobuf_families(self):
+        body = dcgm_self_metrics.render_protobuf(self.registry.collect())
+        families, pos = {}, 0
+        while pos < len(body):
+            length, pos = read_varint(body, pos)
+            family = decode_message(body[pos:pos + length])
+            pos += length
+            families[family[1][0].decode()] = family
+        self.assertEqual(families['demo_requests_total'][3][0], 0)
+        counter = decode_message(decode_message(families['demo_requests_total'][4][0])[3][0])
+        self.assertEqual(counter[1][0], 3.0)
+        latency = families['demo_latency_seconds']
+        self.assertEqual((latency[3][0], latency[5][0]), (4, b'seconds'))
+        histogram = decode_message(decode_message(latency[4][0])[7][0])
+        self.assertEqual(histogram[1][0], 4)
+        self.assertEqual([(decode_message(b)[1][0], decode_message(b)[2][0]) for b in histogram[3]],
+                         [(2, 0.1), (3, 1.0)])
+
+    def test_family_file_round_trip(self):
+        workdir = tempfile.mkdtemp(prefix='dcgm-self-metrics-')
+        try:
+            path = os.path.join(workdir, 'manager.json')
+            family_file = dcgm_self_metrics.FamilyFile(path)
+            self.assertEqual(family_file.load(), [])
+            dcgm_self_metrics.write_families(path, self.registry.collect())
+            self.assertEqual(family_file.load(), self.registry.collect())
+            self.temperature.set(30.0)
+            dcgm_self_metrics.write_families(path, self.registry.collect())
+            os.utime(path, ns=(0, time.time_ns() + 10 ** 9))
+            text = dcgm_self_metrics.render_text(family_file.load())
+            self.assertIn('demo_temperature 30.0\n', text)
+        finally:
+            shutil.rmtree(workdir)
+
+    def test_recording_is_cheap(self):
+        rounds = 100000
+        start = time.perf_counter()
+        for _ in range(rounds):
+            self.requests.inc(('200',))
+            self.latency.observe(0.002, ('parse',))
+        per_event = (time.perf_counter() - start) / (2 * rounds)
+        self.assertLess(per_event, 5e-6, f"{per_event * 1e9:.0f} ns per recorded event")
+
+
+class ExporterInstrumentationTest(ExporterServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.saved_manager_metrics = dcgm_exporter.manager_metrics
+        self.workdir = tempfile.mkdtemp(prefix='dcgm-self-metrics-')
+        dcgm_exporter.manager_metrics = dcgm_self_metrics.FamilyFile(os.path.join(self.workdir, 'manager.json'))
+
+    def tearDown(self):
+        dcgm_exporter.manager_metrics = self.saved_manager_metrics
+        dcgm_exporter.push_clients.clear()
+        shutil.rmtree(self.workdir)
+        super().tearDown()
+
+    def test_refresh_exports_collection_phases(self):
+        def collections():
+            entry = value(dcgm_exporter.COLLECTION_DURATION, ('collect',))
+            return sum(entry[0]) if entry else 0
+
+        before = collections()
+        dcgm_exporter.collector = SlowCollector(delay=0)
+        dcgm_exporter.refresh_metrics_cache()
+        self.assertEqual(collections(), before + 1)
+        samples = parse_samples(dcgm_exporter.metrics_cache.body.decode())
+        for phase in ('collect', 'render'):
+            self.assertGreaterEqual(
+                samples[('dcgm_exporter_collection_duration_seconds_count', (('phase', phase),))], 1)
+        self.assertIn(b'dcgm_gpu_temp{gpu="1",device="nvidia1"}', dcgm_exporter.metrics_cache.body)
+        openmetrics = dcgm_exporter.metrics_cache.payloads['openmetrics'].body.decode()
+        self.assertTrue(openmetrics.endswith('# EOF\n'))
+        self.assertEqual(openmetrics.count('# EOF'), 1)
+        self.assertIn('# TYPE dcgm_exporter_scrape_duration_seconds histogram\n', openmetrics)
+
+    def test_failed_collection_is_counted_and_still_exported(self):
+        errors = value(dcgm_exporter.COLLECTION_ERRORS, ('dcgmi',))
+        dcgm_exporter.collector = SlowCollector(delay=0)
+        dcgm_exporter.refresh_metrics_cache()
+        dcgm_exporter.collector = FailingCollector()
+        dcgm_exporter.refresh_metrics_cache()
+        snapshot = dcgm_exporter.metrics_cache
+        self.assertTrue(snapshot.body.startswith(b'# Error: dcgmi command failed\n'))
+        samples = parse_samples(snapshot.body.decode())
+        self.assertEqual(samples[('dcgm_exporter_collection_errors_total', (('reason', 'dcgmi'),))], errors + 1)
+        self.assertIn(('dcgm_exporter_cache_age_seconds', ()), samples)
+        self.assertIn('openmetrics', snapshot.payloads)
+        self.assertIn(b'dcgm_exporter_collection_errors_total', snapshot.payloads['protobuf'].body)
+
+    def test_scrapes_are_counted(self):
+        dcgm_exporter.metrics_cache = dcgm_exporter.build_snapshot({'1': {'150': 50.0}}, ['openmetrics'])
+        scrapes = value(dcgm_exporter.SCRAPES, ('openmetrics', '200'))
+        scrape_bytes = value(dcgm_exporter.SCRAPE_BYTES, ('openmetrics',))
+        for _ in range(3):
+            response, body = self.get('/metrics', {'Accept': 'application/openmetrics-text'})
+            self.assertEqual(response.status, 200)
+        self.assertEqual(value(dcgm_exporter.SCRAPES, ('openmetrics', '200')), scrapes + 3)
+        self.assertEqual(value(dcgm_exporter.SCRAPE_BYTES, ('openmetrics',)), scrape_bytes + 3 * len(body))
+        response, _ = self.get('/metrics', {'Accept': 'application/openmetrics-text',
+                                            'If-None-Match': response.getheader('ETag')})
+        self.assertEqual(response.status, 304)
+        self.assertGreaterEqual(value(dcgm_exporter.SCRAPES, ('openmetrics', '304')), 1)
+
+    def test_etag_survives_refreshes_of_unchanged_series(self):
+        dcgm_exporter.collector = FixedCollector({'1': {'150': 50.0}})
+        accepts = ('text/plain', 'application/openmetrics-text', 'application/vnd.google.protobuf')
+        with mock.patch.object(dcgm_exporter, 'SELF_METRICS', True):
+            dcgm_exporter.refresh_metrics_cache()
+            first = {accept: self.get('/metrics', {'Accept': accept}) for accept in accepts}
+            dcgm_exporter.refresh_metrics_cache()
+            for accept, (response, body) in first.items():
+                with self.subTest(accept=accept):
+                    etag = response.getheader('ETag')
+                    self.assertTrue(etag.startswith('W/"'), etag)
+                    again, refreshed = self.get('/metrics', {'Accept': accept})
+                    # The self metrics moved on (scrapes, collection durations); the GPU series and ETag did not
+                    self.assertNotEqual(refreshed, body)
+                    self.assertEqual(again.getheader('ETag'), etag)
+                    for tag in (etag, etag[2:]):
+                        self.assertEqual(self.get('/metrics', {'Accept': accept, 'If-None-Match': tag})[0].status, 304)
+            dcgm_exporter.collector.metrics = {'1': {'150': 51.0}}
+            dcgm_exporter.refresh_metrics_cache()
+        response, _ = self.get('/metrics', {'If-None-Match': first['text/plain'][0].getheader('ETag')})
+        self.assertEqual(response.status, 200)
+
+    def test_manager_and_push_metrics_are_included(self):
+        dcgm_fake_manager.INJECTION_CYCLES.inc(('success',))
+        dcgm_fake_manager.INJECTION_GPU_DURATION.observe(0.0002)
+        dcgm_self_metrics.write_families(dcgm_exporter.manager_metrics.path,
+                                         dcgm_fake_manager.MANAGER_METRICS.collect())
+        dcgm_exporter.push_clients.append(('remote_write', FakePushClient()))
+        dcgm_exporter.collector = SlowCollector(delay=0)
+        dcgm_exporter.refresh_metrics_cache()
+        samples = parse_samples(dcgm_exporter.metrics_cache.body.decode())
+        self.assertGreaterEqual(samples[('dcgm_fake_manager_injection_cycles_total', (('result', 'success'),))], 1)
+        self.assertGreaterEqual(samples[('dcgm_fake_manager_injection_gpu_duration_seconds_count', ())], 1)
+        self.assertEqual(samples[('dcgm_exporter_push_samples_total',
+                                  (('protocol', 'remote_write'), ('result', 'dropped')))], 3)
+        self.assertEqual(samples[('dcgm_exporter_push_retries_total', (('protocol', 'remote_write'),))], 1)
+        # The manager's registry stays out of the exporter's own
+        self.assertNotIn('dcgm_fake_manager', dcgm_self_metrics.render_text(dcgm_self_metrics.REGISTRY.collect()))
+
+    def test_self_metrics_can_be_disabled(self):
+        saved = dcgm_exporter.SELF_METRICS
+        dcgm_exporter.SELF_METRICS = False
+        try:
+            dcgm_exporter.collector = SlowCollector(delay=0)
+            dcgm_exporter.refresh_metrics_cache()
+        finally:
+            dcgm_exporter.SELF_METRICS = saved
+        self.assertNotIn(b'dcgm_exporter_', dcgm_exporter.metrics_cache.body)
+
+
+class UDSInstrumentationTest(UDSServerTestCase):
+    def test_connections_and_bytes_are_counted(self):
+        served = value(dcgm_uds_server.UDS_CONNECTIONS, ('snapshot',))
+        sent = value(dcgm_uds_server.UDS_BYTES)
+        response = fetch(self.uds_path)
+        self.assertEqual(value(dcgm_uds_server.UDS_CONNECTIONS, ('snapshot',)), served + 1)
+        self.assertEqual(value(dcgm_uds_server.UDS_BYTES), sent + len(response))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+"""Tests for src/dcgm_trace.py and the manager's trace profile (no DCGM required)"""
+
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import dcgm_fake_manager  # noqa: E402
+import dcgm_trace  # noqa: E402
+
+DMON_TRACE = """\
+#Entity   TMPTR  POWER     GPUTL  MCUTL  SMCLK  MMCLK  FBUSD
+ID        C      W         %      %      MHZ    MHZ    MB
+GPU 0     41     71.250    0      0      210    877    0
+GPU 1     63     250.100   97     40     1410   877    30000
+GPU 0     42     N/A       5      1      1410   877    512
+GPU 1     64     251.000   98     41     1410   877    30100
+GPU 0     43     90.000    10     2      1410   877    1024
+GPU 1     65     252.500   99     42     1410   877    30200
+"""
+
+SCRAPES = """\
+# HELP DCGM_FI_DEV_GPU_TEMP GPU temperature (in C).
+# TYPE DCGM_FI_DEV_GPU_TEMP gauge
+DCGM_FI_DEV_GPU_TEMP{gpu="0",UUID="GPU-a",device="nvidia0",Hostname="node7"} 55
+DCGM_FI_DEV_GPU_TEMP{gpu="1",UUID="GPU-b",device="nvidia1",Hostname="node7"} 70
+DCGM_FI_DEV_POWER_USAGE{gpu="0",UUID="GPU-a",device="nvidia0",Hostname="node7"} 123.4
+DCGM_FI_DEV_XID_ERRORS{gpu="0",UUID="GPU-a",device="nvidia0",Hostname="node7"} 0
+DCGM_FI_DEV_GPU_TEMP{gpu="0",UUID="GPU-a",device="nvidia0",Hostname="node7"} 57
+DCGM_FI_DEV_GPU_TEMP{gpu="1",UUID="GPU-b",device="nvidia1",Hostname="node7"} 71
+"""
+
+NVIDIA_SMI_CSV = """\
+timestamp, index, temperature.gpu, power.draw [W], utilization.gpu [%], memory.used [MiB]
+2024/01/15 10:00:00.000, 0, 40, 70.00 W, 0 %, 0 MiB
+2024/01/15 10:00:00.000, 1, 60, 200.00 W, 90 %, 20000 MiB
+2024/01/15 10:00:04.000, 0, 45, 80.00 W, 10 %, 100 MiB
+2024/01/15 10:00:04.000, 1, 61, 210.00 W, [N/A], 20100 MiB
+2024/01/15 10:00:09.000, 0, 50, 90.00 W, 20 %, 200 MiB
+2024/01/15 10:00:11.000, 0, 55, 95.00 W, 30 %, 300 MiB
+"""
+
+
+def ticks(reader, count):
+    return [reader.tick(index) for index in range(count)]
+
+
+class TraceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='dcgm-trace-')
+        dcgm_fake_manager.TraceProfile.readers.clear()
+
+    def tearDown(self):
+        dcgm_fake_manager.TraceProfile.readers.clear()
+        shutil.rmtree(self.workdir)
+
+    def write(self, name, text):
+        path = os.path.join(self.workdir, name)
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(path, 'wt') as f:
+            f.write(text)
+        return path
+
+
+class TraceFormatTest(TraceTestCase):
+    def test_dmon_log(self):
+        path = self.write('node7.dmon', DMON_TRACE)
+        reader = dcgm_trace.TraceReader(path, interval=1.0)
+        self.assertEqual(reader.format, 'dmon')
+        first, second, third = ticks(reader, 3)
+        self.assertEqual(first['1'], {'temp': 63, 'power': 250.1, 'gpu_util': 97, 'mem_util': 40, 'sm_clock': 1410,
+                                      'mem_clock': 877, 'fb_used': 30000})
+        # N/A leaves the previous value in place
+        self.assertEqual((second['0']['temp'], second['0']['power']), (42, 71.25))
+        self.assertEqual(third['0']['power'], 90.0)
+        self.assertEqual(reader.gpus, ['0', '1'])
+
+    def test_exporter_scrapes(self):
+        path = self.write('node7.prom', SCRAPES)
+        reader = dcgm_trace.TraceReader(path, interval=1.0)
+        self.assertEqual(reader.format, 'prometheus')
+        first, second = ticks(reader, 2)
+        self.assertEqual(first, {'0': {'temp': 55, 'power': 123.4}, '1': {'temp': 70}})
+        self.assertEqual(second['0'], {'temp': 57, 'power': 123.4})
+
+    def test_nvidia_smi_csv_is_resampled(self):
+        path = self.write('node7.csv.gz', NVIDIA_SMI_CSV)
+        reader = dcgm_trace.TraceReader(path, interval=5.0, loop=False)
+        self.assertEqual(reader.format, 'csv')
+        # Ticks at 0s, 5s, 10s, 15s of trace time keep each GPU's last value at or before the tick
+        temps = [(tick['0']['temp'], tick['1']['temp']) for tick in ticks(reader, 4)]
+        self.assertEqual(temps, [(40, 60), (45, 61), (50, 61), (55, 61)])
+        self.assertEqual(reader.tick(1)['1']['gpu_util'], 90)
+        self.assertEqual(reader.tick(1)['0']['power'], 80.0)
+        # Without looping the last tick is held
+        self.assertEqual(reader.tick(20)['0']['temp'], 55)
+
+    def test_column_mapping_and_wide_csv(self):
+        path = self.write('rack.csv', "time,gpu0_temp,gpu1_temp,node_watts\n"
+                                      "100,50,60,400\n101,51,61,410\n")
+        reader = dcgm_trace.TraceReader(path, interval=1.0,
+                                        columns='temp@0=gpu0_temp,temp@1=gpu1_temp,power=node_watts')
+        first, second = ticks(reader, 2)
+        self.assertEqual(first, {'0': {'temp': 50, 'power': 400}, '1': {'temp': 60}})
+        self.assertEqual(second['1'], {'temp': 61})
+        with self.assertRaises(ValueError):
+            dcgm_trace.parse_columns('voltage=volts')
+
+    def test_loops_back_to_the_start(self):
+        path = self.write('node7.dmon', DMON_TRACE)
+        reader = dcgm_trace.TraceReader(path, interval=1.0)
+        self.assertEqual([tick['0']['temp'] for tick in ticks(reader, 7)], [41, 42, 43, 41, 42, 43, 41])
+        self.assertEqual(reader.passes, 2)
+
+    def test_trace_without_known_metrics(self):
+        path = self.write('other.csv', "timestamp,gpu,fan_speed\n1,0,40\n")
+        with self.assertRaises(ValueError):
+            dcgm_trace.TraceReader(path, interval=1.0).tick(0)
+
+
+class TraceProfileTest(TraceTestCase):
+    def test_profile_maps_fake_gpus_to_trace_gpus(self):
+        path = self.write('node7.prom', SCRAPES)
+        profiles = dcgm_fake_manager.create_profiles(3, 'trace')
+        for profile in profiles.values():
+            profile.path, profile.interval = path, 1.0
+        profiles[3].gpu_map = {3: '1'}
+        generator = dcgm_fake_manager.MetricGenerator(profiles)
+        first = generator.generate([1, 2, 3])
+        self.assertEqual((first[1]['temp'], first[2]['temp'], first[3]['temp']), (55, 70, 70))
+        self.assertEqual(first[1]['power'], 123)
+        # Metrics the trace lacks fall back to an idle GPU
+        self.assertEqual(first[2]['power'], dcgm_fake_manager.TRACE_DEFAULTS['power'])
+        self.assertEqual(generator.generate([1, 2, 3])[1]['temp'], 57)
+        self.assertEqual(len(dcgm_fake_manager.TraceProfile.readers), 1)
+        self.assertEqual(dcgm_fake_manager.parse_gpu_map('1=0, 2=3,bad'), {1: '0', 2: '3'})
+
+    def test_large_trace_streams_in_constant_memory_and_keeps_up(self):
+        gpus, frames = 512, 100
+        path = os.path.join(self.workdir, 'fleet.dmon')
+        with open(path, 'w') as f:
+            f.write("#Entity TMPTR POWER GPUTL MCUTL SMCLK MMCLK FBUSD\n")
+            for frame in range(frames):
+                f.writelines(f"GPU {gpu} {40 + frame % 40} {100 + gpu % 200}.5 {frame % 100} 30 1410 877 {gpu}\n"
+                             for gpu in range(gpus))
+        reader = dcgm_trace.TraceReader(path, interval=1.0, loop=False)
+        tracemalloc.start()
+        try:
+            start = time.perf_counter()
+            for index in range(10):
+                reader.tick(index)
+            _, early_peak = tracemalloc.get_traced_memory()
+            for index in range(10, frames):
+                reader.tick(index)
+            per_tick = (time.perf_counter() - start) / frames
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(reader.tick(frames - 1)['511']['temp'], 40 + (frames - 1) % 40)
+        # Reading 10x more of the trace does not grow memory: only the current frame and per-GPU state are kept
+        self.assertLess(peak, early_peak * 1.5, f"{early_peak / 2**20:.1f} -> {peak / 2**20:.1f} MiB peak")
+        # Sub-second update intervals for hundreds of GPUs (timed under tracemalloc, so with margin)
+        self.assertLess(per_tick, 0.25, f"{per_tick * 1000:.0f} ms per {gpus}-GPU tick")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,255 @@
+"""Unit tests for src/dcgm_uds_server.py (no DCGM required)"""
+
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import dcgm_exporter  # noqa: E402
+import dcgm_uds_server  # noqa: E402
+from common import wait_until  # noqa: E402
+
+
+def fetch(uds_path, timeout=30, accept=None):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(uds_path)
+        accept_header = f'Accept: {accept}\r\n' if accept else ''
+        sock.sendall(f'GET /metrics HTTP/1.1\r\nHost: localhost\r\n{accept_header}\r\n'.encode())
+        chunks = []
+        while True:
+            try:
+                chunk = sock.recv(65536)
+            except ConnectionResetError:
+                break
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b''.join(chunks)
+    finally:
+        sock.close()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+
+class UDSServerTestCase(unittest.TestCase):
+    max_clients = 8
+    max_queued = 64
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='dcgm-uds-test-')
+        self.uds_path = os.path.join(self.workdir, 'metrics.sock')
+        self.snapshot = dcgm_exporter.MetricsSnapshot(
+            dcgm_exporter.render_metrics({str(g): {'150': 50.0 + g} for g in range(1, 65)}))
+        self.broadcaster = dcgm_uds_server.SnapshotBroadcaster()
+        self.server = dcgm_uds_server.UDSServer(
+            self.uds_path, dcgm_uds_server.handle_snapshot_client, (lambda: self.snapshot, self.broadcaster),
+            max_clients=self.max_clients, max_queued=self.max_queued)
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(ready,), daemon=True)
+        self.thread.start()
+        self.assertTrue(ready.wait(5))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join(timeout=5)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class SnapshotServingTest(UDSServerTestCase):
+    def test_serves_snapshot_bytes(self):
+        response = fetch(self.uds_path)
+        head, _, body = response.partition(b'\r\n\r\n')
+        self.assertTrue(head.startswith(b'HTTP/1.1 200 OK'))
+        self.assertIn(f'Content-Length: {len(self.snapshot.body)}'.encode(), head)
+        self.assertEqual(body, self.snapshot.body)
+
+    def test_content_type_follows_accept(self):
+        self.snapshot = dcgm_exporter.build_snapshot({'1': {'150': 50.0}}, ['openmetrics', 'protobuf'])
+        for accept, fmt in (('', 'text'), ('application/openmetrics-text', 'openmetrics'),
+                            ('application/vnd.google.protobuf', 'protobuf')):
+            with self.subTest(accept=accept):
+                head, _, body = fetch(self.uds_path, accept=accept).partition(b'\r\n\r\n')
+                payload = self.snapshot.payloads[fmt]
+                self.assertIn(f'Content-Type: {payload.content_type}\r\n'.encode(), head)
+                self.assertEqual(body, payload.body)
+
+    def test_connection_closed_without_request_is_not_an_error(self):
+        errors = dcgm_uds_server.UDS_CONNECTIONS.values.get(('error',), 0)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(5)
+        sock.connect(self.uds_path)
+        sock.shutdown(socket.SHUT_WR)
+        self.assertEqual(sock.recv(1024), b'')
+        sock.close()
+        self.assertEqual(dcgm_uds_server.UDS_CONNECTIONS.values.get(('error',), 0), errors)
+        self.assertTrue(fetch(self.uds_path).startswith(b'HTTP/1.1 200 OK'))
+
+
+class SubscriptionTest(UDSServerTestCase):
+    def subscribe(self, query=''):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(5)
+        sock.connect(self.uds_path)
+        sock.sendall(f'GET /subscribe{query} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+        stream = sock.makefile('rb')
+        self.addCleanup(sock.close)
+        self.addCleanup(stream.close)
+        headers = []
+        while True:
+            line = stream.readline()
+            if line in (b'\r\n', b''):
+                break
+            headers.append(line)
+        self.assertTrue(headers[0].startswith(b'HTTP/1.1 200'))
+        self.assertIn(b'Transfer-Encoding: chunked\r\n', headers)
+        return sock, stream
+
+    def read_frame(self, stream):
+        size = int(stream.readline().strip(), 16)
+        frame = stream.read(size)
+        self.assertEqual(stream.read(2), b'\r\n')
+        return frame
+
+    def publish(self, metrics):
+        self.snapshot = dcgm_exporter.MetricsSnapshot(dcgm_exporter.render_metrics(metrics))
+        self.broadcaster.publish(self.snapshot)
+        return self.snapshot
+
+    def test_full_subscription_pushes_each_snapshot(self):
+        _, stream = self.subscribe()
+        first = self.read_frame(stream)
+        self.assertTrue(first.startswith(b'# dcgm-snapshot full'))
+        self.assertTrue(first.endswith(self.snapshot.body))
+        update = self.publish({'1': {'150': 99.0}})
+        second = self.read_frame(stream)
+        self.assertEqual(second.split(b'\n', 1)[1], update.body)
+
+    def test_delta_subscription_pushes_only_changes(self):
+        metrics = {str(g): {'150': 50.0 + g} for g in range(1, 65)}
+        self.publish(metrics)
+        _, stream = self.subscribe('?mode=delta')
+        self.read_frame(stream)
+        time.sleep(0.05)  # let the broadcaster finish the first publish
+
+        metrics['1'] = {'150': 90.0}
+        del metrics['64']
+        start = time.perf_counter()
+        self.publish(metrics)
+        frame = self.read_frame(stream)
+        latency = time.perf_counter() - start
+
+        lines = frame.rstrip(b'\n').split(b'\n')
+        self.assertTrue(lines[0].startswith(b'# dcgm-snapshot delta'))
+        self.assertEqual(lines[1:], [
+            b'dcgm_gpu_temp{gpu="1",device="nvidia1"} 90.0',
+            b'# removed dcgm_gpu_temp{gpu="64",device="nvidia64"}',
+        ])
+        self.assertLess(latency, 0.5)
+
+    def test_unchanged_snapshot_is_not_pushed(self):
+        sock, stream = self.subscribe('?mode=delta')
+        self.read_frame(stream)
+        self.broadcaster.publish(dcgm_exporter.MetricsSnapshot(self.snapshot.body.decode()))
+        sock.settimeout(0.3)
+        with self.assertRaises(socket.timeout):
+            stream.readline()
+
+    def test_stuck_subscriber_does_not_delay_others(self):
+        # Subscribed first, so it is written to first, and never reads
+        stuck, _ = self.subscribe()
+        _, stream = self.subscribe()
+        self.read_frame(stream)
+        latencies = []
+        for tick in range(3 * dcgm_uds_server.UDS_SUBSCRIBER_BACKLOG):
+            # ~100 KB frames fill the stuck socket's buffer within a few snapshots
+            update = self.publish({str(g): {'150': float(tick)} for g in range(1, 2001)})
+            start = time.perf_counter()
+            frame = self.read_frame(stream)
+            latencies.append(time.perf_counter() - start)
+            self.assertEqual(frame.split(b'\n', 1)[1], update.body)
+        self.assertLess(max(latencies), 0.5)
+        # Too far behind: dropped, and the other subscriber is still served
+        wait_until(lambda: len(self.broadcaster.subscribers) == 1)
+        stuck.settimeout(5)
+        while stuck.recv(1 << 20):
+            pass
+
+
+class BurstStressTest(UDSServerTestCase):
+    clients = 1000
+
+    def test_thousand_simultaneous_consumers(self):
+        baseline_threads = threading.active_count()
+        barrier = threading.Barrier(self.clients)
+        results = [None] * self.clients
+        peak_threads = []
+
+        def consumer(i):
+            barrier.wait()
+            start = time.perf_counter()
+            try:
+                response = fetch(self.uds_path)
+            except OSError as e:
+                results[i] = (type(e).__name__, time.perf_counter() - start)
+                return
+            results[i] = (response[:12], time.perf_counter() - start)
+
+        threads = [threading.Thread(target=consumer, args=(i,), daemon=True) for i in range(self.clients)]
+        for t in threads:
+            t.start()
+        # All consumer threads exist now; the server must not have added one per connection
+        peak_threads.append(threading.active_count() - baseline_threads - self.clients)
+        for t in threads:
+            t.join(timeout=60)
+
+        statuses = [r[0] for r in results]
+        served = [r[1] for r in results if r[0] == b'HTTP/1.1 200']
+        rejected = statuses.count(b'HTTP/1.1 503')
+        self.assertEqual(len(served) + rejected, self.clients, f"unexpected results: {set(statuses)}")
+        self.assertEqual(rejected, self.server.rejected)
+        self.assertGreater(len(served), self.max_clients + self.max_queued - 1)
+        self.assertLessEqual(max(peak_threads), self.max_clients)
+        self.assertLess(percentile(served, 99), 5.0)
+
+
+class RejectTest(UDSServerTestCase):
+    max_clients = 1
+    max_queued = 1
+
+    def connect_silently(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(5)
+        sock.connect(self.uds_path)
+        self.addCleanup(sock.close)
+        return sock
+
+    def test_silent_clients_do_not_stall_accepts(self):
+        # Occupy the worker and the queue slot with clients that never send a request
+        held = [self.connect_silently()]
+        wait_until(lambda: self.server.accepted == 1 and self.server.pending.empty())
+        held.append(self.connect_silently())
+        wait_until(self.server.pending.full)
+        rejected = self.server.rejected
+        start = time.perf_counter()
+        clients = [self.connect_silently() for _ in range(20)]
+        responses = [client.recv(1024) for client in clients]
+        elapsed = time.perf_counter() - start
+        self.assertEqual(responses, [dcgm_uds_server.REJECT_RESPONSE] * 20)
+        self.assertEqual(self.server.rejected, rejected + 20)
+        self.assertLess(elapsed, 0.5, f"{elapsed:.2f}s to reject 20 silent clients")
+        for sock in held:
+            sock.close()
+
+
+if __name__ == '__main__':
+    unittest.main()